@@ -0,0 +1,5 @@
+# app/commands/__init__.py
+"""
+运维命令，均以 ``python -m app.commands.<name>`` 方式运行，直接连接 DB_* 配置的数据库。
+升级后先执行 ``python -m app.commands.migrate`` 一次补齐所有功能的表、列和索引。
+"""
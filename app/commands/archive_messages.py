@@ -0,0 +1,51 @@
+# app/commands/archive_messages.py
+"""
+冷数据归档::
+
+    python -m app.commands.archive_messages --ensure-schema --days 180
+    python -m app.commands.archive_messages --dialog-id 123456 --before 2024-01-01
+    python -m app.commands.archive_messages --list
+
+把早于截止时间的消息及其媒体写入 ARCHIVE_DIR 下的 Parquet 分段并从热表分批
+删除；中断后重新执行会先完成上次没删完的分段。
+"""
+import argparse
+import json
+import logging
+from datetime import datetime
+
+from ..database import SessionLocal, get_engine
+from ..models import ArchiveSegment
+from ..services import ArchiveService
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="TGCrawler 冷数据归档")
+    parser.add_argument("--dialog-id", type=int, help="只归档一个频道，默认全部")
+    parser.add_argument("--days", type=int, help="归档多少天以前的消息，默认 ARCHIVE_AFTER_DAYS")
+    parser.add_argument("--before", type=datetime.fromisoformat, help="归档此时间（UTC）之前的消息，优先于 --days")
+    parser.add_argument("--ensure-schema", action="store_true", help="先补建 archive_segments 表")
+    parser.add_argument("--list", action="store_true", help="只列出已归档的分段")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.ensure_schema:
+        ArchiveSegment.__table__.create(get_engine(), checkfirst=True)
+    with SessionLocal() as db:
+        service = ArchiveService(db)
+        if args.list:
+            for obj in service.get_segments(args.dialog_id):
+                print(json.dumps({
+                    "dialog_id": obj.dialog_id, "path": obj.path, "status": obj.status.value,
+                    "message_ids": [obj.min_message_id, obj.max_message_id],
+                    "dates": [str(obj.min_date), str(obj.max_date)], "rows": obj.row_count, "bytes": obj.file_bytes,
+                }, ensure_ascii=False))
+            return
+        report = service.archive(args.dialog_id, args.before, args.days)
+        print(json.dumps(report, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
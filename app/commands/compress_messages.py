@@ -0,0 +1,78 @@
+# app/commands/compress_messages.py
+"""
+消息正文压缩迁移::
+
+    python -m app.commands.compress_messages --ensure-schema --train
+    python -m app.commands.compress_messages --dialog-id 123456 --pause 0.2
+    python -m app.commands.compress_messages --decompress
+    python -m app.commands.compress_messages --stats
+
+按主键分批改写，每批一个事务，可以在服务运行时执行；中断后重新执行会
+从还没处理的行继续。新消息是否压缩写入由 MESSAGE_COMPRESSION 控制。
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from ..database import SessionLocal, get_engine
+from ..models import Message, CompressionDict
+from ..services import CompressionService
+
+logger = logging.getLogger(__name__)
+
+_NEW_COLUMNS = ("message_zstd", "message_dict_id")
+
+
+def ensure_schema(engine: Engine) -> None:
+    """补建 compression_dicts 表和 messages 表上的压缩列（已存在时跳过）"""
+    CompressionDict.__table__.create(engine, checkfirst=True)
+    existing = {column["name"] for column in inspect(engine).get_columns(Message.__tablename__)}
+    with engine.begin() as conn:
+        for name in _NEW_COLUMNS:
+            if name in existing:
+                continue
+            column = Message.__table__.c[name]
+            conn.execute(text(
+                f"ALTER TABLE {Message.__tablename__} ADD COLUMN {name} {column.type.compile(dialect=engine.dialect)} NULL"
+            ))
+            logger.info("已添加列 messages.%s", name)
+
+
+async def _main(args) -> None:
+    if args.ensure_schema:
+        ensure_schema(get_engine())
+    with SessionLocal() as db:
+        service = CompressionService(db)
+        if args.stats:
+            print(json.dumps(service.get_stats(args.dialog_id), ensure_ascii=False))
+            return
+        if args.train:
+            trained = [service.train(args.dialog_id)] if args.dialog_id else service.train_all()
+            logger.info("训练了 %s 个字典", len([obj for obj in trained if obj is not None]))
+        if args.decompress:
+            report = await service.decompress_existing(args.dialog_id, args.batch_size, args.pause)
+        else:
+            report = await service.compress_existing(args.dialog_id, args.batch_size, args.pause)
+        print(json.dumps(report, ensure_ascii=False))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="TGCrawler 消息正文压缩迁移")
+    parser.add_argument("--dialog-id", type=int, help="只处理一个频道，默认全部")
+    parser.add_argument("--ensure-schema", action="store_true", help="先补建压缩所需的表和列")
+    parser.add_argument("--train", action="store_true", help="迁移前先训练字典（全局字典 + 每个频道一个）")
+    parser.add_argument("--decompress", action="store_true", help="把已压缩的行还原为明文")
+    parser.add_argument("--stats", action="store_true", help="只输出明文/压缩存储的行数和字节数")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批改写的行数")
+    parser.add_argument("--pause", type=float, default=0.0, help="每批之间暂停的秒数")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# app/commands/fingerprint_rows.py
+"""
+内容指纹迁移::
+
+    python -m app.commands.fingerprint_rows --ensure-schema
+    python -m app.commands.fingerprint_rows --backfill --pause 0.2
+
+--ensure-schema 给 messages / medias 补建 content_hash 列（已存在时跳过）。
+升级前写入的行没有指纹，下一次重抓会把它们各写一次再补上指纹；
+--backfill 提前按主键分批补齐，每批一个事务，可以在服务运行时执行，中断后重新执行会继续。
+"""
+import argparse
+import json
+import logging
+import time
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from ..database import SessionLocal, get_engine
+from ..models import Message, Media
+from ..repositories import IngestRepository, shards
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_schema(engine: Engine) -> None:
+    for table in (Message.__table__, Media.__table__):
+        existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+        if "content_hash" in existing:
+            continue
+        column_type = table.c.content_hash.type.compile(dialect=engine.dialect)
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN content_hash {column_type} NULL"))
+        logger.info("已添加列 %s.content_hash", table.name)
+
+
+def backfill(batch_size: int, pause: float) -> dict:
+    report = {}
+    with SessionLocal() as db:
+        repo = IngestRepository(db)
+        for table_name in ("messages", "medias"):
+            start = time.perf_counter()
+            total = 0
+            # 分片时逐个分片按主键补齐
+            for shard in shards.indexes():
+                after_pk = 0
+                while True:
+                    after_pk, count = repo.backfill_hashes(table_name, after_pk, batch_size, shard)
+                    if not count:
+                        break
+                    total += count
+                    if pause:
+                        time.sleep(pause)
+            report[table_name] = {"rows": total, "seconds": round(time.perf_counter() - start, 3)}
+            logger.info("%s 补齐指纹 %s 行", table_name, total)
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="TGCrawler 内容指纹迁移")
+    parser.add_argument("--ensure-schema", action="store_true", help="补建 content_hash 列")
+    parser.add_argument("--backfill", action="store_true", help="给还没有指纹的行补上指纹")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批处理的行数")
+    parser.add_argument("--pause", type=float, default=0.0, help="每批之间暂停的秒数")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.ensure_schema:
+        ensure_schema(get_engine())
+    if args.backfill:
+        print(json.dumps(backfill(args.batch_size, args.pause), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
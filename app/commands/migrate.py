@@ -0,0 +1,102 @@
+# app/commands/migrate.py
+"""
+升级迁移（统一入口）::
+
+    python -m app.commands.migrate
+    python -m app.commands.migrate --check
+
+按当前模型补齐数据库结构：主库补建缺少的表，各分片补建分片表，主库和各分片上
+已有的表补建缺少的列（新增列都可为空）与索引。已存在的部分跳过，可以重复执行，
+也可以在服务运行时执行。升级后先执行一次，抓取、压缩、归档、订阅、发送者等功能
+需要的表和列一次补齐，不必逐个执行各命令的 --ensure-schema。
+--check 只列出缺少的部分，不做修改；有缺少时退出码为 1。
+
+数据迁移（回复树重算、指纹补齐、压缩、发送者补查）不在这里，仍用各自的命令。
+"""
+import argparse
+import logging
+import sys
+from typing import List, Tuple
+
+from sqlalchemy import Table, inspect, text
+from sqlalchemy.engine import Engine
+
+from ..database import get_engine
+from ..models import Base
+from ..repositories import shards
+from ..repositories.shard_repository import shard_tables
+
+logger = logging.getLogger(__name__)
+
+
+def _targets() -> List[Tuple[str, Engine, List[Table]]]:
+    """(名称, engine, 应有的表)：主库是全部模型，分片是分片表"""
+    targets = [("main", get_engine(), list(Base.metadata.sorted_tables))]
+    if shards.enabled:
+        tables = shard_tables()
+        targets.extend((f"shard{index}", shards.engine(index), tables) for index in shards.indexes())
+    return targets
+
+
+def _plan(engine: Engine, tables: List[Table]) -> List[Tuple[str, Table, str]]:
+    """缺少的部分：("table" | "column" | "index", 表, 名称)"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    steps = []
+    for table in tables:
+        if table.name not in existing_tables:
+            steps.append(("table", table, table.name))
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        steps.extend(("column", table, column.name) for column in table.columns if column.name not in columns)
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        steps.extend(("index", table, index.name) for index in table.indexes if index.name not in indexes)
+    return steps
+
+
+def pending() -> List[str]:
+    """缺少的表 / 列 / 索引，形如 ``main: column messages.forward_from_msg_id``"""
+    return [f"{name}: {kind} {table.name}" + ("" if kind == "table" else f".{item}")
+            for name, engine, tables in _targets() for kind, table, item in _plan(engine, tables)]
+
+
+def migrate() -> int:
+    """补齐全部缺少的表、列、索引，返回执行的步骤数"""
+    done = 0
+    for name, engine, tables in _targets():
+        for kind, table, item in _plan(engine, tables):
+            if kind == "table":
+                table.create(engine, checkfirst=True)
+            elif kind == "column":
+                column = table.c[item]
+                if not column.nullable:
+                    # 新增列都可为空；不可为空的列需要人工迁移
+                    logger.warning("%s: 跳过不可为空的列 %s.%s", name, table.name, item)
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {item} {column_type} NULL"))
+            else:
+                next(index for index in table.indexes if index.name == item).create(engine)
+            logger.info("%s: 已添加%s %s", name, {"table": "表", "column": "列", "index": "索引"}[kind],
+                        table.name if kind == "table" else f"{table.name}.{item}")
+            done += 1
+    return done
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="TGCrawler 升级迁移")
+    parser.add_argument("--check", action="store_true", help="只列出缺少的表、列、索引")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.check:
+        missing = pending()
+        for line in missing:
+            print(line)
+        sys.exit(1 if missing else 0)
+    logger.info("迁移完成，执行 %s 步", migrate())
+
+
+if __name__ == "__main__":
+    main()
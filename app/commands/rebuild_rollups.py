@@ -0,0 +1,43 @@
+# app/commands/rebuild_rollups.py
+"""
+从明细表（含已归档的分段）重建汇总表::
+
+    python -m app.commands.rebuild_rollups --ensure-schema
+    python -m app.commands.rebuild_rollups --dialog-id 123456 --keywords 编程,python
+
+每个频道一个事务：先删掉该频道的汇总行再写入重新统计的结果。
+重建期间该频道最好没有抓取在写入，否则这段时间的增量可能被覆盖。
+"""
+import argparse
+import json
+import logging
+
+from ..database import SessionLocal, get_engine
+from ..models import DialogActivityRollup, KeywordHitRollup, MediaRollup, SenderRollup
+from ..services import AnalyticsService
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="TGCrawler 汇总表重建")
+    parser.add_argument("--dialog-id", type=int, help="只重建一个频道，默认全部")
+    parser.add_argument("--keywords", help="额外统计命中数的关键词，逗号分隔")
+    parser.add_argument("--ensure-schema", action="store_true", help="先补建汇总表")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.ensure_schema:
+        engine = get_engine()
+        for model in (DialogActivityRollup, KeywordHitRollup, MediaRollup, SenderRollup):
+            model.__table__.create(engine, checkfirst=True)
+    with SessionLocal() as db:
+        service = AnalyticsService(db)
+        if args.dialog_id is not None:
+            reports = [service.rebuild(args.dialog_id, args.keywords)]
+        else:
+            reports = service.rebuild_all(args.keywords)
+    for report in reports:
+        print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
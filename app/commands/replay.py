@@ -0,0 +1,46 @@
+# app/commands/replay.py
+"""
+把录制的原始消息离线重新写入数据库::
+
+    python -m app.commands.replay --stats
+    python -m app.commands.replay --dialog-id 123456
+    python -m app.commands.replay --all --keywords 编程,python
+
+录制需要在抓取前开启 RECORDING_ENABLED=true，分段写在 RECORDING_DIR 下。
+不指定 --keywords 时写入全部录制的消息。回放不访问 Telegram。
+"""
+import argparse
+import json
+import logging
+
+from ..database import SessionLocal
+from ..services import ReplayService
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="TGCrawler 录制回放")
+    parser.add_argument("--dialog-id", type=int, help="只回放一个频道")
+    parser.add_argument("--all", action="store_true", help="回放全部录制过的频道")
+    parser.add_argument("--keywords", help="只写入命中这些关键词的消息，逗号分隔")
+    parser.add_argument("--min-id", type=int, default=0, help="只回放大于此ID的消息")
+    parser.add_argument("--max-id", type=int, help="只回放小于此ID的消息")
+    parser.add_argument("--stats", action="store_true", help="只列出各频道的分段数与大小")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    with SessionLocal() as db:
+        service = ReplayService(db)
+        if args.stats:
+            reports = service.stats()
+        elif args.dialog_id is not None:
+            reports = [service.replay(args.dialog_id, args.keywords, args.min_id, args.max_id)]
+        elif args.all:
+            reports = service.replay_all(args.keywords)
+        else:
+            parser.error("需要 --dialog-id、--all 或 --stats")
+    for report in reports:
+        print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
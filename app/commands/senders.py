@@ -0,0 +1,54 @@
+# app/commands/senders.py
+"""
+发送者资料迁移::
+
+    python -m app.commands.senders --ensure-schema
+    python -m app.commands.senders --resolve
+    python -m app.commands.senders --resolve --dialog-id 123456 --limit 1000
+
+--ensure-schema 在主库建 senders 表（已存在时跳过）。升级后新抓取的消息会随历史页
+写入发送者资料；--resolve 补查升级前抓取的消息里 senders 还没有的发送者。
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+from ..database import SessionLocal, get_engine
+from ..models import Sender
+from ..services import SenderService, TelegramClientManager
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_schema() -> None:
+    Sender.__table__.create(get_engine(), checkfirst=True)
+    logger.info("senders 表已就绪")
+
+
+async def resolve(dialog_id, limit):
+    await TelegramClientManager().connect()
+    with SessionLocal() as db:
+        service = SenderService(db)
+        if dialog_id is not None:
+            return {"dialog_id": dialog_id, **await service.resolve(dialog_id, limit)}
+        return await service.resolve_all(limit)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="TGCrawler 发送者资料迁移")
+    parser.add_argument("--ensure-schema", action="store_true", help="建 senders 表")
+    parser.add_argument("--resolve", action="store_true", help="补查缺失的发送者")
+    parser.add_argument("--dialog-id", type=int, help="只补查这个频道")
+    parser.add_argument("--limit", type=int, help="每个频道最多补查的发送者数")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.ensure_schema:
+        ensure_schema()
+    if args.resolve:
+        print(json.dumps(asyncio.run(resolve(args.dialog_id, args.limit)), ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# app/commands/shards.py
+"""
+分片管理::
+
+    python -m app.commands.shards --ensure-schema
+    python -m app.commands.shards --stats
+    python -m app.commands.shards --rebalance 123456 --to 2
+    python -m app.commands.shards --pin-all
+
+分片地址在 SHARD_URLS 里配置（逗号分隔，顺序即分片序号）。--ensure-schema
+在主库补建 dialog_shards 表、在每个分片上补建 messages / medias / rollup_* 表。
+--rebalance 把一个频道的行迁到指定分片，迁移期间应暂停该频道的抓取。
+在 SHARD_URLS 末尾追加分片前先执行 --pin-all，把已有频道固定在当前分片。
+"""
+import argparse
+import json
+import logging
+
+from ..database import SessionLocal, get_engine
+from ..models import DialogShard
+from ..repositories import shards
+from ..repositories.shard_repository import shard_tables
+from ..services import ShardService
+
+
+def ensure_schema() -> None:
+    DialogShard.__table__.create(get_engine(), checkfirst=True)
+    tables = shard_tables()
+    for index in shards.indexes() if shards.enabled else ():
+        engine = shards.engine(index)
+        for table in tables:
+            table.create(engine, checkfirst=True)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="TGCrawler 分片管理")
+    parser.add_argument("--ensure-schema", action="store_true", help="补建 dialog_shards 与各分片上的分片表")
+    parser.add_argument("--stats", action="store_true", help="各分片的频道数")
+    parser.add_argument("--rebalance", type=int, metavar="DIALOG_ID", help="迁移一个频道")
+    parser.add_argument("--to", type=int, metavar="SHARD", help="迁移的目标分片序号")
+    parser.add_argument("--pin-all", action="store_true", help="把已有频道固定在当前分片")
+    parser.add_argument("--batch-size", type=int, default=1000, help="迁移时每批复制 / 删除的行数")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.rebalance is not None and args.to is None:
+        parser.error("--rebalance 需要同时指定 --to")
+
+    if args.ensure_schema:
+        ensure_schema()
+    with SessionLocal() as db:
+        service = ShardService(db)
+        if args.pin_all:
+            print(json.dumps({"pinned": service.pin_all()}, ensure_ascii=False))
+        if args.rebalance is not None:
+            print(json.dumps(service.rebalance(args.rebalance, args.to, args.batch_size), ensure_ascii=False))
+        if args.stats:
+            for report in service.stats():
+                print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
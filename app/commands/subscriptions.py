@@ -0,0 +1,59 @@
+# app/commands/subscriptions.py
+"""
+订阅规则的扫描与转发::
+
+    python -m app.commands.subscriptions --ensure-schema
+    python -m app.commands.subscriptions --crawl 123456 --dispatch
+    python -m app.commands.subscriptions --crawl-all --dispatch
+    python -m app.commands.subscriptions --crawl 123456 --min-id 0
+
+--crawl 为全部规则扫描一个来源频道（从上次扫描到的位置继续，--min-id 指定起点，
+0 即补扫全部历史消息），
+--dispatch 把转发队列发完。常驻运行用 ``python -m app.worker --subscriptions``。
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+from ..database import SessionLocal, get_engine
+from ..models import SubscriptionRule, ForwardQueueItem, SubscriptionCursor
+from ..services import SubscriptionService, TelegramClientManager
+
+
+async def _run(args) -> list:
+    reports = []
+    if args.crawl is None and not args.crawl_all and not args.dispatch:
+        return reports
+    await TelegramClientManager().connect()
+    with SessionLocal() as db:
+        service = SubscriptionService(db)
+        if args.crawl is not None:
+            reports.append(await service.crawl(args.crawl, args.min_id))
+        if args.crawl_all:
+            reports.extend(await service.crawl_all())
+        if args.dispatch:
+            reports.append(await service.dispatch())
+    return reports
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="TGCrawler 订阅扫描与转发")
+    parser.add_argument("--crawl", type=int, metavar="DIALOG_ID", help="扫描一个来源频道")
+    parser.add_argument("--min-id", type=int, help="与 --crawl 一起使用：从这个消息ID之后扫描，0 为全部历史")
+    parser.add_argument("--crawl-all", action="store_true", help="扫描全部规则指定的来源频道")
+    parser.add_argument("--dispatch", action="store_true", help="转发队列里的待转发消息")
+    parser.add_argument("--ensure-schema", action="store_true", help="先补建订阅规则、转发队列与扫描进度表")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.ensure_schema:
+        engine = get_engine()
+        for model in (SubscriptionRule, ForwardQueueItem, SubscriptionCursor):
+            model.__table__.create(engine, checkfirst=True)
+    for report in asyncio.run(_run(args)):
+        print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
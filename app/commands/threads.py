@@ -0,0 +1,99 @@
+# app/commands/threads.py
+"""
+回复树索引迁移::
+
+    python -m app.commands.threads --ensure-schema
+    python -m app.commands.threads --backfill
+    python -m app.commands.threads --backfill --dialog-id 123456
+
+--ensure-schema 给 messages 补建 thread_root_id / thread_depth / forward_from_msg_id 列
+以及回复树、转发来源两个索引（主库和各分片上已存在的 messages 表，已存在时跳过）。
+--backfill 按频道整体重算回复树，只写回有变化的行，每批一个事务，可以在服务
+运行时执行、中断后重新执行；升级前写入的行要执行一次才会出现在回复树里。
+"""
+import argparse
+import json
+import logging
+import time
+from typing import List, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from ..database import SessionLocal, get_engine
+from ..models import Message
+from ..repositories import ShardRepository, ThreadRepository, shards
+from ..repositories.thread_repository import resolve_threads
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ("thread_root_id", "thread_depth", "forward_from_msg_id")
+_INDEXES = ("idx_thread", "idx_forward_from")
+
+
+def _engines() -> List[Engine]:
+    return [get_engine()] + ([shards.engine(index) for index in shards.indexes()] if shards.enabled else [])
+
+
+def ensure_schema() -> None:
+    table = Message.__table__
+    for engine in _engines():
+        inspector = inspect(engine)
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for name in _COLUMNS:
+            if name in existing:
+                continue
+            column_type = table.c[name].type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type} NULL"))
+            logger.info("已添加列 %s.%s", table.name, name)
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in _INDEXES and index.name not in indexes:
+                index.create(engine)
+                logger.info("已添加索引 %s.%s", table.name, index.name)
+
+
+def backfill(dialog_id: Optional[int], batch_size: int) -> dict:
+    report = {"dialogs": 0, "rows": 0, "changed": 0}
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        repo = ThreadRepository(db)
+        if dialog_id is not None:
+            targets = [(shards.index_of(db, dialog_id), [dialog_id])]
+        else:
+            targets = list(enumerate(ShardRepository(db).get_dialog_ids()))
+        for shard, dialog_ids in targets:
+            for current in dialog_ids:
+                links = repo.get_links(shard, current)
+                threads = resolve_threads({message_id: link[0] for message_id, link in links.items()}, {})
+                changed = {message_id: thread for message_id, thread in threads.items()
+                           if links[message_id][1:] != thread}
+                repo.set_threads(shard, current, changed, batch_size)
+                report["dialogs"] += 1
+                report["rows"] += len(links)
+                report["changed"] += len(changed)
+                logger.info("频道 %s 回复树重算 %s 行，改动 %s 行", current, len(links), len(changed))
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="TGCrawler 回复树索引迁移")
+    parser.add_argument("--ensure-schema", action="store_true", help="补建回复树列与索引")
+    parser.add_argument("--backfill", action="store_true", help="按频道重算回复树")
+    parser.add_argument("--dialog-id", type=int, help="只重算这个频道")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批写回的行数")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.ensure_schema:
+        ensure_schema()
+    if args.backfill:
+        print(json.dumps(backfill(args.dialog_id, args.batch_size), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
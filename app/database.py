@@ -1,9 +1,23 @@
-from sqlalchemy import create_engine
+import itertools
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Header
+from sqlalchemy import create_engine, inspect, text, Select
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
 from sqlalchemy.engine import Engine
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
+from .metrics import TimedQueuePool, track_pool, DB_READ_SESSIONS, DB_REPLICA_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
 # 配置类，读取 .env 文件
 class Settings(BaseSettings):
     db_host: str = "localhost"
@@ -11,6 +25,21 @@ class Settings(BaseSettings):
     db_user: str = "root"
     db_password: str = "root"
     db_name: str = "telegram_crawler"
+    # 直接指定连接 URL 时忽略上面的主机/账号配置
+    db_url: Optional[str] = None
+
+    # 连接池：常驻连接数、高峰时可额外借出的连接数、启动时预先建立并校验的连接数
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_prewarm: int = 5
+    db_pool_timeout: int = 30
+
+    # 逗号分隔的只读副本 URL（DB_REPLICA_URLS），为空时只读请求也走主库
+    replica_urls: Optional[str] = None
+    # 只读请求默认可接受的副本延迟（秒），请求头 X-Max-Replica-Lag 可按请求指定，0 表示只读主库
+    replica_max_lag: float = 5.0
+    # 副本延迟测量结果的缓存秒数
+    replica_lag_ttl: float = 2.0
 
     class Config:
         env_prefix = "DB_"
@@ -25,26 +54,242 @@ def get_settings() -> Settings:
 Base = declarative_base()
 
 _engine: Engine | None = None
+_session_factory: sessionmaker | None = None
+_read_session_factory: sessionmaker | None = None
+
+def _create_engine(url: str) -> Engine:
+    settings = get_settings()
+    return create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        echo=False,
+    )
 
 def get_engine() -> Engine:
+    """首次调用时才创建 engine，导入本模块不连接数据库也不读配置"""
     global _engine
     if _engine is None:
         settings = get_settings()
-        SQLALCHEMY_DATABASE_URL = (
+        SQLALCHEMY_DATABASE_URL = settings.db_url or (
             f"mysql+pymysql://{settings.db_user}:{settings.db_password}"
             f"@{settings.db_host}:{settings.db_port}/{settings.db_name}"
             "?charset=utf8mb4"
         )
-        _engine = create_engine(
-            SQLALCHEMY_DATABASE_URL,
-            pool_pre_ping=True,
-            pool_recycle=3600,
-            echo=False,
-        )
+        _engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+        track_pool(_engine)
     return _engine
 
+class AppSession(Session):
+    """关闭时一并关闭按频道借出的分片 Session（见 repositories/shard_router.py）"""
+
+    def close(self) -> None:
+        for session in self.info.pop("shard_sessions", {}).values():
+            session.close()
+        super().close()
+
+
+def get_session_factory() -> sessionmaker:
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=get_engine(), class_=AppSession)
+    return _session_factory
+
+
+class _LazySessionLocal:
+    """保持 ``SessionLocal()`` 的用法不变，第一次调用时才绑定 engine"""
+
+    def __call__(self, **kwargs) -> Session:
+        return get_session_factory()(**kwargs)
+
+
 # Session 工厂，绑定缓存的 engine
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+SessionLocal = _LazySessionLocal()
+
+
+# region 只读副本
+def measure_lag(engine: Engine) -> float:
+    """
+    副本落后主库的秒数，复制中断或连不上时为 inf。MySQL 读 SHOW REPLICA STATUS
+    （8.0.22 之前为 SHOW SLAVE STATUS），没有复制状态的库（直接指向主库）视为无延迟；
+    其它数据库没有通用的查法，视为无延迟。
+    """
+    if engine.dialect.name != "mysql":
+        return 0.0
+    try:
+        with engine.connect() as conn:
+            try:
+                row = conn.execute(text("SHOW REPLICA STATUS")).mappings().first()
+            except DBAPIError:
+                row = conn.execute(text("SHOW SLAVE STATUS")).mappings().first()
+    except Exception as e:
+        logger.warning("测量副本延迟失败 %s: %s", engine.url.render_as_string(hide_password=True), e)
+        return math.inf
+    if row is None:
+        return 0.0
+    value = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+    return math.inf if value is None else float(value)
+
+
+class ReplicaPool:
+    """只读副本的 engine 与延迟；延迟按副本缓存 DB_REPLICA_LAG_TTL 秒，过期后下次挑选时重测"""
+
+    def __init__(self):
+        self._engines: Optional[List[Engine]] = None
+        # 副本序号 -> (延迟, 测量时间)
+        self._lags: Dict[int, Tuple[float, float]] = {}
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def engines(self) -> List[Engine]:
+        if self._engines is None:
+            with self._lock:
+                if self._engines is None:
+                    urls = get_settings().replica_urls
+                    self._engines = [_create_engine(url.strip()) for url in urls.split(",")
+                                     if url.strip()] if urls else []
+        return self._engines
+
+    def lag(self, index: int) -> float:
+        cached = self._lags.get(index)
+        if cached is not None and time.monotonic() - cached[1] < get_settings().replica_lag_ttl:
+            return cached[0]
+        lag = measure_lag(self.engines()[index])
+        self._lags[index] = (lag, time.monotonic())
+        DB_REPLICA_LAG_SECONDS.labels(str(index)).set(lag if math.isfinite(lag) else -1)
+        return lag
+
+    def choose(self, max_lag: float) -> Optional[Engine]:
+        """轮流挑一个延迟不超过 max_lag 的副本，没有时返回 None（读主库）"""
+        engines = self.engines()
+        if not engines or max_lag <= 0:
+            return None
+        start = next(self._next)
+        for offset in range(len(engines)):
+            index = (start + offset) % len(engines)
+            if self.lag(index) <= max_lag:
+                return engines[index]
+        return None
+
+    def dispose(self) -> None:
+        with self._lock:
+            engines, self._engines = self._engines or [], None
+            self._lags.clear()
+        for engine in engines:
+            engine.dispose()
+
+
+replicas = ReplicaPool()
+
+
+class ReadSession(AppSession):
+    """
+    只读请求的 Session：SELECT 发往副本，其它语句（含 flush、SELECT ... FOR UPDATE）
+    发往主库。写过一次之后的读也都走主库，本请求总能读到自己刚写入的数据。
+    """
+
+    def __init__(self, replica: Optional[Engine] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.replica = replica
+        self.wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replica is not None and not self.wrote and clause is not None:
+            if not self._flushing and isinstance(clause, Select) and clause._for_update_arg is None:
+                return self.replica
+            self.wrote = True
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+def get_read_session_factory() -> sessionmaker:
+    global _read_session_factory
+    if _read_session_factory is None:
+        _read_session_factory = sessionmaker(autocommit=False, autoflush=False, bind=get_engine(),
+                                             class_=ReadSession)
+    return _read_session_factory
+
+
+def read_session(max_lag: Optional[float] = None) -> Session:
+    """
+    只读 Session：有延迟不超过 max_lag（默认 DB_REPLICA_MAX_LAG）的副本时读副本，
+    否则与 ``SessionLocal()`` 一样全部走主库。
+    """
+    replica = replicas.choose(get_settings().replica_max_lag if max_lag is None else max_lag)
+    DB_READ_SESSIONS.labels("primary" if replica is None else "replica").inc()
+    return get_read_session_factory()(replica=replica)
+# endregion
+
+# region 表结构探测
+# (engine URL, 表名) -> (是否存在, 检查时间)
+_tables: Dict[Tuple[str, str], Tuple[bool, float]] = {}
+# 表还没建时隔多久重查一次：升级后补建表不用重启服务
+_TABLE_RECHECK_SECONDS = 60.0
+
+
+def has_table(bind: Engine | Session, name: str) -> bool:
+    """表是否已建好；已存在的结果一直缓存，不存在的结果缓存 _TABLE_RECHECK_SECONDS 秒"""
+    engine = bind.get_bind() if isinstance(bind, Session) else bind
+    key = (engine.url.render_as_string(), name)
+    cached = _tables.get(key)
+    if cached is not None and (cached[0] or time.monotonic() - cached[1] < _TABLE_RECHECK_SECONDS):
+        return cached[0]
+    exists = inspect(engine).has_table(name)
+    _tables[key] = (exists, time.monotonic())
+    return exists
+# endregion
+
+def init_db(prewarm: Optional[int] = None) -> dict:
+    """
+    创建 engine 并预热连接池：并行建立 prewarm 个连接，每个执行一次
+    SELECT 1 校验，全部成功后一起归还，之后的请求直接复用池里的连接。
+    任一连接失败直接抛出，应用不会进入就绪状态。
+    """
+    settings = get_settings()
+    count = settings.db_pool_prewarm if prewarm is None else prewarm
+    count = min(count, settings.db_pool_size)
+    start = time.perf_counter()
+    engine = get_engine()
+
+    def _open():
+        conn = engine.connect()
+        try:
+            conn.execute(text("SELECT 1"))
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    connections = []
+    if count:
+        # 第一个连接要初始化方言（期间其它建连会排队），先单独建立；
+        # 全部借出后再归还，保证建立的是 count 个不同的连接
+        first = _open()
+        with ThreadPoolExecutor(max(count - 1, 1)) as executor:
+            futures = [executor.submit(_open) for _ in range(count - 1)]
+        try:
+            connections = [first] + [future.result() for future in futures]
+        finally:
+            first.close()
+            for future in futures:
+                if future.exception() is None:
+                    future.result().close()
+    seconds = time.perf_counter() - start
+    logger.info("数据库连接池预热完成：%s 个连接，%.3f 秒", len(connections), seconds)
+    return {"prewarmed": len(connections), "seconds": round(seconds, 3), "pool": engine.pool.status()}
+
+def dispose_db() -> None:
+    """关闭连接池里的所有连接；之后再用会重新创建 engine"""
+    global _engine, _session_factory, _read_session_factory
+    if _engine is not None:
+        _engine.dispose()
+    _engine = None
+    _session_factory = None
+    _read_session_factory = None
+    replicas.dispose()
 
 # FastAPI 依赖注入数据库 Session
 def get_db() -> Session:
@@ -53,3 +298,11 @@ def get_db() -> Session:
         yield db
     finally:
         db.close()
+
+# 只读接口用：读走副本，请求头 X-Max-Replica-Lag 指定本次可接受的副本延迟（秒）
+def get_read_db(max_lag: Optional[float] = Header(None, alias="X-Max-Replica-Lag", ge=0)) -> Session:
+    db = read_session(max_lag)
+    try:
+        yield db
+    finally:
+        db.close()
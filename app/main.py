@@ -1,16 +1,75 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import FastAPI
-from .routers import dialog_router, message_router, media_router, telegram_client_router
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from .routers import dialog_router, message_router, media_router, telegram_client_router, metrics_router, \
+    tracing_router, job_router, analytics_router, subscription_router, sender_router
 from .services import TelegramClientManager
+from .database import init_db, dispose_db, get_engine
+from .repositories import shards
+from .services.recorder import recorder
+from .commands.migrate import pending as pending_migrations
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="Telegram Crawler API", debug=True)
+logger = logging.getLogger(__name__)
+
+
+def _check_schema() -> None:
+    """数据库结构落后于当前版本时提示执行迁移，不阻塞启动"""
+    try:
+        missing = pending_migrations()
+    except Exception:
+        logger.exception("检查数据库结构失败")
+        return
+    if missing:
+        logger.warning("数据库结构缺少 %s 项（%s 等），请执行 python -m app.commands.migrate",
+                       len(missing), "；".join(missing[:5]))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    导入模块时不创建 engine、不读 Telegram 配置；启动阶段在这里预热并校验
+    数据库连接池，完成后才开始接收请求。Telegram 仍由 /telegram/connect 按需连接。
+    """
+    start = time.perf_counter()
+    app.state.ready = False
+    app.state.prewarm = await run_in_threadpool(init_db)
+    app.state.startup_seconds = round(time.perf_counter() - start, 3)
+    app.state.ready = True
+    logger.info("启动完成，用时 %.3f 秒", app.state.startup_seconds)
+    asyncio.get_running_loop().run_in_executor(None, _check_schema)
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        # 未攒满一块的录制缓冲在退出前写盘
+        try:
+            recorder.flush()
+        except Exception:
+            logger.exception("写入录制缓冲失败")
+        await TelegramClientManager().disconnect()
+        dispose_db()
+        shards.dispose()
+
+
+app = FastAPI(title="Telegram Crawler API", debug=True, lifespan=lifespan)
 
 app.include_router(dialog_router)
 app.include_router(message_router)
 app.include_router(media_router)
 
 app.include_router(telegram_client_router)
+app.include_router(metrics_router)
+app.include_router(tracing_router)
+app.include_router(job_router)
+app.include_router(analytics_router)
+app.include_router(subscription_router)
+app.include_router(sender_router)
 
 # 配置允许跨域访问
 app.add_middleware(
@@ -19,7 +78,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 让前端能读到对话列表的新鲜度
+    expose_headers=["Age", "X-Dialogs-Synced-At", "X-Dialogs-Refreshing"],
 )
 @app.get("/")
 def root():
-    return {"message": "Welcome to Telegram Crawler API"}
\ No newline at end of file
+    return {"message": "Welcome to Telegram Crawler API"}
+
+
+@app.get("/ready")
+def ready():
+    """就绪检查：连接池预热完成后返回 200"""
+    if not getattr(app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="starting")
+    return {
+        "ready": True,
+        "startup_seconds": app.state.startup_seconds,
+        "prewarmed": app.state.prewarm["prewarmed"],
+        "pool": get_engine().pool.status(),
+    }
@@ -0,0 +1,140 @@
+# app/metrics.py
+"""
+Prometheus 指标定义与埋点工具。
+
+热路径上只做 ``inc`` / ``observe``（每次约 1µs 以内），逐条消息的计数在
+抓取循环里先累加到局部变量，结束时一次性写入，避免每条消息都查 label。
+label 只用取值有限的维度（写入路径、操作类型等），不按频道 ID 打 label，
+否则每抓一个新频道就多一组时间序列；按频道的统计见 /analytics。
+"""
+import time
+from functools import wraps
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy.pool import QueuePool
+
+from . import tracing
+
+# 数据库操作通常在毫秒级，RPC 则可能到秒级
+_DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+_RPC_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# region 抓取
+# source 为写入路径：crawl（关键词抓取）/ backfill（分片回填）
+MESSAGES_SCANNED = Counter(
+    "tgcrawler_messages_scanned_total", "从 Telegram 读取的消息数", ["source"])
+MESSAGES_MATCHED = Counter(
+    "tgcrawler_messages_matched_total", "命中关键词的消息数", ["source"])
+MESSAGES_WRITTEN = Counter(
+    "tgcrawler_messages_written_total", "写入数据库的消息数", ["source", "op"])
+MESSAGES_UNCHANGED = Counter(
+    "tgcrawler_messages_unchanged_total", "重复抓取时内容指纹未变、跳过写入的消息数", ["source"])
+# source 为 task（转发任务）/ subscription（订阅自动转发）
+FORWARDED_MESSAGES = Counter(
+    "tgcrawler_forwarded_messages_total", "已转发的消息数", ["source"])
+VIEWS_REFRESHED = Counter(
+    "tgcrawler_views_refreshed_total", "刷新了浏览数的消息数")
+FORWARD_SECONDS = Histogram(
+    "tgcrawler_forward_seconds", "一次转发任务的耗时", buckets=_RPC_BUCKETS)
+SENDERS_WRITTEN = Counter(
+    "tgcrawler_senders_written_total", "发送者资料的写入，skipped 为进程内缓存命中、跳过写入", ["op"])
+SENDERS_RESOLVED = Counter(
+    "tgcrawler_senders_resolved_total", "按需补查的发送者资料", ["result"])
+# endregion
+
+# region Telegram 客户端
+TELEGRAM_RPC_SECONDS = Histogram(
+    "tgcrawler_telegram_rpc_seconds", "Telegram RPC 耗时", ["method"], buckets=_RPC_BUCKETS)
+TELEGRAM_RPC_ERRORS = Counter(
+    "tgcrawler_telegram_rpc_errors_total", "Telegram RPC 异常次数", ["method", "error"])
+FLOOD_WAITS = Counter(
+    "tgcrawler_flood_waits_total", "收到 FloodWait 的次数", ["method"])
+FLOOD_WAIT_SECONDS = Counter(
+    "tgcrawler_flood_wait_seconds_total", "FloodWait 要求等待的总秒数", ["method"])
+TELEGRAM_RPC_BUDGET = Gauge(
+    "tgcrawler_telegram_rpc_budget", "限速器当前允许的速率（次/秒）", ["method_class"])
+GOVERNOR_WAIT_SECONDS = Counter(
+    "tgcrawler_governor_wait_seconds_total", "RPC 在限速器中排队的总秒数", ["method_class"])
+# endregion
+
+# region 数据库
+REPOSITORY_SECONDS = Histogram(
+    "tgcrawler_repository_seconds", "Repository 方法耗时", ["repository", "method"], buckets=_DB_BUCKETS)
+REPOSITORY_ROWS = Counter(
+    "tgcrawler_repository_rows_total", "Repository 方法返回/影响的行数", ["repository", "method"])
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "tgcrawler_db_pool_checkout_seconds", "从连接池取连接的等待时间", buckets=_DB_BUCKETS)
+DB_POOL_CHECKED_OUT = Gauge(
+    "tgcrawler_db_pool_checked_out", "当前被借出的连接数")
+DB_READ_SESSIONS = Counter(
+    "tgcrawler_db_read_sessions_total", "只读 Session 实际使用的库", ["target"])
+DB_REPLICA_LAG_SECONDS = Gauge(
+    "tgcrawler_db_replica_lag_seconds", "最近一次测得的只读副本延迟，无法测量时为 -1", ["replica"])
+# endregion
+
+
+def _rows_of(result) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, (bool, int)):
+        return int(result)
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    rowcount = getattr(result, "rowcount", None)
+    if rowcount is not None:
+        return rowcount
+    return 1
+
+
+def observe_repository(func):
+    """Repository 方法装饰器：记录耗时和行数，label 为 (类名, 方法名)"""
+    children = {}
+
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        key = type(self).__name__
+        pair = children.get(key)
+        if pair is None:
+            pair = children[key] = (
+                REPOSITORY_SECONDS.labels(key, func.__name__),
+                REPOSITORY_ROWS.labels(key, func.__name__),
+            )
+        start = time.perf_counter()
+        try:
+            result = func(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            pair[0].observe(elapsed)
+            tracing.add_timing("db", elapsed)
+        pair[1].inc(_rows_of(result))
+        return result
+
+    return wrapper
+
+
+class TimedQueuePool(QueuePool):
+    """记录取连接等待时间的连接池"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+
+
+def track_pool(engine) -> None:
+    """把连接池占用情况挂到 Gauge 上，采集时才读取"""
+    DB_POOL_CHECKED_OUT.set_function(lambda: engine.pool.checkedout() if hasattr(engine.pool, "checkedout") else 0)
+
+
+def record_crawl(source: str, scanned: int, matched: int, inserted: int, updated: int, unchanged: int = 0) -> None:
+    label = source
+    MESSAGES_SCANNED.labels(label).inc(scanned)
+    MESSAGES_MATCHED.labels(label).inc(matched)
+    if inserted:
+        MESSAGES_WRITTEN.labels(label, "insert").inc(inserted)
+    if updated:
+        MESSAGES_WRITTEN.labels(label, "update").inc(updated)
+    if unchanged:
+        MESSAGES_UNCHANGED.labels(label).inc(unchanged)
@@ -3,3 +3,13 @@ from .base_model import Base
 from .dialog_model import Dialog, TelegramTypeEnum
 from .message_model import Message, SenderTypeEnum, MediaTypeEnum as MessageMediaTypeEnum
 from .media_model import Media, MediaTypeEnum as MediaMediaTypeEnum
+from .backfill_model import BackfillRange, BackfillStatusEnum
+from .job_model import CrawlJob, ChannelLease, JobKindEnum, JobStatusEnum
+from .sync_marker_model import SyncMarker
+from .update_state_model import UpdateState, ChannelUpdateState
+from .compression_dict_model import CompressionDict
+from .archive_model import ArchiveSegment, ArchiveStatusEnum
+from .rollup_model import DialogActivityRollup, KeywordHitRollup, MediaRollup, SenderRollup
+from .subscription_model import SubscriptionRule, ForwardQueueItem, ForwardStatusEnum, SubscriptionCursor
+from .shard_model import DialogShard
+from .sender_model import Sender
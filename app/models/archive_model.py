@@ -0,0 +1,34 @@
+from sqlalchemy import Column, BigInteger, Integer, DateTime, Enum, String, Index, text
+from .base_model import Base
+import enum
+
+
+class ArchiveStatusEnum(str, enum.Enum):
+    # 文件已写好、热表里的行还没删完
+    pending = "pending"
+    done = "done"
+
+
+class ArchiveSegment(Base):
+    """归档分段清单：一个 Parquet 文件对应一个频道一段 message_id 区间的 messages 或 medias 行"""
+    __tablename__ = "archive_segments"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True, comment="自增主键")
+    dialog_id = Column(BigInteger, nullable=False, comment="频道ID")
+    table_name = Column(String(32), nullable=False, comment="归档的表：messages / medias")
+    path = Column(String(512), nullable=False, comment="分段文件路径（相对 ARCHIVE_DIR）")
+    min_message_id = Column(BigInteger, nullable=False, comment="分段内最小消息ID")
+    max_message_id = Column(BigInteger, nullable=False, comment="分段内最大消息ID")
+    min_pk = Column(BigInteger, nullable=True, comment="分段内最小行主键")
+    max_pk = Column(BigInteger, nullable=True, comment="分段内最大行主键")
+    min_date = Column(DateTime, nullable=True, comment="分段内最早消息时间")
+    max_date = Column(DateTime, nullable=True, comment="分段内最晚消息时间")
+    row_count = Column(Integer, nullable=False, default=0, comment="行数")
+    file_bytes = Column(BigInteger, nullable=False, default=0, comment="文件大小")
+    status = Column(Enum(ArchiveStatusEnum), nullable=False, default=ArchiveStatusEnum.pending, comment="归档状态")
+    created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), comment="记录创建时间")
+
+    __table_args__ = (
+        Index('idx_segment_dialog', 'dialog_id', 'table_name', 'min_message_id'),
+        Index('idx_segment_pk', 'table_name', 'min_pk'),
+    )
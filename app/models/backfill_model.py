@@ -0,0 +1,35 @@
+from sqlalchemy import Column, BigInteger, Integer, DateTime, Enum, String, UniqueConstraint, Index, text
+from .base_model import Base
+import enum
+
+
+class BackfillStatusEnum(str, enum.Enum):
+    pending = "pending"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+class BackfillRange(Base):
+    """历史回填的一个 ID 分片：(low_id, high_id]，从 high_id 往 low_id 方向抓取"""
+    __tablename__ = "backfill_ranges"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True, comment="自增主键")
+    dialog_id = Column(BigInteger, nullable=False, comment="回填的频道ID")
+    range_index = Column(Integer, nullable=False, comment="分片序号")
+    low_id = Column(BigInteger, nullable=False, comment="分片下界（不含）")
+    high_id = Column(BigInteger, nullable=False, comment="分片上界（含）")
+    cursor_id = Column(BigInteger, nullable=False, comment="下一页的 offset_id，小于它的消息尚未抓取")
+    status = Column(Enum(BackfillStatusEnum), nullable=False, default=BackfillStatusEnum.pending, comment="分片状态")
+    keywords = Column(String(255), nullable=True, comment="关键词，为空表示回填全部消息")
+    scanned = Column(Integer, nullable=False, default=0, comment="已读取消息数")
+    matched = Column(Integer, nullable=False, default=0, comment="已写入消息数")
+    error = Column(String(512), nullable=True, comment="最近一次失败原因")
+    created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), comment="记录创建时间")
+    updated_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), server_onupdate="CURRENT_TIMESTAMP",
+                        comment="记录更新时间")
+
+    __table_args__ = (
+        UniqueConstraint('dialog_id', 'range_index', name='uk_backfill_range'),
+        Index('idx_backfill_status', 'dialog_id', 'status'),
+    )
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, BigInteger, Integer, DateTime, LargeBinary, Index, text
+from .base_model import Base
+
+
+class CompressionDict(Base):
+    """zstd 训练字典；dialog_id 为空的是全局字典。字典写入后不再修改，换字典时新增一行"""
+    __tablename__ = "compression_dicts"
+
+    id = Column(Integer, primary_key=True, autoincrement=True, comment="字典ID")
+    dialog_id = Column(BigInteger, nullable=True, comment="字典所属频道，为空表示全局字典")
+    # MySQL 下为 MEDIUMBLOB，字典一般在 100KB 左右
+    data = Column(LargeBinary(length=2 ** 24 - 1), nullable=False, comment="字典内容")
+    samples = Column(Integer, nullable=False, default=0, comment="训练样本数")
+    created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), comment="记录创建时间")
+
+    __table_args__ = (
+        Index('idx_dict_dialog', 'dialog_id'),
+    )
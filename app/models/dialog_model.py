@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, String, Integer, DateTime, Boolean, Enum, UniqueConstraint, Index
+from sqlalchemy import Column, BigInteger, String, Integer, DateTime, Boolean, Enum, UniqueConstraint, Index, text
 from sqlalchemy.orm import declarative_base
 from .base_model import Base
 import enum
@@ -13,7 +13,7 @@ class TelegramTypeEnum(str, enum.Enum):
 class Dialog(Base):
     __tablename__ = "dialogs"
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True, comment="自增主键")
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True, comment="自增主键")
     dialog_id = Column(BigInteger, nullable=False, comment="对话ID，取自 entity.id")
     telegram_type = Column(Enum(TelegramTypeEnum), nullable=False, comment="对话类型")
     access_hash = Column(BigInteger, nullable=True, comment="访问哈希，仅某些类型可用")
@@ -25,8 +25,8 @@ class Dialog(Base):
     last_message_id = Column(BigInteger, nullable=True, comment="最后一条消息ID")
     last_activity = Column(DateTime, nullable=True, comment="最后活动时间（取最后消息时间）")
     unread_count = Column(Integer, default=0, comment="未读消息数")
-    created_at = Column(DateTime, server_default="CURRENT_TIMESTAMP", comment="记录创建时间")
-    updated_at = Column(DateTime, server_default="CURRENT_TIMESTAMP", server_onupdate="CURRENT_TIMESTAMP",
+    created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), comment="记录创建时间")
+    updated_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), server_onupdate="CURRENT_TIMESTAMP",
                         comment="记录更新时间")
 
     __table_args__ = (
@@ -0,0 +1,51 @@
+from sqlalchemy import Column, BigInteger, Integer, DateTime, Enum, String, Text, Index, text
+from .base_model import Base
+import enum
+
+
+class JobKindEnum(str, enum.Enum):
+    crawl = "crawl"
+    backfill = "backfill"
+    views = "views"
+
+
+class JobStatusEnum(str, enum.Enum):
+    pending = "pending"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+class CrawlJob(Base):
+    """抓取任务队列；worker 通过租约认领，租约过期后可被其他 worker 接手"""
+    __tablename__ = "crawl_jobs"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True, comment="自增主键")
+    dialog_id = Column(BigInteger, nullable=False, comment="抓取的频道ID")
+    kind = Column(Enum(JobKindEnum), nullable=False, comment="任务类型")
+    params = Column(Text, nullable=True, comment="任务参数（JSON）")
+    status = Column(Enum(JobStatusEnum), nullable=False, default=JobStatusEnum.pending, comment="任务状态")
+    lease_owner = Column(String(128), nullable=True, comment="持有租约的 worker")
+    lease_expires_at = Column(DateTime, nullable=True, comment="租约到期时间（UTC）")
+    heartbeat_at = Column(DateTime, nullable=True, comment="最近一次心跳时间（UTC）")
+    attempts = Column(Integer, nullable=False, default=0, comment="已认领次数")
+    error = Column(String(512), nullable=True, comment="最近一次失败原因")
+    finished_at = Column(DateTime, nullable=True, comment="结束时间（UTC）")
+    created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), comment="记录创建时间")
+    updated_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), server_onupdate="CURRENT_TIMESTAMP",
+                        comment="记录更新时间")
+
+    __table_args__ = (
+        Index('idx_job_claim', 'status', 'lease_expires_at'),
+        Index('idx_job_dialog', 'dialog_id'),
+    )
+
+
+class ChannelLease(Base):
+    """频道级互斥租约：同一频道同一时刻只被一个 worker 抓取"""
+    __tablename__ = "channel_leases"
+
+    dialog_id = Column(BigInteger, primary_key=True, autoincrement=False, comment="频道ID")
+    owner = Column(String(128), nullable=False, comment="持有租约的 worker")
+    job_id = Column(BigInteger, nullable=False, comment="正在执行的任务ID")
+    expires_at = Column(DateTime, nullable=False, comment="租约到期时间（UTC）")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, String, Integer, DateTime, Enum, LargeBinary, ForeignKey, Index
+from sqlalchemy import Column, BigInteger, String, Integer, DateTime, Enum, LargeBinary, ForeignKey, Index, text
 from sqlalchemy.orm import declarative_base, relationship
 from .base_model import Base
 import enum
@@ -19,7 +19,7 @@ class MediaTypeEnum(str, enum.Enum):
 class Media(Base):
     __tablename__ = "medias"
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True, comment="主键")
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True, comment="主键")
     message_id = Column(BigInteger, ForeignKey("messages.message_id", ondelete="CASCADE"), nullable=False,
                         comment="关联消息的主键（messages.id）")
     dialog_id = Column(BigInteger, ForeignKey("dialogs.dialog_id", ondelete="CASCADE"), nullable=False,
@@ -32,7 +32,8 @@ class Media(Base):
     thumb_height = Column(Integer, nullable=True, comment="缩略图高（可选）")
     duration = Column(Integer, nullable=True, comment="音视频时长（秒）")
     size = Column(BigInteger, nullable=True, comment="媒体文件大小")
-    created_at = Column(DateTime, server_default="CURRENT_TIMESTAMP", comment="创建时间")
+    content_hash = Column(BigInteger, nullable=True, comment="可变字段的内容指纹，重复抓取时相同则跳过写入")
+    created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), comment="创建时间")
 
     dialog = relationship("Dialog", backref="medias")
     message = relationship("Message", backref="medias")
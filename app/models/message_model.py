@@ -1,4 +1,5 @@
-from sqlalchemy import Column, BigInteger, String, Integer, DateTime, Enum, Text, UniqueConstraint, Index, ForeignKey
+from sqlalchemy import Column, BigInteger, String, Integer, DateTime, Enum, Text, UniqueConstraint, Index, ForeignKey, \
+    LargeBinary, text
 from sqlalchemy.orm import declarative_base, relationship
 from .base_model import Base
 import enum
@@ -26,7 +27,7 @@ class MediaTypeEnum(str, enum.Enum):
 class Message(Base):
     __tablename__ = "messages"
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True, comment="自增主键")
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True, comment="自增主键")
     message_id = Column(BigInteger, nullable=False, comment="消息ID")
     dialog_id = Column(BigInteger, ForeignKey("dialogs.dialog_id", ondelete="CASCADE"), nullable=False,
                        comment="关联的 dialog_id")
@@ -34,13 +35,20 @@ class Message(Base):
     sender_type = Column(Enum(SenderTypeEnum), nullable=True, comment="发送者类型")
     date = Column(DateTime, nullable=False, comment="发送时间")
     message = Column(Text, nullable=True, comment="消息文本内容")
+    message_zstd = Column(LargeBinary, nullable=True, comment="zstd 压缩后的消息文本，非空时 message 为空")
+    message_dict_id = Column(Integer, nullable=True, comment="压缩所用的字典ID，为空表示未使用字典")
     views = Column(Integer, nullable=True, comment="查看次数（仅频道消息）")
     media_type = Column(Enum(MediaTypeEnum), nullable=True, comment="媒体类型")
     media_size = Column(BigInteger, nullable=True, comment="媒体文件大小（可选）")
     reply_to_msg_id = Column(BigInteger, nullable=True, comment="回复的消息ID")
-    forward_from_id = Column(BigInteger, nullable=True, comment="转发来源的对话ID")
-    created_at = Column(DateTime, server_default="CURRENT_TIMESTAMP", comment="记录创建时间")
-    updated_at = Column(DateTime, server_default="CURRENT_TIMESTAMP", server_onupdate="CURRENT_TIMESTAMP",
+    forward_from_id = Column(BigInteger, nullable=True, comment="转发来源的对话ID（用户、频道或群组，不带前缀）")
+    forward_from_msg_id = Column(BigInteger, nullable=True, comment="转发自频道时原帖在来源频道里的消息ID")
+    content_hash = Column(BigInteger, nullable=True, comment="可变字段的内容指纹，重复抓取时相同则跳过写入")
+    thread_root_id = Column(BigInteger, nullable=True,
+                            comment="所在回复树的根消息ID，不是回复的消息为自身；根消息尚未抓到时为最早可知的祖先")
+    thread_depth = Column(Integer, nullable=True, comment="在回复树中的深度，根为 0")
+    created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), comment="记录创建时间")
+    updated_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), server_onupdate="CURRENT_TIMESTAMP",
                         comment="记录更新时间")
 
     dialog = relationship("Dialog", backref="messages")
@@ -49,4 +57,6 @@ class Message(Base):
         UniqueConstraint('dialog_id', 'message_id', name='uk_message'),
         Index('idx_sender', 'sender_id'),
         Index('idx_date', 'date'),
+        Index('idx_thread', 'dialog_id', 'thread_root_id'),
+        Index('idx_forward_from', 'forward_from_id', 'dialog_id', 'message_id'),
     )
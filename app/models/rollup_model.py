@@ -0,0 +1,47 @@
+from sqlalchemy import Column, BigInteger, Integer, String, Date, DateTime, Index
+from .base_model import Base
+
+
+class DialogActivityRollup(Base):
+    """每个频道每小时/每天新增的消息数，抓取写入时在同一事务里累加"""
+    __tablename__ = "rollup_dialog_activity"
+
+    dialog_id = Column(BigInteger, primary_key=True, comment="频道ID")
+    granularity = Column(String(8), primary_key=True, comment="粒度：hour / day")
+    bucket = Column(DateTime, primary_key=True, comment="时间桶起点（UTC）")
+    messages = Column(BigInteger, nullable=False, default=0, comment="消息数")
+    media_messages = Column(BigInteger, nullable=False, default=0, comment="带媒体的消息数")
+
+
+class KeywordHitRollup(Base):
+    """每个频道每个关键词每天命中的消息数"""
+    __tablename__ = "rollup_keyword_hits"
+
+    dialog_id = Column(BigInteger, primary_key=True, comment="频道ID")
+    keyword = Column(String(128), primary_key=True, comment="关键词（小写）")
+    day = Column(Date, primary_key=True, comment="日期（UTC）")
+    hits = Column(BigInteger, nullable=False, default=0, comment="命中的消息数")
+
+
+class MediaRollup(Base):
+    """每个频道按媒体类型统计的消息数与媒体总字节数"""
+    __tablename__ = "rollup_media"
+
+    dialog_id = Column(BigInteger, primary_key=True, comment="频道ID")
+    media_type = Column(String(16), primary_key=True, comment="媒体类型")
+    messages = Column(BigInteger, nullable=False, default=0, comment="消息数")
+    total_bytes = Column(BigInteger, nullable=False, default=0, comment="媒体总字节数（已知大小的部分）")
+
+
+class SenderRollup(Base):
+    """每个频道每个发送者的消息数，用于活跃发送者排行"""
+    __tablename__ = "rollup_senders"
+
+    dialog_id = Column(BigInteger, primary_key=True, comment="频道ID")
+    sender_id = Column(BigInteger, primary_key=True, comment="发送者ID")
+    messages = Column(BigInteger, nullable=False, default=0, comment="消息数")
+    last_date = Column(DateTime, nullable=True, comment="最近一条消息的时间")
+
+    __table_args__ = (
+        Index('idx_sender_rank', 'dialog_id', 'messages'),
+    )
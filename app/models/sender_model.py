@@ -0,0 +1,24 @@
+from sqlalchemy import Column, BigInteger, String, DateTime, Enum, Index, text
+from .base_model import Base
+from .message_model import SenderTypeEnum
+
+
+class Sender(Base):
+    """消息发送者（用户 / 机器人 / 以频道身份发言）的资料，抓取时随历史页返回的实体一起写入；只存在主库"""
+    __tablename__ = "senders"
+
+    sender_id = Column(BigInteger, primary_key=True, autoincrement=False, comment="发送者ID，与 messages.sender_id 对应")
+    sender_type = Column(Enum(SenderTypeEnum), nullable=False, comment="发送者类型")
+    access_hash = Column(BigInteger, nullable=True, comment="访问哈希，min 实体没有")
+    username = Column(String(64), nullable=True, comment="用户名（不含 @）")
+    first_name = Column(String(255), nullable=True, comment="名（用户）")
+    last_name = Column(String(255), nullable=True, comment="姓（用户）")
+    title = Column(String(255), nullable=True, comment="名称（频道）")
+    content_hash = Column(BigInteger, nullable=True, comment="资料字段的指纹，未变时跳过写入")
+    created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), comment="记录创建时间")
+    updated_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), server_onupdate="CURRENT_TIMESTAMP",
+                        comment="记录更新时间")
+
+    __table_args__ = (
+        Index('idx_sender_username', 'username'),
+    )
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, BigInteger, Integer, DateTime, text
+from .base_model import Base
+
+
+class DialogShard(Base):
+    """频道所在分片的显式指定（迁移过的频道），没有记录的频道按哈希落到默认分片；只存在主库"""
+    __tablename__ = "dialog_shards"
+
+    dialog_id = Column(BigInteger, primary_key=True, autoincrement=False, comment="频道ID")
+    shard = Column(Integer, nullable=False, comment="分片序号，对应 SHARD_URLS 中的位置")
+    updated_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), server_onupdate="CURRENT_TIMESTAMP",
+                        comment="记录更新时间")
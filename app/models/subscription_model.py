@@ -0,0 +1,61 @@
+from sqlalchemy import Column, BigInteger, Integer, DateTime, Enum, String, Text, Boolean, UniqueConstraint, Index, \
+    text
+from .base_model import Base
+import enum
+
+
+class ForwardStatusEnum(str, enum.Enum):
+    pending = "pending"
+    sent = "sent"
+    failed = "failed"
+
+
+class SubscriptionRule(Base):
+    """订阅规则：来源频道 + 关键词 + 媒体条件 -> 目标会话，新写入的消息命中即排队转发"""
+    __tablename__ = "subscription_rules"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True, comment="自增主键")
+    name = Column(String(128), nullable=True, comment="规则名称")
+    source_dialog_ids = Column(Text, nullable=True, comment="逗号分隔的来源频道ID，为空表示所有频道")
+    keywords = Column(Text, nullable=True, comment="逗号分隔的关键词，命中任意一个即可，为空表示不限")
+    media_types = Column(String(255), nullable=True, comment="逗号分隔的媒体类型，为空表示不限")
+    min_duration = Column(Integer, nullable=True, comment="最短媒体时长（秒）")
+    max_duration = Column(Integer, nullable=True, comment="最长媒体时长（秒）")
+    min_size = Column(BigInteger, nullable=True, comment="最小媒体大小（字节）")
+    max_size = Column(BigInteger, nullable=True, comment="最大媒体大小（字节）")
+    to_chat_id = Column(BigInteger, nullable=False, comment="转发目标会话ID")
+    enabled = Column(Boolean, nullable=False, default=True, comment="是否启用")
+    created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), comment="记录创建时间")
+    updated_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), server_onupdate="CURRENT_TIMESTAMP",
+                        comment="记录更新时间")
+
+
+class ForwardQueueItem(Base):
+    """待转发队列；同一条消息对同一目标只排队一次，多条规则命中也只转发一次"""
+    __tablename__ = "forward_queue"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True, comment="自增主键")
+    rule_id = Column(BigInteger, nullable=False, comment="命中的规则ID（多条命中时取第一条）")
+    dialog_id = Column(BigInteger, nullable=False, comment="来源频道ID")
+    message_id = Column(BigInteger, nullable=False, comment="来源消息ID")
+    to_chat_id = Column(BigInteger, nullable=False, comment="转发目标会话ID")
+    status = Column(Enum(ForwardStatusEnum), nullable=False, default=ForwardStatusEnum.pending, comment="转发状态")
+    attempts = Column(Integer, nullable=False, default=0, comment="已尝试次数")
+    error = Column(String(512), nullable=True, comment="最近一次失败原因")
+    created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), comment="入队时间")
+    sent_at = Column(DateTime, nullable=True, comment="转发成功时间（UTC）")
+
+    __table_args__ = (
+        UniqueConstraint('to_chat_id', 'dialog_id', 'message_id', name='uk_forward'),
+        Index('idx_forward_status', 'status', 'to_chat_id', 'dialog_id'),
+    )
+
+
+class SubscriptionCursor(Base):
+    """订阅扫描的进度：每个来源频道扫描到的最大消息ID，下次从这里往后扫"""
+    __tablename__ = "subscription_cursors"
+
+    dialog_id = Column(BigInteger, primary_key=True, autoincrement=False, comment="来源频道ID")
+    last_message_id = Column(BigInteger, nullable=False, default=0, comment="已扫描到的最大消息ID")
+    updated_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), server_onupdate="CURRENT_TIMESTAMP",
+                        comment="记录更新时间")
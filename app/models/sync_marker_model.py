@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, DateTime
+from .base_model import Base
+
+
+class SyncMarker(Base):
+    """记录某类数据最近一次从 Telegram 同步的时间（UTC）"""
+    __tablename__ = "sync_markers"
+
+    name = Column(String(64), primary_key=True, comment="同步项名称")
+    synced_at = Column(DateTime, nullable=True, comment="最近一次同步完成时间（UTC）")
+    full_synced_at = Column(DateTime, nullable=True, comment="最近一次全量同步完成时间（UTC）")
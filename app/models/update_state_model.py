@@ -0,0 +1,25 @@
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, text
+from .base_model import Base
+
+
+class UpdateState(Base):
+    """账号级的更新状态（updates.State），用于断线后 getDifference 补齐"""
+    __tablename__ = "update_states"
+
+    account = Column(String(64), primary_key=True, comment="账号标识")
+    pts = Column(Integer, nullable=False, comment="pts")
+    qts = Column(Integer, nullable=False, comment="qts")
+    date = Column(DateTime, nullable=False, comment="状态时间（UTC）")
+    seq = Column(Integer, nullable=False, default=0, comment="seq")
+    updated_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), server_onupdate="CURRENT_TIMESTAMP",
+                        comment="记录更新时间")
+
+
+class ChannelUpdateState(Base):
+    """频道级 pts，用于 getChannelDifference"""
+    __tablename__ = "channel_update_states"
+
+    channel_id = Column(BigInteger, primary_key=True, autoincrement=False, comment="频道ID")
+    pts = Column(Integer, nullable=False, comment="频道 pts")
+    updated_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"), server_onupdate="CURRENT_TIMESTAMP",
+                        comment="记录更新时间")
@@ -2,3 +2,20 @@
 from .dialog_repository import DialogRepository
 from .message_repository import MessageRepository
 from .media_repository import MediaRepository
+from .ingest_repository import IngestRepository, BatchResult
+from .rows import MessageRow, MediaRow, SenderRow
+from .backfill_repository import BackfillRepository
+from .job_repository import JobRepository
+from .sync_marker_repository import SyncMarkerRepository
+from .update_state_repository import UpdateStateRepository
+from .view_repository import ViewRepository
+from .compression_repository import CompressionRepository
+from .archive_repository import ArchiveRepository
+from .rollup_repository import RollupRepository, RollupAccumulator
+from .subscription_repository import SubscriptionRepository
+from .subscription_index import subscriptions, RuleIndex
+from .recording_store import RecordingStore
+from .shard_router import shards, ShardRouter, AmbiguousIdError
+from .shard_repository import ShardRepository
+from .thread_repository import ThreadRepository
+from .sender_repository import SenderRepository, sender_cache
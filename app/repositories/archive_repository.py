@@ -0,0 +1,277 @@
+import heapq
+from datetime import datetime
+from operator import itemgetter
+from typing import Callable, List, Optional, Dict, Any, Iterator
+
+from sqlalchemy import select, delete, distinct
+from sqlalchemy.orm import Session
+
+from ..database import has_table
+from ..metrics import observe_repository
+from ..models import Message, Media, ArchiveSegment, ArchiveStatusEnum
+from .archive_store import ParquetStore, archive_columns, compute
+from .text_codec import codec
+from .shard_router import shards
+
+
+def merge_hot(archived: Iterator[Dict[str, Any]], hot: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    两路按 message_id 升序的行归并成一路，同一条消息两边都有（归档后又被重新抓回）时取热表，
+    输出的 message_id 严格递增，可以直接用最后一条作为下一页的 after_id。
+    """
+    pending = next(archived, None)
+    for row in hot:
+        message_id = row["message_id"]
+        while pending is not None and pending["message_id"] < message_id:
+            yield pending
+            pending = next(archived, None)
+        if pending is not None and pending["message_id"] == message_id:
+            pending = next(archived, None)
+        yield row
+    if pending is not None:
+        yield pending
+        yield from archived
+
+
+class ArchiveRepository:
+    """
+    归档清单（archive_segments）的读写、热表中待归档行的读取与分批删除，
+    以及按清单定位分段文件读取归档行。归档行以 dict 返回，列与热表一致。
+    """
+
+    def __init__(self, db: Session, store: Optional[ParquetStore] = None):
+        self.db = db
+        self.store = store or ParquetStore()
+
+    # region 清单
+    @observe_repository
+    def create_segment(self, **fields) -> ArchiveSegment:
+        obj = ArchiveSegment(**fields)
+        self.db.add(obj)
+        self.db.commit()
+        self.db.refresh(obj)
+        return obj
+
+    @observe_repository
+    def set_status(self, obj: ArchiveSegment, status: ArchiveStatusEnum) -> ArchiveSegment:
+        obj.status = status
+        self.db.commit()
+        return obj
+
+    @observe_repository
+    def get_pending(self) -> List[ArchiveSegment]:
+        return (
+            self.db.query(ArchiveSegment)
+            .filter(ArchiveSegment.status == ArchiveStatusEnum.pending)
+            .order_by(ArchiveSegment.id)
+            .all()
+        )
+
+    @observe_repository
+    def get_segments(self, table_name: str = "messages", dialog_id: Optional[int] = None) -> List[ArchiveSegment]:
+        query = self.db.query(ArchiveSegment).filter(ArchiveSegment.table_name == table_name)
+        if dialog_id is not None:
+            query = query.filter(ArchiveSegment.dialog_id == dialog_id)
+        return query.order_by(ArchiveSegment.dialog_id, ArchiveSegment.min_message_id).all()
+
+    @observe_repository
+    def find_segments(self, table_name: str, dialog_id: Optional[int] = None, message_id: Optional[int] = None,
+                      pk: Optional[int] = None, since: Optional[datetime] = None,
+                      until: Optional[datetime] = None, after_id: Optional[int] = None) -> List[ArchiveSegment]:
+        """
+        按清单里的 ID / 时间范围筛出可能包含目标行的分段，其余文件不打开。
+        还没建 archive_segments 表（没有启用归档）时没有分段。
+        """
+        if not has_table(self.db, ArchiveSegment.__tablename__):
+            return []
+        query = self.db.query(ArchiveSegment).filter(ArchiveSegment.table_name == table_name)
+        if dialog_id is not None:
+            query = query.filter(ArchiveSegment.dialog_id == dialog_id)
+        if message_id is not None:
+            query = query.filter(ArchiveSegment.min_message_id <= message_id,
+                                 ArchiveSegment.max_message_id >= message_id)
+        if pk is not None:
+            query = query.filter(ArchiveSegment.min_pk <= pk, ArchiveSegment.max_pk >= pk)
+        if since is not None:
+            query = query.filter(ArchiveSegment.max_date >= since)
+        if until is not None:
+            query = query.filter(ArchiveSegment.min_date < until)
+        if after_id:
+            query = query.filter(ArchiveSegment.max_message_id > after_id)
+        return query.order_by(ArchiveSegment.min_message_id).all()
+    # endregion
+
+    # region 热表
+    @observe_repository
+    def get_dialogs_before(self, cutoff: datetime) -> List[int]:
+        query = select(distinct(Message.dialog_id)).where(Message.date < cutoff)
+        return sorted({row[0] for rows in shards.fan_out(self.db, lambda data: data.execute(query).all())
+                       for row in rows})
+
+    @observe_repository
+    def get_old_messages(self, dialog_id: int, cutoff: datetime, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        """按 message_id 顺序取早于 cutoff 的消息，压缩正文解压成明文"""
+        table = Message.__table__
+        rows = shards.session(self.db, dialog_id).execute(
+            select(table)
+            .where(table.c.dialog_id == dialog_id, table.c.date < cutoff, table.c.message_id > after_id)
+            .order_by(table.c.message_id)
+            .limit(limit)
+        ).mappings().all()
+        result = []
+        for row in rows:
+            item = dict(row)
+            item["message"] = codec.decode(self.db, item.pop("message"), item.pop("message_zstd"),
+                                           item.pop("message_dict_id"))
+            result.append(item)
+        return result
+
+    @observe_repository
+    def get_medias(self, dialog_id: int, message_ids: List[int]) -> List[Dict[str, Any]]:
+        table = Media.__table__
+        data = shards.session(self.db, dialog_id)
+        rows = []
+        for start in range(0, len(message_ids), 1000):
+            rows.extend(dict(row) for row in data.execute(
+                select(table).where(table.c.dialog_id == dialog_id,
+                                    table.c.message_id.in_(message_ids[start:start + 1000]))
+            ).mappings())
+        return rows
+
+    @observe_repository
+    def delete_rows(self, table_name: str, dialog_id: int, message_ids: List[int], chunk: int) -> int:
+        """分批删除，每批一个事务，避免长事务和大范围锁"""
+        table = Message.__table__ if table_name == "messages" else Media.__table__
+        data = shards.session(self.db, dialog_id)
+        deleted = 0
+        for start in range(0, len(message_ids), chunk):
+            try:
+                result = data.execute(
+                    delete(table).where(table.c.dialog_id == dialog_id,
+                                        table.c.message_id.in_(message_ids[start:start + chunk])))
+                data.commit()
+            except Exception:
+                data.rollback()
+                raise
+            deleted += result.rowcount
+        return deleted
+    # endregion
+
+    # region 归档读取
+    def _read_messages(self, segments: List[ArchiveSegment], filters) -> Iterator[Dict[str, Any]]:
+        for segment in segments:
+            yield from self.store.read_rows(segment.path, archive_columns("messages"), filters)
+
+    @staticmethod
+    def _merge_segments(segments: List[ArchiveSegment],
+                        read: Callable[[ArchiveSegment], List[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+        """
+        按 min_message_id 排好序的分段读成一路按 message_id 升序、不重复的行。
+        同一区间重新抓回后再次归档会产生区间重叠的分段：重叠的一组一起归并，
+        同一条取较新（清单 id 较大）的分段；不重叠的分段逐个读取，不同时载入内存。
+        """
+        group: List[ArchiveSegment] = []
+        group_max = None
+        for segment in segments + [None]:
+            if segment is not None and (not group or segment.min_message_id <= group_max):
+                group.append(segment)
+                group_max = max(group_max, segment.max_message_id) if group_max is not None \
+                    else segment.max_message_id
+                continue
+            if len(group) == 1:
+                yield from read(group[0])
+            elif group:
+                streams = [((row["message_id"], -item.id, row) for row in read(item)) for item in group]
+                last = None
+                for message_id, _, row in heapq.merge(*streams, key=itemgetter(0, 1)):
+                    if message_id != last:
+                        last = message_id
+                        yield row
+            group = [segment]
+            group_max = segment.max_message_id if segment is not None else None
+
+    @observe_repository
+    def find_message(self, dialog_id: int, message_id: int) -> Dict[str, Any] | None:
+        # 多个分段都有这条时取最新的分段
+        segments = sorted(self.find_segments("messages", dialog_id, message_id=message_id),
+                          key=lambda segment: segment.id, reverse=True)
+        if not segments:
+            return None
+        pc = compute()
+        filters = (pc.field("dialog_id") == dialog_id) & (pc.field("message_id") == message_id)
+        return next(self._read_messages(segments, filters), None)
+
+    @observe_repository
+    def find_media(self, dialog_id: int, message_id: int) -> Dict[str, Any] | None:
+        segments = sorted(self.find_segments("medias", dialog_id, message_id=message_id),
+                          key=lambda segment: segment.id, reverse=True)
+        if not segments:
+            return None
+        pc = compute()
+        filters = (pc.field("dialog_id") == dialog_id) & (pc.field("message_id") == message_id)
+        for segment in segments:
+            rows = self.store.read_rows(segment.path, archive_columns("medias"), filters)
+            if rows:
+                return rows[0]
+        return None
+
+    @observe_repository
+    def find_by_pk(self, table_name: str, pk: int, dialog_id: Optional[int] = None,
+                   unique: bool = False) -> List[Dict[str, Any]]:
+        """
+        按热表主键找归档行，dialog_id 不为空时只找该频道。unique 为 False 时找到一条即返回；
+        为 True 时读完全部候选分段，返回所有不同的 (dialog_id, message_id) 各一行——分片时
+        主键只在分片内唯一，不同频道的行可能有同一主键。
+        """
+        segments = sorted(self.find_segments(table_name, dialog_id, pk=pk),
+                          key=lambda segment: segment.id, reverse=True)
+        if not segments:
+            return []
+        pc = compute()
+        filters = pc.field("id") == pk
+        if dialog_id is not None:
+            filters = filters & (pc.field("dialog_id") == dialog_id)
+        found = {}
+        for segment in segments:
+            for row in self.store.read_rows(segment.path, archive_columns(table_name), filters):
+                found.setdefault((row["dialog_id"], row["message_id"]), row)
+                if not unique:
+                    return list(found.values())
+        return list(found.values())
+
+    @observe_repository
+    def search_message_ids(self, dialog_id: int, keyword: str) -> List[int]:
+        """只读 message_id / message 两列，用 Arrow 的子串匹配（不区分大小写）"""
+        matched = []
+        for segment in self.find_segments("messages", dialog_id):
+            pc = compute()
+            table = self.store.read(segment.path, ["message_id", "message"])
+            mask = pc.fill_null(pc.match_substring(table["message"], keyword, ignore_case=True), False)
+            matched.extend(table["message_id"].filter(mask).to_pylist())
+        return matched
+
+    def iter_messages(self, dialog_id: int, since: Optional[datetime] = None,
+                      until: Optional[datetime] = None, after_id: int = 0) -> Iterator[Dict[str, Any]]:
+        segments = self.find_segments("messages", dialog_id, since=since, until=until, after_id=after_id)
+        if not segments:
+            return iter(())
+        pc = compute()
+        filters = pc.field("dialog_id") == dialog_id
+        if after_id:
+            filters = filters & (pc.field("message_id") > after_id)
+        if since is not None:
+            filters = filters & (pc.field("date") >= since)
+        if until is not None:
+            filters = filters & (pc.field("date") < until)
+        columns = archive_columns("messages")
+        return self._merge_segments(segments, lambda segment: self.store.read_rows(segment.path, columns, filters))
+
+    def iter_medias(self, dialog_id: int, after_id: int = 0) -> Iterator[Dict[str, Any]]:
+        segments = self.find_segments("medias", dialog_id, after_id=after_id)
+        if not segments:
+            return iter(())
+        pc = compute()
+        filters = (pc.field("dialog_id") == dialog_id) & (pc.field("message_id") > after_id)
+        columns = archive_columns("medias")
+        return self._merge_segments(segments, lambda segment: self.store.read_rows(segment.path, columns, filters))
+    # endregion
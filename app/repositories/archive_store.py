@@ -0,0 +1,155 @@
+# app/repositories/archive_store.py
+"""
+归档分段的 Parquet 读写。
+
+每个分段是一个频道一段 message_id 区间的 messages 或 medias 行，列类型由
+ORM 模型推导；按 row group 写入并带统计信息，读取时用 memory_map 打开，
+按 message_id / date 过滤可以直接跳过不相关的 row group。
+pyarrow 是可选依赖，只有归档和读取归档时才需要，也只在那时才导入。
+"""
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Any
+
+from pydantic_settings import BaseSettings
+from sqlalchemy import BigInteger, Integer, DateTime, LargeBinary, Enum
+
+from ..models import Message, Media
+
+# 第一次用到时由 _require_pyarrow 导入，应用启动不为它付出导入时间
+pa = pc = pq = None
+
+# 不进入归档的列：压缩正文在归档前解压，Parquet 自己会压缩；内容指纹与回复树索引只用于热表
+_SKIP_COLUMNS = {"message_zstd", "message_dict_id", "content_hash", "thread_root_id", "thread_depth"}
+
+ARCHIVE_TABLES = {
+    "messages": Message.__table__,
+    "medias": Media.__table__,
+}
+
+
+class ArchiveSettings(BaseSettings):
+    archive_dir: str = "archive"
+    # 早于此天数的消息会被归档
+    archive_after_days: int = 180
+    archive_segment_rows: int = 100000
+    archive_row_group_rows: int = 10000
+    archive_compression: str = "zstd"
+    # 从 MySQL 删除已归档行时每批的行数
+    archive_delete_chunk: int = 1000
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+@lru_cache()
+def get_archive_settings() -> ArchiveSettings:
+    return ArchiveSettings()
+
+
+def _require_pyarrow():
+    global pa, pc, pq
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.compute
+            import pyarrow.parquet
+        except ImportError:  # 可选依赖
+            raise RuntimeError("消息归档需要安装 pyarrow：pip install pyarrow")
+        pa, pc, pq = pyarrow, pyarrow.compute, pyarrow.parquet
+    return pc
+
+
+def compute():
+    """pyarrow.compute，用于构造读取归档时的过滤表达式"""
+    return _require_pyarrow()
+
+
+def _arrow_type(column):
+    if isinstance(column.type, (BigInteger, Integer)):
+        return pa.int64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column.type, LargeBinary):
+        return pa.binary()
+    # String / Text / Enum 都存成字符串
+    return pa.string()
+
+
+@lru_cache()
+def arrow_schema(table_name: str):
+    _require_pyarrow()
+    table = ARCHIVE_TABLES[table_name]
+    return pa.schema([(c.name, _arrow_type(c)) for c in table.columns if c.name not in _SKIP_COLUMNS])
+
+
+def archive_columns(table_name: str) -> List[str]:
+    return [c.name for c in ARCHIVE_TABLES[table_name].columns if c.name not in _SKIP_COLUMNS]
+
+
+@lru_cache()
+def _enum_columns(table_name: str) -> frozenset:
+    return frozenset(c.name for c in ARCHIVE_TABLES[table_name].columns if isinstance(c.type, Enum))
+
+
+def _plain(value):
+    # str 枚举写成取值本身
+    return value.value if hasattr(value, "value") and isinstance(value, str) else value
+
+
+def record_batch(table_name: str, rows: Sequence[Dict[str, Any]]):
+    """一批行 dict 按表的 Arrow schema 转成 RecordBatch，逐列构造；只有枚举列需要逐个取值"""
+    schema = arrow_schema(table_name)
+    enums = _enum_columns(table_name)
+    columns = [pa.array([_plain(row[name]) for row in rows] if name in enums else [row[name] for row in rows],
+                        type=field.type)
+               for name, field in zip(schema.names, schema)]
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+class ParquetStore:
+    def __init__(self, settings: Optional[ArchiveSettings] = None):
+        self.settings = settings or get_archive_settings()
+
+    def resolve(self, path: str) -> str:
+        return path if os.path.isabs(path) else os.path.join(self.settings.archive_dir, path)
+
+    def write(self, path: str, table_name: str, rows: Sequence[Dict[str, Any]]) -> int:
+        """写一个分段文件（先写临时文件再改名），返回文件字节数"""
+        _require_pyarrow()
+        table = pa.Table.from_batches([record_batch(table_name, rows)])
+        full = self.resolve(path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        tmp = full + ".tmp"
+        pq.write_table(table, tmp,
+                       compression=self.settings.archive_compression,
+                       row_group_size=self.settings.archive_row_group_rows)
+        os.replace(tmp, full)
+        return os.path.getsize(full)
+
+    def read(self, path: str, columns: Optional[Iterable[str]] = None, filters=None):
+        """memory_map 读取分段；filters 为 pyarrow 表达式，按 row group 统计信息跳过不匹配的部分"""
+        _require_pyarrow()
+        return pq.read_table(self.resolve(path), columns=list(columns) if columns else None,
+                             filters=filters, memory_map=True)
+
+    def read_rows(self, path: str, columns: Optional[Iterable[str]] = None, filters=None) -> List[Dict[str, Any]]:
+        """分段写于加列之前时，文件里没有的列读为 None"""
+        if columns is None:
+            return self.read(path, None, filters).to_pylist()
+        _require_pyarrow()
+        columns = list(columns)
+        present = set(pq.read_schema(self.resolve(path), memory_map=True).names)
+        missing = [name for name in columns if name not in present]
+        rows = self.read(path, [name for name in columns if name in present], filters).to_pylist()
+        for row in rows:
+            for name in missing:
+                row[name] = None
+        return rows
+
+    def delete(self, path: str) -> None:
+        full = self.resolve(path)
+        if os.path.exists(full):
+            os.remove(full)
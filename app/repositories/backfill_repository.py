@@ -0,0 +1,69 @@
+from typing import List, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..metrics import observe_repository
+from ..models import BackfillRange, BackfillStatusEnum
+
+
+class BackfillRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    @observe_repository
+    def get_by_dialog(self, dialog_id: int) -> List[BackfillRange]:
+        return (
+            self.db.query(BackfillRange)
+            .filter(BackfillRange.dialog_id == dialog_id)
+            .order_by(BackfillRange.range_index)
+            .all()
+        )
+
+    @observe_repository
+    def get_unfinished(self, dialog_id: int) -> List[BackfillRange]:
+        return (
+            self.db.query(BackfillRange)
+            .filter(BackfillRange.dialog_id == dialog_id, BackfillRange.status != BackfillStatusEnum.done)
+            .order_by(BackfillRange.range_index)
+            .all()
+        )
+
+    @observe_repository
+    def create_plan(self, dialog_id: int, bounds: Sequence[Tuple[int, int]], keywords: str | None) -> List[BackfillRange]:
+        """用新的分片计划替换该频道之前的回填记录"""
+        self.db.query(BackfillRange).filter(BackfillRange.dialog_id == dialog_id).delete()
+        ranges = [
+            BackfillRange(
+                dialog_id=dialog_id,
+                range_index=index,
+                low_id=low,
+                high_id=high,
+                cursor_id=high + 1,
+                status=BackfillStatusEnum.pending,
+                keywords=keywords,
+                scanned=0,
+                matched=0,
+            )
+            for index, (low, high) in enumerate(bounds)
+        ]
+        self.db.add_all(ranges)
+        self.db.commit()
+        return ranges
+
+    @observe_repository
+    def save_progress(self, obj: BackfillRange, cursor_id: int, scanned: int, matched: int,
+                      status: BackfillStatusEnum) -> BackfillRange:
+        obj.cursor_id = cursor_id
+        obj.scanned += scanned
+        obj.matched += matched
+        obj.status = status
+        obj.error = None
+        self.db.commit()
+        return obj
+
+    @observe_repository
+    def set_status(self, obj: BackfillRange, status: BackfillStatusEnum, error: str | None = None) -> BackfillRange:
+        obj.status = status
+        obj.error = error[:512] if error else None
+        self.db.commit()
+        return obj
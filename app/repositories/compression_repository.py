@@ -0,0 +1,105 @@
+from typing import List, Optional, Dict, Any
+
+from sqlalchemy import select, update, bindparam, func, distinct
+from sqlalchemy.orm import Session
+
+from ..metrics import observe_repository
+from ..models import Message, CompressionDict
+from .text_codec import codec
+from .shard_router import shards
+
+
+class CompressionRepository:
+    """压缩字典的读写（主库），以及存量正文迁移用的按主键分批读写（分片时逐个分片进行）"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @observe_repository
+    def get_dicts(self) -> List[CompressionDict]:
+        return self.db.query(CompressionDict).order_by(CompressionDict.id).all()
+
+    @observe_repository
+    def create_dict(self, dialog_id: Optional[int], data: bytes, samples: int) -> CompressionDict:
+        obj = CompressionDict(dialog_id=dialog_id, data=data, samples=samples)
+        self.db.add(obj)
+        self.db.commit()
+        self.db.refresh(obj)
+        return obj
+
+    @observe_repository
+    def get_dialog_ids(self) -> List[int]:
+        query = select(distinct(Message.dialog_id))
+        return sorted({row[0] for rows in shards.fan_out(self.db, lambda data: data.execute(query).all())
+                       for row in rows})
+
+    @observe_repository
+    def sample_texts(self, dialog_id: Optional[int], limit: int) -> List[str]:
+        """取最近的 limit 条正文作为训练样本，已压缩的先解压"""
+        table = Message.__table__
+        query = (
+            select(table.c.message, table.c.message_zstd, table.c.message_dict_id)
+            .where((table.c.message.is_not(None)) | (table.c.message_zstd.is_not(None)))
+            .order_by(table.c.id.desc())
+            .limit(limit)
+        )
+        if dialog_id is not None:
+            rows = shards.session(self.db, dialog_id).execute(query.where(table.c.dialog_id == dialog_id)).all()
+        else:
+            # 全局样本从各分片各取一部分
+            query = query.limit(-(-limit // shards.count))
+            rows = [row for part in shards.fan_out(self.db, lambda data: data.execute(query).all()) for row in part]
+        return [codec.decode(self.db, plain, blob, dict_id) for plain, blob, dict_id in rows]
+
+    @observe_repository
+    def get_batch(self, compressed: bool, dialog_id: Optional[int], after_id: int, limit: int,
+                  shard: int = 0) -> list:
+        """按主键顺序取 shard 分片上的一批 (id, dialog_id, message, message_zstd, message_dict_id)"""
+        table = Message.__table__
+        stored = table.c.message_zstd.is_not(None) if compressed else (
+            table.c.message_zstd.is_(None) & table.c.message.is_not(None))
+        query = (
+            select(table.c.id, table.c.dialog_id, table.c.message, table.c.message_zstd, table.c.message_dict_id)
+            .where(stored, table.c.id > after_id)
+            .order_by(table.c.id)
+            .limit(limit)
+        )
+        if dialog_id is not None:
+            query = query.where(table.c.dialog_id == dialog_id)
+        return shards.shard_session(self.db, shard).execute(query).all()
+
+    @observe_repository
+    def set_texts(self, params: List[Dict[str, Any]], shard: int = 0) -> int:
+        """params 为 {b_id, message, message_zstd, message_dict_id}，在 shard 分片上 executemany 一次提交"""
+        if not params:
+            return 0
+        table = Message.__table__
+        data = shards.shard_session(self.db, shard)
+        try:
+            data.execute(update(table).where(table.c.id == bindparam("b_id")), params)
+            data.commit()
+        except Exception:
+            data.rollback()
+            raise
+        return len(params)
+
+    @observe_repository
+    def storage_stats(self, dialog_id: Optional[int] = None) -> Dict[str, int]:
+        table = Message.__table__
+        query = select(
+            func.count(table.c.message),
+            func.coalesce(func.sum(func.length(table.c.message)), 0),
+            func.count(table.c.message_zstd),
+            func.coalesce(func.sum(func.length(table.c.message_zstd)), 0),
+        )
+        if dialog_id is not None:
+            parts = [shards.session(self.db, dialog_id).execute(query.where(table.c.dialog_id == dialog_id)).one()]
+        else:
+            parts = shards.fan_out(self.db, lambda data: data.execute(query).one())
+        plain_rows, plain_bytes, compressed_rows, compressed_bytes = (sum(column) for column in zip(*parts))
+        return {
+            "plain_rows": plain_rows,
+            "plain_bytes": int(plain_bytes),
+            "compressed_rows": compressed_rows,
+            "compressed_bytes": int(compressed_bytes),
+        }
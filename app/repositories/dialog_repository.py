@@ -1,24 +1,35 @@
-from typing import Optional
+from typing import Optional, List, Tuple, Dict, Any
 
+from sqlalchemy import select, insert, update, bindparam
 from sqlalchemy.orm import Session
+
+from ..metrics import observe_repository
 from ..models import Dialog
 from ..schemas import DialogCreate, DialogUpdate
 from ..schemas.dialog_schema import TelegramTypeEnum
 
 
+def _enum_value(value):
+    return getattr(value, "value", value)
+
+
 class DialogRepository:
     def __init__(self, db: Session):
         self.db = db
 
+    @observe_repository
     def get_all(self) -> list[Dialog]:
         return self.db.query(Dialog).all()
 
+    @observe_repository
     def get_by_dialog_id_and_type(self, dialog_id: int, telegram_type: TelegramTypeEnum) -> Optional[Dialog]:
         return self.db.query(Dialog).filter_by(dialog_id=dialog_id, telegram_type=telegram_type).first()
 
+    @observe_repository
     def get_by_id(self, id: int) -> Dialog | None:
         return self.db.query(Dialog).filter(Dialog.id == id).first()
 
+    @observe_repository
     def get_by_dialog_id_and_type(self, dialog_id: int, telegram_type: str) -> Dialog | None:
         return (
             self.db.query(Dialog)
@@ -26,6 +37,7 @@ class DialogRepository:
             .first()
         )
 
+    @observe_repository
     def create(self, obj_in: DialogCreate) -> Dialog:
         obj = Dialog(**obj_in.dict())
         self.db.add(obj)
@@ -34,6 +46,59 @@ class DialogRepository:
         return obj
 
 
+    @observe_repository
+    def upsert_many(self, items: List[Tuple[Optional[Dialog], DialogCreate]]) -> int:
+        """批量写入：已有对象就地更新，没有的新建，一次提交"""
+        for db_obj, obj_in in items:
+            if db_obj is None:
+                self.db.add(Dialog(**obj_in.dict()))
+            else:
+                for field, value in obj_in.dict(exclude_unset=True).items():
+                    setattr(db_obj, field, value)
+        self.db.commit()
+        return len(items)
+
+    @observe_repository
+    def bulk_upsert(self, rows: List[Dict[str, Any]]) -> List[bool]:
+        """
+        按 (dialog_id, telegram_type) 批量写入整行：一次查询已有的键，新行 executemany INSERT，
+        已有行 executemany UPDATE，一个事务提交，不回查；返回每行是否为新插入
+        """
+        table = Dialog.__table__
+        try:
+            existing = {
+                (dialog_id, _enum_value(telegram_type)) for dialog_id, telegram_type in self.db.execute(
+                    select(table.c.dialog_id, table.c.telegram_type)
+                    .where(table.c.dialog_id.in_({row["dialog_id"] for row in rows})))
+            }
+            flags, new_params, update_params = [], [], []
+            for row in rows:
+                params = dict(row)
+                if (params["dialog_id"], _enum_value(params["telegram_type"])) in existing:
+                    params["b_dialog_id"] = params.pop("dialog_id")
+                    params["b_telegram_type"] = params.pop("telegram_type")
+                    update_params.append(params)
+                    flags.append(False)
+                else:
+                    new_params.append(params)
+                    flags.append(True)
+            if new_params:
+                self.db.execute(insert(table), new_params)
+            if update_params:
+                self.db.execute(
+                    update(table).where(
+                        table.c.dialog_id == bindparam("b_dialog_id"),
+                        table.c.telegram_type == bindparam("b_telegram_type"),
+                    ),
+                    update_params,
+                )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return flags
+
+    @observe_repository
     def update(self, db_obj: Dialog, obj_in: DialogUpdate) -> Dialog:
         obj_data = obj_in.dict(exclude_unset=True)
         for field, value in obj_data.items():
@@ -42,6 +107,7 @@ class DialogRepository:
         self.db.refresh(db_obj)
         return db_obj
 
+    @observe_repository
     def delete(self, id: int) -> None:
         obj = self.get_by_id(id)
         if obj:
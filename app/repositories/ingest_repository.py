@@ -0,0 +1,244 @@
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import insert, update, select, bindparam
+from sqlalchemy.orm import Session
+
+from ..metrics import observe_repository
+from ..models import Message, Media
+from .rows import MessageRow, MediaRow
+from .text_codec import codec
+from .fingerprint import (fingerprint, message_fingerprint, media_fingerprint, message_values, MEDIA_FIELDS,
+                          VOLATILE_MESSAGE_FIELDS)
+from .rollup_repository import RollupRepository, RollupAccumulator, get_rollup_settings
+from .subscription_repository import SubscriptionRepository
+from .subscription_index import subscriptions
+from .shard_router import shards
+from .thread_repository import ThreadRepository
+
+
+class BatchResult:
+    __slots__ = ("inserted", "updated", "media_inserted", "media_updated", "new_messages", "new_medias",
+                 "unchanged_messages", "unchanged_medias", "queued", "views_updated")
+
+    def __init__(self, inserted=0, updated=0, media_inserted=0, media_updated=0):
+        self.inserted = inserted
+        self.updated = updated
+        self.media_inserted = media_inserted
+        self.media_updated = media_updated
+        # 本批中新插入的行对象、内容未变跳过写入的行对象，其余即为更新，调用方据此给出逐行状态而无需回查
+        self.new_messages: list = []
+        self.new_medias: list = []
+        self.unchanged_messages: list = []
+        self.unchanged_medias: list = []
+        # 命中订阅规则、排队转发的条数
+        self.queued = 0
+        # 内容未变、只写回了浏览数的条数（这些行同时计在 unchanged_messages 里）
+        self.views_updated = 0
+
+    def merge(self, other: "BatchResult") -> None:
+        for name in ("inserted", "updated", "media_inserted", "media_updated", "queued", "views_updated"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in ("new_messages", "new_medias", "unchanged_messages", "unchanged_medias"):
+            getattr(self, name).extend(getattr(other, name))
+
+    @property
+    def unchanged(self) -> int:
+        return len(self.unchanged_messages)
+
+    @property
+    def media_unchanged(self) -> int:
+        return len(self.unchanged_medias)
+
+    @property
+    def rowcount(self) -> int:
+        return self.inserted + self.updated + self.media_inserted + self.media_updated
+
+
+class IngestRepository:
+    """
+    抓取写入：一批行只做一次“已存在”查询（同时取回内容指纹），新行 executemany INSERT，
+    指纹变化的已有行 executemany UPDATE，指纹相同的跳过（浏览数变了的只写 views 一列）；写入时一并填好回复树索引，
+    新插入的消息同时累加到汇总表、按订阅规则入队转发，整批一个事务。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.rollups = RollupRepository(db)
+        self.subscriptions = SubscriptionRepository(db)
+        self.threads = ThreadRepository(db)
+
+    @observe_repository
+    def write_batch(self, message_rows: Sequence[MessageRow], media_rows: Sequence[MediaRow],
+                    pattern: Optional[re.Pattern] = None) -> BatchResult:
+        """pattern 为抓取用的关键词正则，用于按关键词累加命中数"""
+        if not shards.enabled:
+            return self._write(self.db, message_rows, media_rows, pattern)
+        # 分片时每个分片各一个事务，一批跨多个分片时不是原子的；重试整批即可，已写入的行指纹相同会跳过
+        by_shard = defaultdict(lambda: ([], []))
+        for row in message_rows:
+            by_shard[shards.index_of(self.db, row.dialog_id)][0].append(row)
+        for row in media_rows:
+            by_shard[shards.index_of(self.db, row.dialog_id)][1].append(row)
+        result = BatchResult()
+        for index in sorted(by_shard):
+            result.merge(self._write(shards.shard_session(self.db, index), *by_shard[index], pattern))
+        return result
+
+    def _write(self, data: Session, message_rows: Sequence[MessageRow], media_rows: Sequence[MediaRow],
+               pattern: Optional[re.Pattern]) -> BatchResult:
+        """写入同一个分片上的行；不分片时 data 就是主库，转发队列与消息同一事务"""
+        result = BatchResult()
+        try:
+            threads = self.threads.assign(data, message_rows) if message_rows else {}
+
+            def transform(params: dict) -> None:
+                self._encode_text(params)
+                params["thread_root_id"], params["thread_depth"] = threads[(params["dialog_id"], params["message_id"])]
+
+            inserted, result.updated, result.unchanged_messages, result.views_updated = self._upsert(
+                data, Message.__table__, MessageRow.__slots__, message_rows, message_fingerprint, transform,
+                VOLATILE_MESSAGE_FIELDS)
+            if inserted:
+                # 先于父消息写入的回复改挂到父消息的根上
+                self.threads.reroot(data, inserted, threads)
+            result.inserted = len(inserted)
+            media_inserted, result.media_updated, result.unchanged_medias, _ = self._upsert(
+                data, Media.__table__, MediaRow.__slots__, media_rows, media_fingerprint)
+            result.media_inserted = len(media_inserted)
+            result.new_messages, result.new_medias = inserted, media_inserted
+            if inserted and get_rollup_settings().rollup_enabled:
+                # 只累加第一次写入的消息，重复抓取不会重复计数
+                acc = RollupAccumulator()
+                for row in inserted:
+                    acc.add_row(row, pattern)
+                self.rollups.apply(acc)
+            if inserted:
+                # 新消息对全部订阅规则评估一遍，命中的与消息同一事务入队转发
+                index = subscriptions.get(self.db)
+                if index:
+                    result.queued = self.subscriptions.enqueue(index.match_rows(inserted, media_rows))
+            if data is not self.db:
+                # 分片时队列在主库，先于分片提交：分片提交失败重试时消息仍是新行，入队会被去重
+                self.db.commit()
+            data.commit()
+        except Exception:
+            data.rollback()
+            if data is not self.db:
+                self.db.rollback()
+            raise
+        return result
+
+    @observe_repository
+    def backfill_hashes(self, table_name: str, after_pk: int, limit: int, shard: int = 0) -> tuple[int, int]:
+        """
+        给升级前写入、还没有内容指纹的行补上指纹，按主键顺序处理 shard 分片上的 limit 行，一个事务。
+        返回 (本批最后一行的主键, 处理的行数)，行数为 0 表示已处理完。
+        """
+        data = shards.shard_session(self.db, shard)
+        table = Message.__table__ if table_name == "messages" else Media.__table__
+        result = data.execute(
+            select(table).where(table.c.id > after_pk, table.c.content_hash.is_(None))
+            .order_by(table.c.id).limit(limit)
+        )
+        keys = list(result.keys())
+        rows = result.all()
+        if not rows:
+            return after_pk, 0
+        params = []
+        for row in rows:
+            item = dict(zip(keys, row))
+            if table_name == "messages" and item["message_zstd"] is not None:
+                item["message"] = codec.decode(self.db, item["message"], item["message_zstd"], item["message_dict_id"])
+            values = message_values(item.get) if table_name == "messages" else [item[name] for name in MEDIA_FIELDS]
+            params.append({"b_id": item["id"], "content_hash": fingerprint(values)})
+        try:
+            data.execute(update(table).where(table.c.id == bindparam("b_id")), params)
+            data.commit()
+        except Exception:
+            data.rollback()
+            raise
+        return rows[-1].id, len(rows)
+
+    @staticmethod
+    def _existing_hashes(data: Session, table, dialog_id: int, message_ids: List[int],
+                         volatile: Sequence[str] = ()) -> Dict[int, tuple]:
+        """已存在的 message_id -> (内容指纹, *volatile 列的值)，升级前写入的行指纹为 None"""
+        rows = data.execute(
+            select(table.c.message_id, table.c.content_hash, *(table.c[name] for name in volatile))
+            .where(table.c.dialog_id == dialog_id, table.c.message_id.in_(message_ids))
+        )
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    def _encode_text(self, params: dict) -> None:
+        # 压缩列总是一起写，关闭压缩后再次写入的行会清掉旧的压缩数据
+        params["message"], params["message_zstd"], params["message_dict_id"] = codec.encode(
+            self.db, params["dialog_id"], params["message"])
+
+    def _upsert(self, data: Session, table, columns: Iterable[str], rows: Sequence, hasher, transform=None,
+                volatile: Sequence[str] = ()) -> tuple[list, int, list, int]:
+        """
+        返回 (新插入的行, 更新的行数, 内容未变跳过的行, 只写了 volatile 列的行数)。
+        volatile 为不参与指纹的列，指纹相同而这些列变了的行只 UPDATE 这几列。
+        """
+        if not rows:
+            return [], 0, [], 0
+
+        by_dialog = defaultdict(list)
+        for row in rows:
+            by_dialog[row.dialog_id].append(row)
+
+        new_rows = []
+        new_params = []
+        update_params = []
+        volatile_params = []
+        unchanged_rows = []
+        for dialog_id, dialog_rows in by_dialog.items():
+            existing = self._existing_hashes(data, table, dialog_id, [row.message_id for row in dialog_rows], volatile)
+            for row in dialog_rows:
+                # 指纹对明文计算，须在 transform（压缩）之前
+                content_hash = hasher(row)
+                stored = existing.get(row.message_id)
+                if stored is not None and stored[0] == content_hash:
+                    unchanged_rows.append(row)
+                    # 新值为空（如没取到浏览数）时保留库里的值
+                    values = {name: old if getattr(row, name) is None else getattr(row, name)
+                              for name, old in zip(volatile, stored[1:])}
+                    if any(values[name] != old for name, old in zip(volatile, stored[1:])):
+                        volatile_params.append({"b_dialog_id": dialog_id, "b_message_id": row.message_id, **values})
+                    continue
+                params = {name: getattr(row, name) for name in columns}
+                params["content_hash"] = content_hash
+                if transform is not None:
+                    transform(params)
+                if row.message_id in existing:
+                    # 主键列以 b_ 前缀作为 WHERE 参数，其余键作为 SET 列
+                    params["b_dialog_id"] = params.pop("dialog_id")
+                    params["b_message_id"] = params.pop("message_id")
+                    update_params.append(params)
+                else:
+                    new_rows.append(row)
+                    new_params.append(params)
+
+        if new_params:
+            data.execute(insert(table), new_params)
+        if update_params:
+            data.execute(
+                update(table).where(
+                    table.c.dialog_id == bindparam("b_dialog_id"),
+                    table.c.message_id == bindparam("b_message_id"),
+                ),
+                update_params,
+            )
+        if volatile_params:
+            data.execute(
+                update(table).where(
+                    table.c.dialog_id == bindparam("b_dialog_id"),
+                    table.c.message_id == bindparam("b_message_id"),
+                )
+                # 内容没变，不刷新 updated_at
+                .values(updated_at=table.c.updated_at),
+                volatile_params,
+            )
+        return new_rows, len(update_params), unchanged_rows, len(volatile_params)
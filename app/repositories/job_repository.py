@@ -0,0 +1,161 @@
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any
+
+from sqlalchemy import select, update, insert, delete, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..metrics import observe_repository
+from ..models import CrawlJob, ChannelLease, JobKindEnum, JobStatusEnum
+
+
+def utcnow() -> datetime:
+    """租约时间统一用不带时区的 UTC 存储"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class JobRepository:
+    """
+    任务认领用“条件 UPDATE + 检查 rowcount”实现比较并交换，MySQL 与 SQLite
+    都适用；MySQL 下候选查询额外加 ``FOR UPDATE SKIP LOCKED``，多个 worker
+    不会在同一批行上排队。频道级互斥由 channel_leases 表的主键保证。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @observe_repository
+    def create(self, dialog_id: int, kind: JobKindEnum, params: Dict[str, Any]) -> CrawlJob:
+        obj = CrawlJob(dialog_id=dialog_id, kind=kind, params=json.dumps(params, default=str),
+                       status=JobStatusEnum.pending, attempts=0)
+        self.db.add(obj)
+        self.db.commit()
+        self.db.refresh(obj)
+        return obj
+
+    @observe_repository
+    def get_by_id(self, id: int) -> CrawlJob | None:
+        return self.db.query(CrawlJob).filter(CrawlJob.id == id).first()
+
+    @observe_repository
+    def get_list(self, status: Optional[JobStatusEnum] = None, dialog_id: Optional[int] = None,
+                 limit: int = 100) -> List[CrawlJob]:
+        query = self.db.query(CrawlJob)
+        if status is not None:
+            query = query.filter(CrawlJob.status == status)
+        if dialog_id is not None:
+            query = query.filter(CrawlJob.dialog_id == dialog_id)
+        return query.order_by(CrawlJob.id.desc()).limit(limit).all()
+
+    @observe_repository
+    def claim(self, owner: str, lease_seconds: float, max_attempts: int, candidates: int = 10) -> CrawlJob | None:
+        """认领一个可执行的任务：待执行，或执行中但租约已过期（原 worker 已失联）"""
+        now = utcnow()
+        expires = now + timedelta(seconds=lease_seconds)
+        expired = and_(CrawlJob.status == JobStatusEnum.running, CrawlJob.lease_expires_at < now)
+        claimable = or_(CrawlJob.status == JobStatusEnum.pending, expired)
+        try:
+            # 租约反复过期的任务不再重试
+            self.db.execute(
+                update(CrawlJob)
+                .where(expired, CrawlJob.attempts >= max_attempts)
+                .values(status=JobStatusEnum.failed, error="租约多次过期", finished_at=now, lease_owner=None)
+            )
+            query = (
+                select(CrawlJob.id, CrawlJob.dialog_id)
+                .where(claimable, CrawlJob.attempts < max_attempts)
+                .order_by(CrawlJob.id)
+                .limit(candidates)
+            )
+            if self.db.get_bind().dialect.name == "mysql":
+                query = query.with_for_update(skip_locked=True)
+
+            for job_id, dialog_id in self.db.execute(query).all():
+                if not self._acquire_channel(dialog_id, job_id, owner, now, expires):
+                    continue
+                claimed = self.db.execute(
+                    update(CrawlJob)
+                    .where(CrawlJob.id == job_id, claimable)
+                    .values(status=JobStatusEnum.running, lease_owner=owner, lease_expires_at=expires,
+                            heartbeat_at=now, attempts=CrawlJob.attempts + 1)
+                ).rowcount
+                if claimed:
+                    self.db.commit()
+                    return self.get_by_id(job_id)
+                self._release_channel(dialog_id, job_id, owner)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return None
+
+    @observe_repository
+    def heartbeat(self, job_id: int, dialog_id: int, owner: str, lease_seconds: float) -> bool:
+        """续租；返回 False 说明租约已被别的 worker 接手"""
+        now = utcnow()
+        expires = now + timedelta(seconds=lease_seconds)
+        try:
+            renewed = self.db.execute(
+                update(CrawlJob)
+                .where(CrawlJob.id == job_id, CrawlJob.lease_owner == owner,
+                       CrawlJob.status == JobStatusEnum.running)
+                .values(lease_expires_at=expires, heartbeat_at=now)
+            ).rowcount
+            if renewed:
+                self.db.execute(
+                    update(ChannelLease)
+                    .where(ChannelLease.dialog_id == dialog_id, ChannelLease.owner == owner,
+                           ChannelLease.job_id == job_id)
+                    .values(expires_at=expires)
+                )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return bool(renewed)
+
+    @observe_repository
+    def finish(self, job_id: int, dialog_id: int, owner: str, status: JobStatusEnum,
+               error: Optional[str] = None) -> bool:
+        """结束任务并释放频道租约；status 为 pending 表示放回队列等待重试"""
+        values = {"status": status, "lease_owner": None, "lease_expires_at": None,
+                  "error": error[:512] if error else None}
+        if status in (JobStatusEnum.done, JobStatusEnum.failed):
+            values["finished_at"] = utcnow()
+        try:
+            finished = self.db.execute(
+                update(CrawlJob)
+                .where(CrawlJob.id == job_id, CrawlJob.lease_owner == owner)
+                .values(**values)
+            ).rowcount
+            self._release_channel(dialog_id, job_id, owner)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return bool(finished)
+
+    def _acquire_channel(self, dialog_id: int, job_id: int, owner: str, now: datetime, expires: datetime) -> bool:
+        taken = self.db.execute(
+            update(ChannelLease)
+            .where(ChannelLease.dialog_id == dialog_id, ChannelLease.expires_at < now)
+            .values(owner=owner, job_id=job_id, expires_at=expires)
+        ).rowcount
+        if taken:
+            return True
+        try:
+            with self.db.begin_nested():
+                self.db.execute(
+                    insert(ChannelLease).values(dialog_id=dialog_id, owner=owner, job_id=job_id, expires_at=expires)
+                )
+            return True
+        except IntegrityError:
+            # 频道正被其他 worker（或本 worker 的其他任务）抓取
+            return False
+
+    def _release_channel(self, dialog_id: int, job_id: int, owner: str) -> None:
+        self.db.execute(
+            delete(ChannelLease)
+            .where(ChannelLease.dialog_id == dialog_id, ChannelLease.owner == owner, ChannelLease.job_id == job_id)
+        )
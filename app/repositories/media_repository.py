@@ -1,42 +1,114 @@
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Iterator, Dict, Any
 
+from sqlalchemy import select, delete
 from sqlalchemy.orm import Session
+
+from ..metrics import observe_repository
 from ..models import Media
 from ..schemas import MediaCreate, MediaUpdate
+from .archive_repository import ArchiveRepository, merge_hot
+from .fingerprint import media_fingerprint
+from .shard_router import shards, AmbiguousIdError
 
 
 class MediaRepository:
     def __init__(self, db: Session):
         self.db = db
+        self.archive = ArchiveRepository(db)
+
+    @observe_repository
+    def get_by_id(self, id: int, include_archived: bool = True, dialog_id: Optional[int] = None) -> Media | None:
+        """按自增主键查找，dialog_id 的用法同 MessageRepository.get_by_id；已归档的行构造成只读的游离对象"""
+        if dialog_id is not None:
+            obj = shards.session(self.db, dialog_id).query(Media) \
+                .filter(Media.id == id, Media.dialog_id == dialog_id).first()
+            if obj is None and include_archived:
+                row = next(iter(self.archive.find_by_pk("medias", id, dialog_id)), None)
+                obj = Media(**row) if row is not None else None
+            return obj
+
+        data = shards.locate(self.db, select(Media.id).where(Media.id == id))
+        obj = data.query(Media).filter(Media.id == id).first() if data is not None else None
+        if include_archived and (obj is None or shards.enabled):
+            rows = [row for row in self.archive.find_by_pk("medias", id, unique=shards.enabled)
+                    if obj is None or (row["dialog_id"], row["message_id"]) != (obj.dialog_id, obj.message_id)]
+            if len(rows) + (obj is not None) > 1:
+                raise AmbiguousIdError(f"媒体主键 {id} 对应多条媒体，需要指定 dialog_id")
+            if obj is None and rows:
+                obj = Media(**rows[0])
+        return obj
+
+    @observe_repository
+    def get_by_dialog_and_message_id(self, dialog_id: int, message_id: int) -> Media | None:
+        obj = shards.session(self.db, dialog_id).query(Media) \
+            .filter(Media.dialog_id == dialog_id, Media.message_id == message_id).first()
+        if obj is None:
+            row = self.archive.find_media(dialog_id, message_id)
+            obj = Media(**row) if row is not None else None
+        return obj
+
+    def iter_by_dialog(self, dialog_id: int, after_id: int = 0, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """按 message_id 顺序读一个频道的媒体，归档分段与热表归并成一路，同一条以热表为准"""
+        return merge_hot(self.archive.iter_medias(dialog_id, after_id),
+                         self._iter_hot(dialog_id, after_id, batch_size))
 
-    def get_by_id(self, id: int) -> Media | None:
-        return self.db.query(Media).filter(Media.id == id).first()
+    def _iter_hot(self, dialog_id: int, after_id: int, batch_size: int) -> Iterator[Dict[str, Any]]:
+        table = Media.__table__
+        data = shards.session(self.db, dialog_id)
+        while True:
+            result = data.execute(
+                select(table)
+                .where(table.c.dialog_id == dialog_id, table.c.message_id > after_id)
+                .order_by(table.c.message_id)
+                .limit(batch_size)
+            )
+            keys = list(result.keys())
+            rows = result.all()
+            for row in rows:
+                item = dict(zip(keys, row))
+                del item["content_hash"]
+                yield item
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1].message_id
 
+    @observe_repository
     def create(self, obj_in: MediaCreate) -> Media:
         obj = Media(**obj_in.dict())
-        self.db.add(obj)
-        self.db.commit()
-        self.db.refresh(obj)
+        obj.content_hash = media_fingerprint(obj)
+        data = shards.session(self.db, obj.dialog_id)
+        data.add(obj)
+        data.commit()
+        data.refresh(obj)
         return obj
 
+    @observe_repository
     def update(self, db_obj: Media, obj_in: MediaUpdate) -> Media:
         obj_data = obj_in.dict(exclude_unset=True)
         for field, value in obj_data.items():
             setattr(db_obj, field, value)
-        self.db.commit()
-        self.db.refresh(db_obj)
+        db_obj.content_hash = media_fingerprint(db_obj)
+        data = Session.object_session(db_obj) or self.db
+        data.commit()
+        data.refresh(db_obj)
         return db_obj
 
-    def delete(self, id: int) -> None:
-        obj = self.get_by_id(id)
+    @observe_repository
+    def delete(self, id: int, dialog_id: Optional[int] = None) -> None:
+        obj = self.get_by_id(id, include_archived=False, dialog_id=dialog_id)
         if obj:
-            self.db.delete(obj)
-            self.db.commit()
+            # 按主键直接删：分片上没有 dialogs 表，ORM 删除会去加载 dialog 关系
+            data = Session.object_session(obj)
+            data.execute(delete(Media).where(Media.id == id, Media.dialog_id == obj.dialog_id))
+            data.commit()
 
+    @observe_repository
     def get_by_message_id(self, message_id: int) -> Optional[Media]:
-        return self.db.query(Media).filter(Media.message_id == message_id).first()
+        data = shards.locate(self.db, select(Media.id).where(Media.message_id == message_id))
+        return data.query(Media).filter(Media.message_id == message_id).first() if data is not None else None
 
     # 在 MediaRepository 类中添加
+    @observe_repository
     def exists_by_message_and_duration(
             self,
             message_id: int,
@@ -51,8 +123,9 @@ class MediaRepository:
         :param min_duration: 最小duration要求(秒)
         :return: 是否存在符合条件的记录
         """
-        return self.db.query(
-            self.db.query(Media)
+        data = shards.session(self.db, dialog_id)
+        return data.query(
+            data.query(Media)
             .filter(
                 Media.message_id == message_id,
                 Media.dialog_id == dialog_id,
@@ -1,42 +1,157 @@
+from datetime import datetime
+from typing import Optional, Iterator, Dict, Any
+
+from sqlalchemy import select, delete
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ..metrics import observe_repository
 from ..models import Message
 from ..schemas import MessageCreate, MessageUpdate
+from .text_codec import codec
+from .fingerprint import message_fingerprint
+from .archive_repository import ArchiveRepository, merge_hot
+from .shard_router import shards, AmbiguousIdError
+from .thread_repository import ThreadRepository
+
+# 关键词搜索时每批解压的压缩行数
+_SCAN_BATCH_SIZE = 1000
 
 class MessageRepository:
     def __init__(self, db: Session):
         self.db = db
+        self.archive = ArchiveRepository(db)
+        self.threads = ThreadRepository(db)
+
+    def _inflate(self, obj: Message | None) -> Message | None:
+        """压缩存储的正文解压回 message，不标记为修改"""
+        if obj is not None and obj.message_zstd is not None:
+            set_committed_value(obj, "message", codec.decode(self.db, None, obj.message_zstd, obj.message_dict_id))
+        return obj
+
+    def _deflate(self, obj: Message) -> None:
+        # 指纹对明文计算，与抓取写入路径一致
+        obj.content_hash = message_fingerprint(obj)
+        obj.message, obj.message_zstd, obj.message_dict_id = codec.encode(self.db, obj.dialog_id, obj.message)
+
+    @staticmethod
+    def _archived(row: Dict[str, Any] | None) -> Message | None:
+        """归档行构造成游离的 Message 对象，只读，不加入 Session"""
+        return Message(**row) if row is not None else None
+
+    @observe_repository
+    def get_by_id(self, id: int, include_archived: bool = True, dialog_id: Optional[int] = None) -> Message | None:
+        """
+        按自增主键查找。分片时主键只在分片内唯一：带上 dialog_id 只查该频道所在的分片；
+        不带时并发问一遍各分片（和归档），有多条时抛 AmbiguousIdError。
+        """
+        if dialog_id is not None:
+            obj = self._inflate(shards.session(self.db, dialog_id).query(Message)
+                                .filter(Message.id == id, Message.dialog_id == dialog_id).first())
+            if obj is None and include_archived:
+                obj = self._archived(next(iter(self.archive.find_by_pk("messages", id, dialog_id)), None))
+            return obj
 
-    def get_by_id(self, id: int) -> Message | None:
-        return self.db.query(Message).filter(Message.id == id).first()
+        data = shards.locate(self.db, select(Message.id).where(Message.id == id))
+        obj = self._inflate(data.query(Message).filter(Message.id == id).first()) if data is not None else None
+        if include_archived and (obj is None or shards.enabled):
+            rows = [row for row in self.archive.find_by_pk("messages", id, unique=shards.enabled)
+                    if obj is None or (row["dialog_id"], row["message_id"]) != (obj.dialog_id, obj.message_id)]
+            if len(rows) + (obj is not None) > 1:
+                raise AmbiguousIdError(f"消息主键 {id} 对应多条消息，需要指定 dialog_id")
+            if obj is None and rows:
+                obj = self._archived(rows[0])
+        return obj
 
+    @observe_repository
     def get_by_dialog_and_message_id(self, dialog_id: int, message_id: int) -> Message | None:
-        return (
-            self.db.query(Message)
+        obj = self._inflate(
+            shards.session(self.db, dialog_id).query(Message)
             .filter(Message.dialog_id == dialog_id, Message.message_id == message_id)
             .first()
         )
+        if obj is None:
+            obj = self._archived(self.archive.find_message(dialog_id, message_id))
+        return obj
 
+    def iter_by_dialog(self, dialog_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       batch_size: int = 1000, after_id: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        导出一个频道的消息：归档分段与热表按 message_id 归并成一路，
+        同一条消息同时存在于热表和归档时以热表为准。after_id 用于分页续读。
+        """
+        return merge_hot(self.archive.iter_messages(dialog_id, since, until, after_id),
+                         self._iter_hot(dialog_id, since, until, batch_size, after_id))
+
+    def _iter_hot(self, dialog_id: int, since: Optional[datetime], until: Optional[datetime],
+                  batch_size: int, after_id: int) -> Iterator[Dict[str, Any]]:
+        table = Message.__table__
+        data = shards.session(self.db, dialog_id)
+        conditions = [table.c.dialog_id == dialog_id]
+        if since is not None:
+            conditions.append(table.c.date >= since)
+        if until is not None:
+            conditions.append(table.c.date < until)
+        while True:
+            query = (select(table).where(*conditions, table.c.message_id > after_id)
+                     .order_by(table.c.message_id).limit(batch_size))
+            result = data.execute(query)
+            # 列名只取一次再 zip，比逐行 .mappings() 转 dict 省不少
+            keys = list(result.keys())
+            rows = result.all()
+            for row in rows:
+                item = dict(zip(keys, row))
+                del item["content_hash"], item["thread_root_id"], item["thread_depth"]
+                blob, dict_id = item.pop("message_zstd"), item.pop("message_dict_id")
+                if blob is not None:
+                    item["message"] = codec.decode(self.db, item["message"], blob, dict_id)
+                yield item
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1].message_id
+
+    @observe_repository
     def create(self, obj_in: MessageCreate) -> Message:
         obj = Message(**obj_in.dict())
-        self.db.add(obj)
-        self.db.commit()
-        self.db.refresh(obj)
-        return obj
+        self._deflate(obj)
+        data = shards.session(self.db, obj.dialog_id)
+        threads = self.threads.assign(data, [obj])
+        obj.thread_root_id, obj.thread_depth = threads[(obj.dialog_id, obj.message_id)]
+        data.add(obj)
+        self.threads.reroot(data, [obj], threads)
+        data.commit()
+        data.refresh(obj)
+        return self._inflate(obj)
 
+    @observe_repository
     def update(self, db_obj: Message, obj_in: MessageUpdate) -> Message:
         obj_data = obj_in.dict(exclude_unset=True)
         for field, value in obj_data.items():
             setattr(db_obj, field, value)
-        self.db.commit()
-        self.db.refresh(db_obj)
-        return db_obj
+        if "message" in obj_data:
+            self._deflate(db_obj)
+        elif obj_data:
+            db_obj.content_hash = message_fingerprint(db_obj)
+        # 对象由哪个分片的 Session 读出就在哪个分片提交；归档行是游离对象，提交不会写入
+        data = Session.object_session(db_obj) or self.db
+        if "reply_to_msg_id" in obj_data and Session.object_session(db_obj) is not None:
+            # 只重算本条；改了回复对象的消息下面若已有回复，需重建该频道的索引（--backfill）
+            db_obj.thread_root_id, db_obj.thread_depth = self.threads.assign(data, [db_obj])[
+                (db_obj.dialog_id, db_obj.message_id)]
+        data.commit()
+        data.refresh(db_obj)
+        return self._inflate(db_obj)
 
-    def delete(self, id: int) -> None:
-        obj = self.get_by_id(id)
+    @observe_repository
+    def delete(self, id: int, dialog_id: Optional[int] = None) -> None:
+        obj = self.get_by_id(id, include_archived=False, dialog_id=dialog_id)
         if obj:
-            self.db.delete(obj)
-            self.db.commit()
+            # 按主键直接删：分片上没有 dialogs 表，ORM 删除会去加载 dialog 关系
+            data = Session.object_session(obj)
+            data.execute(delete(Message).where(Message.id == id, Message.dialog_id == obj.dialog_id))
+            data.commit()
 
+    @observe_repository
     def get_message_ids_by_keyword_and_channel(self, keyword: str, channel_id: int) -> list[int]:
         """
         根据关键词和频道ID(dialog_id)获取匹配的消息ID列表
@@ -49,11 +164,37 @@ class MessageRepository:
             匹配的消息ID列表
         """
         results = (
-            self.db.query(Message.message_id)
+            shards.session(self.db, channel_id).query(Message.message_id)
             .filter(
                 Message.dialog_id == channel_id,
                 Message.message.contains(keyword)
             )
             .all()
         )
-        return [result[0] for result in results]
+        ids = [result[0] for result in results] + self._scan_compressed(keyword, channel_id)
+        # 已归档的消息：热表里仍有同一条时不重复返回
+        seen = set(ids)
+        ids.extend(i for i in self.archive.search_message_ids(channel_id, keyword) if i not in seen)
+        return ids
+
+    def _scan_compressed(self, keyword: str, channel_id: int) -> list[int]:
+        """压缩存储的行无法在 SQL 里匹配，按 message_id 分批取出解压后匹配（与 MySQL 默认排序规则一样不区分大小写）"""
+        table = Message.__table__
+        needle = keyword.lower()
+        matched = []
+        after_id = 0
+        data = shards.session(self.db, channel_id)
+        while True:
+            rows = data.execute(
+                select(table.c.message_id, table.c.message_zstd, table.c.message_dict_id)
+                .where(table.c.dialog_id == channel_id, table.c.message_zstd.is_not(None),
+                       table.c.message_id > after_id)
+                .order_by(table.c.message_id)
+                .limit(_SCAN_BATCH_SIZE)
+            ).all()
+            for message_id, blob, dict_id in rows:
+                if needle in codec.decode(self.db, None, blob, dict_id).lower():
+                    matched.append(message_id)
+            if len(rows) < _SCAN_BATCH_SIZE:
+                return matched
+            after_id = rows[-1][0]
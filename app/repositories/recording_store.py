@@ -0,0 +1,157 @@
+# app/repositories/recording_store.py
+"""
+原始 Telegram 响应的录制分段。
+
+每个频道一个目录，目录下是只追加的分段文件，文件名为
+``<创建时间毫秒>-<进程号>-<序号>.tgrec``，每个写入进程只写自己的文件，多个
+worker 同时录制同一频道也不会交错。按文件名排序即为写入顺序。
+
+分段格式::
+
+    MAGIC
+    块头 <压缩后长度 u32, 记录数 u32> + zstd(记录 ...)
+    ...
+    记录：<类型 u8, 长度 u32> + TL 序列化字节
+
+类型为实体（User / Channel 等）或消息。每个块单独压缩、一次写入，进程
+崩溃时最多留下一个不完整的尾块，读取时直接忽略。分段写满
+RECORDING_SEGMENT_BYTES 后换新文件。
+
+zstandard 是可选依赖，只有开启录制或回放时才需要。
+"""
+import itertools
+import os
+import struct
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pydantic_settings import BaseSettings
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+MAGIC = b"TGREC\x01"
+SEGMENT_SUFFIX = ".tgrec"
+KIND_ENTITY = 1
+KIND_MESSAGE = 2
+
+_BLOCK = struct.Struct("<II")
+_RECORD = struct.Struct("<BI")
+
+
+class RecordingSettings(BaseSettings):
+    recording_enabled: bool = False
+    recording_dir: str = "recordings"
+    # 每个频道攒够这么多条记录压缩成一块写入
+    recording_block_records: int = 1000
+    recording_segment_bytes: int = 64 * 1024 * 1024
+    recording_compression_level: int = 3
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+@lru_cache()
+def get_recording_settings() -> RecordingSettings:
+    return RecordingSettings()
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise RuntimeError("录制与回放需要安装 zstandard：pip install zstandard")
+    return zstandard
+
+
+def iter_segment(path: str) -> Iterator[Tuple[int, bytes]]:
+    """按写入顺序读出一个分段里的 (类型, TL 字节)；不完整的尾块忽略"""
+    decompressor = _require_zstandard().ZstdDecompressor()
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"不是录制分段: {path}")
+        while True:
+            header = f.read(_BLOCK.size)
+            if len(header) < _BLOCK.size:
+                return
+            length, count = _BLOCK.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            block = memoryview(decompressor.decompress(data))
+            offset = 0
+            for _ in range(count):
+                kind, size = _RECORD.unpack_from(block, offset)
+                offset += _RECORD.size
+                yield kind, bytes(block[offset:offset + size])
+                offset += size
+
+
+class RecordingStore:
+    """分段文件的追加写入与顺序读取"""
+
+    def __init__(self, settings: Optional[RecordingSettings] = None):
+        self._settings = settings
+        # dialog_id -> 本进程正在写的分段
+        self._current: Dict[int, str] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> RecordingSettings:
+        if self._settings is None:
+            self._settings = get_recording_settings()
+        return self._settings
+
+    def dialog_dir(self, dialog_id: int) -> str:
+        return os.path.join(self.settings.recording_dir, str(dialog_id))
+
+    def dialogs(self) -> List[int]:
+        root = self.settings.recording_dir
+        if not os.path.isdir(root):
+            return []
+        return sorted(int(name) for name in os.listdir(root) if name.lstrip("-").isdigit())
+
+    def segments(self, dialog_id: int) -> List[str]:
+        directory = self.dialog_dir(dialog_id)
+        if not os.path.isdir(directory):
+            return []
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                if name.endswith(SEGMENT_SUFFIX)]
+
+    def append(self, dialog_id: int, records: Sequence[Tuple[int, bytes]]) -> bool:
+        """把一批记录压缩成一块追加到当前分段；写完后分段已满则换新文件，此时返回 True"""
+        if not records:
+            return False
+        parts = []
+        for kind, payload in records:
+            parts.append(_RECORD.pack(kind, len(payload)))
+            parts.append(payload)
+        compressor = _require_zstandard().ZstdCompressor(level=self.settings.recording_compression_level)
+        data = compressor.compress(b"".join(parts))
+        with self._lock:
+            path = self._current.get(dialog_id)
+            if path is None:
+                os.makedirs(self.dialog_dir(dialog_id), exist_ok=True)
+                name = f"{int(time.time() * 1000):013d}-{os.getpid()}-{next(self._seq):06d}{SEGMENT_SUFFIX}"
+                path = self._current[dialog_id] = os.path.join(self.dialog_dir(dialog_id), name)
+            with open(path, "ab") as f:
+                if f.tell() == 0:
+                    f.write(MAGIC)
+                f.write(_BLOCK.pack(len(data), len(records)) + data)
+                full = f.tell() >= self.settings.recording_segment_bytes
+            if full:
+                del self._current[dialog_id]
+        return full
+
+    def read(self, dialog_id: int) -> Iterator[Tuple[int, bytes]]:
+        for path in self.segments(dialog_id):
+            yield from iter_segment(path)
+
+    def stats(self, dialog_id: int) -> Dict[str, int]:
+        paths = self.segments(dialog_id)
+        return {"dialog_id": dialog_id, "segments": len(paths), "bytes": sum(os.path.getsize(p) for p in paths)}
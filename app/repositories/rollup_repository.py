@@ -0,0 +1,201 @@
+import re
+from collections import Counter
+from datetime import datetime, date, timezone
+from functools import lru_cache
+from typing import Optional, Sequence, Dict, Any, List, Iterable
+
+from pydantic_settings import BaseSettings
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+
+from ..metrics import observe_repository
+from ..models import DialogActivityRollup, KeywordHitRollup, MediaRollup, SenderRollup
+from .rows import MessageRow
+from .shard_router import shards
+
+GRANULARITIES = ("hour", "day")
+
+_ROLLUP_MODELS = (DialogActivityRollup, KeywordHitRollup, MediaRollup, SenderRollup)
+
+
+class RollupSettings(BaseSettings):
+    # 关闭后抓取写入不再累加汇总表，需要时用 rebuild_rollups 命令重建
+    rollup_enabled: bool = True
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+@lru_cache()
+def get_rollup_settings() -> RollupSettings:
+    return RollupSettings()
+
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def _enum_value(value) -> Optional[str]:
+    return getattr(value, "value", value)
+
+
+class RollupAccumulator:
+    """在内存里把一批消息归并成各汇总表的增量，写库时每张表一次 executemany"""
+
+    def __init__(self):
+        self.activity: Counter = Counter()
+        self.activity_media: Counter = Counter()
+        self.keywords: Counter = Counter()
+        self.media: Counter = Counter()
+        self.media_bytes: Counter = Counter()
+        self.senders: Counter = Counter()
+        self.sender_last: Dict[tuple, datetime] = {}
+
+    def add(self, dialog_id: int, sent_at: datetime, sender_id: Optional[int], media_type, media_size: Optional[int],
+            text: Optional[str] = None, pattern: Optional[re.Pattern] = None) -> None:
+        sent_at = _naive_utc(sent_at)
+        hour = sent_at.replace(minute=0, second=0, microsecond=0)
+        day = hour.replace(hour=0)
+        media_type = _enum_value(media_type)
+        for key in ((dialog_id, "hour", hour), (dialog_id, "day", day)):
+            self.activity[key] += 1
+            if media_type is not None:
+                self.activity_media[key] += 1
+        if media_type is not None:
+            self.media[(dialog_id, media_type)] += 1
+            self.media_bytes[(dialog_id, media_type)] += media_size or 0
+        if sender_id is not None:
+            key = (dialog_id, sender_id)
+            self.senders[key] += 1
+            last = self.sender_last.get(key)
+            if last is None or sent_at > last:
+                self.sender_last[key] = sent_at
+        if pattern is not None and text:
+            for keyword in {m.group(0).lower() for m in pattern.finditer(text)}:
+                self.keywords[(dialog_id, keyword, day.date())] += 1
+
+    def add_row(self, row: MessageRow, pattern: Optional[re.Pattern] = None) -> None:
+        self.add(row.dialog_id, row.date, row.sender_id, row.media_type, row.media_size, row.message, pattern)
+
+
+class RollupRepository:
+    """
+    汇总表的增量累加与查询。累加用数据库原生 upsert（MySQL 的
+    ON DUPLICATE KEY UPDATE / SQLite 的 ON CONFLICT），不提交事务，
+    由调用方与明细写入放在同一个事务里提交。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _upsert(self, model, keys: Sequence[str], params: List[Dict[str, Any]], sums: Sequence[str],
+                maxes: Sequence[str] = ()) -> None:
+        # 分片时按频道所在分片分组，用的是主库 Session 下同一个分片 Session，与明细写入同一事务
+        for data, group in shards.group(self.db, params, lambda item: item["dialog_id"]):
+            data.execute(self._upsert_statement(data, model, keys, sums, maxes), group)
+
+    @staticmethod
+    def _upsert_statement(data: Session, model, keys: Sequence[str], sums: Sequence[str], maxes: Sequence[str]):
+        table = model.__table__
+        dialect = data.get_bind().dialect.name
+        if dialect == "mysql":
+            stmt = mysql.insert(table)
+            values = {name: table.c[name] + stmt.inserted[name] for name in sums}
+            values.update({name: func.greatest(func.coalesce(table.c[name], stmt.inserted[name]), stmt.inserted[name])
+                           for name in maxes})
+            stmt = stmt.on_duplicate_key_update(values)
+        elif dialect == "sqlite":
+            stmt = sqlite.insert(table)
+            values = {name: table.c[name] + stmt.excluded[name] for name in sums}
+            values.update({name: func.max(func.coalesce(table.c[name], stmt.excluded[name]), stmt.excluded[name])
+                           for name in maxes})
+            stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_=values)
+        else:
+            raise NotImplementedError(f"汇总表不支持数据库 {dialect}")
+        return stmt
+
+    @observe_repository
+    def apply(self, acc: RollupAccumulator) -> int:
+        """把一批增量累加到汇总表（不提交），返回影响的汇总行数"""
+        # 按主键顺序写，并发写入同一批汇总行时加锁顺序一致，减少死锁
+        activity = [{"dialog_id": d, "granularity": g, "bucket": b, "messages": n,
+                     "media_messages": acc.activity_media[(d, g, b)]} for (d, g, b), n in sorted(acc.activity.items())]
+        keywords = [{"dialog_id": d, "keyword": k, "day": day, "hits": n}
+                    for (d, k, day), n in sorted(acc.keywords.items())]
+        media = [{"dialog_id": d, "media_type": t, "messages": n, "total_bytes": acc.media_bytes[(d, t)]}
+                 for (d, t), n in sorted(acc.media.items())]
+        senders = [{"dialog_id": d, "sender_id": s, "messages": n, "last_date": acc.sender_last[(d, s)]}
+                   for (d, s), n in sorted(acc.senders.items())]
+        self._upsert(DialogActivityRollup, ("dialog_id", "granularity", "bucket"), activity,
+                     ("messages", "media_messages"))
+        self._upsert(KeywordHitRollup, ("dialog_id", "keyword", "day"), keywords, ("hits",))
+        self._upsert(MediaRollup, ("dialog_id", "media_type"), media, ("messages", "total_bytes"))
+        self._upsert(SenderRollup, ("dialog_id", "sender_id"), senders, ("messages",), ("last_date",))
+        return len(activity) + len(keywords) + len(media) + len(senders)
+
+    @observe_repository
+    def replace(self, dialog_id: int, acc: RollupAccumulator) -> int:
+        """重建：删除一个频道的全部汇总行后写入新的汇总，一个事务提交"""
+        data = shards.session(self.db, dialog_id)
+        try:
+            for model in _ROLLUP_MODELS:
+                data.execute(delete(model).where(model.dialog_id == dialog_id))
+            count = self.apply(acc)
+            data.commit()
+        except Exception:
+            data.rollback()
+            raise
+        return count
+
+    @observe_repository
+    def get_keywords(self, dialog_id: int) -> List[str]:
+        return [row[0] for row in shards.session(self.db, dialog_id).execute(
+            select(KeywordHitRollup.keyword).where(KeywordHitRollup.dialog_id == dialog_id).distinct())]
+
+    # region 查询
+    @observe_repository
+    def get_activity(self, dialog_id: int, granularity: str, since: Optional[datetime] = None,
+                     until: Optional[datetime] = None) -> List[DialogActivityRollup]:
+        query = shards.session(self.db, dialog_id).query(DialogActivityRollup).filter(
+            DialogActivityRollup.dialog_id == dialog_id, DialogActivityRollup.granularity == granularity)
+        if since is not None:
+            query = query.filter(DialogActivityRollup.bucket >= since)
+        if until is not None:
+            query = query.filter(DialogActivityRollup.bucket < until)
+        return query.order_by(DialogActivityRollup.bucket).all()
+
+    @observe_repository
+    def get_keyword_hits(self, dialog_id: int, since: Optional[date] = None, until: Optional[date] = None,
+                         keywords: Optional[Iterable[str]] = None) -> List[KeywordHitRollup]:
+        query = shards.session(self.db, dialog_id).query(KeywordHitRollup).filter(
+            KeywordHitRollup.dialog_id == dialog_id)
+        if since is not None:
+            query = query.filter(KeywordHitRollup.day >= since)
+        if until is not None:
+            query = query.filter(KeywordHitRollup.day < until)
+        if keywords:
+            query = query.filter(KeywordHitRollup.keyword.in_([k.lower() for k in keywords]))
+        return query.order_by(KeywordHitRollup.day, KeywordHitRollup.keyword).all()
+
+    @observe_repository
+    def get_media(self, dialog_id: int) -> List[MediaRollup]:
+        return (
+            shards.session(self.db, dialog_id).query(MediaRollup)
+            .filter(MediaRollup.dialog_id == dialog_id)
+            .order_by(MediaRollup.messages.desc())
+            .all()
+        )
+
+    @observe_repository
+    def get_top_senders(self, dialog_id: int, limit: int = 10) -> List[SenderRollup]:
+        return (
+            shards.session(self.db, dialog_id).query(SenderRollup)
+            .filter(SenderRollup.dialog_id == dialog_id)
+            .order_by(SenderRollup.messages.desc())
+            .limit(limit)
+            .all()
+        )
+    # endregion
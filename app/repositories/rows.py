@@ -0,0 +1,74 @@
+# app/repositories/rows.py
+"""
+抓取写入路径使用的紧凑行记录。
+
+爬虫产出的数据是可信的，不需要 Pydantic 校验，也不需要 ORM 对象的
+身份映射和变更追踪；``__slots__`` 记录直接转成 Core ``insert()`` /
+``update()`` 的参数字典。Pydantic 模型只保留在 HTTP 边界。
+"""
+from typing import Dict, Any
+
+
+class MessageRow:
+    __slots__ = (
+        "message_id", "dialog_id", "sender_id", "sender_type", "date", "message", "views",
+        "media_type", "media_size", "reply_to_msg_id", "forward_from_id", "forward_from_msg_id",
+    )
+
+    def __init__(self, message_id, dialog_id, sender_id, sender_type, date, message, views,
+                 media_type, media_size, reply_to_msg_id, forward_from_id, forward_from_msg_id=None):
+        self.message_id = message_id
+        self.dialog_id = dialog_id
+        self.sender_id = sender_id
+        self.sender_type = sender_type
+        self.date = date
+        self.message = message
+        self.views = views
+        self.media_type = media_type
+        self.media_size = media_size
+        self.reply_to_msg_id = reply_to_msg_id
+        self.forward_from_id = forward_from_id
+        self.forward_from_msg_id = forward_from_msg_id
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class SenderRow:
+    __slots__ = ("sender_id", "sender_type", "access_hash", "username", "first_name", "last_name", "title")
+
+    def __init__(self, sender_id, sender_type, access_hash=None, username=None, first_name=None, last_name=None,
+                 title=None):
+        self.sender_id = sender_id
+        self.sender_type = sender_type
+        self.access_hash = access_hash
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+        self.title = title
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class MediaRow:
+    __slots__ = (
+        "message_id", "dialog_id", "media_type", "mime_type", "file_name", "file_reference",
+        "thumb_width", "thumb_height", "duration", "size",
+    )
+
+    def __init__(self, message_id, dialog_id, media_type, mime_type=None, file_name=None,
+                 file_reference=None, thumb_width=None, thumb_height=None, duration=None, size=None):
+        self.message_id = message_id
+        self.dialog_id = dialog_id
+        self.media_type = media_type
+        self.mime_type = mime_type
+        self.file_name = file_name
+        self.file_reference = file_reference
+        self.thumb_width = thumb_width
+        self.thumb_height = thumb_height
+        self.duration = duration
+        self.size = size
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
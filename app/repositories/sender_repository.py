@@ -0,0 +1,199 @@
+# app/repositories/sender_repository.py
+"""
+发送者资料（senders 表，只在主库）的读写。
+
+抓取时 Telethon 每页历史都会带回本页消息涉及的 users / chats，写入路径顺手把
+发送者资料 upsert 进 senders，不多发请求。同一个发送者会在成千上万条消息里
+反复出现，进程内用 LRU 记住最近写过的发送者资料指纹，资料没变的直接跳过，
+不再查库；未命中的一批只做一次“已存在”查询，与消息写入相同。新增和变化的资料
+用数据库的 upsert 一条语句写入，API 抓取、worker、订阅扫描并发写入同一个新发送者
+时不会因主键冲突失败。
+"""
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pydantic_settings import BaseSettings
+from sqlalchemy import select, func
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+
+from .. import metrics
+from ..metrics import observe_repository
+from ..models import Message, Sender, SenderTypeEnum
+from .fingerprint import fingerprint
+from .rows import SenderRow
+from .shard_router import shards
+
+SENDER_FIELDS = tuple(name for name in SenderRow.__slots__ if name != "sender_id")
+
+# 有资料可查的发送者类型（anonymous 没有实体）
+RESOLVABLE_TYPES = (SenderTypeEnum.user, SenderTypeEnum.bot, SenderTypeEnum.channel)
+
+# IN 查询每批的 ID 数
+_CHUNK = 1000
+
+
+class SenderSettings(BaseSettings):
+    # 关闭后抓取不再写入发送者资料
+    sender_enabled: bool = True
+    # 进程内记住的发送者数
+    sender_cache_size: int = 100000
+    # 补查缺失发送者时每次 users.getUsers / channels.getChannels 的 ID 数
+    sender_resolve_chunk: int = 200
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+@lru_cache()
+def get_sender_settings() -> SenderSettings:
+    return SenderSettings()
+
+
+def sender_fingerprint(row: SenderRow) -> int:
+    return fingerprint(getattr(row, name) for name in SENDER_FIELDS)
+
+
+class SenderCache:
+    """sender_id -> 最近一次写入（或确认库里一致）的资料指纹，按最近使用淘汰"""
+
+    def __init__(self, settings: Optional[SenderSettings] = None):
+        self._settings = settings
+        self._items: "OrderedDict[int, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> SenderSettings:
+        if self._settings is None:
+            self._settings = get_sender_settings()
+        return self._settings
+
+    def known(self, sender_id: int, content_hash: int) -> bool:
+        with self._lock:
+            if self._items.get(sender_id) != content_hash:
+                return False
+            self._items.move_to_end(sender_id)
+            return True
+
+    def put_many(self, items: Iterable[Tuple[int, int]]) -> None:
+        limit = self.settings.sender_cache_size
+        with self._lock:
+            for sender_id, content_hash in items:
+                self._items[sender_id] = content_hash
+                self._items.move_to_end(sender_id)
+            while len(self._items) > limit:
+                self._items.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+sender_cache = SenderCache()
+
+
+class SenderRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    @observe_repository
+    def upsert(self, rows: Sequence[SenderRow]) -> Dict[str, int]:
+        """
+        写入一批发送者资料（同一 sender_id 以最后一条为准），自己一个事务。
+        返回 inserted / updated / skipped（缓存命中或库里资料相同）。
+        """
+        latest = {row.sender_id: row for row in rows}
+        hashes = {sender_id: sender_fingerprint(row) for sender_id, row in latest.items()}
+        pending = [sender_id for sender_id in latest if not sender_cache.known(sender_id, hashes[sender_id])]
+        counts = {"inserted": 0, "updated": 0, "skipped": len(latest) - len(pending)}
+        if pending:
+            table = Sender.__table__
+            existing = {}
+            for start in range(0, len(pending), _CHUNK):
+                existing.update(self.db.execute(
+                    select(table.c.sender_id, table.c.content_hash)
+                    .where(table.c.sender_id.in_(pending[start:start + _CHUNK]))).all())
+            params = []
+            for sender_id in pending:
+                if existing.get(sender_id) == hashes[sender_id]:
+                    continue
+                item = latest[sender_id].as_dict()
+                item["content_hash"] = hashes[sender_id]
+                params.append(item)
+            try:
+                if params:
+                    self.db.execute(self._upsert_statement(), params)
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+            # 与并发写入者同时插入时，这里记为 inserted 的实际可能是更新
+            counts["inserted"] = sum(1 for item in params if item["sender_id"] not in existing)
+            counts["updated"] = len(params) - counts["inserted"]
+            counts["skipped"] += len(pending) - len(params)
+        # 提交成功后才记入缓存，回滚的资料下次还会写
+        sender_cache.put_many(hashes.items())
+        for op, count in counts.items():
+            if count:
+                metrics.SENDERS_WRITTEN.labels(op).inc(count)
+        return counts
+
+    def _upsert_statement(self):
+        table = Sender.__table__
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "mysql":
+            stmt = mysql.insert(table)
+            new = stmt.inserted
+        elif dialect == "sqlite":
+            stmt = sqlite.insert(table)
+            new = stmt.excluded
+        else:
+            raise NotImplementedError(f"senders 表不支持数据库 {dialect}")
+        values = {name: new[name] for name in SENDER_FIELDS + ("content_hash",)}
+        # min 实体不带 access_hash，不覆盖已有的
+        values["access_hash"] = func.coalesce(new.access_hash, table.c.access_hash)
+        values["updated_at"] = func.now()
+        if dialect == "mysql":
+            return stmt.on_duplicate_key_update(values)
+        return stmt.on_conflict_do_update(index_elements=["sender_id"], set_=values)
+
+    @observe_repository
+    def get_by_id(self, sender_id: int) -> Optional[Sender]:
+        return self.db.get(Sender, sender_id)
+
+    @observe_repository
+    def get_many(self, sender_ids: Iterable[int]) -> Dict[int, Sender]:
+        ids = sorted(set(sender_ids))
+        result = {}
+        for start in range(0, len(ids), _CHUNK):
+            result.update((obj.sender_id, obj) for obj in
+                          self.db.query(Sender).filter(Sender.sender_id.in_(ids[start:start + _CHUNK])))
+        return result
+
+    @observe_repository
+    def get_missing(self, dialog_id: int, limit: Optional[int] = None) -> List[Tuple[int, SenderTypeEnum, int]]:
+        """
+        频道里出现过、senders 里还没有的发送者，返回 (sender_id, sender_type, 该发送者最近一条消息的 message_id)，
+        补查时用这条消息引用 min 实体。
+        """
+        table = Message.__table__
+        rows = shards.session(self.db, dialog_id).execute(
+            select(table.c.sender_id, table.c.sender_type, func.max(table.c.message_id))
+            .where(table.c.dialog_id == dialog_id, table.c.sender_id.is_not(None),
+                   table.c.sender_type.in_(RESOLVABLE_TYPES))
+            .group_by(table.c.sender_id, table.c.sender_type)
+            .order_by(table.c.sender_id)).all()
+        known = set()
+        ids = [row[0] for row in rows]
+        for start in range(0, len(ids), _CHUNK):
+            known.update(row[0] for row in self.db.execute(
+                select(Sender.sender_id).where(Sender.sender_id.in_(ids[start:start + _CHUNK]))))
+        missing = [tuple(row) for row in rows if row[0] not in known]
+        return missing[:limit] if limit is not None else missing
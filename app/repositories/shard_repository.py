@@ -0,0 +1,132 @@
+from typing import List, Dict, Any, Optional
+
+from sqlalchemy import select, delete, insert, distinct, func, tuple_, MetaData, Table
+from sqlalchemy.orm import Session
+
+from ..metrics import observe_repository
+from ..models import DialogShard, Message, Media, DialogActivityRollup, KeywordHitRollup, MediaRollup, SenderRollup
+from .shard_router import shards
+
+# 按 dialog_id 分片存储的表
+SHARDED_MODELS = (Message, Media, DialogActivityRollup, KeywordHitRollup, MediaRollup, SenderRollup)
+
+
+def shard_tables() -> List[Table]:
+    """分片上建表用的表定义：去掉指向主库表（dialogs）的外键，其余与模型一致"""
+    metadata = MetaData()
+    names = {model.__tablename__ for model in SHARDED_MODELS}
+    tables = []
+    for model in SHARDED_MODELS:
+        table = model.__table__.to_metadata(metadata)
+        for constraint in list(table.foreign_key_constraints):
+            if any(fk.target_fullname.split(".")[0] not in names for fk in constraint.elements):
+                table.constraints.discard(constraint)
+                for fk in constraint.elements:
+                    fk.parent.foreign_keys.discard(fk)
+        tables.append(table)
+    return tables
+
+
+class ShardRepository:
+    """
+    频道分片指定（主库 dialog_shards）的读写，以及迁移频道用的按频道分批
+    读取 / 写入 / 删除分片表的行。自增主键只在分片内唯一，复制时不带 id 列。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # region 指定
+    @observe_repository
+    def get_placements(self) -> List[DialogShard]:
+        return self.db.query(DialogShard).order_by(DialogShard.dialog_id).all()
+
+    @observe_repository
+    def set_placement(self, dialog_id: int, shard: Optional[int]) -> None:
+        """shard 为 None 时删除指定，频道回到哈希默认分片"""
+        try:
+            obj = self.db.get(DialogShard, dialog_id)
+            if shard is None:
+                if obj is not None:
+                    self.db.delete(obj)
+            elif obj is None:
+                self.db.add(DialogShard(dialog_id=dialog_id, shard=shard))
+            else:
+                obj.shard = shard
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+    # endregion
+
+    # region 分片表
+    @observe_repository
+    def get_dialog_ids(self) -> List[List[int]]:
+        """每个分片上有数据的频道，按分片序号排列"""
+        query = select(distinct(Message.dialog_id)).union(select(distinct(Media.dialog_id)))
+        return [sorted(row[0] for row in rows)
+                for rows in shards.fan_out(self.db, lambda data: data.execute(query).all())]
+
+    @observe_repository
+    def count_rows(self, shard: int, model, dialog_id: int) -> int:
+        return shards.shard_session(self.db, shard).execute(
+            select(func.count()).select_from(model).where(model.dialog_id == dialog_id)).scalar()
+
+    @staticmethod
+    def row_keys(model) -> List[str]:
+        """频道内唯一确定一行的列：明细表为 message_id，汇总表为 dialog_id 之外的联合主键"""
+        if "message_id" in model.__table__.c:
+            return ["message_id"]
+        return [c.name for c in model.__table__.primary_key.columns if c.name != "dialog_id"]
+
+    @classmethod
+    def _key(cls, model):
+        columns = [model.__table__.c[name] for name in cls.row_keys(model)]
+        return columns[0] if len(columns) == 1 else tuple_(*columns)
+
+    @observe_repository
+    def get_rows(self, shard: int, model, dialog_id: int, after: Optional[tuple], limit: int) -> List[Dict[str, Any]]:
+        """按 row_keys 顺序取一批（不含自增 id 列），after 为上一批最后一行的键"""
+        table = model.__table__
+        keys = self.row_keys(model)
+        query = select(*[c for c in table.c if c.name != "id"]).where(table.c.dialog_id == dialog_id)
+        if after is not None:
+            query = query.where(self._key(model) > (after[0] if len(keys) == 1 else after))
+        rows = shards.shard_session(self.db, shard).execute(
+            query.order_by(*[table.c[k] for k in keys]).limit(limit)).mappings().all()
+        return [dict(row) for row in rows]
+
+    @observe_repository
+    def insert_rows(self, shard: int, model, rows: List[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        data = shards.shard_session(self.db, shard)
+        try:
+            data.execute(insert(model.__table__), rows)
+            data.commit()
+        except Exception:
+            data.rollback()
+            raise
+        return len(rows)
+
+    @observe_repository
+    def delete_dialog(self, shard: int, model, dialog_id: int, chunk: int) -> int:
+        """分批删除一个频道在某个分片上的行，每批一个事务"""
+        table = model.__table__
+        keys = [table.c[k] for k in self.row_keys(model)]
+        data = shards.shard_session(self.db, shard)
+        deleted = 0
+        while True:
+            batch = data.execute(select(*keys).where(table.c.dialog_id == dialog_id).limit(chunk)).all()
+            if not batch:
+                return deleted
+            values = [row[0] for row in batch] if len(keys) == 1 else [tuple(row) for row in batch]
+            try:
+                result = data.execute(delete(table).where(table.c.dialog_id == dialog_id,
+                                                          self._key(model).in_(values)))
+                data.commit()
+            except Exception:
+                data.rollback()
+                raise
+            deleted += result.rowcount
+    # endregion
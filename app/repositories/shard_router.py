@@ -0,0 +1,223 @@
+# app/repositories/shard_router.py
+"""
+messages / medias 与汇总表（rollup_*）按 dialog_id 分片存储。
+
+配置 SHARD_URLS（逗号分隔的数据库 URL）后开启：频道默认按 dialog_id 的稳定
+哈希落到一个分片，主库 dialog_shards 表里有记录的以记录为准，迁移频道
+（``python -m app.commands.shards --rebalance``）只改这张表。其余的表（频道、
+压缩字典、归档清单、任务、订阅与转发队列等）仍在主库。
+
+repository 始终持有主库 Session，读写分片表时用 ``shards.session(db, dialog_id)``
+取该频道所在分片的 Session：同一个主库 Session 下每个分片只开一个，随主库
+Session 一起关闭，同一分片上的写入在同一个事务里。跨频道的查询用 ``fan_out``
+在各分片上并发执行（每个分片一个独立 Session），由调用方合并结果。
+
+未配置 SHARD_URLS 时这些方法都直接返回主库 Session，行为与不分片完全相同。
+分片之间没有分布式事务，自增主键只在分片内唯一：按主键查找的接口要带上
+dialog_id，只给主键而多个分片上都有时抛 AmbiguousIdError，不会随便取一条。
+"""
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from pydantic_settings import BaseSettings
+from sqlalchemy import create_engine, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..database import get_settings
+from ..metrics import TimedQueuePool
+from ..models import DialogShard
+
+T = TypeVar("T")
+
+# 主库 Session.info 里缓存分片 Session 的键
+_SESSIONS_KEY = "shard_sessions"
+
+
+class ShardSettings(BaseSettings):
+    # 逗号分隔的分片数据库 URL，为空表示不分片；顺序即分片序号，只能在末尾追加
+    shard_urls: Optional[str] = None
+    # dialog_shards 的缓存时间，其它进程迁移频道后最多这么久生效
+    shard_placement_ttl: float = 30.0
+    # 跨分片查询的并发线程数
+    shard_fanout_workers: int = 8
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+@lru_cache()
+def get_shard_settings() -> ShardSettings:
+    return ShardSettings()
+
+
+class AmbiguousIdError(ValueError):
+    """只按主键查找时多个分片（或归档）上都有这个主键，需要指定 dialog_id"""
+
+
+def shard_hash(dialog_id: int) -> int:
+    """跨进程稳定的哈希，取值有规律的 ID 也能均匀打散"""
+    return int.from_bytes(hashlib.blake2b(str(dialog_id).encode(), digest_size=8).digest(), "big")
+
+
+class ShardRouter:
+    def __init__(self, settings: Optional[ShardSettings] = None):
+        self._settings = settings
+        self._factories: Dict[int, sessionmaker] = {}
+        # dialog_id -> 分片序号，只含 dialog_shards 里有记录的频道
+        self._placements: Optional[Dict[int, int]] = None
+        self._loaded_at = 0.0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> ShardSettings:
+        if self._settings is None:
+            self._settings = get_shard_settings()
+        return self._settings
+
+    @property
+    def urls(self) -> List[str]:
+        value = self.settings.shard_urls
+        return [url.strip() for url in value.split(",") if url.strip()] if value else []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings.shard_urls)
+
+    @property
+    def count(self) -> int:
+        return len(self.urls) or 1
+
+    def indexes(self) -> range:
+        return range(self.count)
+
+    # region 连接
+    def _factory(self, index: int) -> sessionmaker:
+        factory = self._factories.get(index)
+        if factory is None:
+            with self._lock:
+                factory = self._factories.get(index)
+                if factory is None:
+                    settings = get_settings()
+                    engine = create_engine(
+                        self.urls[index],
+                        poolclass=TimedQueuePool,
+                        pool_size=settings.db_pool_size,
+                        max_overflow=settings.db_max_overflow,
+                        pool_timeout=settings.db_pool_timeout,
+                        pool_pre_ping=True,
+                        pool_recycle=3600,
+                    )
+                    factory = self._factories[index] = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        return factory
+
+    def engine(self, index: int) -> Engine:
+        return self._factory(index).kw["bind"]
+
+    def dispose(self) -> None:
+        """关闭所有分片的连接池，之后再用会重新创建"""
+        with self._lock:
+            factories, self._factories = self._factories, {}
+            executor, self._executor = self._executor, None
+        for factory in factories.values():
+            factory.kw["bind"].dispose()
+        if executor is not None:
+            executor.shutdown(wait=False)
+    # endregion
+
+    # region 频道 -> 分片
+    def invalidate(self) -> None:
+        with self._lock:
+            self._placements = None
+
+    def placements(self, db: Session) -> Dict[int, int]:
+        placements = self._placements
+        if placements is None or time.monotonic() - self._loaded_at > self.settings.shard_placement_ttl:
+            placements = dict(db.execute(select(DialogShard.dialog_id, DialogShard.shard)).all())
+            with self._lock:
+                self._placements = placements
+                self._loaded_at = time.monotonic()
+        return placements
+
+    def home(self, dialog_id: int) -> int:
+        """按哈希的默认分片"""
+        return shard_hash(dialog_id) % self.count
+
+    def index_of(self, db: Session, dialog_id: int) -> int:
+        if not self.enabled:
+            return 0
+        return self.placements(db).get(dialog_id, self.home(dialog_id))
+    # endregion
+
+    # region Session
+    def shard_session(self, db: Session, index: int) -> Session:
+        """主库 Session 下某个分片的 Session，首次使用时创建并缓存在 db.info 里"""
+        if not self.enabled:
+            return db
+        sessions = db.info.setdefault(_SESSIONS_KEY, {})
+        session = sessions.get(index)
+        if session is None:
+            session = sessions[index] = self._factory(index)()
+        return session
+
+    def session(self, db: Session, dialog_id: int) -> Session:
+        return self.shard_session(db, self.index_of(db, dialog_id))
+
+    def group(self, db: Session, items: Iterable[T], dialog_of: Callable[[T], int]) -> List[Tuple[Session, List[T]]]:
+        """按所在分片分组，组内保持原顺序"""
+        if not self.enabled:
+            items = list(items)
+            return [(db, items)] if items else []
+        groups: Dict[int, List[T]] = {}
+        for item in items:
+            groups.setdefault(self.index_of(db, dialog_of(item)), []).append(item)
+        return [(self.shard_session(db, index), group) for index, group in sorted(groups.items())]
+
+    def close(self, db: Session) -> None:
+        for session in db.info.pop(_SESSIONS_KEY, {}).values():
+            session.close()
+    # endregion
+
+    # region 跨分片
+    def fan_out(self, db: Session, fn: Callable[[Session], T]) -> List[T]:
+        """
+        在每个分片上并发执行 fn，按分片序号返回结果列表。fn 拿到的是独立的
+        Session，执行完即关闭，返回值里不要带 ORM 对象。不分片时在 db 上执行一次。
+        """
+        if not self.enabled:
+            return [fn(db)]
+
+        def run(index: int) -> T:
+            with self._factory(index)() as session:
+                return fn(session)
+
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.settings.shard_fanout_workers,
+                                                        thread_name_prefix="shard-fanout")
+        return list(self._executor.map(run, self.indexes()))
+
+    def locate(self, db: Session, statement) -> Optional[Session]:
+        """
+        statement 在哪个分片上有结果就返回该分片的 Session，都没有时返回 None，
+        多个分片上都有时抛 AmbiguousIdError；不分片时直接返回 db。用于只有主键等不含 dialog_id 的查找。
+        """
+        if not self.enabled:
+            return db
+        hits = self.fan_out(db, lambda session: session.execute(statement).first() is not None)
+        found = [index for index, hit in enumerate(hits) if hit]
+        if len(found) > 1:
+            raise AmbiguousIdError(f"分片 {found} 上都有结果，需要指定 dialog_id")
+        return self.shard_session(db, found[0]) if found else None
+    # endregion
+
+
+shards = ShardRouter()
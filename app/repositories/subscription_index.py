@@ -0,0 +1,280 @@
+# app/repositories/subscription_index.py
+"""
+订阅规则的匹配索引。
+
+所有启用的规则编译成一个索引，每条消息只评估一遍：
+
+- 来源：dialog_id -> 规则位图（Python int，每条规则一位），不限来源的规则另存一个位图；
+- 关键词：所有规则的关键词合成一个 Aho-Corasick 自动机，正文扫一遍得到命中关键词
+  所属规则的位图。自动机逐字符走状态，耗时只与正文长度有关，与规则数、关键词数无关；
+- 媒体条件（类型 / 时长 / 大小）：只对前两步剩下的规则逐条检查。
+
+规则增删改后调用 ``invalidate()``；其它进程（如 worker）里的索引每
+SUBSCRIPTION_RELOAD_SECONDS 秒重新加载一次。
+"""
+import enum
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from pydantic_settings import BaseSettings
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import SubscriptionRule, MessageMediaTypeEnum
+from .rows import MessageRow, MediaRow
+
+
+class SubscriptionSettings(BaseSettings):
+    # 关闭后写入路径不再评估订阅规则
+    subscription_enabled: bool = True
+    # 其它进程改了规则后，本进程最迟多久看到
+    subscription_reload_seconds: float = 30.0
+    # 每次调用 forwardMessages 的最大消息数（Telegram 上限 100）
+    subscription_forward_batch: int = 100
+    subscription_forward_interval_seconds: float = 5.0
+    subscription_forward_max_attempts: int = 5
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+@lru_cache()
+def get_subscription_settings() -> SubscriptionSettings:
+    return SubscriptionSettings()
+
+
+# region 规则字段解析，非法时抛 ValueError
+def split_ids(value: Optional[str]) -> List[int]:
+    try:
+        return [int(part) for part in (value or "").split(",") if part.strip()]
+    except ValueError:
+        raise ValueError(f"频道ID应为逗号分隔的整数: {value}")
+
+
+def split_keywords(value: Optional[str]) -> List[str]:
+    return [part.strip().lower() for part in (value or "").split(",") if part.strip()]
+
+
+def split_media_types(value: Optional[str]) -> List[str]:
+    types = [part.strip() for part in (value or "").split(",") if part.strip()]
+    allowed = {item.value for item in MessageMediaTypeEnum}
+    unknown = [name for name in types if name not in allowed]
+    if unknown:
+        raise ValueError(f"未知的媒体类型: {', '.join(unknown)}，可选 {', '.join(sorted(allowed))}")
+    return types
+# endregion
+
+
+class KeywordAutomaton:
+    """Aho-Corasick 自动机：关键词（已小写）-> 规则位图，scan 返回正文里出现的关键词的位图之并"""
+
+    def __init__(self, keywords: Dict[str, int]):
+        goto: List[Dict[str, int]] = [{}]
+        out = [0]
+        for keyword, mask in keywords.items():
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto.append({})
+                    out.append(0)
+                    goto[state][ch] = nxt
+                state = nxt
+            out[state] |= mask
+
+        # 按层构建失败指针，输出沿失败链合并，扫描时只需看当前状态
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                target = goto[f].get(ch, 0)
+                fail[nxt] = target if target != nxt else 0
+                out[nxt] |= out[fail[nxt]]
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def scan(self, text: str) -> int:
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        hits = 0
+        for ch in text:
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            if out[state]:
+                hits |= out[state]
+        return hits
+
+
+class CompiledRule:
+    __slots__ = ("id", "bit", "to_chat_id", "media_types", "min_duration", "max_duration", "min_size", "max_size")
+
+    def __init__(self, obj: SubscriptionRule, bit: int):
+        self.id = obj.id
+        self.bit = bit
+        self.to_chat_id = obj.to_chat_id
+        self.media_types = frozenset(split_media_types(obj.media_types)) or None
+        self.min_duration = obj.min_duration
+        self.max_duration = obj.max_duration
+        self.min_size = obj.min_size
+        self.max_size = obj.max_size
+
+    @property
+    def constrained(self) -> bool:
+        return any(value is not None for value in (self.media_types, self.min_duration, self.max_duration,
+                                                   self.min_size, self.max_size))
+
+    def accepts(self, media_type: Optional[str], duration: Optional[int], size: Optional[int]) -> bool:
+        if self.media_types is not None and media_type not in self.media_types:
+            return False
+        if self.min_duration is not None or self.max_duration is not None:
+            if duration is None:
+                return False
+            if self.min_duration is not None and duration < self.min_duration:
+                return False
+            if self.max_duration is not None and duration > self.max_duration:
+                return False
+        if self.min_size is not None or self.max_size is not None:
+            if size is None:
+                return False
+            if self.min_size is not None and size < self.min_size:
+                return False
+            if self.max_size is not None and size > self.max_size:
+                return False
+        return True
+
+
+def _media_value(value) -> Optional[str]:
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+class RuleIndex:
+    def __init__(self, rules: Sequence[SubscriptionRule]):
+        self.rules: List[CompiledRule] = []
+        self._by_source: Dict[int, int] = {}
+        self._any_source = 0
+        self._keyword_rules = 0
+        self._constrained = 0
+        keywords: Dict[str, int] = {}
+        for obj in rules:
+            rule = CompiledRule(obj, len(self.rules))
+            self.rules.append(rule)
+            mask = 1 << rule.bit
+            sources = split_ids(obj.source_dialog_ids)
+            if sources:
+                for dialog_id in sources:
+                    self._by_source[dialog_id] = self._by_source.get(dialog_id, 0) | mask
+            else:
+                self._any_source |= mask
+            rule_keywords = split_keywords(obj.keywords)
+            if rule_keywords:
+                self._keyword_rules |= mask
+                for keyword in rule_keywords:
+                    keywords[keyword] = keywords.get(keyword, 0) | mask
+            if rule.constrained:
+                self._constrained |= mask
+        self._automaton = KeywordAutomaton(keywords) if keywords else None
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def watches(self, dialog_id: int) -> bool:
+        return bool(self._any_source or dialog_id in self._by_source)
+
+    def sources(self) -> List[int]:
+        """规则里指定过的来源频道（不限来源的规则不在其中）"""
+        return sorted(self._by_source)
+
+    def candidates(self, dialog_id: int, text: Optional[str]) -> int:
+        """只看来源和关键词的规则位图，扫描频道时用来决定要不要转换这条消息"""
+        mask = self._by_source.get(dialog_id, 0) | self._any_source
+        if mask & self._keyword_rules:
+            hits = self._automaton.scan(text.lower()) if text else 0
+            mask &= hits | ~self._keyword_rules
+        return mask
+
+    def match(self, dialog_id: int, text: Optional[str], media_type=None, duration: Optional[int] = None,
+              size: Optional[int] = None) -> List[CompiledRule]:
+        mask = self.candidates(dialog_id, text)
+        if not mask:
+            return []
+        media_type = _media_value(media_type)
+        result = []
+        while mask:
+            low = mask & -mask
+            mask ^= low
+            rule = self.rules[low.bit_length() - 1]
+            if not (low & self._constrained) or rule.accepts(media_type, duration, size):
+                result.append(rule)
+        return result
+
+    def match_rows(self, message_rows: Iterable[MessageRow], media_rows: Iterable[MediaRow] = ()) -> List[dict]:
+        """批量匹配，返回 forward_queue 的插入参数；同一目标只保留第一条命中的规则"""
+        medias = {(row.dialog_id, row.message_id): row for row in media_rows}
+        queued = []
+        for row in message_rows:
+            media = medias.get((row.dialog_id, row.message_id))
+            duration = media.duration if media is not None else None
+            size = media.size if media is not None and media.size is not None else row.media_size
+            targets = set()
+            for rule in self.match(row.dialog_id, row.message, row.media_type, duration, size):
+                if rule.to_chat_id in targets:
+                    continue
+                targets.add(rule.to_chat_id)
+                queued.append({"rule_id": rule.id, "dialog_id": row.dialog_id, "message_id": row.message_id,
+                               "to_chat_id": rule.to_chat_id})
+        return queued
+
+
+_EMPTY = RuleIndex([])
+
+
+class SubscriptionIndex:
+    """进程内缓存的规则索引，过期或 invalidate 后下次使用时重新加载"""
+
+    def __init__(self, settings: Optional[SubscriptionSettings] = None):
+        self._settings = settings
+        self._index: Optional[RuleIndex] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> SubscriptionSettings:
+        if self._settings is None:
+            self._settings = get_subscription_settings()
+        return self._settings
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._index = None
+
+    def get(self, db: Session) -> RuleIndex:
+        if not self.settings.subscription_enabled:
+            return _EMPTY
+        index = self._index
+        if index is None or time.monotonic() - self._loaded_at > self.settings.subscription_reload_seconds:
+            rules = db.execute(
+                select(SubscriptionRule).where(SubscriptionRule.enabled.is_(True)).order_by(SubscriptionRule.id)
+            ).scalars().all()
+            index = RuleIndex(rules) if rules else _EMPTY
+            with self._lock:
+                self._index = index
+                self._loaded_at = time.monotonic()
+        return index
+
+
+subscriptions = SubscriptionIndex()
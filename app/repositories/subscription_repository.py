@@ -0,0 +1,163 @@
+from typing import Optional, List, Dict, Any, Tuple, Collection
+
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+
+from ..metrics import observe_repository
+from ..models import SubscriptionRule, ForwardQueueItem, ForwardStatusEnum, SubscriptionCursor
+from .job_repository import utcnow
+
+
+class SubscriptionRepository:
+    """
+    订阅规则、转发队列与扫描进度。入队不提交事务，由写入路径与消息一起提交；
+    同一 (目标, 频道, 消息) 已在队列里时忽略。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # region 规则
+    @observe_repository
+    def get_rules(self, enabled: Optional[bool] = None) -> List[SubscriptionRule]:
+        query = self.db.query(SubscriptionRule)
+        if enabled is not None:
+            query = query.filter(SubscriptionRule.enabled.is_(enabled))
+        return query.order_by(SubscriptionRule.id).all()
+
+    @observe_repository
+    def get_rule(self, id: int) -> SubscriptionRule | None:
+        return self.db.query(SubscriptionRule).filter(SubscriptionRule.id == id).first()
+
+    @observe_repository
+    def create_rule(self, values: Dict[str, Any]) -> SubscriptionRule:
+        obj = SubscriptionRule(**values)
+        self.db.add(obj)
+        self.db.commit()
+        self.db.refresh(obj)
+        return obj
+
+    @observe_repository
+    def update_rule(self, db_obj: SubscriptionRule, values: Dict[str, Any]) -> SubscriptionRule:
+        for field, value in values.items():
+            setattr(db_obj, field, value)
+        db_obj.updated_at = utcnow()
+        self.db.commit()
+        self.db.refresh(db_obj)
+        return db_obj
+
+    @observe_repository
+    def delete_rule(self, id: int) -> bool:
+        obj = self.get_rule(id)
+        if obj is None:
+            return False
+        self.db.delete(obj)
+        self.db.commit()
+        return True
+    # endregion
+
+    # region 转发队列
+    def enqueue(self, params: List[Dict[str, Any]]) -> int:
+        """批量入队（不提交），返回参数条数（已在队列里的会被忽略）"""
+        if not params:
+            return 0
+        table = ForwardQueueItem.__table__
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "mysql":
+            stmt = mysql.insert(table).prefix_with("IGNORE")
+        elif dialect == "sqlite":
+            stmt = sqlite.insert(table).on_conflict_do_nothing(index_elements=["to_chat_id", "dialog_id", "message_id"])
+        else:
+            raise NotImplementedError(f"转发队列不支持数据库 {dialect}")
+        self.db.execute(stmt, [{**item, "status": ForwardStatusEnum.pending, "attempts": 0} for item in params])
+        return len(params)
+
+    @observe_repository
+    def next_batch(self, limit: int, skip: Collection[int] = ()) -> Tuple[Optional[int], Optional[int],
+                                                                        List[ForwardQueueItem]]:
+        """取最早的一组待转发：同一目标、同一来源频道，按消息ID排序，最多 limit 条；skip 为本轮跳过的队列ID"""
+        pending = [ForwardQueueItem.status == ForwardStatusEnum.pending]
+        if skip:
+            pending.append(ForwardQueueItem.id.not_in(list(skip)))
+        first = self.db.execute(
+            select(ForwardQueueItem.to_chat_id, ForwardQueueItem.dialog_id)
+            .where(*pending)
+            .order_by(ForwardQueueItem.id)
+            .limit(1)
+        ).first()
+        if first is None:
+            return None, None, []
+        to_chat_id, dialog_id = first
+        items = (
+            self.db.query(ForwardQueueItem)
+            .filter(*pending,
+                    ForwardQueueItem.to_chat_id == to_chat_id,
+                    ForwardQueueItem.dialog_id == dialog_id)
+            .order_by(ForwardQueueItem.message_id)
+            .limit(limit)
+            .all()
+        )
+        return to_chat_id, dialog_id, items
+
+    @observe_repository
+    def mark_sent(self, ids: List[int]) -> None:
+        self.db.execute(
+            update(ForwardQueueItem).where(ForwardQueueItem.id.in_(ids))
+            .values(status=ForwardStatusEnum.sent, attempts=ForwardQueueItem.attempts + 1, error=None,
+                    sent_at=utcnow())
+        )
+        self.db.commit()
+
+    @observe_repository
+    def mark_failed(self, ids: List[int], error: str, max_attempts: int) -> None:
+        """失败次数达到 max_attempts 的标记为 failed，其余留在队列里下次重试"""
+        table = ForwardQueueItem.__table__
+        self.db.execute(
+            update(table).where(table.c.id.in_(ids))
+            .values(attempts=table.c.attempts + 1, error=error[:512])
+        )
+        self.db.execute(
+            update(table).where(table.c.id.in_(ids), table.c.attempts >= max_attempts)
+            .values(status=ForwardStatusEnum.failed)
+        )
+        self.db.commit()
+
+    @observe_repository
+    def get_queue(self, status: Optional[ForwardStatusEnum] = None, rule_id: Optional[int] = None,
+                  limit: int = 100) -> List[ForwardQueueItem]:
+        query = self.db.query(ForwardQueueItem)
+        if status is not None:
+            query = query.filter(ForwardQueueItem.status == status)
+        if rule_id is not None:
+            query = query.filter(ForwardQueueItem.rule_id == rule_id)
+        return query.order_by(ForwardQueueItem.id.desc()).limit(limit).all()
+
+    @observe_repository
+    def queue_stats(self) -> Dict[str, int]:
+        rows = self.db.execute(
+            select(ForwardQueueItem.status, func.count()).group_by(ForwardQueueItem.status)
+        )
+        stats = {status.value: 0 for status in ForwardStatusEnum}
+        stats.update({status.value: count for status, count in rows})
+        return stats
+    # endregion
+
+    # region 扫描进度
+    @observe_repository
+    def get_cursor(self, dialog_id: int) -> Optional[int]:
+        """扫描进度；还没有进度的来源返回 None"""
+        return self.db.execute(
+            select(SubscriptionCursor.last_message_id).where(SubscriptionCursor.dialog_id == dialog_id)
+        ).scalar()
+
+    @observe_repository
+    def save_cursor(self, dialog_id: int, last_message_id: int) -> None:
+        obj = self.db.get(SubscriptionCursor, dialog_id)
+        if obj is None:
+            self.db.add(SubscriptionCursor(dialog_id=dialog_id, last_message_id=last_message_id))
+        elif last_message_id > obj.last_message_id:
+            obj.last_message_id = last_message_id
+            obj.updated_at = utcnow()
+        self.db.commit()
+    # endregion
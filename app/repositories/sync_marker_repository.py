@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from ..metrics import observe_repository
+from ..models import SyncMarker
+
+
+class SyncMarkerRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    @observe_repository
+    def get(self, name: str) -> SyncMarker | None:
+        return self.db.get(SyncMarker, name)
+
+    @observe_repository
+    def touch(self, name: str, synced_at: datetime, full: bool = False) -> SyncMarker:
+        obj = self.db.get(SyncMarker, name)
+        if obj is None:
+            obj = SyncMarker(name=name)
+            self.db.add(obj)
+        obj.synced_at = synced_at
+        if full:
+            obj.full_synced_at = synced_at
+        self.db.commit()
+        return obj
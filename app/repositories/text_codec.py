@@ -0,0 +1,176 @@
+# app/repositories/text_codec.py
+"""
+消息正文的 zstd 压缩存储。
+
+开启 MESSAGE_COMPRESSION 后，写入路径把正文压缩进 messages.message_zstd，
+message 列置空；频道内的帖子高度重复，用按频道（或全局）训练的字典压缩
+短文本效果远好于无字典压缩。读路径在 repository 内透明解压，上层拿到的
+Message.message 始终是明文。压缩后不比原文小、或原文很短时仍存明文。
+
+字典写入后不再修改，按 ID 进程内缓存；压缩器/解压器按线程复用。
+"""
+import threading
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from pydantic_settings import BaseSettings
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from ..models import CompressionDict
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，只有开启压缩或库里已有压缩数据时才需要
+    zstandard = None
+
+
+class CompressionSettings(BaseSettings):
+    message_compression: bool = False
+    message_compression_level: int = 3
+    # 短于此长度（UTF-8 字节）的正文直接存明文
+    message_compression_min_length: int = 64
+    # dialog：按频道训练字典；global：所有频道共用一个字典
+    message_compression_dict_scope: str = "dialog"
+    message_compression_dict_size: int = 112640
+    message_compression_dict_samples: int = 5000
+    # 样本少于此数时不训练频道字典，退回全局字典
+    message_compression_min_samples: int = 200
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+@lru_cache()
+def get_compression_settings() -> CompressionSettings:
+    return CompressionSettings()
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise RuntimeError("消息压缩需要安装 zstandard：pip install zstandard")
+    return zstandard
+
+
+class TextCodec:
+    def __init__(self, settings: Optional[CompressionSettings] = None):
+        self._settings = settings
+        self._dicts: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+        # dialog_id（全局字典为 None）-> 最新字典ID；None 值表示查过但没有
+        self._latest: Optional[Dict[Optional[int], int]] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> CompressionSettings:
+        # 首次使用时才读取配置，导入模块不读 .env
+        if self._settings is None:
+            self._settings = get_compression_settings()
+        return self._settings
+
+    @settings.setter
+    def settings(self, value: CompressionSettings) -> None:
+        self._settings = value
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.message_compression
+
+    def invalidate(self) -> None:
+        """训练出新字典后调用，下次写入重新查找最新字典"""
+        with self._lock:
+            self._latest = None
+
+    # region 字典
+    def _latest_ids(self, db: Session) -> Dict[Optional[int], int]:
+        latest = self._latest
+        if latest is None:
+            rows = db.execute(
+                select(CompressionDict.dialog_id, func.max(CompressionDict.id)).group_by(CompressionDict.dialog_id)
+            )
+            latest = {dialog_id: dict_id for dialog_id, dict_id in rows}
+            with self._lock:
+                self._latest = latest
+        return latest
+
+    def dict_id_for(self, db: Session, dialog_id: int) -> Optional[int]:
+        latest = self._latest_ids(db)
+        if self.settings.message_compression_dict_scope == "dialog" and dialog_id in latest:
+            return latest[dialog_id]
+        return latest.get(None)
+
+    def _dict(self, db: Session, dict_id: int):
+        obj = self._dicts.get(dict_id)
+        if obj is None:
+            data = db.execute(select(CompressionDict.data).where(CompressionDict.id == dict_id)).scalar_one()
+            obj = _require_zstandard().ZstdCompressionDict(data)
+            with self._lock:
+                self._dicts[dict_id] = obj
+        return obj
+
+    def _compressor(self, db: Session, dict_id: Optional[int]):
+        cache = getattr(self._local, "compressors", None)
+        if cache is None:
+            cache = self._local.compressors = {}
+        compressor = cache.get(dict_id)
+        if compressor is None:
+            zstd = _require_zstandard()
+            level = self.settings.message_compression_level
+            if dict_id is None:
+                compressor = zstd.ZstdCompressor(level=level)
+            else:
+                compressor = zstd.ZstdCompressor(level=level, dict_data=self._dict(db, dict_id))
+            cache[dict_id] = compressor
+        return compressor
+
+    def _decompressor(self, db: Session, dict_id: Optional[int]):
+        cache = getattr(self._local, "decompressors", None)
+        if cache is None:
+            cache = self._local.decompressors = {}
+        decompressor = cache.get(dict_id)
+        if decompressor is None:
+            zstd = _require_zstandard()
+            if dict_id is None:
+                decompressor = zstd.ZstdDecompressor()
+            else:
+                decompressor = zstd.ZstdDecompressor(dict_data=self._dict(db, dict_id))
+            cache[dict_id] = decompressor
+        return decompressor
+    # endregion
+
+    def compress(self, db: Session, text: Optional[str], dict_id: Optional[int]) -> Tuple[Optional[str], Optional[bytes]]:
+        """返回 (明文, 压缩数据)，两者只有一个非空"""
+        if not text:
+            return text, None
+        raw = text.encode("utf-8")
+        if len(raw) < self.settings.message_compression_min_length:
+            return text, None
+        blob = self._compressor(db, dict_id).compress(raw)
+        if len(blob) >= len(raw):
+            return text, None
+        return None, blob
+
+    def encode(self, db: Session, dialog_id: int, text: Optional[str]) -> Tuple[Optional[str], Optional[bytes], Optional[int]]:
+        """写入路径：返回 (message, message_zstd, message_dict_id)；未开启压缩时原样返回明文"""
+        if not self.enabled:
+            return text, None, None
+        dict_id = self.dict_id_for(db, dialog_id)
+        plain, blob = self.compress(db, text, dict_id)
+        return plain, blob, (dict_id if blob is not None else None)
+
+    def decode(self, db: Session, plain: Optional[str], blob: Optional[bytes], dict_id: Optional[int]) -> Optional[str]:
+        if blob is None:
+            return plain
+        return self._decompressor(db, dict_id).decompress(blob).decode("utf-8")
+
+    def train(self, samples, dict_size: Optional[int] = None) -> bytes:
+        """用样本正文训练字典，返回字典内容；样本不足时 zstandard 会抛 ZstdError"""
+        zstd = _require_zstandard()
+        data = [text.encode("utf-8") for text in samples if text]
+        trained = zstd.train_dictionary(dict_size or self.settings.message_compression_dict_size, data)
+        return trained.as_bytes()
+
+
+codec = TextCodec()
@@ -0,0 +1,211 @@
+# app/repositories/thread_repository.py
+"""
+回复树与转发来源的索引读写。
+
+每条消息记下所在回复树的根（thread_root_id）和深度（thread_depth），取整棵树
+只需按 (dialog_id, thread_root_id) 走一次索引，不必沿 reply_to_msg_id 逐条回查。
+
+写入时在内存里沿本批的回复链解析，本批没有的父消息回库里查一次。父消息还没
+抓到（倒序抓取时很常见）的回复先挂在父消息 ID 下、深度为 1；父消息写入时再把
+挂在它下面的子树整体改挂到它的根上、深度加上它的深度。抓取顺序不影响最终结果，
+与按整个频道重算（``python -m app.commands.threads --backfill``）一致。
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update, bindparam, distinct, tuple_
+from sqlalchemy.orm import Session
+
+from ..metrics import observe_repository
+from ..models import Message
+from .text_codec import codec
+from .shard_router import shards
+
+# (根消息ID, 深度)
+Thread = Tuple[int, int]
+
+# IN 查询每批的 ID 数
+_CHUNK = 1000
+
+
+def resolve_threads(links: Dict[int, Optional[int]], known: Dict[int, Thread]) -> Dict[int, Thread]:
+    """
+    links 为同一频道 message_id -> reply_to_msg_id，known 为库里已有父消息的 (根, 深度)。
+    沿回复链迭代解析（不递归，长链不会爆栈），返回 links 里每条消息的 (根, 深度)。
+    """
+    resolved: Dict[int, Thread] = {}
+    for message_id in links:
+        chain, pending = [], set()
+        current = message_id
+        while current not in resolved:
+            parent = links[current]
+            if parent is None or parent == current:
+                resolved[current] = (current, 0)
+            elif parent in resolved:
+                root, depth = resolved[parent]
+                resolved[current] = (root, depth + 1)
+            elif parent in links:
+                if parent in pending:
+                    # 回复链成环只可能是脏数据，断开处当作根
+                    resolved[current] = (current, 0)
+                else:
+                    chain.append(current)
+                    pending.add(current)
+                    current = parent
+                    continue
+            elif parent in known:
+                root, depth = known[parent]
+                resolved[current] = (root, depth + 1)
+            else:
+                resolved[current] = (parent, 1)
+            while chain:
+                child = chain.pop()
+                root, depth = resolved[links[child]]
+                resolved[child] = (root, depth + 1)
+            current = message_id
+    return resolved
+
+
+def _plain(db: Session, rows, thread: bool = False) -> List[Dict[str, Any]]:
+    """Core 查询结果转成行 dict，压缩正文解压，去掉存储用的列；thread 为真时保留回复树列"""
+    result = []
+    for row in rows:
+        item = dict(row)
+        del item["content_hash"]
+        if not thread:
+            del item["thread_root_id"], item["thread_depth"]
+        blob, dict_id = item.pop("message_zstd"), item.pop("message_dict_id")
+        if blob is not None:
+            item["message"] = codec.decode(db, item["message"], blob, dict_id)
+        result.append(item)
+    return result
+
+
+class ThreadRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    # region 写入
+    def assign(self, data: Session, rows: Iterable) -> Dict[Tuple[int, int], Thread]:
+        """
+        rows 为同一个分片上的消息（MessageRow 或 Message 对象），返回
+        (dialog_id, message_id) -> (根, 深度)。每个频道最多查一次库里的父消息。
+        """
+        by_dialog: Dict[int, Dict[int, Optional[int]]] = {}
+        for row in rows:
+            by_dialog.setdefault(row.dialog_id, {})[row.message_id] = row.reply_to_msg_id
+        table = Message.__table__
+        threads = {}
+        for dialog_id, links in by_dialog.items():
+            parents = sorted({parent for parent in links.values() if parent is not None and parent not in links})
+            known = {}
+            for start in range(0, len(parents), _CHUNK):
+                known.update((row[0], (row[1], row[2])) for row in data.execute(
+                    select(table.c.message_id, table.c.thread_root_id, table.c.thread_depth)
+                    .where(table.c.dialog_id == dialog_id, table.c.message_id.in_(parents[start:start + _CHUNK]),
+                           table.c.thread_root_id.is_not(None))))
+            for message_id, thread in resolve_threads(links, known).items():
+                threads[(dialog_id, message_id)] = thread
+        return threads
+
+    def reroot(self, data: Session, rows: Iterable, threads: Dict[Tuple[int, int], Thread]) -> int:
+        """
+        rows 为刚插入的消息：此前挂在其中某条回复下的子树改挂到它的根上。
+        不提交，与插入同一事务；返回改挂的子树数。
+        """
+        by_dialog: Dict[int, List[int]] = {}
+        for row in rows:
+            if row.reply_to_msg_id is not None:
+                by_dialog.setdefault(row.dialog_id, []).append(row.message_id)
+        table = Message.__table__
+        params = []
+        for dialog_id, message_ids in by_dialog.items():
+            for start in range(0, len(message_ids), _CHUNK):
+                for (old_root,) in data.execute(
+                        select(distinct(table.c.thread_root_id))
+                        .where(table.c.dialog_id == dialog_id,
+                               table.c.thread_root_id.in_(message_ids[start:start + _CHUNK]))):
+                    root, depth = threads[(dialog_id, old_root)]
+                    if root != old_root:
+                        params.append({"b_dialog_id": dialog_id, "b_old_root": old_root,
+                                       "b_root": root, "b_depth": depth})
+        if params:
+            data.execute(
+                update(table)
+                .where(table.c.dialog_id == bindparam("b_dialog_id"),
+                       table.c.thread_root_id == bindparam("b_old_root"))
+                .values(thread_root_id=bindparam("b_root"), thread_depth=table.c.thread_depth + bindparam("b_depth")),
+                params,
+            )
+        return len(params)
+    # endregion
+
+    # region 查询
+    @observe_repository
+    def get_thread_root(self, dialog_id: int, message_id: int) -> Optional[Tuple[Optional[int]]]:
+        """消息所在回复树的根；消息不在热表里时返回 None，还没建索引时返回 (None,)"""
+        table = Message.__table__
+        return shards.session(self.db, dialog_id).execute(
+            select(table.c.thread_root_id)
+            .where(table.c.dialog_id == dialog_id, table.c.message_id == message_id)
+        ).first()
+
+    @observe_repository
+    def get_thread(self, dialog_id: int, root_id: int, max_depth: Optional[int] = None,
+                   limit: int = 10000) -> List[Dict[str, Any]]:
+        """整棵回复树，按深度、message_id 排序"""
+        table = Message.__table__
+        data = shards.session(self.db, dialog_id)
+        query = select(table).where(table.c.dialog_id == dialog_id, table.c.thread_root_id == root_id)
+        if max_depth is not None:
+            query = query.where(table.c.thread_depth <= max_depth)
+        rows = data.execute(query.order_by(table.c.thread_depth, table.c.message_id).limit(limit)).mappings().all()
+        return _plain(self.db, rows, thread=True)
+
+    @observe_repository
+    def get_forwarded(self, source_id: int, after: Optional[Tuple[int, int]] = None,
+                      limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        转发自 source_id 的消息，跨频道按 (dialog_id, message_id) 排序，after 为上一页
+        最后一条的 (dialog_id, message_id)。分片时各分片并发取一页再归并。
+        """
+        table = Message.__table__
+        query = select(table).where(table.c.forward_from_id == source_id)
+        if after is not None:
+            query = query.where(tuple_(table.c.dialog_id, table.c.message_id) > tuple_(*after))
+        query = query.order_by(table.c.dialog_id, table.c.message_id).limit(limit)
+        # 分片线程里只取行，解压正文要用主库 Session 查字典，回到当前线程再做
+        pages = shards.fan_out(self.db, lambda data: [dict(row) for row in data.execute(query).mappings()])
+        rows = sorted((row for page in pages for row in page), key=lambda row: (row["dialog_id"], row["message_id"]))
+        return _plain(self.db, rows[:limit])
+    # endregion
+
+    # region 重建
+    @observe_repository
+    def get_links(self, shard: int, dialog_id: int) -> Dict[int, Tuple[Optional[int], Optional[int], Optional[int]]]:
+        """一个频道热表里全部消息的 message_id -> (reply_to_msg_id, thread_root_id, thread_depth)"""
+        table = Message.__table__
+        rows = shards.shard_session(self.db, shard).execute(
+            select(table.c.message_id, table.c.reply_to_msg_id, table.c.thread_root_id, table.c.thread_depth)
+            .where(table.c.dialog_id == dialog_id))
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+    @observe_repository
+    def set_threads(self, shard: int, dialog_id: int, threads: Dict[int, Thread], chunk: int) -> int:
+        """分批写回 (根, 深度)，每批一个事务"""
+        table = Message.__table__
+        data = shards.shard_session(self.db, shard)
+        params = [{"b_dialog_id": dialog_id, "b_message_id": message_id, "b_root": root, "b_depth": depth}
+                  for message_id, (root, depth) in threads.items()]
+        statement = (update(table)
+                     .where(table.c.dialog_id == bindparam("b_dialog_id"),
+                            table.c.message_id == bindparam("b_message_id"))
+                     .values(thread_root_id=bindparam("b_root"), thread_depth=bindparam("b_depth")))
+        for start in range(0, len(params), chunk):
+            try:
+                data.execute(statement, params[start:start + chunk])
+                data.commit()
+            except Exception:
+                data.rollback()
+                raise
+        return len(params)
+    # endregion
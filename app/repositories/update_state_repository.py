@@ -0,0 +1,46 @@
+from datetime import datetime
+from typing import List, Dict
+
+from sqlalchemy.orm import Session
+
+from ..metrics import observe_repository
+from ..models import UpdateState, ChannelUpdateState
+
+
+class UpdateStateRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    @observe_repository
+    def get(self, account: str) -> UpdateState | None:
+        return self.db.get(UpdateState, account)
+
+    @observe_repository
+    def save(self, account: str, pts: int, qts: int, date: datetime, seq: int) -> UpdateState:
+        obj = self.db.get(UpdateState, account)
+        if obj is None:
+            obj = UpdateState(account=account)
+            self.db.add(obj)
+        obj.pts, obj.qts, obj.date, obj.seq = pts, qts, date, seq
+        self.db.commit()
+        return obj
+
+    @observe_repository
+    def get_channels(self) -> List[ChannelUpdateState]:
+        return self.db.query(ChannelUpdateState).all()
+
+    @observe_repository
+    def save_channels(self, pts_by_channel: Dict[int, int]) -> int:
+        existing = {
+            obj.channel_id: obj
+            for obj in self.db.query(ChannelUpdateState)
+            .filter(ChannelUpdateState.channel_id.in_(list(pts_by_channel)))
+        }
+        for channel_id, pts in pts_by_channel.items():
+            obj = existing.get(channel_id)
+            if obj is None:
+                self.db.add(ChannelUpdateState(channel_id=channel_id, pts=pts))
+            else:
+                obj.pts = pts
+        self.db.commit()
+        return len(pts_by_channel)
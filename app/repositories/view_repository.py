@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.orm import Session
+
+from ..metrics import observe_repository
+from ..models import Message
+from .shard_router import shards
+
+
+class ViewRepository:
+    """
+    浏览数刷新：按 message_id 键集分页读取已存消息的 ID，
+    只对 views 一列做 executemany UPDATE，不重写整行。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @observe_repository
+    def get_message_ids(self, dialog_id: int, since: Optional[datetime] = None, after_id: int = 0,
+                        limit: int = 1000) -> List[int]:
+        table = Message.__table__
+        query = (
+            select(table.c.message_id)
+            .where(table.c.dialog_id == dialog_id, table.c.message_id > after_id)
+            .order_by(table.c.message_id)
+            .limit(limit)
+        )
+        if since is not None:
+            query = query.where(table.c.date >= since)
+        return [row[0] for row in shards.session(self.db, dialog_id).execute(query)]
+
+    @observe_repository
+    def update_views(self, dialog_id: int, views: Dict[int, int]) -> int:
+        if not views:
+            return 0
+        table = Message.__table__
+        data = shards.session(self.db, dialog_id)
+        try:
+            data.execute(
+                update(table)
+                .where(table.c.dialog_id == bindparam("b_dialog_id"), table.c.message_id == bindparam("b_message_id"))
+                # 浏览数不参与内容指纹，指纹和 updated_at 都保持不变
+                .values(views=bindparam("b_views"), updated_at=table.c.updated_at),
+                [{"b_dialog_id": dialog_id, "b_message_id": message_id, "b_views": value}
+                 for message_id, value in views.items()],
+            )
+            data.commit()
+        except Exception:
+            data.rollback()
+            raise
+        return len(views)
@@ -2,10 +2,22 @@ from .dialog_router import router as dialog_router
 from .message_router import router as message_router
 from .media_router import router as media_router
 from .telegram_client_router import router as telegram_client_router
+from .metrics_router import router as metrics_router
+from .tracing_router import router as tracing_router
+from .job_router import router as job_router
+from .analytics_router import router as analytics_router
+from .subscription_router import router as subscription_router
+from .sender_router import router as sender_router
 
 __all__ = [
     "dialog_router",
     "message_router",
     "media_router",
-    "telegram_client_router"
+    "telegram_client_router",
+    "metrics_router",
+    "tracing_router",
+    "job_router",
+    "analytics_router",
+    "subscription_router",
+    "sender_router"
 ]
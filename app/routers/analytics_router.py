@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import datetime, date
+
+from ..services import AnalyticsService
+from ..schemas import GranularityEnum, ActivityBucket, KeywordHits, MediaStats, SenderStats
+from ..database import get_read_db
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+@router.get("/dialogs/{dialog_id}/activity", response_model=List[ActivityBucket])
+def read_activity(dialog_id: int, granularity: GranularityEnum = GranularityEnum.day,
+                  since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  db: Session = Depends(get_read_db)):
+    """每小时/每天新增的消息数（UTC 时间桶）"""
+    return AnalyticsService(db).get_activity(dialog_id, granularity.value, since, until)
+
+
+@router.get("/dialogs/{dialog_id}/keywords", response_model=List[KeywordHits])
+def read_keyword_hits(dialog_id: int, since: Optional[date] = None, until: Optional[date] = None,
+                      keywords: Optional[str] = Query(None, description="逗号分隔，只看这些关键词"),
+                      db: Session = Depends(get_read_db)):
+    """每天各关键词命中的消息数"""
+    return AnalyticsService(db).get_keyword_hits(dialog_id, since, until, keywords)
+
+
+@router.get("/dialogs/{dialog_id}/media", response_model=List[MediaStats])
+def read_media_stats(dialog_id: int, db: Session = Depends(get_read_db)):
+    """按媒体类型统计的消息数与总字节数"""
+    return AnalyticsService(db).get_media(dialog_id)
+
+
+@router.get("/dialogs/{dialog_id}/top-senders", response_model=List[SenderStats])
+def read_top_senders(dialog_id: int, limit: int = Query(10, ge=1, le=100), db: Session = Depends(get_read_db)):
+    """发消息最多的发送者"""
+    return AnalyticsService(db).get_top_senders(dialog_id, limit)
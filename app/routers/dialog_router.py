@@ -1,18 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+
+from ..services import DialogService, BulkService
+from ..schemas import Dialog, DialogCreate, DialogUpdate, BulkResult
+from ..database import get_db, SessionLocal
+from .formats import read_items
 
-from ..services import DialogService
-from ..schemas import Dialog, DialogCreate, DialogUpdate
-from ..database import get_db
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/dialogs", tags=["dialogs"])
 
+# 后台刷新任务，同一时刻只跑一个
+_refresh_task: Optional[asyncio.Task] = None
+
+
+async def _refresh_dialogs():
+    db = SessionLocal()
+    try:
+        await DialogService(db).refresh()
+    except Exception:
+        logger.exception("后台刷新对话列表失败")
+    finally:
+        db.close()
+
+
+def _start_refresh() -> None:
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_refresh_dialogs())
+
 
 @router.get("/get_all_dialogs", response_model=List[Dialog])
-async def get_all_dialogs(db: Session = Depends(get_db)):
+async def get_all_dialogs(response: Response, refresh: bool = False, db: Session = Depends(get_db)):
+    """
+    直接返回数据库中的对话列表；数据超过 DIALOG_MAX_AGE_SECONDS 时在后台增量刷新。
+    从未同步过或 refresh=true 时先同步再返回。
+
+    响应头:
+    - Age: 数据距上次同步的秒数
+    - X-Dialogs-Synced-At: 上次同步时间（UTC）
+    - X-Dialogs-Refreshing: 是否正在后台刷新
+    """
     service = DialogService(db)
-    dialogs = await service.get_all_dialogs()
+    dialogs, synced_at = service.get_cached()
+    if refresh or synced_at is None:
+        await service.refresh(full=refresh)
+        dialogs, synced_at = service.get_cached()
+    elif service.is_stale(synced_at):
+        _start_refresh()
+
+    response.headers["Age"] = str(int(service.age_seconds(synced_at)))
+    response.headers["X-Dialogs-Synced-At"] = synced_at.isoformat() + "Z"
+    response.headers["X-Dialogs-Refreshing"] = str(_refresh_task is not None and not _refresh_task.done()).lower()
     return dialogs
 
 
@@ -25,6 +69,19 @@ def read_dialog(dialog_id: int, telegram_type: str, db: Session = Depends(get_db
     return db_obj
 
 
+@router.post("/bulk", response_model=BulkResult)
+async def bulk_write_dialogs(request: Request, db: Session = Depends(get_db)):
+    """
+    批量写入对话：请求体为 JSON 数组、NDJSON（Content-Type: application/x-ndjson）
+    或 MessagePack 数组，单次最多 BULK_MAX_ITEMS 条。
+    按 (dialog_id, telegram_type) upsert，每 BULK_CHUNK_SIZE 条一个事务；返回与请求一一对应的逐条状态
+    （inserted / updated / duplicate / invalid / error）
+    """
+    service = BulkService(db)
+    items = await read_items(request, service.settings.bulk_max_items)
+    return await run_in_threadpool(service.write_dialogs, items)
+
+
 @router.post("/", response_model=Dialog)
 def create_dialog(dialog_in: DialogCreate, db: Session = Depends(get_db)):
     service = DialogService(db)
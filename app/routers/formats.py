@@ -0,0 +1,205 @@
+# app/routers/formats.py
+"""
+列表与导出接口的内容协商，以及批量写入接口的请求体解析。
+
+按 Accept 头（或 ?format=）在 JSON / MessagePack / Arrow IPC stream 之间选择。
+二进制格式直接从数据库行 dict 分批编码，不经过逐行的 Pydantic 校验：
+
+- MessagePack：列表接口返回一个数组；导出接口逐条拼接 map，用
+  ``msgpack.Unpacker`` 流式读取。时间为 msgpack Timestamp 扩展类型（UTC）。
+- Arrow：IPC stream，每批一个 RecordBatch，列类型与归档 Parquet 一致。
+
+msgpack / pyarrow 是可选依赖，未安装时请求对应格式返回 406。
+"""
+import io
+import json
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Iterable, Iterator, Dict, Any, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+from ..repositories.archive_store import arrow_schema, record_batch, compute
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖
+    msgpack = None
+
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+MSGPACK = "application/x-msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+_MEDIA_TYPES = {
+    JSON: JSON,
+    NDJSON: NDJSON,
+    MSGPACK: MSGPACK,
+    "application/msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    ARROW: ARROW,
+}
+
+_FORMATS = {"json": JSON, "ndjson": NDJSON, "msgpack": MSGPACK, "arrow": ARROW}
+
+# 二进制格式每次编码、发送的行数
+ENCODE_BATCH_ROWS = 1000
+
+
+def negotiate(request: Request, default: str, fmt: Optional[str] = None) -> str:
+    """
+    选出响应格式：?format= 优先，其次按 Accept 的 q 值；都没有或是 */* 时用 default。
+    JSON 与 NDJSON 视为同一种文本格式，由 default 决定用哪个。
+    """
+    if fmt:
+        if fmt not in _FORMATS:
+            raise HTTPException(status_code=400, detail=f"不支持的格式: {fmt}，可选 {', '.join(_FORMATS)}")
+        chosen = _FORMATS[fmt]
+    else:
+        accept = request.headers.get("accept")
+        if not accept:
+            return default
+        candidates = []
+        for index, part in enumerate(accept.split(",")):
+            media_type, _, params = part.strip().partition(";")
+            media_type = media_type.strip().lower()
+            q = 1.0
+            for param in params.split(";"):
+                key, _, value = param.strip().partition("=")
+                if key == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            if q <= 0:
+                continue
+            if media_type in ("*/*", "application/*"):
+                candidates.append((q, -index, default))
+            elif media_type in _MEDIA_TYPES:
+                candidates.append((q, -index, _MEDIA_TYPES[media_type]))
+        if not candidates:
+            raise HTTPException(status_code=406, detail=f"可用的响应格式: {JSON}, {MSGPACK}, {ARROW}")
+        chosen = max(candidates)[2]
+
+    if chosen in (JSON, NDJSON):
+        return default
+    if chosen == MSGPACK and msgpack is None:
+        raise HTTPException(status_code=406, detail="服务端未安装 msgpack")
+    if chosen == ARROW:
+        try:
+            compute()
+        except RuntimeError as e:
+            raise HTTPException(status_code=406, detail=str(e))
+    return chosen
+
+
+def _batches(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[list]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        # 数据库里的时间不带时区，按 UTC；直接由差值构造，比 Timestamp.from_datetime 快一倍多
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        delta = value - _EPOCH
+        return msgpack.Timestamp(delta.days * 86400 + delta.seconds, delta.microseconds * 1000)
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+def iter_ndjson(rows: Iterable[Dict[str, Any]], batch_rows: int = ENCODE_BATCH_ROWS) -> Iterator[str]:
+    for batch in _batches(rows, batch_rows):
+        yield "".join(json.dumps(row, ensure_ascii=False, default=_json_default) + "\n" for row in batch)
+
+
+def iter_msgpack(rows: Iterable[Dict[str, Any]], batch_rows: int = ENCODE_BATCH_ROWS) -> Iterator[bytes]:
+    packer = msgpack.Packer(default=_msgpack_default)
+    for batch in _batches(rows, batch_rows):
+        yield b"".join(packer.pack(row) for row in batch)
+
+
+def pack_msgpack_array(rows: Iterable[Dict[str, Any]]) -> bytes:
+    rows = list(rows)
+    packer = msgpack.Packer(default=_msgpack_default)
+    return packer.pack_array_header(len(rows)) + b"".join(packer.pack(row) for row in rows)
+
+
+def iter_arrow(table_name: str, rows: Iterable[Dict[str, Any]],
+               batch_rows: int = ENCODE_BATCH_ROWS) -> Iterator[bytes]:
+    """Arrow IPC stream：先写 schema，再每批一个 RecordBatch，没有行时只有 schema 和结束标记"""
+    import pyarrow as pa  # 协商时已确认可用
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, arrow_schema(table_name))
+    for batch in _batches(rows, batch_rows):
+        writer.write_batch(record_batch(table_name, batch))
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+
+def list_response(request: Request, table_name: str, rows: Iterable[Dict[str, Any]],
+                  fmt: Optional[str] = None) -> Optional[Response]:
+    """列表接口：协商为二进制格式时直接返回 Response，JSON 返回 None 由 response_model 处理"""
+    media_type = negotiate(request, JSON, fmt)
+    if media_type == MSGPACK:
+        return Response(pack_msgpack_array(rows), media_type=MSGPACK)
+    if media_type == ARROW:
+        return Response(b"".join(iter_arrow(table_name, rows)), media_type=ARROW)
+    return None
+
+
+def stream_response(request: Request, table_name: str, rows: Iterable[Dict[str, Any]],
+                    fmt: Optional[str] = None) -> StreamingResponse:
+    """导出接口：默认 NDJSON，也可协商为 MessagePack 流或 Arrow IPC stream"""
+    media_type = negotiate(request, NDJSON, fmt)
+    if media_type == MSGPACK:
+        return StreamingResponse(iter_msgpack(rows), media_type=MSGPACK)
+    if media_type == ARROW:
+        return StreamingResponse(iter_arrow(table_name, rows), media_type=ARROW)
+    return StreamingResponse(iter_ndjson(rows), media_type=NDJSON)
+
+
+async def read_items(request: Request, max_items: int) -> list:
+    """
+    批量写入的请求体，按 Content-Type 解析：JSON 数组（默认）、NDJSON（每行一个对象）
+    或 MessagePack 数组；条目数超过 max_items 返回 413
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    media_type = _MEDIA_TYPES.get(content_type, JSON)
+    try:
+        if media_type == NDJSON:
+            lines = [line for line in body.splitlines() if line.strip()]
+            if len(lines) > max_items:
+                raise HTTPException(status_code=413, detail=f"单次最多 {max_items} 条")
+            items = [json.loads(line) for line in lines]
+        elif media_type == MSGPACK:
+            if msgpack is None:
+                raise HTTPException(status_code=415, detail="服务端未安装 msgpack")
+            items = msgpack.unpackb(body, timestamp=3)
+        else:
+            items = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"请求体解析失败: {e}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="请求体应为数组")
+    if len(items) > max_items:
+        raise HTTPException(status_code=413, detail=f"单次最多 {max_items} 条")
+    return items
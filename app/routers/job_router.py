@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from ..services import JobService
+from ..schemas import Job, JobCreate
+from ..schemas.job_schema import JobStatusEnum
+from ..database import get_db
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.post("/", response_model=Job)
+def create_job(job_in: JobCreate, db: Session = Depends(get_db)):
+    """
+    提交抓取任务，由 ``python -m app.worker`` 进程认领执行
+
+    参数:
+    - dialog_id: 频道ID
+    - kind: crawl（关键词抓取）、backfill（分片回填）或 views（刷新已存消息的浏览数）
+    - params: 对应接口的参数，如 {"keywords": "编程", "since": "2024-03-01"}
+    """
+    try:
+        return JobService(db).enqueue(job_in)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/", response_model=List[Job])
+def list_jobs(status: Optional[JobStatusEnum] = None, dialog_id: Optional[int] = None, limit: int = 100,
+              db: Session = Depends(get_db)):
+    return JobService(db).get_list(status, dialog_id, limit)
+
+
+@router.get("/{id}", response_model=Job)
+def read_job(id: int, db: Session = Depends(get_db)):
+    db_obj = JobService(db).get(id)
+    if not db_obj:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return db_obj
@@ -1,37 +1,98 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from ..services import MediaService
-from ..schemas import Media, MediaCreate, MediaUpdate
-from ..database import get_db
+from ..services import MediaService, BulkService
+from ..schemas import Media, MediaCreate, MediaUpdate, BulkResult
+from ..database import get_db, get_read_db, read_session
+from ..repositories import AmbiguousIdError
+from .formats import list_response, stream_response, read_items
 
 router = APIRouter(prefix="/medias", tags=["medias"])
 
-@router.get("/{id}", response_model=Media)
-def read_media(id: int, db: Session = Depends(get_db)):
-    service = MediaService(db)
-    db_obj = service.get(id)
+def _get_by_id(service: MediaService, id: int, dialog_id: Optional[int], include_archived: bool = True):
+    try:
+        db_obj = service.get(id, include_archived, dialog_id)
+    except AmbiguousIdError:
+        # 分片时自增主键只在分片内唯一
+        raise HTTPException(status_code=409, detail="Media id is ambiguous across shards, pass dialog_id "
+                                                    "or use /medias/dialog/{dialog_id}/message/{message_id}")
     if not db_obj:
         raise HTTPException(status_code=404, detail="Media not found")
     return db_obj
 
+def _get_by_message(service: MediaService, dialog_id: int, message_id: int, writable: bool = False):
+    db_obj = service.get_by_dialog_and_msg_id(dialog_id, message_id)
+    # 已归档的行只读
+    if not db_obj or (writable and Session.object_session(db_obj) is None):
+        raise HTTPException(status_code=404, detail="Media not found")
+    return db_obj
+
+@router.get("/{id}", response_model=Media)
+def read_media(id: int, dialog_id: Optional[int] = None, db: Session = Depends(get_read_db)):
+    """按主键读取；分片时主键只在分片内唯一，多个分片上都有时返回 409，需带上 dialog_id"""
+    return _get_by_id(MediaService(db), id, dialog_id)
+
+@router.get("/dialog/{dialog_id}/message/{message_id}", response_model=Media)
+def read_media_by_dialog_and_msg(dialog_id: int, message_id: int, db: Session = Depends(get_read_db)):
+    return _get_by_message(MediaService(db), dialog_id, message_id)
+
+@router.put("/dialog/{dialog_id}/message/{message_id}", response_model=Media)
+def update_media_by_dialog_and_msg(dialog_id: int, message_id: int, media_in: MediaUpdate,
+                                   db: Session = Depends(get_db)):
+    service = MediaService(db)
+    return service.update(_get_by_message(service, dialog_id, message_id, writable=True), media_in)
+
+@router.delete("/dialog/{dialog_id}/message/{message_id}", status_code=204)
+def delete_media_by_dialog_and_msg(dialog_id: int, message_id: int, db: Session = Depends(get_db)):
+    service = MediaService(db)
+    service.delete(_get_by_message(service, dialog_id, message_id, writable=True).id, dialog_id)
+
+@router.get("/dialog/{dialog_id}", response_model=List[Media])
+def list_medias(request: Request, dialog_id: int, after_id: int = 0, limit: int = Query(100, ge=1, le=10000),
+                fmt: Optional[str] = Query(None, alias="format"), db: Session = Depends(get_read_db)):
+    """
+    按 message_id 分页列出一个频道的媒体（含已归档），下一页用最后一条的 message_id 作为 after_id；
+    响应格式按 Accept 协商：application/json（默认）/ application/x-msgpack / application/vnd.apache.arrow.stream
+    """
+    rows = MediaService(db).list_by_dialog(dialog_id, after_id, limit)
+    return list_response(request, "medias", rows, fmt) or list(rows)
+
+@router.get("/dialog/{dialog_id}/export")
+def export_medias(request: Request, dialog_id: int, fmt: Optional[str] = Query(None, alias="format"),
+                  max_lag: Optional[float] = Header(None, alias="X-Max-Replica-Lag", ge=0)):
+    """流式导出一个频道的媒体，默认 NDJSON，也可协商为 MessagePack 流或 Arrow IPC stream"""
+    def rows():
+        with read_session(max_lag) as db:
+            yield from MediaService(db).export_medias(dialog_id)
+
+    return stream_response(request, "medias", rows(), fmt)
+
+@router.post("/bulk", response_model=BulkResult)
+async def bulk_write_medias(request: Request, db: Session = Depends(get_db)):
+    """
+    批量写入媒体：请求体为 JSON 数组、NDJSON（Content-Type: application/x-ndjson）
+    或 MessagePack 数组，单次最多 BULK_MAX_ITEMS 条。
+    按 (dialog_id, message_id) upsert，每 BULK_CHUNK_SIZE 条一个事务；返回与请求一一对应的逐条状态
+    （inserted / updated / duplicate / invalid / error）
+    """
+    service = BulkService(db)
+    items = await read_items(request, service.settings.bulk_max_items)
+    return await run_in_threadpool(service.write_medias, items)
+
 @router.post("/", response_model=Media)
 def create_media(media_in: MediaCreate, db: Session = Depends(get_db)):
     service = MediaService(db)
     return service.create(media_in)
 
 @router.put("/{id}", response_model=Media)
-def update_media(id: int, media_in: MediaUpdate, db: Session = Depends(get_db)):
+def update_media(id: int, media_in: MediaUpdate, dialog_id: Optional[int] = None, db: Session = Depends(get_db)):
     service = MediaService(db)
-    db_obj = service.get(id)
-    if not db_obj:
-        raise HTTPException(status_code=404, detail="Media not found")
-    return service.update(db_obj, media_in)
+    return service.update(_get_by_id(service, id, dialog_id, include_archived=False), media_in)
 
 @router.delete("/{id}", status_code=204)
-def delete_media(id: int, db: Session = Depends(get_db)):
+def delete_media(id: int, dialog_id: Optional[int] = None, db: Session = Depends(get_db)):
     service = MediaService(db)
-    db_obj = service.get(id)
-    if not db_obj:
-        raise HTTPException(status_code=404, detail="Media not found")
-    service.delete(id)
+    service.delete(id, _get_by_id(service, id, dialog_id, include_archived=False).dialog_id)
@@ -1,20 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import logging
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Dict
+from datetime import datetime
+
+from ..services import MessageService, BackfillService, BulkService, SenderService
+from ..schemas import Message, MessageCreate, MessageUpdate, MessageThread, MessageWithSender, BulkResult
+from ..database import get_db, get_read_db, read_session, SessionLocal
+from ..repositories import AmbiguousIdError
+from .formats import list_response, stream_response, read_items
 
-from ..services import MessageService
-from ..schemas import Message, MessageCreate, MessageUpdate
-from ..database import get_db
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
+# 正在后台执行的回填任务，按频道ID去重
+_backfills: Dict[int, asyncio.Task] = {}
+
 
 class MessageRequest(BaseModel):
     channel_id: int
     keywords: str = "编程"
     limit: Optional[int] = None
     min_id: Optional[int] = 0
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    parallel: Optional[int] = None
+
+
+class BackfillRequest(BaseModel):
+    channel_id: int
+    keywords: Optional[str] = None
+    ranges: Optional[int] = None
+    min_id: int = 0
+    restart: bool = False
 
 
 class ForwardRequest(BaseModel):
@@ -37,23 +60,24 @@ async def get_messages(
     - keywords: 要匹配的关键词列表，默认为["编程"]
     - limit: 返回消息数量的限制(可选)
     - min_id: 只获取大于此ID的消息(可选)
+    - since: 只获取此时间及之后的消息(可选，不带时区按 UTC)
+    - until: 只获取此时间之前的消息(可选，不带时区按 UTC)
+    - parallel: 把时间窗口切成几段并发抓取(可选，需指定 since)
     """
     try:
         service = MessageService(db)
-        messages = await service.fetch_messages_by_keywords(
+        report = await service.fetch_messages_by_keywords(
             channel_id=param.channel_id,
             keywords=param.keywords,
             limit=param.limit,
-            min_id=param.min_id
+            min_id=param.min_id,
+            since=param.since,
+            until=param.until,
+            parallel=param.parallel,
         )
 
-        if not messages:
-            raise HTTPException(
-                status_code=404,
-                detail="未找到匹配关键词的消息"
-            )
-        if messages:
-            return "消息获取完毕！"
+        # 计数含 unchanged：已存在且内容指纹未变、跳过写入的消息数
+        return {"detail": "消息获取完毕！", **report}
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -83,17 +107,77 @@ async def forward_message(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/{id}", response_model=Message)
-def read_message(id: int, db: Session = Depends(get_db)):
-    service = MessageService(db)
-    db_obj = service.get(id)
+async def _run_backfill(channel_id: int):
+    db = SessionLocal()
+    try:
+        await BackfillService(db).resume(channel_id)
+    except Exception:
+        logger.exception("频道 %s 回填失败", channel_id)
+    finally:
+        db.close()
+        _backfills.pop(channel_id, None)
+
+
+@router.post("/backfill")
+async def start_backfill(
+        param: BackfillRequest,
+        db: Session = Depends(get_db)
+):
+    """
+    分片并发回填频道历史消息，后台执行
+
+    参数:
+    - channel_id: 频道ID
+    - keywords: 只回填命中关键词的消息(可选，默认全部)
+    - ranges: 分片数(可选，默认 BACKFILL_RANGES)
+    - min_id: 只回填大于此ID的消息
+    - restart: 丢弃未完成的进度重新规划
+    """
+    if param.channel_id in _backfills:
+        raise HTTPException(status_code=409, detail="该频道正在回填")
+    service = BackfillService(db)
+    try:
+        plan = await service.plan(
+            channel_id=param.channel_id,
+            keywords=param.keywords,
+            ranges=param.ranges,
+            min_id=param.min_id,
+            restart=param.restart,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if plan:
+        _backfills[param.channel_id] = asyncio.create_task(_run_backfill(param.channel_id))
+    return service.get_progress(param.channel_id)
+
+
+@router.get("/backfill/{channel_id}")
+def get_backfill(channel_id: int, db: Session = Depends(get_db)):
+    progress = BackfillService(db).get_progress(channel_id)
+    progress["running"] = channel_id in _backfills
+    return progress
+
+
+def _get_by_id(service: MessageService, id: int, dialog_id: Optional[int], include_archived: bool = True):
+    try:
+        db_obj = service.get(id, include_archived, dialog_id)
+    except AmbiguousIdError:
+        # 分片时自增主键只在分片内唯一
+        raise HTTPException(status_code=409, detail="Message id is ambiguous across shards, pass dialog_id "
+                                                    "or use /messages/dialog/{dialog_id}/message/{message_id}")
     if not db_obj:
         raise HTTPException(status_code=404, detail="Message not found")
     return db_obj
 
 
+@router.get("/{id}", response_model=Message)
+def read_message(id: int, dialog_id: Optional[int] = None, db: Session = Depends(get_read_db)):
+    """按主键读取；分片时主键只在分片内唯一，多个分片上都有时返回 409，需带上 dialog_id"""
+    return _get_by_id(MessageService(db), id, dialog_id)
+
+
 @router.get("/dialog/{dialog_id}/message/{message_id}", response_model=Message)
-def read_message_by_dialog_and_msg(dialog_id: int, message_id: int, db: Session = Depends(get_db)):
+def read_message_by_dialog_and_msg(dialog_id: int, message_id: int, db: Session = Depends(get_read_db)):
     service = MessageService(db)
     db_obj = service.get_by_dialog_and_msg_id(dialog_id, message_id)
     if not db_obj:
@@ -101,6 +185,142 @@ def read_message_by_dialog_and_msg(dialog_id: int, message_id: int, db: Session
     return db_obj
 
 
+@router.put("/dialog/{dialog_id}/message/{message_id}", response_model=Message)
+def update_message_by_dialog_and_msg(dialog_id: int, message_id: int, message_in: MessageUpdate,
+                                     db: Session = Depends(get_db)):
+    service = MessageService(db)
+    db_obj = service.get_by_dialog_and_msg_id(dialog_id, message_id)
+    # 已归档的行只读
+    if not db_obj or Session.object_session(db_obj) is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return service.update(db_obj, message_in)
+
+
+@router.delete("/dialog/{dialog_id}/message/{message_id}", status_code=204)
+def delete_message_by_dialog_and_msg(dialog_id: int, message_id: int, db: Session = Depends(get_db)):
+    service = MessageService(db)
+    db_obj = service.get_by_dialog_and_msg_id(dialog_id, message_id)
+    if not db_obj or Session.object_session(db_obj) is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    service.delete(db_obj.id, dialog_id)
+
+
+@router.get("/dialog/{dialog_id}/message/{message_id}/thread", response_model=MessageThread)
+def read_thread(dialog_id: int, message_id: int, max_depth: Optional[int] = Query(None, ge=0),
+                limit: int = Query(10000, ge=1, le=100000), db: Session = Depends(get_read_db)):
+    """
+    消息所在的整棵回复树（从根开始，不只是这条消息以下），按深度、message_id 排序；
+    每条带 thread_depth（根为 0），用 reply_to_msg_id 即可还原树形。
+    根消息还没抓到时 root_id 为最早可知的祖先ID，树里不含根本身。
+    """
+    found = MessageService(db).get_thread(dialog_id, message_id, max_depth, limit)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    root_id, rows = found
+    if root_id is None:
+        raise HTTPException(status_code=409, detail="回复树索引尚未建立，先执行 python -m app.commands.threads --backfill")
+    return {"dialog_id": dialog_id, "root_id": root_id, "messages": rows}
+
+
+@router.get("/forwarded-from/{source_id}", response_model=List[Message])
+def list_forwarded(
+        request: Request,
+        source_id: int,
+        after_dialog_id: Optional[int] = None,
+        after_id: int = 0,
+        limit: int = Query(100, ge=1, le=10000),
+        fmt: Optional[str] = Query(None, alias="format"),
+        db: Session = Depends(get_read_db)
+):
+    """
+    所有频道里转发自 source_id 的消息（不含已归档），按 (dialog_id, message_id) 分页，
+    下一页用最后一条的 dialog_id / message_id 作为 after_dialog_id / after_id；响应格式同列表接口
+    """
+    after = (after_dialog_id, after_id) if after_dialog_id is not None else None
+    rows = MessageService(db).get_forwarded(source_id, after, limit)
+    return list_response(request, "messages", rows, fmt) or rows
+
+
+@router.get("/dialog/{dialog_id}", response_model=List[Message])
+def list_messages(
+        request: Request,
+        dialog_id: int,
+        after_id: int = 0,
+        limit: int = Query(100, ge=1, le=10000),
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        fmt: Optional[str] = Query(None, alias="format"),
+        db: Session = Depends(get_read_db)
+):
+    """
+    按 message_id 分页列出一个频道的消息（含已归档），下一页用最后一条的 message_id 作为 after_id
+
+    响应格式按 Accept 协商（也可用 format=json|msgpack|arrow 指定）：
+    - application/json（默认）
+    - application/x-msgpack：消息数组
+    - application/vnd.apache.arrow.stream：Arrow IPC stream
+    """
+    rows = MessageService(db).list_by_dialog(dialog_id, after_id, limit, since, until)
+    return list_response(request, "messages", rows, fmt) or list(rows)
+
+
+@router.get("/dialog/{dialog_id}/with-senders", response_model=List[MessageWithSender])
+def list_messages_with_senders(
+        dialog_id: int,
+        after_id: int = 0,
+        limit: int = Query(100, ge=1, le=10000),
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        db: Session = Depends(get_read_db)
+):
+    """与 /dialog/{dialog_id} 相同的分页，每条消息附上 senders 表里的发送者资料（没有时为 null）"""
+    rows = MessageService(db).list_by_dialog(dialog_id, after_id, limit, since, until)
+    return SenderService(db).attach(rows)
+
+
+@router.get("/dialog/{dialog_id}/export")
+def export_messages(
+        request: Request,
+        dialog_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        fmt: Optional[str] = Query(None, alias="format"),
+        max_lag: Optional[float] = Header(None, alias="X-Max-Replica-Lag", ge=0)
+):
+    """
+    流式导出一个频道的消息，已归档的历史消息一并导出
+
+    参数:
+    - since: 只导出此时间及之后的消息(可选，UTC)
+    - until: 只导出此时间之前的消息(可选，UTC)
+    - X-Max-Replica-Lag 请求头: 可接受的只读副本延迟（秒），0 表示读主库
+
+    响应格式按 Accept 协商（也可用 format=ndjson|msgpack|arrow 指定）：
+    - application/x-ndjson（默认）：每行一条
+    - application/x-msgpack：逐条拼接的 map
+    - application/vnd.apache.arrow.stream：Arrow IPC stream
+    """
+    def rows():
+        # 流式响应在请求处理函数返回后才产出，使用独立的 Session
+        with read_session(max_lag) as db:
+            yield from MessageService(db).export_messages(dialog_id, since, until)
+
+    return stream_response(request, "messages", rows(), fmt)
+
+
+@router.post("/bulk", response_model=BulkResult)
+async def bulk_write_messages(request: Request, db: Session = Depends(get_db)):
+    """
+    批量写入消息：请求体为 JSON 数组、NDJSON（Content-Type: application/x-ndjson）
+    或 MessagePack 数组，单次最多 BULK_MAX_ITEMS 条。
+    按 (dialog_id, message_id) upsert，每 BULK_CHUNK_SIZE 条一个事务；返回与请求一一对应的逐条状态
+    （inserted / updated / duplicate / invalid / error）
+    """
+    service = BulkService(db)
+    items = await read_items(request, service.settings.bulk_max_items)
+    return await run_in_threadpool(service.write_messages, items)
+
+
 @router.post("/", response_model=Message)
 def create_message(message_in: MessageCreate, db: Session = Depends(get_db)):
     service = MessageService(db)
@@ -109,18 +329,15 @@ def create_message(message_in: MessageCreate, db: Session = Depends(get_db)):
 
 
 @router.put("/{id}", response_model=Message)
-def update_message(id: int, message_in: MessageUpdate, db: Session = Depends(get_db)):
+def update_message(id: int, message_in: MessageUpdate, dialog_id: Optional[int] = None,
+                   db: Session = Depends(get_db)):
     service = MessageService(db)
-    db_obj = service.get(id)
-    if not db_obj:
-        raise HTTPException(status_code=404, detail="Message not found")
+    db_obj = _get_by_id(service, id, dialog_id, include_archived=False)
     return service.update(db_obj, message_in)
 
 
 @router.delete("/{id}", status_code=204)
-def delete_message(id: int, db: Session = Depends(get_db)):
+def delete_message(id: int, dialog_id: Optional[int] = None, db: Session = Depends(get_db)):
     service = MessageService(db)
-    db_obj = service.get(id)
-    if not db_obj:
-        raise HTTPException(status_code=404, detail="Message not found")
-    service.delete(id)
+    db_obj = _get_by_id(service, id, dialog_id, include_archived=False)
+    service.delete(id, db_obj.dialog_id)
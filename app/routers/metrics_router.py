@@ -0,0 +1,9 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", summary="Prometheus 指标")
+def metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
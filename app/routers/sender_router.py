@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from ..services import SenderService
+from ..schemas import Sender
+from ..database import get_db, get_read_db
+
+router = APIRouter(prefix="/senders", tags=["senders"])
+
+
+@router.post("/resolve/{dialog_id}")
+async def resolve_dialog(dialog_id: int, limit: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    补查一个频道里 senders 表还没有的发送者，按 SENDER_RESOLVE_CHUNK 个一批调用
+    users.getUsers / channels.getChannels；返回 missing / resolved / failed
+    """
+    return await SenderService(db).resolve(dialog_id, limit)
+
+
+@router.post("/resolve")
+async def resolve_all(limit: Optional[int] = None, db: Session = Depends(get_db)):
+    """逐个频道补查缺失的发送者，limit 为每个频道最多补查的个数"""
+    return await SenderService(db).resolve_all(limit)
+
+
+@router.get("/{sender_id}", response_model=Sender)
+def read_sender(sender_id: int, db: Session = Depends(get_read_db)):
+    sender = SenderService(db).get(sender_id)
+    if sender is None:
+        raise HTTPException(status_code=404, detail="Sender not found")
+    return sender
@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from ..services import SubscriptionService
+from ..schemas import SubscriptionRule, SubscriptionRuleCreate, SubscriptionRuleUpdate, ForwardQueueItem
+from ..schemas.subscription_schema import ForwardStatusEnum
+from ..database import get_db, get_read_db
+
+router = APIRouter(prefix="/subscriptions", tags=["subscriptions"])
+
+
+@router.post("/", response_model=SubscriptionRule)
+async def create_rule(rule_in: SubscriptionRuleCreate, db: Session = Depends(get_db)):
+    """
+    新建订阅规则，之后写入的新消息命中即排队转发到 to_chat_id。
+    新来源频道的扫描进度从当前最新的消息开始，历史消息不会转发；
+    需要时用 POST /subscriptions/crawl/{dialog_id}?min_id=0 显式补扫
+
+    参数:
+    - source_dialog_ids: 逗号分隔的来源频道ID，为空表示所有频道
+    - keywords: 逗号分隔的关键词，命中任意一个即可，为空表示不限
+    - media_types / min_duration / max_duration / min_size / max_size: 媒体条件，为空表示不限
+    """
+    service = SubscriptionService(db)
+    try:
+        rule = service.create_rule(rule_in)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await service.seed_cursors(rule.source_dialog_ids)
+    return rule
+
+
+@router.get("/", response_model=List[SubscriptionRule])
+def list_rules(enabled: Optional[bool] = None, db: Session = Depends(get_db)):
+    return SubscriptionService(db).get_rules(enabled)
+
+
+@router.get("/queue", response_model=List[ForwardQueueItem])
+def list_queue(status: Optional[ForwardStatusEnum] = None, rule_id: Optional[int] = None,
+               limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_read_db)):
+    """转发队列，最新的在前"""
+    return SubscriptionService(db).get_queue(status, rule_id, limit)
+
+
+@router.get("/queue/stats")
+def read_queue_stats(db: Session = Depends(get_read_db)):
+    """各状态的队列条数"""
+    return SubscriptionService(db).queue_stats()
+
+
+@router.post("/crawl/{dialog_id}")
+async def crawl_source(dialog_id: int, min_id: Optional[int] = None, limit: Optional[int] = None,
+                       db: Session = Depends(get_db)):
+    """
+    为全部订阅规则扫描一个来源频道（只扫一遍），默认从上次扫描到的位置继续；
+    指定 min_id 时从 min_id 之后扫描，min_id=0 即补扫全部历史消息
+    """
+    return await SubscriptionService(db).crawl(dialog_id, min_id, limit)
+
+
+@router.post("/dispatch")
+async def dispatch_queue(max_batches: Optional[int] = None, db: Session = Depends(get_db)):
+    """立即转发队列里的待转发消息"""
+    return await SubscriptionService(db).dispatch(max_batches)
+
+
+@router.get("/{id}", response_model=SubscriptionRule)
+def read_rule(id: int, db: Session = Depends(get_db)):
+    db_obj = SubscriptionService(db).get_rule(id)
+    if not db_obj:
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return db_obj
+
+
+@router.put("/{id}", response_model=SubscriptionRule)
+async def update_rule(id: int, rule_in: SubscriptionRuleUpdate, db: Session = Depends(get_db)):
+    service = SubscriptionService(db)
+    db_obj = service.get_rule(id)
+    if not db_obj:
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    try:
+        rule = service.update_rule(db_obj, rule_in)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # 新加入的来源频道同样从当前最新的消息开始
+    await service.seed_cursors(rule.source_dialog_ids)
+    return rule
+
+
+@router.delete("/{id}", status_code=204)
+def delete_rule(id: int, db: Session = Depends(get_db)):
+    if not SubscriptionService(db).delete_rule(id):
+        raise HTTPException(status_code=404, detail="Subscription not found")
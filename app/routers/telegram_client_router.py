@@ -2,11 +2,13 @@
 from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Form, HTTPException
+from fastapi import APIRouter, Depends, Form, HTTPException
 from pydantic import BaseModel
 from telethon import TelegramClient
 from telethon.sessions import StringSession
-from ..services import TelegramClientManager
+from sqlalchemy.orm import Session
+from ..services import TelegramClientManager, CatchUpService
+from ..database import get_db
 from telethon.errors import SessionPasswordNeededError
 
 router = APIRouter(prefix="/telegram", tags=["Telegram"])
@@ -143,3 +145,30 @@ async def logout():
             return {"status": "退出登录成功"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Logout failed: {e}")
+
+
+@router.get("/governor", summary="RPC 限速状态")
+async def get_governor_status():
+    """
+    全局 RPC 限速器的状态
+    - budgets: 各方法类别当前速率、上限、剩余令牌、剩余暂停秒数
+    - recent_waits: 最近收到的 FloodWait
+    """
+    return tg_manager.get_governor_status()
+
+
+@router.post("/catch-up", summary="补齐断线期间错过的消息")
+async def catch_up(db: Session = Depends(get_db)):
+    """
+    用保存的更新状态调用 getDifference / getChannelDifference，
+    把错过的消息写入数据库；首次调用只记录当前状态作为起点
+    """
+    try:
+        return await CatchUpService(db).catch_up()
+    except RuntimeError as e:
+        raise HTTPException(400, detail=str(e))
+
+
+@router.get("/update-state", summary="已保存的更新状态")
+def get_update_state(db: Session = Depends(get_db)):
+    return CatchUpService(db).get_state()
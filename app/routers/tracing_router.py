@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Query
+
+from ..tracing import tracer, summarize
+
+router = APIRouter(prefix="/traces", tags=["traces"])
+
+
+@router.get("/summary", summary="最近 N 次抓取的耗时分布")
+def trace_summary(
+        last: int = Query(10, ge=1, description="统计最近多少次"),
+        name: str = Query("crawl", description="crawl 或 forward")
+):
+    """
+    返回最近 N 次抓取/转发的 wall-clock 时间分布：
+    rpc（Telegram 请求）、wait（iter_messages 的 wait_time 休眠）、
+    match（正则匹配）、convert（消息转换）、db（数据库操作）、other
+    """
+    if not tracer.enabled:
+        raise HTTPException(status_code=404, detail="追踪未开启，请设置 TRACING_ENABLED=true")
+    return summarize(tracer.recent(name=name, last=last))
+
+
+@router.get("/{trace_id}", summary="查看单次抓取的 span 树")
+def read_trace(trace_id: str):
+    root = tracer.get(trace_id)
+    if root is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return {"trace_id": root.trace_id, **root.to_dict()}
@@ -1,3 +1,8 @@
 from .dialog_schema import DialogBase, DialogCreate, DialogUpdate, Dialog
-from .message_schema import MessageBase, MessageCreate, MessageUpdate, Message
+from .message_schema import MessageBase, MessageCreate, MessageUpdate, Message, ThreadMessage, MessageThread
 from .media_schema import MediaBase, MediaCreate, MediaUpdate, Media
+from .job_schema import JobCreate, Job, CrawlJobParams, BackfillJobParams, ViewsJobParams
+from .analytics_schema import GranularityEnum, ActivityBucket, KeywordHits, MediaStats, SenderStats
+from .bulk_schema import BulkItemStatusEnum, BulkItemError, BulkResult
+from .subscription_schema import SubscriptionRuleCreate, SubscriptionRuleUpdate, SubscriptionRule, ForwardQueueItem
+from .sender_schema import Sender, MessageWithSender
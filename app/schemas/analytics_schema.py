@@ -0,0 +1,40 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime, date
+from enum import Enum
+
+class GranularityEnum(str, Enum):
+    hour = "hour"
+    day = "day"
+
+class ActivityBucket(BaseModel):
+    bucket: datetime
+    messages: int
+    media_messages: int
+
+    class Config:
+        orm_mode = True
+
+class KeywordHits(BaseModel):
+    keyword: str
+    day: date
+    hits: int
+
+    class Config:
+        orm_mode = True
+
+class MediaStats(BaseModel):
+    media_type: str
+    messages: int
+    total_bytes: int
+
+    class Config:
+        orm_mode = True
+
+class SenderStats(BaseModel):
+    sender_id: int
+    messages: int
+    last_date: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from typing import List
+from enum import Enum
+
+class BulkItemStatusEnum(str, Enum):
+    inserted = "inserted"
+    updated = "updated"
+    # 已存在且内容指纹相同，未写库
+    unchanged = "unchanged"
+    # 同一请求里键重复，以最后一条为准，前面的不写入
+    duplicate = "duplicate"
+    invalid = "invalid"
+    error = "error"
+
+class BulkItemError(BaseModel):
+    index: int
+    error: str
+
+class BulkResult(BaseModel):
+    total: int
+    inserted: int
+    updated: int
+    unchanged: int = 0
+    failed: int
+    seconds: float
+    # 与请求中的条目一一对应
+    statuses: List[BulkItemStatusEnum]
+    errors: List[BulkItemError] = []
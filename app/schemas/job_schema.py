@@ -0,0 +1,57 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, Any
+from datetime import datetime
+from enum import Enum
+
+class JobKindEnum(str, Enum):
+    crawl = "crawl"
+    backfill = "backfill"
+    views = "views"
+
+class JobStatusEnum(str, Enum):
+    pending = "pending"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+class CrawlJobParams(BaseModel):
+    keywords: str
+    limit: Optional[int] = None
+    min_id: Optional[int] = 0
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    parallel: Optional[int] = None
+
+class BackfillJobParams(BaseModel):
+    keywords: Optional[str] = None
+    ranges: Optional[int] = None
+    min_id: int = 0
+    restart: bool = False
+
+class ViewsJobParams(BaseModel):
+    # 为空时使用 VIEWS_DAYS；<= 0 表示刷新全部已存消息
+    days: Optional[float] = None
+
+class JobCreate(BaseModel):
+    dialog_id: int
+    kind: JobKindEnum = JobKindEnum.crawl
+    # crawl 对应 CrawlJobParams，backfill 对应 BackfillJobParams，views 对应 ViewsJobParams
+    params: Dict[str, Any] = {}
+
+class Job(BaseModel):
+    id: int
+    dialog_id: int
+    kind: JobKindEnum
+    params: Optional[str] = None
+    status: JobStatusEnum
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    attempts: int
+    error: Optional[str] = None
+    finished_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        orm_mode = True
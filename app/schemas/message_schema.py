@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 from enum import Enum
 
@@ -32,6 +32,7 @@ class MessageBase(BaseModel):
     media_size: Optional[int] = None
     reply_to_msg_id: Optional[int] = None
     forward_from_id: Optional[int] = None
+    forward_from_msg_id: Optional[int] = None
 
 class MessageCreate(MessageBase):
     pass
@@ -49,3 +50,11 @@ class MessageInDBBase(MessageBase):
 
 class Message(MessageInDBBase):
     pass
+
+class ThreadMessage(Message):
+    thread_depth: int
+
+class MessageThread(BaseModel):
+    dialog_id: int
+    root_id: int
+    messages: List[ThreadMessage]
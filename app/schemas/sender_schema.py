@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+from .message_schema import SenderTypeEnum, Message
+
+class Sender(BaseModel):
+    sender_id: int
+    sender_type: SenderTypeEnum
+    username: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    title: Optional[str] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class MessageWithSender(Message):
+    sender: Optional[Sender] = None
@@ -0,0 +1,53 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+from enum import Enum
+
+class ForwardStatusEnum(str, Enum):
+    pending = "pending"
+    sent = "sent"
+    failed = "failed"
+
+class SubscriptionRuleBase(BaseModel):
+    name: Optional[str] = None
+    # 逗号分隔的来源频道ID，为空表示所有频道
+    source_dialog_ids: Optional[str] = None
+    # 逗号分隔的关键词，不区分大小写，命中任意一个即可；为空表示不限
+    keywords: Optional[str] = None
+    # 逗号分隔的媒体类型，如 "video,document"；为空表示不限（含无媒体的消息）
+    media_types: Optional[str] = None
+    min_duration: Optional[int] = None
+    max_duration: Optional[int] = None
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    to_chat_id: int
+    enabled: bool = True
+
+class SubscriptionRuleCreate(SubscriptionRuleBase):
+    pass
+
+class SubscriptionRuleUpdate(SubscriptionRuleBase):
+    pass
+
+class SubscriptionRule(SubscriptionRuleBase):
+    id: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        orm_mode = True
+
+class ForwardQueueItem(BaseModel):
+    id: int
+    rule_id: int
+    dialog_id: int
+    message_id: int
+    to_chat_id: int
+    status: ForwardStatusEnum
+    attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    sent_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
@@ -1,4 +1,16 @@
 from .dialog_service import DialogService
 from .message_service import MessageService
 from .media_service import MediaService
+from .backfill_service import BackfillService
+from .job_service import JobService
+from .catch_up_service import CatchUpService
+from .view_refresh_service import ViewRefreshService
+from .compression_service import CompressionService
+from .archive_service import ArchiveService
+from .analytics_service import AnalyticsService
+from .bulk_service import BulkService
+from .subscription_service import SubscriptionService
+from .replay_service import ReplayService
+from .shard_service import ShardService
+from .sender_service import SenderService
 from .telegram_client_service import TelegramConfig, TelegramClientManager,TelegramClient
@@ -0,0 +1,67 @@
+# app/services/analytics_service.py
+"""
+频道统计：只读汇总表（rollup_*），不扫描 messages / medias 明细，
+查询耗时只与返回的时间桶数有关，与明细数据量无关。
+"""
+import logging
+import time
+from datetime import datetime, date
+from typing import Optional, List, Dict, Any
+
+from sqlalchemy.orm import Session
+
+from ..models import DialogActivityRollup, KeywordHitRollup, MediaRollup, SenderRollup
+from ..repositories import RollupRepository, RollupAccumulator, MessageRepository, DialogRepository
+from .message_service import compile_keywords
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsService:
+    def __init__(self, db: Session):
+        self.repo = RollupRepository(db)
+        self.message_repo = MessageRepository(db)
+        self.dialog_repo = DialogRepository(db)
+
+    def get_activity(self, dialog_id: int, granularity: str = "day", since: Optional[datetime] = None,
+                     until: Optional[datetime] = None) -> List[DialogActivityRollup]:
+        return self.repo.get_activity(dialog_id, granularity, since, until)
+
+    def get_keyword_hits(self, dialog_id: int, since: Optional[date] = None, until: Optional[date] = None,
+                         keywords: Optional[str] = None) -> List[KeywordHitRollup]:
+        keyword_list = [k.strip() for k in keywords.split(",") if k.strip()] if keywords else None
+        return self.repo.get_keyword_hits(dialog_id, since, until, keyword_list)
+
+    def get_media(self, dialog_id: int) -> List[MediaRollup]:
+        return self.repo.get_media(dialog_id)
+
+    def get_top_senders(self, dialog_id: int, limit: int = 10) -> List[SenderRollup]:
+        return self.repo.get_top_senders(dialog_id, limit)
+
+    def rebuild(self, dialog_id: int, keywords: Optional[str] = None) -> Dict[str, Any]:
+        """
+        从明细重新生成一个频道的汇总（含已归档的消息）。关键词命中按已有汇总里
+        出现过的关键词加上 keywords 重新统计。重建期间该频道最好没有抓取在写入。
+        """
+        start = time.perf_counter()
+        known = set(self.repo.get_keywords(dialog_id))
+        if keywords:
+            known.update(k.strip().lower() for k in keywords.split(",") if k.strip())
+        pattern = compile_keywords(",".join(sorted(known))) if known else None
+
+        acc = RollupAccumulator()
+        messages = 0
+        for row in self.message_repo.iter_by_dialog(dialog_id):
+            acc.add(row["dialog_id"], row["date"], row["sender_id"], row["media_type"], row["media_size"],
+                    row["message"], pattern)
+            messages += 1
+        rows = self.repo.replace(dialog_id, acc)
+        return {"dialog_id": dialog_id, "messages": messages, "rollup_rows": rows,
+                "seconds": round(time.perf_counter() - start, 3)}
+
+    def rebuild_all(self, keywords: Optional[str] = None) -> List[Dict[str, Any]]:
+        reports = []
+        for dialog_id in sorted({d.dialog_id for d in self.dialog_repo.get_all()}):
+            reports.append(self.rebuild(dialog_id, keywords))
+            logger.info("汇总重建完成: %s", reports[-1])
+        return reports
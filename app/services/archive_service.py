@@ -0,0 +1,103 @@
+# app/services/archive_service.py
+"""
+冷数据归档：把早于截止时间的 messages / medias 行按频道、按 message_id
+顺序切成分段写入 Parquet 文件，登记到 archive_segments 清单，再从热表
+分批删除。清单先以 pending 登记、删完才标记 done，中断后再次执行会先
+把 pending 分段的删除做完。归档后的行仍可通过 repository 读取。
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+from sqlalchemy.orm import Session
+
+from ..models import ArchiveSegment, ArchiveStatusEnum
+from ..repositories import ArchiveRepository
+from ..repositories.archive_store import ParquetStore, ArchiveSettings, get_archive_settings
+from ..tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+def _range(rows: List[Dict[str, Any]], name: str):
+    values = [row[name] for row in rows if row[name] is not None]
+    return (min(values), max(values)) if values else (None, None)
+
+
+class ArchiveService:
+    def __init__(self, db: Session, settings: Optional[ArchiveSettings] = None):
+        self.settings = settings or get_archive_settings()
+        self.store = ParquetStore(self.settings)
+        self.repo = ArchiveRepository(db, self.store)
+
+    def get_segments(self, dialog_id: Optional[int] = None) -> List[ArchiveSegment]:
+        return self.repo.get_segments("messages", dialog_id)
+
+    def archive(self, dialog_id: Optional[int] = None, before: Optional[datetime] = None,
+                days: Optional[int] = None) -> Dict[str, Any]:
+        """归档早于 before（默认 ARCHIVE_AFTER_DAYS 天前）的消息；dialog_id 为空时处理所有频道"""
+        cutoff = before or datetime.utcnow() - timedelta(days=days or self.settings.archive_after_days)
+        report = {"cutoff": cutoff, "dialogs": 0, "segments": 0, "messages": 0, "medias": 0, "bytes": 0,
+                  "resumed": self.resume()}
+        start = time.perf_counter()
+        with tracer.trace("archive", dialog_id=dialog_id) as span:
+            dialog_ids = [dialog_id] if dialog_id is not None else self.repo.get_dialogs_before(cutoff)
+            for current in dialog_ids:
+                self._archive_dialog(current, cutoff, report)
+                report["dialogs"] += 1
+            report["seconds"] = round(time.perf_counter() - start, 3)
+            if span is not None:
+                span.attributes.update({k: v for k, v in report.items() if k != "cutoff"})
+        return report
+
+    def resume(self) -> int:
+        """把上次中断时还没删完的分段删完；medias 先于 messages"""
+        pending = sorted(self.repo.get_pending(), key=lambda obj: obj.table_name != "medias")
+        for segment in pending:
+            ids = self.store.read(segment.path, ["message_id"])["message_id"].to_pylist()
+            self.repo.delete_rows(segment.table_name, segment.dialog_id, ids, self.settings.archive_delete_chunk)
+            self.repo.set_status(segment, ArchiveStatusEnum.done)
+        return len(pending)
+
+    def _archive_dialog(self, dialog_id: int, cutoff: datetime, report: Dict[str, Any]) -> None:
+        after_id = 0
+        while True:
+            rows = self.repo.get_old_messages(dialog_id, cutoff, after_id, self.settings.archive_segment_rows)
+            if not rows:
+                return
+            message_ids = [row["message_id"] for row in rows]
+            medias = self.repo.get_medias(dialog_id, message_ids)
+
+            # 文件名带时间戳：同一区间被重新抓回后再次归档不会覆盖旧分段
+            stamp = f"{message_ids[0]}-{message_ids[-1]}-{int(time.time() * 1000)}"
+            segments = [self._write_segment(dialog_id, "medias", f"{dialog_id}/medias-{stamp}.parquet", medias)] \
+                if medias else []
+            segments.append(self._write_segment(dialog_id, "messages", f"{dialog_id}/messages-{stamp}.parquet", rows))
+
+            for segment in segments:
+                # 先删 medias 再删 messages，与外键方向一致
+                self.repo.delete_rows(segment.table_name, dialog_id, message_ids, self.settings.archive_delete_chunk)
+                self.repo.set_status(segment, ArchiveStatusEnum.done)
+                report["bytes"] += segment.file_bytes
+                report["segments"] += 1
+            report["messages"] += len(rows)
+            report["medias"] += len(medias)
+            logger.info("频道 %s 归档 %s 条消息（%s - %s）", dialog_id, len(rows), message_ids[0], message_ids[-1])
+
+            after_id = message_ids[-1]
+            if len(rows) < self.settings.archive_segment_rows:
+                return
+
+    def _write_segment(self, dialog_id: int, table_name: str, path: str,
+                       rows: List[Dict[str, Any]]) -> ArchiveSegment:
+        file_bytes = self.store.write(path, table_name, rows)
+        min_message_id, max_message_id = _range(rows, "message_id")
+        min_pk, max_pk = _range(rows, "id")
+        min_date, max_date = _range(rows, "date") if table_name == "messages" else (None, None)
+        return self.repo.create_segment(
+            dialog_id=dialog_id, table_name=table_name, path=path,
+            min_message_id=min_message_id, max_message_id=max_message_id, min_pk=min_pk, max_pk=max_pk,
+            min_date=min_date, max_date=max_date, row_count=len(rows), file_bytes=file_bytes,
+            status=ArchiveStatusEnum.pending,
+        )
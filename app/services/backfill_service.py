@@ -0,0 +1,183 @@
+# app/services/backfill_service.py
+"""
+大频道历史回填：把 (min_id, top_message_id] 切成 K 个 ID 分片并发抓取。
+
+每个分片有自己的 offset_id 游标，从分片上界往下界逐页拉取；所有分片
+共用一个令牌桶，总请求速率受控。每页写库后立即保存游标，中断后再次
+发起回填只会继续未完成的分片。写入走 MessageService 的抓取写入路径，
+重复写入同一页是幂等的。
+"""
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Tuple
+
+from pydantic_settings import BaseSettings
+from sqlalchemy.orm import Session
+
+from .telegram_client_service import TelegramClientManager
+from .message_service import MessageService, compile_keywords
+from .recorder import recorder
+from .rate_limiter import AsyncTokenBucket
+from .. import metrics
+from ..tracing import tracer
+from ..repositories import BackfillRepository
+from ..models import BackfillRange, BackfillStatusEnum
+
+logger = logging.getLogger(__name__)
+
+manager = TelegramClientManager()
+
+
+class BackfillSettings(BaseSettings):
+    backfill_ranges: int = 8
+    # 所有分片合计的每秒请求数；原顺序抓取为每 2 秒一页
+    backfill_requests_per_second: float = 2.0
+    backfill_burst: int = 4
+    backfill_page_size: int = 100
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+@lru_cache()
+def get_backfill_settings() -> BackfillSettings:
+    return BackfillSettings()
+
+
+def split_ranges(low_id: int, top_id: int, ranges: int, page_size: int) -> List[Tuple[int, int]]:
+    """把 (low_id, top_id] 均分成最多 ranges 段，每段至少一页"""
+    span = top_id - low_id
+    if span <= 0:
+        return []
+    count = max(1, min(ranges, -(-span // page_size)))
+    bounds = [low_id + span * i // count for i in range(count + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(count)]
+
+
+class BackfillService:
+    def __init__(self, db: Session, settings: Optional[BackfillSettings] = None):
+        self.backfill_repo = BackfillRepository(db)
+        self.message_service = MessageService(db)
+        self.settings = settings or get_backfill_settings()
+        self.client = None
+
+    async def _get_client(self):
+        self.client = await manager.get_client()
+        return self.client
+
+    def get_progress(self, dialog_id: int) -> Dict[str, Any]:
+        return self._progress(dialog_id, self.backfill_repo.get_by_dialog(dialog_id))
+
+    async def plan(
+            self,
+            channel_id: int,
+            keywords: Optional[str] = None,
+            ranges: Optional[int] = None,
+            min_id: int = 0,
+            restart: bool = False,
+    ) -> List[BackfillRange]:
+        """
+        有未完成的分片时直接续跑（restart=True 时丢弃旧进度）；
+        否则读取频道最新消息 ID，生成新的分片计划。
+        """
+        if keywords:
+            compile_keywords(keywords)
+        if not restart:
+            unfinished = self.backfill_repo.get_unfinished(channel_id)
+            if unfinished:
+                return unfinished
+
+        if self.client is None:
+            await self._get_client()
+        if not self.client.is_connected():
+            await self.client.connect()
+
+        await self.client.get_dialogs()
+        latest = await self.client.get_messages(channel_id, limit=1)
+        if not latest:
+            return []
+        bounds = split_ranges(min_id or 0, latest[0].id, ranges or self.settings.backfill_ranges,
+                              self.settings.backfill_page_size)
+        return self.backfill_repo.create_plan(channel_id, bounds, keywords or None)
+
+    async def run(self, channel_id: int, plan: List[BackfillRange]) -> Dict[str, Any]:
+        """并发执行分片，返回各分片进度"""
+        if self.client is None:
+            await self._get_client()
+        if not self.client.is_connected():
+            await self.client.connect()
+
+        bucket = AsyncTokenBucket(self.settings.backfill_requests_per_second, self.settings.backfill_burst)
+        with tracer.trace("backfill", dialog_id=channel_id, ranges=len(plan)):
+            try:
+                await asyncio.gather(*(self._run_range(obj, bucket) for obj in plan))
+            finally:
+                recorder.flush(channel_id)
+        return self.get_progress(channel_id)
+
+    async def backfill(self, channel_id: int, **kwargs) -> Dict[str, Any]:
+        return await self.run(channel_id, await self.plan(channel_id, **kwargs))
+
+    async def resume(self, channel_id: int) -> Dict[str, Any]:
+        """只执行未完成的分片"""
+        return await self.run(channel_id, self.backfill_repo.get_unfinished(channel_id))
+
+    async def _run_range(self, obj: BackfillRange, bucket: AsyncTokenBucket) -> None:
+        pattern = compile_keywords(obj.keywords) if obj.keywords else None
+        page_size = self.settings.backfill_page_size
+        self.backfill_repo.set_status(obj, BackfillStatusEnum.running)
+        with tracer.span("range", index=obj.range_index, low_id=obj.low_id, high_id=obj.high_id):
+            try:
+                while obj.cursor_id - 1 > obj.low_id:
+                    await bucket.acquire()
+                    with tracer.span("page", cursor_id=obj.cursor_id):
+                        messages = await self.client.get_messages(
+                            obj.dialog_id,
+                            limit=page_size,
+                            offset_id=obj.cursor_id,
+                            min_id=obj.low_id,
+                        )
+                        # 写库与保存游标之间没有 await，并发分片不会交错使用同一个 Session
+                        matched, result = self.message_service.ingest_messages(messages, pattern)
+                        metrics.record_crawl("backfill", len(messages), matched, result.inserted, result.updated,
+                                             result.unchanged)
+                        if len(messages) < page_size:
+                            cursor_id, status = obj.low_id + 1, BackfillStatusEnum.done
+                        else:
+                            cursor_id, status = min(m.id for m in messages), BackfillStatusEnum.running
+                        self.backfill_repo.save_progress(obj, cursor_id, len(messages), matched, status)
+                if obj.status != BackfillStatusEnum.done:
+                    self.backfill_repo.set_status(obj, BackfillStatusEnum.done)
+            except Exception as e:
+                logger.warning("回填分片 %s/%s 失败: %s", obj.dialog_id, obj.range_index, e)
+                self.backfill_repo.set_status(obj, BackfillStatusEnum.failed, f"{type(e).__name__}: {e}")
+
+    @staticmethod
+    def _progress(dialog_id: int, ranges: List[BackfillRange]) -> Dict[str, Any]:
+        items = []
+        total = fetched = 0
+        for obj in ranges:
+            size = obj.high_id - obj.low_id
+            done = obj.high_id + 1 - obj.cursor_id
+            total += size
+            fetched += done
+            items.append({
+                "range_index": obj.range_index,
+                "low_id": obj.low_id,
+                "high_id": obj.high_id,
+                "cursor_id": obj.cursor_id,
+                "status": obj.status,
+                "scanned": obj.scanned,
+                "matched": obj.matched,
+                "progress": round(done / size, 4) if size else 1.0,
+                "error": obj.error,
+            })
+        return {
+            "dialog_id": dialog_id,
+            "ranges": items,
+            "done": sum(1 for obj in ranges if obj.status == BackfillStatusEnum.done),
+            "progress": round(fetched / total, 4) if total else 1.0,
+        }
@@ -0,0 +1,143 @@
+# app/services/bulk_service.py
+"""
+批量写入：导入工具一次提交一批消息 / 媒体 / 对话，按块走 executemany，
+每块一个事务，返回逐条状态。
+
+逐条用 Pydantic 校验（HTTP 边界），不合法的条目标记 invalid，不影响其它条目；
+同一请求里键重复的以最后一条为准。某一块写库失败时整块回滚，再逐条重试，
+只有真正出错的条目标记 error。写入后不回查，新插入 / 更新 / 未变由写入前的
+一次“已存在”查询（含内容指纹）得出。
+"""
+import time
+from functools import lru_cache
+from typing import List, Any, Callable, Dict, Sequence, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from pydantic_settings import BaseSettings
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..repositories import IngestRepository, DialogRepository, MessageRow, MediaRow
+from ..schemas import MessageCreate, MediaCreate, DialogCreate, BulkItemStatusEnum
+from ..tracing import tracer
+
+
+class BulkSettings(BaseSettings):
+    # 单个请求最多的条目数，超过返回 413
+    bulk_max_items: int = 10000
+    # 每块的行数，一块一个事务
+    bulk_chunk_size: int = 1000
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+@lru_cache()
+def get_bulk_settings() -> BulkSettings:
+    return BulkSettings()
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in err['loc']) or 'item'}: {err['msg']}" for err in e.errors())
+
+
+def _db_message(e: SQLAlchemyError) -> str:
+    return str(getattr(e, "orig", None) or e).splitlines()[0][:300]
+
+
+def _row_statuses(rows: list, new_rows: list, unchanged_rows: list) -> List[BulkItemStatusEnum]:
+    new, unchanged = {id(row) for row in new_rows}, {id(row) for row in unchanged_rows}
+    return [BulkItemStatusEnum.inserted if id(row) in new
+            else BulkItemStatusEnum.unchanged if id(row) in unchanged
+            else BulkItemStatusEnum.updated for row in rows]
+
+
+class BulkService:
+    def __init__(self, db: Session, settings: BulkSettings | None = None):
+        self.settings = settings or get_bulk_settings()
+        self.ingest = IngestRepository(db)
+        self.dialogs = DialogRepository(db)
+
+    def write_messages(self, items: Sequence[Any]) -> Dict[str, Any]:
+        return self._write("messages", items, MessageCreate, lambda obj: (obj.dialog_id, obj.message_id),
+                           self._write_messages)
+
+    def write_medias(self, items: Sequence[Any]) -> Dict[str, Any]:
+        return self._write("medias", items, MediaCreate, lambda obj: (obj.dialog_id, obj.message_id),
+                           self._write_medias)
+
+    def write_dialogs(self, items: Sequence[Any]) -> Dict[str, Any]:
+        return self._write("dialogs", items, DialogCreate, lambda obj: (obj.dialog_id, obj.telegram_type.value),
+                           self._write_dialogs)
+
+    # region 每块的写入，返回每行的状态
+    def _write_messages(self, objs: List[MessageCreate]) -> List[BulkItemStatusEnum]:
+        rows = [MessageRow(**obj.dict()) for obj in objs]
+        result = self.ingest.write_batch(rows, [])
+        return _row_statuses(rows, result.new_messages, result.unchanged_messages)
+
+    def _write_medias(self, objs: List[MediaCreate]) -> List[BulkItemStatusEnum]:
+        rows = [MediaRow(**obj.dict()) for obj in objs]
+        result = self.ingest.write_batch([], rows)
+        return _row_statuses(rows, result.new_medias, result.unchanged_medias)
+
+    def _write_dialogs(self, objs: List[DialogCreate]) -> List[BulkItemStatusEnum]:
+        return [BulkItemStatusEnum.inserted if new else BulkItemStatusEnum.updated
+                for new in self.dialogs.bulk_upsert([obj.dict() for obj in objs])]
+    # endregion
+
+    def _write(self, table: str, items: Sequence[Any], schema: Type[BaseModel], key: Callable[[Any], tuple],
+               write_chunk: Callable[[list], List[BulkItemStatusEnum]]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        statuses: List[BulkItemStatusEnum | None] = [None] * len(items)
+        errors: List[Dict[str, Any]] = []
+
+        latest: Dict[tuple, Tuple[int, BaseModel]] = {}
+        for index, item in enumerate(items):
+            try:
+                obj = schema.model_validate(item)
+            except ValidationError as e:
+                statuses[index] = BulkItemStatusEnum.invalid
+                errors.append({"index": index, "error": _validation_message(e)})
+                continue
+            previous = latest.get(key(obj))
+            if previous is not None:
+                statuses[previous[0]] = BulkItemStatusEnum.duplicate
+            latest[key(obj)] = (index, obj)
+
+        pending = sorted(latest.values(), key=lambda pair: pair[0])
+        chunk_size = self.settings.bulk_chunk_size
+        with tracer.trace("bulk " + table, items=len(items)) as span:
+            for offset in range(0, len(pending), chunk_size):
+                chunk = pending[offset:offset + chunk_size]
+                try:
+                    outcomes = write_chunk([obj for _, obj in chunk])
+                except SQLAlchemyError:
+                    # 整块已回滚，逐条重试找出出错的条目
+                    outcomes = []
+                    for _, obj in chunk:
+                        try:
+                            outcomes.append(write_chunk([obj])[0])
+                        except SQLAlchemyError as e:
+                            outcomes.append(e)
+                for (index, _), outcome in zip(chunk, outcomes):
+                    if isinstance(outcome, Exception):
+                        statuses[index] = BulkItemStatusEnum.error
+                        errors.append({"index": index, "error": _db_message(outcome)})
+                    else:
+                        statuses[index] = outcome
+
+            report = {
+                "total": len(items),
+                "inserted": statuses.count(BulkItemStatusEnum.inserted),
+                "updated": statuses.count(BulkItemStatusEnum.updated),
+                "unchanged": statuses.count(BulkItemStatusEnum.unchanged),
+                "failed": sum(1 for s in statuses if s in (BulkItemStatusEnum.invalid, BulkItemStatusEnum.error)),
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+            if span is not None:
+                span.attributes.update(report)
+        errors.sort(key=lambda item: item["index"])
+        return {**report, "statuses": statuses, "errors": errors}
@@ -0,0 +1,239 @@
+# app/services/catch_up_service.py
+"""
+断线补齐：把账号的 updates.State（pts/qts/date/seq）和各频道 pts 存在数据库里，
+重连后用 updates.getDifference / updates.getChannelDifference 只拉取错过的
+更新，新消息与编辑过的消息走抓取写入路径落库。一次补齐通常只需要
+“1 + 跟踪的频道数”次左右的请求，而不是把每个频道重新扫一遍。
+
+起点之后才加入（或才写进 dialogs 表）的频道，补齐时发现还没有保存 pts 就从对话
+列表取当前 pts 作为它的起点，之后与其它频道一样补齐。对话列表里找不到（已退出）
+或没有 pts 的频道记为占位 pts（UNSEEDED_PTS），之后的补齐不再为它翻对话列表，
+也不做频道补齐；下次因别的新频道翻对话列表或重新 snapshot 时再取它的 pts。
+"""
+import logging
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import chain
+from typing import Optional, Dict, Any, List, Set
+
+from pydantic_settings import BaseSettings
+from sqlalchemy.orm import Session
+from telethon import utils
+from telethon.tl import types
+from telethon.tl.functions.updates import GetStateRequest, GetDifferenceRequest, GetChannelDifferenceRequest
+
+from .telegram_client_service import TelegramClientManager
+from .message_service import MessageService, compile_keywords, INGEST_BATCH_SIZE
+from .recorder import recorder
+from ..repositories import UpdateStateRepository, DialogRepository
+from ..schemas.dialog_schema import TelegramTypeEnum
+from ..tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+manager = TelegramClientManager()
+
+# other_updates 里携带消息的更新类型
+_MESSAGE_UPDATES = (
+    types.UpdateNewMessage,
+    types.UpdateNewChannelMessage,
+    types.UpdateEditMessage,
+    types.UpdateEditChannelMessage,
+)
+
+# 取不到 pts 的频道记的占位值，真实的频道 pts 从 1 开始
+UNSEEDED_PTS = 0
+
+
+class CatchUpSettings(BaseSettings):
+    catchup_account: str = "default"
+    # 为空时补齐的消息全部写入，否则只写入命中关键词的
+    catchup_keywords: str = ""
+    catchup_channel_limit: int = 100
+    # 单次补齐里 getDifference 翻页的上限，防止异常状态下死循环
+    catchup_max_rounds: int = 50
+    # worker 定期补齐并保存状态的间隔
+    catchup_interval_seconds: float = 300
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+@lru_cache()
+def get_catch_up_settings() -> CatchUpSettings:
+    return CatchUpSettings()
+
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+class CatchUpService:
+    def __init__(self, db: Session, settings: Optional[CatchUpSettings] = None):
+        self.state_repo = UpdateStateRepository(db)
+        self.dialog_repo = DialogRepository(db)
+        self.message_service = MessageService(db)
+        self.settings = settings or get_catch_up_settings()
+        self.pattern = compile_keywords(self.settings.catchup_keywords) if self.settings.catchup_keywords else None
+        self.client = None
+
+    async def _get_client(self):
+        self.client = await manager.get_client()
+        return self.client
+
+    def get_state(self) -> Dict[str, Any]:
+        state = self.state_repo.get(self.settings.catchup_account)
+        return {
+            "account": self.settings.catchup_account,
+            "pts": state.pts if state else None,
+            "qts": state.qts if state else None,
+            "date": state.date if state else None,
+            "seq": state.seq if state else None,
+            "channels": {obj.channel_id: None if obj.pts == UNSEEDED_PTS else obj.pts
+                         for obj in self.state_repo.get_channels()},
+        }
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """记录当前状态作为起点：账号状态来自 getState，频道 pts 来自对话列表"""
+        if self.client is None:
+            await self._get_client()
+
+        state = await self.client(GetStateRequest())
+        self.state_repo.save(self.settings.catchup_account, state.pts, state.qts, _naive_utc(state.date), state.seq)
+
+        pts_by_channel = await self._dialog_pts(set(self._channel_dialogs()))
+        if pts_by_channel:
+            self.state_repo.save_channels(pts_by_channel)
+        return {"initialized": True, "channels": len(pts_by_channel)}
+
+    async def _dialog_pts(self, channel_ids: Set[int]) -> Dict[int, int]:
+        """从对话列表取这些频道当前的 pts"""
+        pts_by_channel = {}
+        async for dialog in self.client.iter_dialogs():
+            pts = getattr(getattr(dialog, "dialog", None), "pts", None)
+            if pts is not None and dialog.entity.id in channel_ids:
+                pts_by_channel[dialog.entity.id] = pts
+        return pts_by_channel
+
+    async def _seed_channels(self, report: Dict[str, Any]) -> None:
+        """dialogs 表里还没有保存 pts 的频道，以当前 pts 作为起点"""
+        states = self.state_repo.get_channels()
+        tracked = {obj.channel_id for obj in states}
+        missing = {dialog_id for dialog_id, dialog in self._channel_dialogs().items()
+                   if dialog_id not in tracked and dialog.access_hash is not None}
+        if not missing:
+            return
+        # 反正要翻一遍对话列表，顺带重试之前取不到 pts 的频道
+        unseeded = {obj.channel_id for obj in states if obj.pts == UNSEEDED_PTS}
+        pts_by_channel = await self._dialog_pts(missing | unseeded)
+        # 这次仍取不到的新频道记占位 pts，下次补齐不再因为它翻对话列表
+        self.state_repo.save_channels({**dict.fromkeys(missing - pts_by_channel.keys(), UNSEEDED_PTS),
+                                       **pts_by_channel})
+        report["seeded"] = len(pts_by_channel)
+
+    async def catch_up(self) -> Dict[str, Any]:
+        """从保存的状态补齐错过的更新；没有保存过状态时只记录当前状态"""
+        if self.client is None:
+            await self._get_client()
+
+        state = self.state_repo.get(self.settings.catchup_account)
+        if state is None:
+            return await self.snapshot()
+
+        known = {d.dialog_id for d in self.dialog_repo.get_all()}
+        report = {"initialized": False, "calls": 0, "messages": 0, "matched": 0, "inserted": 0, "updated": 0,
+                  "unchanged": 0, "channels": 0}
+        with tracer.trace("catch_up", account=self.settings.catchup_account) as span:
+            try:
+                await self._account_difference(state, known, report)
+                await self._seed_channels(report)
+                await self._channel_differences(known, report)
+            finally:
+                recorder.flush()
+            if span is not None:
+                span.attributes.update(report)
+        return report
+
+    async def _account_difference(self, state, known: Set[int], report: Dict[str, Any]) -> None:
+        pts, qts, date, seq = state.pts, state.qts, state.date, state.seq
+        for _ in range(self.settings.catchup_max_rounds):
+            diff = await self.client(GetDifferenceRequest(
+                pts=pts, date=date.replace(tzinfo=timezone.utc), qts=qts))
+            report["calls"] += 1
+            if isinstance(diff, types.updates.DifferenceEmpty):
+                date, seq = _naive_utc(diff.date), diff.seq
+                break
+            if isinstance(diff, types.updates.DifferenceTooLong):
+                # 服务端要求从新的 pts 继续；跳过的部分由下面的频道补齐兜底
+                logger.warning("getDifference 差异过大，pts %s -> %s", pts, diff.pts)
+                pts = diff.pts
+                continue
+
+            self._ingest(diff.new_messages, diff.other_updates, diff.users, diff.chats, known, report)
+            new_state = diff.state if isinstance(diff, types.updates.Difference) else diff.intermediate_state
+            pts, qts, date, seq = new_state.pts, new_state.qts, _naive_utc(new_state.date), new_state.seq
+            # 每一页都保存进度，中途断开下次从这里继续
+            self.state_repo.save(self.settings.catchup_account, pts, qts, date, seq)
+            if isinstance(diff, types.updates.Difference):
+                break
+        self.state_repo.save(self.settings.catchup_account, pts, qts, date, seq)
+
+    async def _channel_differences(self, known: Set[int], report: Dict[str, Any]) -> None:
+        channels = self._channel_dialogs()
+        new_pts = {}
+        for channel_state in self.state_repo.get_channels():
+            dialog = channels.get(channel_state.channel_id)
+            if dialog is None or dialog.access_hash is None or channel_state.pts == UNSEEDED_PTS:
+                continue
+            channel = types.InputChannel(dialog.dialog_id, dialog.access_hash)
+            pts = channel_state.pts
+            for _ in range(self.settings.catchup_max_rounds):
+                diff = await self.client(GetChannelDifferenceRequest(
+                    channel=channel, filter=types.ChannelMessagesFilterEmpty(), pts=pts,
+                    limit=self.settings.catchup_channel_limit, force=True))
+                report["calls"] += 1
+                if isinstance(diff, types.updates.ChannelDifferenceEmpty):
+                    pts = diff.pts
+                    break
+                if isinstance(diff, types.updates.ChannelDifferenceTooLong):
+                    # 只返回最新的一批消息，更早的缺口需要按 ID 回填
+                    logger.warning("频道 %s 差异过大，仅补齐最新消息", dialog.dialog_id)
+                    self._ingest(diff.messages, (), diff.users, diff.chats, known, report)
+                    pts = diff.dialog.pts
+                    break
+                self._ingest(diff.new_messages, diff.other_updates, diff.users, diff.chats, known, report)
+                pts = diff.pts
+                if diff.final:
+                    break
+            if pts != channel_state.pts:
+                new_pts[channel_state.channel_id] = pts
+            report["channels"] += 1
+        if new_pts:
+            self.state_repo.save_channels(new_pts)
+
+    def _channel_dialogs(self) -> Dict[int, Any]:
+        return {d.dialog_id: d for d in self.dialog_repo.get_all() if d.telegram_type == TelegramTypeEnum.channel}
+
+    def _ingest(self, new_messages, other_updates, users, chats, known: Set[int], report: Dict[str, Any]) -> None:
+        """把差异里的消息补全实体后按批写入；只写入 dialogs 表里已有的对话"""
+        entities = {utils.get_peer_id(x): x for x in chain(users, chats)}
+        messages: List[types.Message] = []
+        updated_messages = (u.message for u in other_updates if isinstance(u, _MESSAGE_UPDATES))
+        for message in chain(new_messages, updated_messages):
+            if not isinstance(message, types.Message):
+                continue
+            if utils.get_peer_id(message.peer_id, add_mark=False) not in known:
+                continue
+            message._finish_init(self.client, entities, None)
+            messages.append(message)
+
+        report["messages"] += len(messages)
+        for start in range(0, len(messages), INGEST_BATCH_SIZE):
+            matched, result = self.message_service.ingest_messages(
+                messages[start:start + INGEST_BATCH_SIZE], self.pattern)
+            report["matched"] += matched
+            report["inserted"] += result.inserted
+            report["updated"] += result.updated
+            report["unchanged"] += result.unchanged
@@ -0,0 +1,109 @@
+# app/services/compression_service.py
+"""
+消息正文压缩的字典训练与存量迁移。
+
+迁移按主键分批进行，每批一个事务，只处理还没压缩的行，随时中断后
+重新执行即可继续。新写入的消息是否压缩由 MESSAGE_COMPRESSION 控制，
+与迁移无关。
+"""
+import asyncio
+import logging
+import time
+from typing import Optional, Dict, Any, List
+
+from sqlalchemy.orm import Session
+
+from ..models import CompressionDict
+from ..repositories import CompressionRepository, shards
+from ..repositories.text_codec import codec
+from ..tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class CompressionService:
+    def __init__(self, db: Session):
+        self.db = db
+        self.repo = CompressionRepository(db)
+        self.settings = codec.settings
+
+    def get_stats(self, dialog_id: Optional[int] = None) -> Dict[str, Any]:
+        stats = self.repo.storage_stats(dialog_id)
+        stats["dicts"] = len(self.repo.get_dicts())
+        stats["enabled"] = codec.enabled
+        return stats
+
+    def train(self, dialog_id: Optional[int] = None) -> CompressionDict | None:
+        """训练一个频道字典（dialog_id 为空时训练全局字典）；样本不足或训练失败时返回 None"""
+        samples = self.repo.sample_texts(dialog_id, self.settings.message_compression_dict_samples)
+        if dialog_id is not None and len(samples) < self.settings.message_compression_min_samples:
+            logger.info("频道 %s 只有 %s 条样本，使用全局字典", dialog_id, len(samples))
+            return None
+        try:
+            data = codec.train(samples)
+        except Exception as e:
+            logger.warning("训练字典失败（dialog_id=%s，%s 条样本）: %s", dialog_id, len(samples), e)
+            return None
+        obj = self.repo.create_dict(dialog_id, data, len(samples))
+        codec.invalidate()
+        logger.info("字典 %s 训练完成：dialog_id=%s，%s 条样本，%s 字节", obj.id, dialog_id, len(samples), len(data))
+        return obj
+
+    def train_all(self) -> List[CompressionDict]:
+        """先训练全局字典，按频道范围时再逐个频道训练"""
+        trained = [self.train(None)]
+        if self.settings.message_compression_dict_scope == "dialog":
+            trained.extend(self.train(dialog_id) for dialog_id in self.repo.get_dialog_ids())
+        return [obj for obj in trained if obj is not None]
+
+    async def compress_existing(self, dialog_id: Optional[int] = None, batch_size: int = 1000,
+                                pause: float = 0.0) -> Dict[str, Any]:
+        """把明文存储的行压缩；pause 为每批之间让出的秒数，降低对线上库的压力"""
+        return await self._migrate(True, dialog_id, batch_size, pause)
+
+    async def decompress_existing(self, dialog_id: Optional[int] = None, batch_size: int = 1000,
+                                  pause: float = 0.0) -> Dict[str, Any]:
+        """把压缩存储的行还原为明文"""
+        return await self._migrate(False, dialog_id, batch_size, pause)
+
+    async def _migrate(self, compress: bool, dialog_id: Optional[int], batch_size: int,
+                       pause: float) -> Dict[str, Any]:
+        report = {"scanned": 0, "changed": 0, "bytes_before": 0, "bytes_after": 0}
+        start = time.perf_counter()
+        # 主键只在分片内有序，分片时逐个分片各走一遍主键游标
+        targets = [shards.index_of(self.db, dialog_id)] if dialog_id is not None else shards.indexes()
+        with tracer.trace("compress_messages" if compress else "decompress_messages", dialog_id=dialog_id) as span:
+            for shard in targets:
+                after_id = 0
+                while True:
+                    # 明文行压缩后会离开结果集，但仍用主键游标推进，跳过保持明文的短文本
+                    rows = self.repo.get_batch(not compress, dialog_id, after_id, batch_size, shard)
+                    if not rows:
+                        break
+                    after_id = rows[-1][0]
+                    report["scanned"] += len(rows)
+                    params = []
+                    for id, row_dialog_id, plain, blob, dict_id in rows:
+                        if compress:
+                            new_dict_id = codec.dict_id_for(self.db, row_dialog_id)
+                            new_plain, new_blob = codec.compress(self.db, plain, new_dict_id)
+                            if new_blob is None:
+                                continue
+                            report["bytes_before"] += len(plain.encode("utf-8"))
+                            report["bytes_after"] += len(new_blob)
+                        else:
+                            new_plain, new_blob, new_dict_id = codec.decode(self.db, plain, blob, dict_id), None, None
+                            report["bytes_before"] += len(blob)
+                            report["bytes_after"] += len(new_plain.encode("utf-8"))
+                        params.append({"b_id": id, "message": new_plain, "message_zstd": new_blob,
+                                       "message_dict_id": new_dict_id if new_blob is not None else None})
+                    report["changed"] += self.repo.set_texts(params, shard)
+                    if len(rows) < batch_size:
+                        break
+                    if pause:
+                        await asyncio.sleep(pause)
+            report["seconds"] = round(time.perf_counter() - start, 3)
+            report["rows_per_second"] = round(report["scanned"] / report["seconds"], 1) if report["seconds"] else 0.0
+            if span is not None:
+                span.attributes.update(report)
+        return report
@@ -1,18 +1,49 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional, List, Dict, Tuple
 
+from pydantic_settings import BaseSettings
 from sqlalchemy.orm import Session
-from ..repositories import DialogRepository
+from ..repositories import DialogRepository, SyncMarkerRepository
 from ..schemas import DialogCreate, DialogUpdate
 from ..models import Dialog
 from ..schemas.dialog_schema import TelegramTypeEnum
+from ..tracing import tracer
 from .telegram_client_service import TelegramClientManager
 
 manager = TelegramClientManager()
 
+DIALOG_SYNC = "dialogs"
+
+
+class DialogSettings(BaseSettings):
+    # 数据超过这个秒数就在后台刷新，本次请求仍直接返回数据库里的数据
+    dialog_max_age_seconds: float = 300
+    # 增量刷新只看最近有新消息的对话，其他对话的未读数靠定期全量刷新兜底
+    dialog_full_refresh_seconds: float = 3600
+    # 增量刷新的截止时间往前多留一点，避免时钟误差漏掉对话
+    dialog_refresh_margin_seconds: float = 60
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+@lru_cache()
+def get_dialog_settings() -> DialogSettings:
+    return DialogSettings()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 
 class DialogService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, settings: Optional[DialogSettings] = None):
         self.repo = DialogRepository(db)
+        self.marker_repo = SyncMarkerRepository(db)
+        self.settings = settings or get_dialog_settings()
         self.client = None
 
     async def _get_client(self):
@@ -20,49 +51,95 @@ class DialogService:
         return self.client
 
     async def get_all_dialogs(self):
+        """全量同步后返回全部对话"""
+        await self.refresh(full=True)
+        return self.repo.get_all()
+
+    def get_cached(self) -> Tuple[List[Dialog], Optional[datetime]]:
+        """直接返回数据库中的对话以及最近一次同步时间（UTC），不访问 Telegram"""
+        marker = self.marker_repo.get(DIALOG_SYNC)
+        return self.repo.get_all(), marker.synced_at if marker else None
+
+    def is_stale(self, synced_at: Optional[datetime]) -> bool:
+        return synced_at is None or self.age_seconds(synced_at) > self.settings.dialog_max_age_seconds
+
+    @staticmethod
+    def age_seconds(synced_at: datetime) -> float:
+        return max((_utcnow() - synced_at).total_seconds(), 0.0)
+
+    async def refresh(self, full: bool = False) -> Dict[str, int]:
+        """
+        从 Telegram 同步对话列表。增量模式下按最新消息时间从新到旧遍历，
+        遇到上次同步之前就没有新消息的（非置顶）对话即停止，后面的页不再请求；
+        只写入最新消息或未读数有变化的对话。
+        """
         if self.client is None:
             await self._get_client()
 
-        dialogs = await self.client.get_dialogs()
-
-        for dialog in dialogs:
-            entity = dialog.entity
-            if not hasattr(entity, "id") or not hasattr(entity, "__class__"):
-                continue
-
-            # 识别对话类型
-            if entity.__class__.__name__ == "User":
-                telegram_type = TelegramTypeEnum.user
-            elif entity.__class__.__name__ == "Chat":
-                telegram_type = TelegramTypeEnum.chat
-            elif entity.__class__.__name__ == "Channel":
-                telegram_type = TelegramTypeEnum.channel
-            else:
-                continue  # 跳过未知类型
-
-            # 构造 DialogCreate
-            dialog_create = DialogCreate(
-                dialog_id=entity.id,
-                telegram_type=telegram_type,
-                access_hash=getattr(entity, "access_hash", None),
-                title=getattr(entity, "title", None) or getattr(entity, "first_name", None),
-                username=getattr(entity, "username", None),
-                verified=getattr(entity, "verified", False),
-                bot=getattr(entity, "bot", False),
-                participants_count=getattr(entity, "participants_count", None),
-                last_message_id=dialog.message.id if dialog.message else None,
-                last_activity=datetime.fromtimestamp(dialog.message.date.timestamp()) if dialog.message else None,
-                unread_count=dialog.unread_count or 0,
-            )
-
-            # 查找是否已有，决定 create or update
-            existing = self.repo.get_by_dialog_id_and_type(entity.id, telegram_type)
-            if existing:
-                self.repo.update(existing, dialog_create)
-            else:
-                self.repo.create(dialog_create)
-
-        return self.repo.get_all()
+        started = _utcnow()
+        marker = self.marker_repo.get(DIALOG_SYNC)
+        if not full:
+            full = (marker is None or marker.synced_at is None or marker.full_synced_at is None
+                    or (started - marker.full_synced_at).total_seconds() > self.settings.dialog_full_refresh_seconds)
+        cutoff = None
+        if not full:
+            cutoff = marker.synced_at - timedelta(seconds=self.settings.dialog_refresh_margin_seconds)
+
+        existing = {(d.dialog_id, d.telegram_type): d for d in self.repo.get_all()}
+        pending = []
+        scanned = 0
+        with tracer.trace("dialogs", full=full) as span:
+            async for dialog in self.client.iter_dialogs():
+                if cutoff is not None and not getattr(dialog, "pinned", False) and dialog.date is not None \
+                        and dialog.date.astimezone(timezone.utc).replace(tzinfo=None) < cutoff:
+                    break
+                scanned += 1
+                dialog_create = self._to_create(dialog)
+                if dialog_create is None:
+                    continue
+                db_obj = existing.get((dialog_create.dialog_id, dialog_create.telegram_type))
+                if not full and db_obj is not None \
+                        and db_obj.last_message_id == dialog_create.last_message_id \
+                        and db_obj.unread_count == dialog_create.unread_count:
+                    continue
+                pending.append((db_obj, dialog_create))
+
+            if pending:
+                self.repo.upsert_many(pending)
+            self.marker_repo.touch(DIALOG_SYNC, started, full=full)
+            if span is not None:
+                span.attributes.update(scanned=scanned, changed=len(pending))
+        return {"full": int(full), "scanned": scanned, "changed": len(pending)}
+
+    @staticmethod
+    def _to_create(dialog) -> Optional[DialogCreate]:
+        entity = dialog.entity
+        if not hasattr(entity, "id") or not hasattr(entity, "__class__"):
+            return None
+
+        # 识别对话类型
+        if entity.__class__.__name__ == "User":
+            telegram_type = TelegramTypeEnum.user
+        elif entity.__class__.__name__ == "Chat":
+            telegram_type = TelegramTypeEnum.chat
+        elif entity.__class__.__name__ == "Channel":
+            telegram_type = TelegramTypeEnum.channel
+        else:
+            return None  # 跳过未知类型
+
+        return DialogCreate(
+            dialog_id=entity.id,
+            telegram_type=telegram_type,
+            access_hash=getattr(entity, "access_hash", None),
+            title=getattr(entity, "title", None) or getattr(entity, "first_name", None),
+            username=getattr(entity, "username", None),
+            verified=getattr(entity, "verified", False),
+            bot=getattr(entity, "bot", False),
+            participants_count=getattr(entity, "participants_count", None),
+            last_message_id=dialog.message.id if dialog.message else None,
+            last_activity=datetime.fromtimestamp(dialog.message.date.timestamp()) if dialog.message else None,
+            unread_count=dialog.unread_count or 0,
+        )
 
     def get(self, dialog_id: int, telegram_type: str) -> Dialog | None:
         return self.repo.get_by_dialog_id_and_type(dialog_id, telegram_type)
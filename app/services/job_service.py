@@ -0,0 +1,52 @@
+import json
+from typing import Optional, List, Dict, Any
+
+from sqlalchemy.orm import Session
+
+from .message_service import MessageService
+from .backfill_service import BackfillService
+from .view_refresh_service import ViewRefreshService
+from ..repositories import JobRepository
+from ..models import CrawlJob, JobKindEnum, JobStatusEnum
+from ..schemas import JobCreate, CrawlJobParams, BackfillJobParams, ViewsJobParams
+
+_PARAMS = {
+    JobKindEnum.crawl: CrawlJobParams,
+    JobKindEnum.backfill: BackfillJobParams,
+    JobKindEnum.views: ViewsJobParams,
+}
+
+
+class JobService:
+    def __init__(self, db: Session):
+        self.db = db
+        self.repo = JobRepository(db)
+
+    def enqueue(self, obj_in: JobCreate) -> CrawlJob:
+        params = self.parse_params(obj_in.kind, obj_in.params)
+        return self.repo.create(obj_in.dialog_id, JobKindEnum(obj_in.kind.value), params)
+
+    def get(self, id: int) -> CrawlJob | None:
+        return self.repo.get_by_id(id)
+
+    def get_list(self, status: Optional[JobStatusEnum] = None, dialog_id: Optional[int] = None,
+                 limit: int = 100) -> List[CrawlJob]:
+        return self.repo.get_list(status, dialog_id, limit)
+
+    @staticmethod
+    def parse_params(kind, params: Dict[str, Any]) -> Dict[str, Any]:
+        """按任务类型校验参数，非法时抛 ValueError"""
+        try:
+            return _PARAMS[JobKindEnum(kind)](**params).dict(exclude_none=True)
+        except Exception as e:
+            raise ValueError(f"任务参数不合法: {e}")
+
+    async def execute(self, job: CrawlJob) -> None:
+        """在当前进程里执行一个已认领的任务"""
+        params = self.parse_params(job.kind, json.loads(job.params or "{}"))
+        if job.kind == JobKindEnum.crawl:
+            await MessageService(self.db).fetch_messages_by_keywords(channel_id=job.dialog_id, **params)
+        elif job.kind == JobKindEnum.views:
+            await ViewRefreshService(self.db).refresh(job.dialog_id, **params)
+        else:
+            await BackfillService(self.db).backfill(job.dialog_id, **params)
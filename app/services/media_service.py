@@ -1,4 +1,5 @@
-from typing import List, AsyncGenerator
+from itertools import islice
+from typing import List, AsyncGenerator, Iterator, Dict, Any, Optional
 
 from sqlalchemy.orm import Session
 import re
@@ -14,8 +15,19 @@ class MediaService:
     def __init__(self, db: Session):
         self.repo = MediaRepository(db)
 
-    def get(self, id: int) -> Media | None:
-        return self.repo.get_by_id(id)
+    def get(self, id: int, include_archived: bool = True, dialog_id: Optional[int] = None) -> Media | None:
+        return self.repo.get_by_id(id, include_archived, dialog_id)
+
+    def get_by_dialog_and_msg_id(self, dialog_id: int, message_id: int) -> Media | None:
+        return self.repo.get_by_dialog_and_message_id(dialog_id, message_id)
+
+    def list_by_dialog(self, dialog_id: int, after_id: int = 0, limit: int = 100) -> Iterator[Dict[str, Any]]:
+        """按 message_id 分页读取一个频道的媒体（含已归档），返回行 dict"""
+        return islice(self.repo.iter_by_dialog(dialog_id, after_id, batch_size=min(limit, 1000)), limit)
+
+    def export_medias(self, dialog_id: int) -> Iterator[Dict[str, Any]]:
+        """导出一个频道的媒体，已归档的部分从归档分段读取"""
+        return self.repo.iter_by_dialog(dialog_id)
 
     def create(self, obj_in: MediaCreate) -> Media:
         return self.repo.create(obj_in)
@@ -23,5 +35,5 @@ class MediaService:
     def update(self, db_obj: Media, obj_in: MediaUpdate) -> Media:
         return self.repo.update(db_obj, obj_in)
 
-    def delete(self, id: int) -> None:
-        self.repo.delete(id)
+    def delete(self, id: int, dialog_id: Optional[int] = None) -> None:
+        self.repo.delete(id, dialog_id)
@@ -0,0 +1,195 @@
+# app/services/message_converter.py
+"""
+Telethon 消息 -> 存储行（MessageRow / MediaRow）的单遍转换器。
+
+按具体的 Telethon 类（``type(obj)``）查表分派，文档属性只遍历一次，
+一次调用同时得到 messages 行与 medias 行。结果与 MessageService 中
+``_determine_media_type`` / ``_get_sender_id`` / ``_determine_sender_type`` /
+``_get_forward_from_id`` / ``_get_forward_from_msg_id`` / ``_get_media_size`` / ``_create_media_from_message``
+逐字段一致（见 tests/test_message_converter.py）。
+"""
+from operator import attrgetter
+from typing import Iterable, List, Optional, Tuple
+
+from telethon.tl import types
+
+from ..repositories.rows import MessageRow, MediaRow, SenderRow
+from ..schemas.message_schema import SenderTypeEnum, MediaTypeEnum
+
+# region 查找表
+_PEER_ID = {
+    types.PeerChannel: attrgetter("channel_id"),
+    types.PeerUser: attrgetter("user_id"),
+    types.PeerChat: attrgetter("chat_id"),
+}
+
+# 有 sender 实体时按实体类判断；User 需要再看 bot 标记
+_ENTITY_SENDER_TYPE = {
+    types.Channel: SenderTypeEnum.channel,
+    types.ChannelForbidden: SenderTypeEnum.channel,
+}
+
+# 没有 sender 实体时退回 from_id 的 Peer 类型
+_PEER_SENDER_TYPE = {
+    types.PeerUser: SenderTypeEnum.user,
+    types.PeerChannel: SenderTypeEnum.channel,
+}
+
+# 文档属性 -> 媒体类型；第一个命中的属性决定类型，音频还要区分语音
+_DOC_ATTRIBUTE_TYPE = {
+    types.DocumentAttributeVideo: MediaTypeEnum.video,
+    types.DocumentAttributeAudio: MediaTypeEnum.audio,
+    types.DocumentAttributeSticker: MediaTypeEnum.sticker,
+    types.DocumentAttributeAnimated: MediaTypeEnum.gif,
+}
+
+_TIMED_MEDIA = (MediaTypeEnum.video, MediaTypeEnum.audio, MediaTypeEnum.voice)
+# endregion
+
+
+def _photo(media, message_id: int, dialog_id: int) -> Tuple[MediaRow, Optional[int]]:
+    row = MediaRow(message_id, dialog_id, MediaTypeEnum.photo)
+    # MessageMediaInvoice 的 photo 是 WebDocument，没有 sizes
+    largest = None
+    largest_size = 0
+    for size in getattr(media.photo, "sizes", None) or ():
+        value = getattr(size, "size", 0)
+        if largest is None or value > largest_size:
+            largest, largest_size = size, value
+    if largest is not None:
+        row.thumb_width = getattr(largest, "w", None)
+        row.thumb_height = getattr(largest, "h", None)
+    # Photo 本身没有 size 字段，messages.media_size 为空
+    return row, None
+
+
+def _document(media, message_id: int, dialog_id: int) -> Tuple[MediaRow, Optional[int]]:
+    doc = media.document
+    if type(doc) is not types.Document:
+        return MediaRow(message_id, dialog_id, MediaTypeEnum.document), None
+
+    media_type = None
+    duration = None
+    file_name = None
+    for attr in doc.attributes:
+        cls = type(attr)
+        if media_type is None:
+            media_type = _DOC_ATTRIBUTE_TYPE.get(cls)
+            if media_type is MediaTypeEnum.audio and attr.voice:
+                media_type = MediaTypeEnum.voice
+        if duration is None and (cls is types.DocumentAttributeVideo or cls is types.DocumentAttributeAudio):
+            duration = attr.duration
+        elif cls is types.DocumentAttributeFilename:
+            file_name = attr.file_name
+
+    if media_type is None:
+        row = MediaRow(message_id, dialog_id, MediaTypeEnum.document, mime_type=doc.mime_type,
+                       file_name=file_name, file_reference=doc.file_reference, size=doc.size)
+    else:
+        row = MediaRow(message_id, dialog_id, media_type)
+        if media_type in _TIMED_MEDIA and duration is not None:
+            row.duration = round(duration)
+    return row, doc.size
+
+
+def _webpage(media, message_id: int, dialog_id: int) -> Tuple[MediaRow, Optional[int]]:
+    page = media.webpage
+    size = None
+    if type(page) is types.WebPage and type(page.photo) is not types.Photo \
+            and type(page.document) is types.Document:
+        size = page.document.size
+    return MediaRow(message_id, dialog_id, MediaTypeEnum.webpage), size
+
+
+def _poll(media, message_id: int, dialog_id: int) -> Tuple[MediaRow, Optional[int]]:
+    return MediaRow(message_id, dialog_id, MediaTypeEnum.poll), None
+
+
+_MEDIA_HANDLERS = {
+    types.MessageMediaPhoto: _photo,
+    types.MessageMediaInvoice: _photo,
+    types.MessageMediaDocument: _document,
+    types.MessageMediaWebPage: _webpage,
+    types.MessageMediaPoll: _poll,
+}
+
+
+def convert_message(message) -> Tuple[MessageRow, Optional[MediaRow]]:
+    """
+    把一条 Telethon 消息转换为 (messages 行, medias 行)。
+    不支持的媒体（地理位置、联系人、骰子等）不生成 medias 行。
+    """
+    peer = message.peer_id
+    dialog_id = _PEER_ID[type(peer)](peer)
+
+    sender = message.sender
+    from_id = message.from_id
+    if sender:
+        sender_id = sender.id
+        sender_type = _ENTITY_SENDER_TYPE.get(type(sender))
+        if sender_type is None:
+            sender_type = SenderTypeEnum.bot if getattr(sender, "bot", False) else SenderTypeEnum.user
+    else:
+        sender_id = from_id.user_id if type(from_id) is types.PeerUser else None
+        sender_type = _PEER_SENDER_TYPE.get(type(from_id), SenderTypeEnum.anonymous)
+
+    forward_from_id = None
+    forward_from_msg_id = None
+    fwd = message.fwd_from
+    if fwd is not None:
+        # 隐藏来源的转发只有 from_name，没有 from_id
+        if fwd.from_id is not None:
+            forward_from_id = _PEER_ID[type(fwd.from_id)](fwd.from_id)
+        forward_from_msg_id = fwd.channel_post
+
+    media_row = None
+    media_type = None
+    media_size = None
+    handler = _MEDIA_HANDLERS.get(type(message.media))
+    if handler is not None:
+        media_row, media_size = handler(message.media, message.id, dialog_id)
+        media_type = media_row.media_type
+
+    message_row = MessageRow(
+        message.id,
+        dialog_id,
+        sender_id,
+        sender_type,
+        message.date,
+        message.text,
+        message.views,
+        media_type,
+        media_size,
+        getattr(message.reply_to, "reply_to_msg_id", None),
+        forward_from_id,
+        forward_from_msg_id,
+    )
+    return message_row, media_row
+
+
+def convert_senders(entities: Iterable) -> List[SenderRow]:
+    return [row for row in map(convert_sender, entities) if row is not None]
+
+
+def convert_sender(entity) -> Optional[SenderRow]:
+    """
+    消息的 sender 实体（历史页随消息一起返回的 users / chats）-> senders 行。
+    UserEmpty 等没有资料的实体返回 None。
+    """
+    kind = type(entity)
+    if kind is types.User:
+        username = entity.username
+        if username is None and entity.usernames:
+            username = entity.usernames[0].username
+        # min 实体的 access_hash 只能配合来源消息使用，不保存
+        return SenderRow(entity.id, SenderTypeEnum.bot if entity.bot else SenderTypeEnum.user,
+                         None if entity.min else entity.access_hash, username, entity.first_name, entity.last_name)
+    if kind is types.Channel:
+        username = entity.username
+        if username is None and entity.usernames:
+            username = entity.usernames[0].username
+        return SenderRow(entity.id, SenderTypeEnum.channel, None if entity.min else entity.access_hash, username,
+                         title=entity.title)
+    if kind is types.ChannelForbidden:
+        return SenderRow(entity.id, SenderTypeEnum.channel, entity.access_hash, title=entity.title)
+    return None
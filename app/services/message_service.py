@@ -1,58 +1,153 @@
-from typing import Optional, List, Union
+from itertools import islice
+from typing import Optional, List, Union, Tuple, Iterator, Dict, Any
 
 from sqlalchemy.orm import Session
+import asyncio
+import logging
 import re
+import time
+from datetime import datetime, timezone
 
-from telethon.tl.types import InputPeerChannel, InputPeerUser, PeerUser, PeerChannel
+from telethon import utils
+from telethon.tl.types import InputPeerChannel, InputPeerUser, PeerUser, PeerChannel, Channel, ChannelForbidden
 
 from .telegram_client_service import TelegramClientManager
-from ..repositories import MessageRepository, MediaRepository
+from .message_converter import convert_message, convert_senders
+from .recorder import recorder
+from .. import metrics
+from ..tracing import tracer, timed, trace_pages
+from ..repositories import (MessageRepository, MediaRepository, IngestRepository, ThreadRepository, SenderRepository,
+                             BatchResult, MessageRow, MediaRow)
+from ..repositories.sender_repository import get_sender_settings
 from ..schemas import MessageCreate, MessageUpdate, MediaCreate, Media
 from ..models import Message
 from ..schemas.message_schema import SenderTypeEnum, MediaTypeEnum
 
+logger = logging.getLogger(__name__)
+
 manager = TelegramClientManager()
 
+# 抓取时每攒够这么多条命中消息写一次库
+INGEST_BATCH_SIZE = 500
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+_CRAWL_COUNTS = ("scanned", "matched", "inserted", "updated", "unchanged")
+
+
+def _add_counts(counts: List[int], result: BatchResult) -> None:
+    counts[2] += result.inserted
+    counts[3] += result.updated
+    counts[4] += result.unchanged
+
+
+def split_windows(since: datetime, until: datetime, parts: int) -> List[Tuple[datetime, datetime]]:
+    """把 [since, until) 等分成 parts 个子窗口"""
+    step = (until - since) / parts
+    bounds = [since + step * i for i in range(parts)] + [until]
+    return [(bounds[i], bounds[i + 1]) for i in range(parts)]
+
+
+def compile_keywords(keywords: str) -> re.Pattern:
+    """把逗号分隔的关键词编译成一个不区分大小写的正则"""
+    keyword_list = [k.strip() for k in keywords.split(",") if k.strip()]
+    if not keyword_list:
+        raise ValueError("至少需要提供一个有效关键词")
+    return re.compile('|'.join(map(re.escape, keyword_list)), re.IGNORECASE)
+
+
+def write_senders(repo: SenderRepository, senders: Dict[int, Any]) -> None:
+    """把一批发送者实体写入 senders 表；失败只记日志，发送者资料不能拖累消息写入"""
+    try:
+        repo.upsert(convert_senders(senders.values()))
+    except Exception:
+        logger.exception("写入 %s 个发送者资料失败", len(senders))
+
 
 class MessageService:
     def __init__(self, db: Session):
         self.message_repo = MessageRepository(db)
         self.media_repo = MediaRepository(db)
+        self.ingest_repo = IngestRepository(db)
+        self.thread_repo = ThreadRepository(db)
+        self.sender_repo = SenderRepository(db)
         self.client = None
 
     async def _get_client(self):
         self.client = await manager.get_client()
         return self.client
 
-    def get(self, id: int) -> Message | None:
-        return self.message_repo.get_by_id(id)
+    def get(self, id: int, include_archived: bool = True, dialog_id: Optional[int] = None) -> Message | None:
+        return self.message_repo.get_by_id(id, include_archived, dialog_id)
 
     def get_by_dialog_and_msg_id(self, dialog_id: int, message_id: int) -> Message | None:
         return self.message_repo.get_by_dialog_and_message_id(dialog_id, message_id)
 
+    def export_messages(self, dialog_id: int, since: Optional[datetime] = None,
+                        until: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """导出一个频道的消息，已归档的部分从归档分段读取"""
+        return self.message_repo.iter_by_dialog(dialog_id, since, until)
+
+    def list_by_dialog(self, dialog_id: int, after_id: int = 0, limit: int = 100, since: Optional[datetime] = None,
+                       until: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """按 message_id 分页读取一个频道的消息（含已归档），返回行 dict"""
+        rows = self.message_repo.iter_by_dialog(dialog_id, since, until, batch_size=min(limit, 1000),
+                                                after_id=after_id)
+        return islice(rows, limit)
+
+    def get_thread(self, dialog_id: int, message_id: int, max_depth: Optional[int] = None,
+                   limit: int = 10000) -> Optional[Tuple[Optional[int], List[Dict[str, Any]]]]:
+        """
+        消息所在的整棵回复树，返回 (根消息ID, 行 dict 列表)；消息不在热表里时返回 None，
+        还没建回复树索引时根消息ID 为 None。已归档的消息不在回复树里。
+        """
+        found = self.thread_repo.get_thread_root(dialog_id, message_id)
+        if found is None:
+            return None
+        root_id = found[0]
+        if root_id is None:
+            return None, []
+        return root_id, self.thread_repo.get_thread(dialog_id, root_id, max_depth, limit)
+
+    def get_forwarded(self, source_id: int, after: Optional[Tuple[int, int]] = None,
+                      limit: int = 100) -> List[Dict[str, Any]]:
+        """各频道里转发自 source_id 的消息，按 (dialog_id, message_id) 分页"""
+        return self.thread_repo.get_forwarded(source_id, after, limit)
+
     def create(self, obj_in: MessageCreate) -> Message:
         return self.message_repo.create(obj_in)
 
     def update(self, db_obj: Message, obj_in: MessageUpdate) -> Message:
         return self.message_repo.update(db_obj, obj_in)
 
-    def delete(self, id: int) -> None:
-        self.message_repo.delete(id)
+    def delete(self, id: int, dialog_id: Optional[int] = None) -> None:
+        self.message_repo.delete(id, dialog_id)
 
     async def fetch_messages_by_keywords(
             self,
             channel_id: int,
             keywords: str,
             limit: Optional[int] = None,
-            min_id: Optional[int] = 0
-    ) -> bool:
+            min_id: Optional[int] = 0,
+            since: Optional[datetime] = None,
+            until: Optional[datetime] = None,
+            parallel: Optional[int] = None,
+    ) -> Dict[str, int]:
         """
         获取并保存匹配关键词的消息
         :param channel_id: 频道ID或用户名
         :param keywords: 关键词字符串，用逗号分隔
         :param limit: 消息数量限制
         :param min_id: 最小消息ID
-        :return: 保存到数据库的消息列表
+        :param since: 只抓取此时间及之后的消息，遇到更早的消息即停止
+        :param until: 只抓取此时间之前的消息，用 offset_date 直接跳到窗口末尾
+        :param parallel: 把 [since, until) 切成多少个子窗口并发抓取（需指定 since，且不能与 limit 同用）
+        :return: 本次抓取的计数：scanned / matched / inserted / updated / unchanged（内容未变、跳过写入）
         """
         if self.client is None:
             await self._get_client()
@@ -60,60 +155,150 @@ class MessageService:
         if not self.client.is_connected():
             await self.client.connect()
 
-            # 处理关键词
-        keyword_list = [k.strip() for k in keywords.split(",") if k.strip()]
-        if not keyword_list:
-            raise ValueError("至少需要提供一个有效关键词")
-
-        # 构建关键词正则表达式
-        pattern = re.compile('|'.join(map(re.escape, keywords)), re.IGNORECASE)
-        await self.client.get_dialogs()
-        async for message in self.client.iter_messages(
-                entity=channel_id,
-                limit=limit,
-                min_id=min_id,
-                wait_time=2,
-                #reverse=True
-        ):
-            if not message.text:
-                continue
-            if pattern.search(message.text):
-                # 构造 MessageCreate 对象
-                message_create = MessageCreate(
-                    message_id=message.id,
-                    dialog_id=message.chat.id,
-                    sender_id=self._get_sender_id(message),  # 使用新方法
-                    sender_type=self._determine_sender_type(message),
-                    date=message.date,
-                    message=message.text,
-                    views=getattr(message, 'views', None),
-                    media_type=self._determine_media_type(message),
-                    media_size=self._get_media_size(message),
-                    reply_to_msg_id=getattr(message.reply_to, 'reply_to_msg_id', None),
-                    forward_from_id=self._get_forward_from_id(message)
-                )
-
-                # 查找是否已有，决定 create or update
-                existing = self.message_repo.get_by_dialog_and_message_id(
-                    dialog_id=message.chat.id,
-                    message_id=message.id
-                )
-                if existing:
-                    self.message_repo.update(existing, message_create)
+        # 处理关键词，构建关键词正则表达式
+        pattern = compile_keywords(keywords)
+
+        # 不带时区的时间按 UTC 处理，与 Telethon 的 message.date 一致
+        since, until = _as_utc(since), _as_utc(until)
+        if since is not None and until is not None and since >= until:
+            raise ValueError("since 必须早于 until")
+        windows = [(since, until)]
+        if parallel and parallel > 1:
+            if since is None or limit is not None:
+                raise ValueError("并行子窗口需要指定 since，且不能同时指定 limit")
+            windows = split_windows(since, until or datetime.now(timezone.utc), parallel)
+
+        with tracer.trace("crawl", dialog_id=channel_id, keywords=keywords, windows=len(windows)) as crawl_span:
+            await self.client.get_dialogs()
+            # scanned, matched, inserted, updated, unchanged
+            counts = [0, 0, 0, 0, 0]
+            try:
+                if len(windows) == 1:
+                    await self._crawl_window(channel_id, pattern, counts, limit, min_id, since, until)
                 else:
-                    self.message_repo.create(message_create)
-
-                # 如果有媒体附件，保存媒体信息
-                if message.media:
-                    media_create = self._create_media_from_message(message, message.id, message.chat.id)
-                    # 检查媒体是否已存在
-                    existing_media = self.media_repo.get_by_message_id(message.id)
-                    if existing_media:
-                        self.media_repo.update(existing_media, media_create)
-                    else:
-                        self.media_repo.create(media_create)
-
-        return True
+                    await asyncio.gather(*(
+                        self._crawl_window(channel_id, pattern, counts, None, min_id, window_since, window_until)
+                        for window_since, window_until in windows
+                    ))
+            finally:
+                metrics.record_crawl("crawl", *counts)
+                if crawl_span is not None:
+                    crawl_span.attributes.update(zip(_CRAWL_COUNTS, counts))
+
+        return dict(zip(_CRAWL_COUNTS, counts))
+
+    async def _crawl_window(
+            self,
+            channel_id: int,
+            pattern: re.Pattern,
+            counts: List[int],
+            limit: Optional[int],
+            min_id: Optional[int],
+            since: Optional[datetime],
+            until: Optional[datetime],
+    ) -> None:
+        """从 until 往前抓取到 since（或 min_id）为止，命中的消息攒批写入，计数累加到 counts"""
+        message_rows = []
+        media_rows = []
+        # 命中消息的发送者实体，随历史页一起返回，按 ID 去重
+        senders = {} if get_sender_settings().sender_enabled else None
+        # 录制在关键词过滤之前，回放时可以换关键词重新筛选
+        record = recorder.record if recorder.enabled else None
+        with tracer.span("window", since=str(since), until=str(until)):
+            error = None
+            try:
+                async for message in trace_pages(self.client.iter_messages(
+                        entity=channel_id,
+                        limit=limit,
+                        min_id=min_id,
+                        offset_date=until,
+                        # 有全局限速器时由它控制节奏，否则沿用每页 2 秒的固定间隔
+                        wait_time=0 if manager.governor is not None else 2,
+                        #reverse=True
+                )):
+                    # 消息从新到旧返回，早于 since 之后的都不需要了
+                    if since is not None and message.date < since:
+                        break
+                    counts[0] += 1
+                    if record is not None:
+                        record(message)
+                    if not message.text:
+                        continue
+                    with timed("match"):
+                        hit = pattern.search(message.text)
+                    if not hit:
+                        continue
+                    counts[1] += 1
+
+                    # 单遍转换出消息行与媒体行，攒批后一次写入
+                    with timed("convert"):
+                        message_row, media_row = convert_message(message)
+                    message_rows.append(message_row)
+                    if media_row is not None:
+                        media_rows.append(media_row)
+                    if senders is not None and message.sender is not None:
+                        senders[message.sender.id] = message.sender
+
+                    if len(message_rows) >= INGEST_BATCH_SIZE:
+                        pending = message_rows, media_rows
+                        message_rows, media_rows = [], []
+                        pending_senders, senders = senders, ({} if senders is not None else None)
+                        result = self._flush(*pending, pattern, pending_senders)
+                        _add_counts(counts, result)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                # 出错时也把已匹配的消息落库，与逐条写入时的行为一致；落库再失败时只记日志，
+                # 抛出的仍是抓取本身的异常
+                try:
+                    if message_rows:
+                        result = self._flush(message_rows, media_rows, pattern, senders)
+                        _add_counts(counts, result)
+                except Exception:
+                    if error is None:
+                        raise
+                    logger.exception("频道 %s 抓取出错后写入已匹配的 %s 条消息失败", channel_id, len(message_rows))
+                if record is not None:
+                    recorder.flush(channel_id)
+
+    def ingest_messages(self, messages, pattern: Optional[re.Pattern] = None,
+                        record: bool = True) -> Tuple[int, BatchResult]:
+        """
+        把一页消息走抓取写入路径落库（单遍转换 + 一次批量写入）。
+        pattern 为空时写入全部消息，否则只写入文本命中的消息。
+        开启录制时先录制整页（回放时传 record=False）；缓冲由调用方在结束时 flush。
+        返回 (命中条数, 写入结果)。
+        """
+        if record and recorder.enabled:
+            recorder.record_many(messages)
+        message_rows = []
+        media_rows = []
+        senders = {} if get_sender_settings().sender_enabled else None
+        for message in messages:
+            if pattern is not None and not (message.text and pattern.search(message.text)):
+                continue
+            with timed("convert"):
+                message_row, media_row = convert_message(message)
+            message_rows.append(message_row)
+            if media_row is not None:
+                media_rows.append(media_row)
+            if senders is not None and message.sender is not None:
+                senders[message.sender.id] = message.sender
+        if not message_rows:
+            return 0, BatchResult()
+        return len(message_rows), self._flush(message_rows, media_rows, pattern, senders)
+
+    def _flush(self, message_rows: List[MessageRow], media_rows: List[MediaRow],
+               pattern: Optional[re.Pattern] = None, senders: Optional[Dict[int, Any]] = None) -> BatchResult:
+        """
+        senders 为命中消息的发送者实体，先于消息写入 senders 表（独立事务，进程内缓存命中的跳过）；
+        发送者资料写入失败只记日志，不影响消息写入
+        """
+        with tracer.span("batch", messages=len(message_rows), medias=len(media_rows)):
+            if senders:
+                write_senders(self.sender_repo, senders)
+            return self.ingest_repo.write_batch(message_rows, media_rows, pattern)
 
     def _create_media_from_message(self, message: Message, message_id: int, chat_id: int) -> MediaCreate:
         """从Telethon消息创建MediaCreate对象（包含duration获取）"""
@@ -189,7 +374,7 @@ class MessageService:
                 elif type(attr).__name__ == 'DocumentAttributeAnimated':
                     return MediaTypeEnum.gif
             return MediaTypeEnum.document
-        elif hasattr(message.media, 'webPage'):
+        elif hasattr(message.media, 'webpage'):
             return MediaTypeEnum.webpage
         elif hasattr(message.media, 'poll'):
             return MediaTypeEnum.poll
@@ -247,9 +432,9 @@ class MessageService:
     def _determine_sender_type(self, message):
         # 优先检查是否频道消息
         if hasattr(message, 'sender') and message.sender:
-            if hasattr(message.sender, 'channel_id'):
+            if isinstance(message.sender, (Channel, ChannelForbidden)):
                 return SenderTypeEnum.channel
-            if hasattr(message.sender, 'bot'):
+            if getattr(message.sender, 'bot', False):
                 return SenderTypeEnum.bot
             return SenderTypeEnum.user
 
@@ -269,7 +454,8 @@ class MessageService:
         if hasattr(message, 'forward') and message.forward:
             # Telethon 新版可能用 message.forward
             if hasattr(message.forward, 'from_id'):
-                return message.forward.from_id.user_id if isinstance(message.forward.from_id, PeerUser) else None
+                from_id = message.forward.from_id
+                return utils.get_peer_id(from_id, add_mark=False) if from_id is not None else None
             return getattr(message.forward, 'from_id', None)
 
         # 旧版 Telethon 可能用 forward_from 或 forward_from_chat
@@ -279,6 +465,12 @@ class MessageService:
             return message.forward_from_chat.id
         return None
 
+    def _get_forward_from_msg_id(self, message):
+        """转发自频道时原帖的消息 ID"""
+        if getattr(message, 'forward', None):
+            return getattr(message.forward, 'channel_post', None)
+        return None
+
     """转发消息业务"""
 
     # async def forward_message(self, keyword, from_chat_id, to_chat_id='me'):
@@ -319,45 +511,49 @@ class MessageService:
         if not self.client.is_connected():
             await self.client.connect()
 
-        await self.client.get_dialogs()
+        with tracer.trace("forward", from_chat_id=from_chat_id, to_chat_id=to_chat_id, keyword=keyword):
+            await self.client.get_dialogs()
 
-        # 1. 获取基础消息ID列表
-        message_ids = self.message_repo.get_message_ids_by_keyword_and_channel(keyword, from_chat_id)
-
-        if not message_ids:
-            return False
-
-        # 2. 如果有duration要求，筛选符合条件的消息
-        if min_duration is not None:
-            filtered_ids = []
-            for msg_id in message_ids:
-                if self.get_message_duration(msg_id, from_chat_id, min_duration):
-                    filtered_ids.append(msg_id)
-            message_ids = filtered_ids
+            # 1. 获取基础消息ID列表
+            message_ids = self.message_repo.get_message_ids_by_keyword_and_channel(keyword, from_chat_id)
 
             if not message_ids:
                 return False
 
-        # 3. 检查目标频道是否已存在这些消息
-        message_ids_set = set(message_ids)  # 转为集合提高查询效率
-        async for message in self.client.iter_messages(
-                entity=to_chat_id
-        ):
-            if message.chat.id == from_chat_id and message.id in message_ids_set:
-                message_ids_set.remove(message.id)
-                if not message_ids_set:  # 如果全部已存在则提前退出
-                    return "转发的消息都已存在！"
-
-        # 4. 执行转发
-        if message_ids_set:
-            await self.client.forward_messages(
-                entity=to_chat_id,
-                messages=list(message_ids_set),  # 转回列表
-                from_peer=from_chat_id
-            )
-            return True
-
-        return False
+            # 2. 如果有duration要求，筛选符合条件的消息
+            if min_duration is not None:
+                filtered_ids = []
+                for msg_id in message_ids:
+                    if self.get_message_duration(msg_id, from_chat_id, min_duration):
+                        filtered_ids.append(msg_id)
+                message_ids = filtered_ids
+
+                if not message_ids:
+                    return False
+
+            # 3. 检查目标频道是否已存在这些消息
+            message_ids_set = set(message_ids)  # 转为集合提高查询效率
+            async for message in trace_pages(self.client.iter_messages(
+                    entity=to_chat_id
+            )):
+                if message.chat.id == from_chat_id and message.id in message_ids_set:
+                    message_ids_set.remove(message.id)
+                    if not message_ids_set:  # 如果全部已存在则提前退出
+                        return "转发的消息都已存在！"
+
+            # 4. 执行转发
+            if message_ids_set:
+                start = time.perf_counter()
+                await self.client.forward_messages(
+                    entity=to_chat_id,
+                    messages=list(message_ids_set),  # 转回列表
+                    from_peer=from_chat_id
+                )
+                metrics.FORWARD_SECONDS.observe(time.perf_counter() - start)
+                metrics.FORWARDED_MESSAGES.labels("task").inc(len(message_ids_set))
+                return True
+
+            return False
 
     def get_message_duration(
             self,
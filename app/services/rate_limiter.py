@@ -0,0 +1,38 @@
+# app/services/rate_limiter.py
+import asyncio
+import time
+
+
+class AsyncTokenBucket:
+    """
+    协程间共享的令牌桶：rate 为每秒补充的令牌数，burst 为桶容量。
+    多个并发任务共用一个桶时，总请求速率不超过 rate。
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate 必须大于 0")
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """取 tokens 个令牌，不够时等待；返回实际等待的秒数"""
+        waited = 0.0
+        # 加锁保证先到先得，等待者按顺序拿到令牌
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                delay = (tokens - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self._tokens -= tokens
+        return waited
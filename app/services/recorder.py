@@ -0,0 +1,94 @@
+# app/services/recorder.py
+"""
+原始消息的录制。
+
+开启 RECORDING_ENABLED 后，抓取、回填、补齐和订阅扫描拿到的每条
+Telethon 消息（关键词过滤之前）连同发送者 / 频道实体按 TL 序列化写入
+录制分段（见 repositories/recording_store.py），之后可以用 ReplayService
+离线重新生成 messages / medias 行。
+"""
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from telethon import utils
+
+from ..repositories import RecordingStore
+from ..repositories.recording_store import KIND_ENTITY, KIND_MESSAGE
+
+logger = logging.getLogger(__name__)
+
+
+class Recorder:
+    """按频道缓冲录制记录，攒够 RECORDING_BLOCK_RECORDS 条写一块"""
+
+    def __init__(self, store: Optional[RecordingStore] = None):
+        self.store = store or RecordingStore()
+        self._buffers: Dict[int, List[Tuple[int, bytes]]] = {}
+        # dialog_id -> 当前分段里已写过的实体
+        self._entities: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.store.settings.recording_enabled
+
+    def record(self, message) -> None:
+        """录制一条消息；序列化失败只记日志，不影响抓取"""
+        try:
+            dialog_id = utils.get_peer_id(message.peer_id, add_mark=False)
+            records = []
+            with self._lock:
+                seen = self._entities.setdefault(dialog_id, set())
+                for entity in (message.sender, message.chat):
+                    if entity is None:
+                        continue
+                    key = utils.get_peer_id(entity)
+                    if key not in seen:
+                        records.append((KIND_ENTITY, bytes(entity)))
+                        seen.add(key)
+            records.append((KIND_MESSAGE, bytes(message)))
+        except Exception as e:
+            logger.warning("录制消息 %s 失败: %s", getattr(message, "id", None), e)
+            return
+        with self._lock:
+            buffer = self._buffers.setdefault(dialog_id, [])
+            buffer.extend(records)
+            if len(buffer) < self.store.settings.recording_block_records:
+                return
+            del self._buffers[dialog_id]
+        self._write(dialog_id, buffer)
+
+    def record_many(self, messages) -> None:
+        for message in messages:
+            self.record(message)
+
+    def flush(self, dialog_id: Optional[int] = None) -> None:
+        """把缓冲写入分段；dialog_id 为空时写全部频道，带标记的频道 ID 与 record 一样按裸 ID 处理"""
+        with self._lock:
+            if dialog_id is None:
+                pending, self._buffers = self._buffers, {}
+            else:
+                dialog_id = utils.get_peer_id(dialog_id, add_mark=False)
+                buffer = self._buffers.pop(dialog_id, None)
+                pending = {dialog_id: buffer} if buffer else {}
+        for key, buffer in pending.items():
+            self._write(key, buffer)
+
+    def _write(self, dialog_id: int, buffer: List[Tuple[int, bytes]]) -> None:
+        """写一块；失败只记日志（这一块的记录丢弃），不影响抓取，也不掩盖抓取本身的异常"""
+        try:
+            appended = self.store.append(dialog_id, buffer)
+        except Exception:
+            logger.exception("频道 %s 写入录制分段失败，丢弃 %s 条记录", dialog_id, len(buffer))
+            # 丢弃的块里可能有实体，之后的消息重新写一遍
+            with self._lock:
+                self._entities.pop(dialog_id, None)
+            return
+        if appended:
+            # 换了新分段，实体在新分段里重新写一遍，每个分段都能单独回放
+            with self._lock:
+                self._entities.pop(dialog_id, None)
+
+
+recorder = Recorder()
@@ -0,0 +1,190 @@
+# app/services/rpc_governor.py
+"""
+全局 Telegram RPC 限速器。
+
+同一账号上的抓取、转发、对话同步共用一个 governor：按方法类别各有一个
+令牌桶，收到 FloodWait 时该类别整体暂停 seconds 秒并把速率减半（乘性
+减小），之后每平稳运行 ramp_seconds 秒就把速率加回一步（加性增大），
+直到回到配置的上限。这样并发任务不会在同一个限制上反复撞墙。
+"""
+import asyncio
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Any, List
+
+from pydantic_settings import BaseSettings
+
+from .. import metrics
+
+# TL 请求类名 -> 方法类别；同类请求共享一个令牌桶
+METHOD_CLASSES = {
+    "GetHistoryRequest": "history",
+    "SearchRequest": "history",
+    "GetRepliesRequest": "history",
+    "GetMessagesRequest": "history",
+    "GetMessagesViewsRequest": "history",
+    "ForwardMessagesRequest": "forward",
+    "SendMessageRequest": "forward",
+    "GetDialogsRequest": "dialogs",
+    "GetPeerDialogsRequest": "dialogs",
+    "ResolveUsernameRequest": "resolve",
+    "GetUsersRequest": "resolve",
+    "GetChannelsRequest": "resolve",
+    "GetFullChannelRequest": "resolve",
+    "GetFullUserRequest": "resolve",
+    "GetDifferenceRequest": "updates",
+    "GetChannelDifferenceRequest": "updates",
+    "GetStateRequest": "updates",
+}
+
+# 各类别的默认速率上限（次/秒）
+DEFAULT_RATES = {
+    "history": 1.0,
+    "forward": 0.5,
+    "dialogs": 0.2,
+    "resolve": 0.5,
+    "updates": 1.0,
+    "default": 2.0,
+}
+
+
+class GovernorSettings(BaseSettings):
+    governor_enabled: bool = True
+    # 覆盖默认速率，如 "history=2,forward=0.3"
+    governor_rates: str = ""
+    governor_burst: float = 3.0
+    governor_backoff: float = 0.5
+    governor_min_rate: float = 0.02
+    governor_ramp_seconds: float = 60.0
+    governor_ramp_step: float = 0.1
+    governor_keep_waits: int = 50
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+    def rates(self) -> Dict[str, float]:
+        rates = dict(DEFAULT_RATES)
+        for item in filter(None, (part.strip() for part in self.governor_rates.split(","))):
+            name, _, value = item.partition("=")
+            rates[name.strip()] = float(value)
+        return rates
+
+
+@lru_cache()
+def get_governor_settings() -> GovernorSettings:
+    return GovernorSettings()
+
+
+class AdaptiveBucket:
+    """AIMD 令牌桶：FloodWait 时暂停并乘性降速，平稳后加性回升"""
+
+    def __init__(self, name: str, max_rate: float, settings: GovernorSettings):
+        self.name = name
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.settings = settings
+        self.burst = max(settings.governor_burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.last_change = self.updated
+        self.flood_waits = 0
+        self._lock = asyncio.Lock()
+        self._gauge = metrics.TELEGRAM_RPC_BUDGET.labels(name)
+        self._gauge.set(self.rate)
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _ramp(self, now: float) -> None:
+        if self.rate >= self.max_rate or now - self.last_change < self.settings.governor_ramp_seconds:
+            return
+        steps = int((now - self.last_change) // self.settings.governor_ramp_seconds)
+        self.rate = min(self.max_rate, self.rate + steps * self.settings.governor_ramp_step * self.max_rate)
+        self.last_change = now
+        self._gauge.set(self.rate)
+
+    async def acquire(self) -> float:
+        """取一个令牌，返回排队等待的秒数"""
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if self.blocked_until > now:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._ramp(now)
+                self._refill(now)
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    break
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+        return time.monotonic() - start
+
+    def on_flood_wait(self, seconds: float) -> None:
+        now = time.monotonic()
+        self.flood_waits += 1
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.rate = max(self.settings.governor_min_rate, self.rate * self.settings.governor_backoff)
+        # 暂停期间不积攒令牌，恢复后从空桶开始
+        self.tokens = 0.0
+        self.updated = self.blocked_until
+        self.last_change = self.blocked_until
+        self._gauge.set(self.rate)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "rate": round(self.rate, 4),
+            "max_rate": self.max_rate,
+            "tokens": round(min(self.burst, self.tokens + max(now - self.updated, 0) * self.rate), 3),
+            "blocked_for": round(max(self.blocked_until - now, 0.0), 3),
+            "flood_waits": self.flood_waits,
+        }
+
+
+class RpcGovernor:
+    def __init__(self, settings: GovernorSettings):
+        self.settings = settings
+        self._buckets: Dict[str, AdaptiveBucket] = {
+            name: AdaptiveBucket(name, rate, settings) for name, rate in settings.rates().items()
+        }
+        self._recent_waits: deque = deque(maxlen=settings.governor_keep_waits)
+
+    @staticmethod
+    def method_class(method: str) -> str:
+        return METHOD_CLASSES.get(method, "default")
+
+    def bucket(self, method: str) -> AdaptiveBucket:
+        return self._buckets.get(self.method_class(method)) or self._buckets["default"]
+
+    async def acquire(self, method: str) -> None:
+        bucket = self.bucket(method)
+        waited = await bucket.acquire()
+        if waited:
+            metrics.GOVERNOR_WAIT_SECONDS.labels(bucket.name).inc(waited)
+
+    def on_flood_wait(self, method: str, seconds: float) -> None:
+        bucket = self.bucket(method)
+        bucket.on_flood_wait(seconds)
+        self._recent_waits.append({
+            "time": time.time(),
+            "method": method,
+            "method_class": bucket.name,
+            "seconds": seconds,
+            "rate_after": round(bucket.rate, 4),
+        })
+
+    def recent_waits(self) -> List[Dict[str, Any]]:
+        return list(self._recent_waits)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.settings.governor_enabled,
+            "budgets": {name: bucket.snapshot() for name, bucket in self._buckets.items()},
+            "recent_waits": self.recent_waits(),
+        }
@@ -0,0 +1,109 @@
+# app/services/sender_service.py
+"""
+发送者资料：给消息列表附上发送者，以及批量补查 senders 里还没有的发送者。
+
+抓取时随历史页写入的发送者已覆盖绝大多数情况；升级前抓取的消息、回放时没有
+实体的消息，其发送者用 ``resolve`` 补查：用该发送者在频道里的一条消息构造
+InputUserFromMessage / InputChannelFromMessage（不需要 access_hash），按
+SENDER_RESOLVE_CHUNK 个一批调用 users.getUsers / channels.getChannels。
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+from telethon.tl import types
+from telethon.tl.functions.channels import GetChannelsRequest
+from telethon.tl.functions.users import GetUsersRequest
+
+from .message_converter import convert_senders
+from .telegram_client_service import TelegramClientManager
+from .. import metrics
+from ..models import Sender, SenderTypeEnum
+from ..repositories import SenderRepository, DialogRepository
+from ..repositories.sender_repository import get_sender_settings
+from ..schemas.dialog_schema import TelegramTypeEnum
+
+logger = logging.getLogger(__name__)
+
+manager = TelegramClientManager()
+
+
+class SenderService:
+    def __init__(self, db: Session):
+        self.sender_repo = SenderRepository(db)
+        self.dialog_repo = DialogRepository(db)
+        self.settings = get_sender_settings()
+        self.client = None
+
+    async def _get_client(self):
+        self.client = await manager.get_client()
+        return self.client
+
+    def get(self, sender_id: int) -> Optional[Sender]:
+        return self.sender_repo.get_by_id(sender_id)
+
+    def attach(self, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """给一页消息行附上 sender（senders 里没有的为 None），整页只查一次"""
+        rows = list(rows)
+        senders = self.sender_repo.get_many(row["sender_id"] for row in rows if row["sender_id"] is not None)
+        for row in rows:
+            row["sender"] = senders.get(row["sender_id"])
+        return rows
+
+    async def resolve(self, dialog_id: int, limit: Optional[int] = None) -> Dict[str, int]:
+        """补查一个频道里 senders 还没有的发送者，返回 missing / resolved / failed"""
+        missing = self.sender_repo.get_missing(dialog_id, limit)
+        report = {"missing": len(missing), "resolved": 0, "failed": 0}
+        if not missing:
+            return report
+        if self.client is None:
+            await self._get_client()
+        peer = await self._input_peer(dialog_id)
+
+        users, channels = {}, {}
+        for sender_id, sender_type, message_id in missing:
+            if sender_type == SenderTypeEnum.channel:
+                channels.setdefault(sender_id, types.InputChannelFromMessage(peer, message_id, sender_id))
+            else:
+                users.setdefault(sender_id, types.InputUserFromMessage(peer, message_id, sender_id))
+
+        chunk = self.settings.sender_resolve_chunk
+        for request_type, inputs in ((GetUsersRequest, list(users.values())),
+                                     (GetChannelsRequest, list(channels.values()))):
+            for start in range(0, len(inputs), chunk):
+                batch = inputs[start:start + chunk]
+                try:
+                    result = await self.client(request_type(batch))
+                except Exception as e:
+                    # 一批里有无法访问的实体时整批失败，其余批次继续
+                    logger.warning("频道 %s 补查发送者失败（%s 个）: %s", dialog_id, len(batch), e)
+                    report["failed"] += len(batch)
+                    continue
+                # GetChannels 返回 messages.Chats，GetUsers 直接返回列表
+                entities = getattr(result, "chats", result)
+                rows = convert_senders(entities)
+                self.sender_repo.upsert(rows)
+                report["resolved"] += len(rows)
+                report["failed"] += len(batch) - len(rows)
+        metrics.SENDERS_RESOLVED.labels("resolved").inc(report["resolved"])
+        metrics.SENDERS_RESOLVED.labels("failed").inc(report["failed"])
+        return report
+
+    async def resolve_all(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """逐个频道补查，单个频道失败不影响其它频道"""
+        reports = []
+        for dialog in self.dialog_repo.get_all():
+            try:
+                report = await self.resolve(dialog.dialog_id, limit)
+            except Exception as e:
+                logger.warning("频道 %s 补查发送者失败: %s", dialog.dialog_id, e)
+                continue
+            reports.append({"dialog_id": dialog.dialog_id, **report})
+        return reports
+
+    async def _input_peer(self, dialog_id: int):
+        """优先用 dialogs 表里的 access_hash 构造 InputPeer，省去一次实体解析"""
+        dialog = self.dialog_repo.get_by_dialog_id_and_type(dialog_id, TelegramTypeEnum.channel)
+        if dialog is not None and dialog.access_hash is not None:
+            return types.InputPeerChannel(dialog.dialog_id, dialog.access_hash)
+        return await self.client.get_input_entity(dialog_id)
@@ -0,0 +1,94 @@
+# app/services/shard_service.py
+"""
+频道在分片之间的迁移与分片概况。
+
+迁移一个频道：先清掉目标分片上可能残留的旧副本，按主键分批把明细与汇总行
+复制到目标分片，核对行数后改主库 dialog_shards 指定，最后分批删除源分片上的
+行。复制期间读写仍走源分片；指定改完后本进程立即生效，其它进程在
+SHARD_PLACEMENT_TTL 内生效，迁移期间应暂停该频道的抓取。中途失败时源分片
+数据完整、指定未改，重新执行即可。
+"""
+import logging
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from ..repositories import ShardRepository, shards
+from ..repositories.shard_repository import SHARDED_MODELS
+
+logger = logging.getLogger(__name__)
+
+
+class ShardService:
+    def __init__(self, db: Session):
+        self.db = db
+        self.repo = ShardRepository(db)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """每个分片的地址（隐藏密码）、频道数，以及有多少频道是显式指定过来的"""
+        placed: Dict[int, int] = {}
+        for obj in self.repo.get_placements():
+            placed[obj.shard] = placed.get(obj.shard, 0) + 1
+        dialogs = self.repo.get_dialog_ids()
+        urls = shards.urls
+        return [{"shard": index,
+                 "url": make_url(urls[index]).render_as_string(hide_password=True) if urls else None,
+                 "dialogs": len(dialogs[index]), "placed": placed.get(index, 0)}
+                for index in shards.indexes()]
+
+    def pin_all(self) -> int:
+        """
+        把所有已有数据的频道固定在当前分片。SHARD_URLS 末尾追加分片会改变哈希
+        默认分片，追加前先执行一次，之后再按需逐个迁移到新分片。
+        """
+        pinned = 0
+        placements = shards.placements(self.db)
+        for index, dialog_ids in enumerate(self.repo.get_dialog_ids()):
+            for dialog_id in dialog_ids:
+                if dialog_id not in placements:
+                    self.repo.set_placement(dialog_id, index)
+                    pinned += 1
+        shards.invalidate()
+        return pinned
+
+    def rebalance(self, dialog_id: int, target: int, batch_size: int = 1000) -> Dict[str, Any]:
+        if not shards.enabled:
+            raise ValueError("没有配置 SHARD_URLS，无法迁移")
+        if not 0 <= target < shards.count:
+            raise ValueError(f"分片序号超出范围: {target}（共 {shards.count} 个分片）")
+        shards.invalidate()
+        source = shards.index_of(self.db, dialog_id)
+        report: Dict[str, Any] = {"dialog_id": dialog_id, "source": source, "target": target, "rows": {}}
+        if source == target:
+            report["seconds"] = 0.0
+            return report
+
+        start = time.perf_counter()
+        for model in SHARDED_MODELS:
+            # 目标分片上的行只可能是上次中断的迁移留下的
+            self.repo.delete_dialog(target, model, dialog_id, batch_size)
+        for model in SHARDED_MODELS:
+            keys = self.repo.row_keys(model)
+            after, copied = None, 0
+            while True:
+                rows = self.repo.get_rows(source, model, dialog_id, after, batch_size)
+                copied += self.repo.insert_rows(target, model, rows)
+                if len(rows) < batch_size:
+                    break
+                after = tuple(rows[-1][k] for k in keys)
+            expected = self.repo.count_rows(source, model, dialog_id)
+            if copied != expected:
+                raise RuntimeError(f"{model.__tablename__} 复制了 {copied} 行，源分片有 {expected} 行，"
+                                   "迁移期间频道可能仍在写入")
+            report["rows"][model.__tablename__] = copied
+
+        # 回到哈希默认分片时删掉指定，dialog_shards 只记录例外
+        self.repo.set_placement(dialog_id, None if target == shards.home(dialog_id) else target)
+        shards.invalidate()
+        for model in SHARDED_MODELS:
+            self.repo.delete_dialog(source, model, dialog_id, batch_size)
+        report["seconds"] = round(time.perf_counter() - start, 3)
+        logger.info("频道迁移完成: %s", report)
+        return report
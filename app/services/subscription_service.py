@@ -0,0 +1,294 @@
+# app/services/subscription_service.py
+"""
+订阅规则与自动转发。
+
+规则保存在 subscription_rules 表，所有启用的规则编译成一个索引（见
+repositories/subscription_index.py）。任何写入路径（关键词抓取、补齐、回填、
+批量写入）新插入的消息都在同一事务里对全部规则评估一遍，命中的写入
+forward_queue；dispatch 按 (目标, 来源频道) 攒批调用 forwardMessages。
+
+crawl 按来源频道扫描：不管有多少条规则订阅了这个频道，都只扫一遍，
+并从上次扫描到的消息ID继续。新来源的进度从建规则时频道最新的消息开始，
+只转发之后的新消息；要补转历史消息需显式指定 min_id（如 min_id=0 从头扫描）。
+"""
+import logging
+import time
+from typing import Optional, Dict, Any, List
+
+from sqlalchemy.orm import Session
+from telethon import errors
+
+from .telegram_client_service import TelegramClientManager
+from .message_converter import convert_message
+from .message_service import INGEST_BATCH_SIZE, write_senders
+from .recorder import recorder
+from .. import metrics
+from ..models import SubscriptionRule, ForwardQueueItem, ForwardStatusEnum
+from ..repositories import SubscriptionRepository, IngestRepository, SenderRepository, subscriptions
+from ..repositories.sender_repository import get_sender_settings
+from ..repositories.subscription_index import (SubscriptionSettings, get_subscription_settings, split_ids,
+                                               split_keywords, split_media_types)
+from ..schemas import SubscriptionRuleCreate, SubscriptionRuleUpdate
+from ..tracing import tracer, timed, trace_pages
+
+logger = logging.getLogger(__name__)
+
+manager = TelegramClientManager()
+
+
+class SubscriptionService:
+    def __init__(self, db: Session, settings: Optional[SubscriptionSettings] = None):
+        self.db = db
+        self.repo = SubscriptionRepository(db)
+        self.ingest_repo = IngestRepository(db)
+        self.sender_repo = SenderRepository(db)
+        self.settings = settings or get_subscription_settings()
+        self.client = None
+
+    async def _get_client(self):
+        self.client = await manager.get_client()
+        return self.client
+
+    # region 规则
+    def get_rules(self, enabled: Optional[bool] = None) -> List[SubscriptionRule]:
+        return self.repo.get_rules(enabled)
+
+    def get_rule(self, id: int) -> SubscriptionRule | None:
+        return self.repo.get_rule(id)
+
+    def create_rule(self, obj_in: SubscriptionRuleCreate) -> SubscriptionRule:
+        obj = self.repo.create_rule(self._normalize(obj_in))
+        subscriptions.invalidate()
+        return obj
+
+    def update_rule(self, db_obj: SubscriptionRule, obj_in: SubscriptionRuleUpdate) -> SubscriptionRule:
+        obj = self.repo.update_rule(db_obj, self._normalize(obj_in))
+        subscriptions.invalidate()
+        return obj
+
+    def delete_rule(self, id: int) -> bool:
+        deleted = self.repo.delete_rule(id)
+        subscriptions.invalidate()
+        return deleted
+
+    async def seed_cursors(self, source_dialog_ids: Optional[str]) -> Dict[int, int]:
+        """
+        还没有扫描进度的来源频道，把进度设为频道当前最新的消息ID，返回 dialog_id -> 消息ID。
+        取不到（如 Telegram 未连接）时跳过，由首次扫描时再设。
+        """
+        seeded = {}
+        for dialog_id in split_ids(source_dialog_ids):
+            if self.repo.get_cursor(dialog_id) is not None:
+                continue
+            try:
+                top = await self._top_message_id(dialog_id)
+            except Exception as e:
+                logger.warning("取频道 %s 最新消息ID失败，首次扫描时再设置进度: %s", dialog_id, e)
+                continue
+            self.repo.save_cursor(dialog_id, top)
+            seeded[dialog_id] = top
+        return seeded
+
+    async def _top_message_id(self, dialog_id: int) -> int:
+        if self.client is None:
+            await self._get_client()
+        messages = await self.client.get_messages(dialog_id, limit=1)
+        return messages[0].id if messages else 0
+
+    @staticmethod
+    def _normalize(obj_in) -> Dict[str, Any]:
+        """校验并规整逗号分隔的字段，非法时抛 ValueError"""
+        values = obj_in.dict()
+        values["source_dialog_ids"] = ",".join(map(str, split_ids(values["source_dialog_ids"]))) or None
+        values["keywords"] = ",".join(split_keywords(values["keywords"])) or None
+        values["media_types"] = ",".join(split_media_types(values["media_types"])) or None
+        for low, high in (("min_duration", "max_duration"), ("min_size", "max_size")):
+            if values[low] is not None and values[high] is not None and values[low] > values[high]:
+                raise ValueError(f"{low} 不能大于 {high}")
+        return values
+    # endregion
+
+    # region 转发队列
+    def get_queue(self, status: Optional[ForwardStatusEnum] = None, rule_id: Optional[int] = None,
+                  limit: int = 100) -> List[ForwardQueueItem]:
+        return self.repo.get_queue(status, rule_id, limit)
+
+    def queue_stats(self) -> Dict[str, int]:
+        return self.repo.queue_stats()
+    # endregion
+
+    async def crawl(self, dialog_id: int, min_id: Optional[int] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        为全部订阅规则扫描一个来源频道，从上次的进度（或 min_id）往后抓取。
+        只转换来源和关键词命中的消息，写入时由写入路径入队转发。
+        还没有进度且未指定 min_id 时只把进度设为当前最新的消息，不回溯历史。
+        """
+        if self.client is None:
+            await self._get_client()
+
+        index = subscriptions.get(self.db)
+        report = {"dialog_id": dialog_id, "rules": len(index), "scanned": 0, "matched": 0, "inserted": 0,
+                  "queued": 0, "last_message_id": 0}
+        if not index.watches(dialog_id):
+            return report
+        cursor = self.repo.get_cursor(dialog_id) if min_id is None else min_id
+        if cursor is None:
+            cursor = await self._top_message_id(dialog_id)
+            self.repo.save_cursor(dialog_id, cursor)
+            report["last_message_id"] = cursor
+            report["seeded"] = True
+            return report
+        report["last_message_id"] = cursor
+
+        message_rows, media_rows = [], []
+        senders = {} if get_sender_settings().sender_enabled else None
+        record = recorder.record if recorder.enabled else None
+        with tracer.trace("subscription_crawl", dialog_id=dialog_id, rules=len(index)) as span:
+            error = None
+            try:
+                async for message in trace_pages(self.client.iter_messages(
+                        entity=dialog_id,
+                        limit=limit,
+                        min_id=cursor,
+                        reverse=True,
+                        wait_time=0 if manager.governor is not None else 2,
+                )):
+                    report["scanned"] += 1
+                    report["last_message_id"] = max(report["last_message_id"], message.id)
+                    if record is not None:
+                        record(message)
+                    with timed("match"):
+                        if not index.candidates(dialog_id, message.text):
+                            continue
+                    with timed("convert"):
+                        message_row, media_row = convert_message(message)
+                    # 媒体条件要看转换后的时长与大小
+                    duration = media_row.duration if media_row is not None else None
+                    size = media_row.size if media_row is not None and media_row.size is not None \
+                        else message_row.media_size
+                    if not index.match(dialog_id, message_row.message, message_row.media_type, duration, size):
+                        continue
+                    report["matched"] += 1
+                    message_rows.append(message_row)
+                    if media_row is not None:
+                        media_rows.append(media_row)
+                    if senders is not None and message.sender is not None:
+                        senders[message.sender.id] = message.sender
+                    if len(message_rows) >= INGEST_BATCH_SIZE:
+                        self._flush(message_rows, media_rows, report, senders)
+                        message_rows, media_rows = [], []
+                        senders = {} if senders is not None else None
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                # 出错时也把已匹配的消息落库并保存进度，下次从断点继续；落库再失败时只记日志，
+                # 抛出的仍是扫描本身的异常
+                try:
+                    self._flush(message_rows, media_rows, report, senders)
+                except Exception:
+                    if error is None:
+                        raise
+                    logger.exception("订阅扫描频道 %s 出错后写入已匹配的消息失败", dialog_id)
+                if record is not None:
+                    recorder.flush(dialog_id)
+            if span is not None:
+                span.attributes.update(report)
+        return report
+
+    def _flush(self, message_rows, media_rows, report: Dict[str, Any],
+               senders: Optional[Dict[int, Any]] = None) -> None:
+        if message_rows:
+            with tracer.span("batch", messages=len(message_rows), medias=len(media_rows)):
+                if senders:
+                    write_senders(self.sender_repo, senders)
+                result = self.ingest_repo.write_batch(message_rows, media_rows)
+            report["inserted"] += result.inserted
+            report["queued"] += result.queued
+        if report["last_message_id"]:
+            self.repo.save_cursor(report["dialog_id"], report["last_message_id"])
+
+    async def crawl_all(self) -> List[Dict[str, Any]]:
+        """扫描全部规则订阅的来源频道；不限来源的规则只对其它写入路径抓到的消息生效"""
+        index = subscriptions.get(self.db)
+        reports = []
+        for dialog_id in index.sources():
+            try:
+                reports.append(await self.crawl(dialog_id))
+            except Exception as e:
+                logger.exception("订阅扫描频道 %s 失败", dialog_id)
+                reports.append({"dialog_id": dialog_id, "error": f"{type(e).__name__}: {e}"})
+        return reports
+
+    async def dispatch(self, max_batches: Optional[int] = None) -> Dict[str, int]:
+        """
+        转发队列里的待转发消息，每次一组（同一目标、同一来源频道，最多
+        SUBSCRIPTION_FORWARD_BATCH 条）调用一次 forwardMessages，直到队列清空。
+        一组失败时（FloodWait 除外）对半拆开重试，只给无法转发的消息记一次失败，本轮不再
+        重试它们；失败的留在队列里下次重试，达到 SUBSCRIPTION_FORWARD_MAX_ATTEMPTS 次后标记为 failed。
+        """
+        if self.client is None:
+            await self._get_client()
+
+        batch_size = max(1, min(self.settings.subscription_forward_batch, 100))
+        report = {"batches": 0, "sent": 0, "failed": 0}
+        # 本轮失败过的队列ID，下次 dispatch 再重试，避免连续重试
+        failed: List[int] = []
+        with tracer.trace("subscription_dispatch") as span:
+            while max_batches is None or report["batches"] < max_batches:
+                to_chat_id, dialog_id, items = self.repo.next_batch(batch_size, failed)
+                if not items:
+                    break
+                report["batches"] += 1
+                try:
+                    await self._forward(to_chat_id, dialog_id, items, report, failed)
+                except (errors.FloodWaitError, errors.FloodPremiumWaitError) as e:
+                    logger.warning("转发 %s -> %s 被限流: %s", dialog_id, to_chat_id, e)
+                    # 拆开后前半已转发的不再记失败
+                    self._mark_failed(e.unsent, e, report)
+                    break
+            if span is not None:
+                span.attributes.update(report)
+        return report
+
+    async def _forward(self, to_chat_id: int, dialog_id: int, items: List[ForwardQueueItem],
+                       report: Dict[str, Any], failed: List[int]) -> None:
+        """
+        转发一组消息。失败时对半拆开分别重试，直到定位到无法转发的单条消息（已删除、
+        禁止转发等），只给它记失败并加入 failed；FloodWait 直接抛出，异常的 unsent 属性为
+        这一组里还没转发的消息，由调用方处理。
+        """
+        start = time.perf_counter()
+        try:
+            await self.client.forward_messages(
+                entity=to_chat_id,
+                messages=[item.message_id for item in items],
+                from_peer=dialog_id,
+            )
+        except (errors.FloodWaitError, errors.FloodPremiumWaitError) as e:
+            e.unsent = list(items)
+            raise
+        except Exception as e:
+            if len(items) > 1:
+                middle = len(items) // 2
+                try:
+                    await self._forward(to_chat_id, dialog_id, items[:middle], report, failed)
+                except (errors.FloodWaitError, errors.FloodPremiumWaitError) as flood:
+                    # 后半还没尝试，一并算作未转发
+                    flood.unsent.extend(items[middle:])
+                    raise
+                await self._forward(to_chat_id, dialog_id, items[middle:], report, failed)
+                return
+            logger.warning("转发 %s/%s -> %s 失败: %s", dialog_id, items[0].message_id, to_chat_id, e)
+            self._mark_failed(items, e, report)
+            failed.append(items[0].id)
+            return
+        metrics.FORWARD_SECONDS.observe(time.perf_counter() - start)
+        metrics.FORWARDED_MESSAGES.labels("subscription").inc(len(items))
+        self.repo.mark_sent([item.id for item in items])
+        report["sent"] += len(items)
+
+    def _mark_failed(self, items: List[ForwardQueueItem], error: Exception, report: Dict[str, Any]) -> None:
+        self.repo.mark_failed([item.id for item in items], f"{type(error).__name__}: {error}",
+                              self.settings.subscription_forward_max_attempts)
+        report["failed"] += len(items)
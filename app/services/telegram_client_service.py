@@ -1,15 +1,24 @@
 # app/services/telegram_client_service.py
 import asyncio
+import logging
+import time
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, List
 
 from fastapi import HTTPException
 from telethon import TelegramClient
+from telethon import errors
 from telethon.errors import SessionPasswordNeededError
 from telethon.sessions import StringSession
 from pydantic_settings import BaseSettings
 from dotenv import set_key, find_dotenv
 
+from .. import metrics
+from ..tracing import tracer
+from .rpc_governor import RpcGovernor, get_governor_settings
+
+logger = logging.getLogger(__name__)
+
 
 class TelegramConfig(BaseSettings):
     # Telegram 基本配置
@@ -43,6 +52,48 @@ class TelegramConfig(BaseSettings):
         )
 
 
+class InstrumentedTelegramClient(TelegramClient):
+    """
+    所有 RPC 都经过 ``_call``，在这里统一限速、记录耗时与 FloodWait。
+    FloodWait 由本类自行等待重试（阈值沿用 flood_sleep_threshold），
+    这样等待次数和秒数才能被统计到；有 governor 时由它暂停整个方法类别，
+    重试时在 governor 里排队，而不是各自 sleep。
+    """
+    governor: Optional[RpcGovernor] = None
+
+    async def _call(self, sender, request, ordered=False, flood_sleep_threshold=None):
+        method = type(request).__name__ if not isinstance(request, list) else "batch"
+        if flood_sleep_threshold is None:
+            flood_sleep_threshold = self.flood_sleep_threshold
+
+        latency = metrics.TELEGRAM_RPC_SECONDS.labels(method)
+        governor = self.governor
+        while True:
+            if governor is not None:
+                await governor.acquire(method)
+            start = time.perf_counter()
+            try:
+                with tracer.span("rpc " + method):
+                    result = await super()._call(sender, request, ordered=ordered, flood_sleep_threshold=0)
+            except (errors.FloodWaitError, errors.FloodPremiumWaitError) as e:
+                latency.observe(time.perf_counter() - start)
+                metrics.FLOOD_WAITS.labels(method).inc()
+                metrics.FLOOD_WAIT_SECONDS.labels(method).inc(e.seconds)
+                if governor is not None:
+                    governor.on_flood_wait(method, e.seconds)
+                if e.seconds > flood_sleep_threshold:
+                    raise
+                if governor is None:
+                    await asyncio.sleep(e.seconds)
+                continue
+            except Exception as e:
+                latency.observe(time.perf_counter() - start)
+                metrics.TELEGRAM_RPC_ERRORS.labels(method, type(e).__name__).inc()
+                raise
+            latency.observe(time.perf_counter() - start)
+            return result
+
+
 class TelegramClientManager:
     _instance = None
 
@@ -55,10 +106,29 @@ class TelegramClientManager:
     def _initialize(self):
         self._client: Optional[TelegramClient] = None
         self._last_activity: Optional[datetime] = None
-        self.config = TelegramConfig()  # 初始化时加载配置
+        # 配置与限速器在第一次用到时才创建，导入各 service 模块不读 .env
+        self._config: Optional[TelegramConfig] = None
+        self._governor: Optional[RpcGovernor] = None
+        self._governor_loaded = False
         self._last_error: Optional[str] = None
         self._lock = asyncio.Lock()  # 异步锁
         self._login_data = {}  # 临时存储验证码等信息
+        # 断线重连成功后调用的回调（如触发补齐），在持有锁时调用，回调里不能等待客户端
+        self._reconnect_listeners: List[Callable[[], None]] = []
+
+    @property
+    def config(self) -> TelegramConfig:
+        if self._config is None:
+            self._config = TelegramConfig()
+        return self._config
+
+    @property
+    def governor(self) -> Optional[RpcGovernor]:
+        if not self._governor_loaded:
+            settings = get_governor_settings()
+            self._governor = RpcGovernor(settings) if settings.governor_enabled else None
+            self._governor_loaded = True
+        return self._governor
 
     def _get_proxy(self):
         """获取代理配置"""
@@ -152,13 +222,14 @@ class TelegramClientManager:
         max_retries = 5
         for attempt in range(max_retries):
             try:
-                self._client = TelegramClient(
+                self._client = InstrumentedTelegramClient(
                     session=StringSession(session_str),
                     api_id=self.config.telegram_api_id,
                     api_hash=self.config.telegram_api_hash,
                     proxy=proxy,
                     connection_retries=5  # 内置重试
                 )
+                self._client.governor = self.governor
 
                 if not self._client.is_connected():
                     await self._client.start()
@@ -210,6 +281,12 @@ class TelegramClientManager:
 
         return status
 
+    def get_governor_status(self) -> Dict[str, Any]:
+        """当前各方法类别的速率预算与最近的 FloodWait"""
+        if self.governor is None:
+            return {"enabled": False, "budgets": {}, "recent_waits": []}
+        return self.governor.snapshot()
+
     async def disconnect(self):
         """断开连接（接口使用）"""
         await self._safe_disconnect()
@@ -222,6 +299,23 @@ class TelegramClientManager:
         except:
             return False
 
+    def add_reconnect_listener(self, listener: Callable[[], None]) -> None:
+        self._reconnect_listeners.append(listener)
+
+    def remove_reconnect_listener(self, listener: Callable[[], None]) -> None:
+        if listener in self._reconnect_listeners:
+            self._reconnect_listeners.remove(listener)
+
+    async def _reconnect(self):
+        """连接已断开时按原配置重新建立客户端，成功后通知重连回调"""
+        await self._safe_disconnect()
+        await self._get_client()
+        for listener in list(self._reconnect_listeners):
+            try:
+                listener()
+            except Exception:
+                logger.exception("重连回调失败")
+
     async def _safe_disconnect(self):
         """安全断开连接"""
         if self._client:
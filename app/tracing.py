@@ -0,0 +1,341 @@
+# app/tracing.py
+"""
+抓取链路的轻量级追踪。
+
+每次抓取/转发生成一棵 span 树：crawl -> page -> rpc。逐条消息的
+转换、正则匹配、数据库写入不单独建 span，而是把耗时累加到当前
+page span 的 ``timings`` 中，避免 span 数量随消息数线性增长。
+
+导出格式为 OTLP/JSON，可写入 JSON Lines 文件（OTel Collector 的
+``otlpjsonfile`` receiver 可直接读取），也可 POST 到本地 Collector 的
+``/v1/traces``。未开启时所有入口都是空操作。
+"""
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional, Dict, Any, List
+
+from pydantic_settings import BaseSettings
+
+logger = logging.getLogger(__name__)
+
+
+class TracingSettings(BaseSettings):
+    tracing_enabled: bool = False
+    # none / json / otlp
+    tracing_exporter: str = "none"
+    tracing_json_path: str = "traces.jsonl"
+    tracing_otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    tracing_keep_last: int = 50
+    tracing_service_name: str = "tgcrawler"
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+@lru_cache()
+def get_tracing_settings() -> TracingSettings:
+    return TracingSettings()
+
+
+_current: ContextVar[Optional["Span"]] = ContextVar("tracing_current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns",
+                 "attributes", "timings", "children")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.timings: Dict[str, float] = {}
+        self.children: List["Span"] = []
+
+    @property
+    def duration(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e9
+
+    def add_timing(self, key: str, seconds: float) -> None:
+        self.timings[key] = self.timings.get(key, 0.0) + seconds
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "timings_ms": {k: round(v * 1000, 3) for k, v in self.timings.items()},
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class _SpanScope:
+    """``with`` 协议的 span 作用域；root 为 True 时结束后交给 tracer 导出"""
+    __slots__ = ("tracer", "span", "token", "root")
+
+    def __init__(self, tracer: "Tracer", span: Span, root: bool):
+        self.tracer = tracer
+        self.span = span
+        self.root = root
+        self.token = None
+
+    def __enter__(self) -> Span:
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end_ns = time.time_ns()
+        if exc is not None:
+            self.span.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        try:
+            _current.reset(self.token)
+        except ValueError:
+            # 异步生成器在别的上下文里被关闭时无法 reset，此时直接忽略
+            pass
+        if self.root:
+            self.tracer._finish(self.span)
+        return False
+
+
+class _NoopScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopScope()
+
+
+class _Timed:
+    __slots__ = ("span", "key", "start")
+
+    def __init__(self, span: Span, key: str):
+        self.span = span
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.add_timing(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class Tracer:
+    def __init__(self, settings: TracingSettings):
+        self.settings = settings
+        self.enabled = settings.tracing_enabled
+        self._recent: deque = deque(maxlen=settings.tracing_keep_last)
+
+    def trace(self, name: str, **attributes):
+        """开启一棵新的 span 树（一次抓取/转发）"""
+        if not self.enabled:
+            return _NOOP
+        return _SpanScope(self, Span(name, os.urandom(16).hex(), None, attributes), root=True)
+
+    def span(self, name: str, **attributes):
+        """在当前 span 下创建子 span；不在任何 trace 内时为空操作"""
+        parent = _current.get()
+        if parent is None:
+            return _NOOP
+        span = Span(name, parent.trace_id, parent.span_id, attributes)
+        parent.children.append(span)
+        return _SpanScope(self, span, root=False)
+
+    def recent(self, name: Optional[str] = None, last: Optional[int] = None) -> List[Span]:
+        spans = [s for s in self._recent if name is None or s.name == name]
+        return spans[-last:] if last else spans
+
+    def get(self, trace_id: str) -> Optional[Span]:
+        return next((s for s in self._recent if s.trace_id == trace_id), None)
+
+    def _finish(self, root: Span) -> None:
+        self._recent.append(root)
+        exporter = self.settings.tracing_exporter
+        if exporter == "json":
+            self._write_json(root)
+        elif exporter == "otlp":
+            threading.Thread(target=self._post_otlp, args=(root,), daemon=True).start()
+
+    # region 导出
+    def _to_otlp(self, root: Span) -> Dict[str, Any]:
+        spans = []
+        for span in root.walk():
+            attributes = dict(span.attributes)
+            for key, seconds in span.timings.items():
+                attributes[f"timing.{key}_ms"] = round(seconds * 1000, 3)
+            item = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()],
+            }
+            if span.parent_id:
+                item["parentSpanId"] = span.parent_id
+            if "error" in span.attributes:
+                item["status"] = {"code": 2, "message": span.attributes["error"]}
+            spans.append(item)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": self.settings.tracing_service_name}},
+            ]},
+            "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": spans}],
+        }]}
+
+    def _write_json(self, root: Span) -> None:
+        try:
+            with open(self.settings.tracing_json_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self._to_otlp(root), ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning("写入 trace 文件失败: %s", e)
+
+    def _post_otlp(self, root: Span) -> None:
+        request = urllib.request.Request(
+            self.settings.tracing_otlp_endpoint,
+            data=json.dumps(self._to_otlp(root)).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+        except Exception as e:
+            logger.warning("发送 trace 到 Collector 失败: %s", e)
+    # endregion
+
+
+def _otlp_value(value) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+tracer = Tracer(get_tracing_settings())
+
+
+def timed(key: str):
+    """把代码块耗时累加到当前 span 的 timings[key]"""
+    span = _current.get()
+    if span is None:
+        return _NOOP
+    return _Timed(span, key)
+
+
+def add_timing(key: str, seconds: float) -> None:
+    span = _current.get()
+    if span is not None:
+        span.add_timing(key, seconds)
+
+
+async def trace_pages(iterator, page_size: int = 100):
+    """
+    包装 ``iter_messages`` 之类的异步迭代器：每 page_size 条消息一个 page span。
+    page.timings 中 fetch 为等待下一条消息的时间（含 RPC 与 wait_time 休眠），
+    process 为调用方处理这一页消息的时间。只在拉取期间把 page 设为当前 span，
+    这样调用方提前退出循环也不会把 page 遗留在上下文里。
+    """
+    parent = _current.get()
+    if parent is None:
+        async for item in iterator:
+            yield item
+        return
+
+    clock = time.perf_counter
+    iterator = iterator.__aiter__()
+    page = None
+    index = count = 0
+    try:
+        while True:
+            if page is None:
+                page = Span("page", parent.trace_id, parent.span_id, {"index": index})
+                parent.children.append(page)
+                count = 0
+            token = _current.set(page)
+            start = clock()
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                page.add_timing("fetch", clock() - start)
+                _current.reset(token)
+            count += 1
+            start = clock()
+            yield item
+            page.add_timing("process", clock() - start)
+            if count >= page_size:
+                page.attributes["messages"] = count
+                page.end_ns = time.time_ns()
+                page = None
+                index += 1
+    finally:
+        if page is not None:
+            page.attributes["messages"] = count
+            page.end_ns = time.time_ns()
+
+
+def summarize(roots: List[Span]) -> Dict[str, Any]:
+    """按类别汇总 wall-clock 时间都花在了哪里"""
+    crawls = []
+    totals: Dict[str, float] = {}
+    for root in roots:
+        breakdown: Dict[str, float] = {}
+        for span in root.walk():
+            if span.name.startswith("rpc "):
+                breakdown["rpc"] = breakdown.get("rpc", 0.0) + span.duration
+            for key, seconds in span.timings.items():
+                if key != "process":
+                    breakdown[key] = breakdown.get(key, 0.0) + seconds
+        # fetch 包含了 RPC，剩下的部分主要是 iter_messages 的 wait_time 休眠
+        if "fetch" in breakdown:
+            breakdown["wait"] = max(breakdown.pop("fetch") - breakdown.get("rpc", 0.0), 0.0)
+        wall = root.duration
+        breakdown["other"] = max(wall - sum(breakdown.values()), 0.0)
+        for key, seconds in breakdown.items():
+            totals[key] = totals.get(key, 0.0) + seconds
+        totals["wall"] = totals.get("wall", 0.0) + wall
+        crawls.append({
+            "trace_id": root.trace_id,
+            "name": root.name,
+            "attributes": root.attributes,
+            "wall_ms": round(wall * 1000, 3),
+            "breakdown_ms": {k: round(v * 1000, 3) for k, v in breakdown.items()},
+        })
+    wall = totals.pop("wall", 0.0)
+    return {
+        "count": len(crawls),
+        "wall_ms": round(wall * 1000, 3),
+        "breakdown_ms": {k: round(v * 1000, 3) for k, v in totals.items()},
+        "breakdown_pct": {k: round(v / wall * 100, 2) for k, v in totals.items()} if wall else {},
+        "crawls": crawls,
+    }
@@ -0,0 +1,269 @@
+# app/worker.py
+"""
+独立的抓取 worker 进程::
+
+    python -m app.worker --concurrency 2
+    python -m app.worker --catch-up   # 同时负责断线补齐
+    python -m app.worker --refresh-views   # 同时定期刷新浏览数
+    python -m app.worker --subscriptions   # 同时扫描订阅的来源频道并转发命中的消息
+
+从 crawl_jobs 表按租约认领任务，执行期间定期心跳续租。进程崩溃或失联后
+租约过期，任务会被其他 worker 接手；同一频道同一时刻只会有一个 worker
+在抓取。多个 worker 可以跨机器连接同一个数据库运行。
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+from functools import lru_cache
+from typing import Dict, Optional
+
+from pydantic_settings import BaseSettings
+from sqlalchemy.orm import sessionmaker
+
+from .database import SessionLocal
+from .models import CrawlJob, JobStatusEnum
+from .repositories import JobRepository
+from .services import JobService, TelegramClientManager, CatchUpService, ViewRefreshService, SubscriptionService
+from .services.catch_up_service import get_catch_up_settings
+from .services.view_refresh_service import get_view_refresh_settings
+from .services.recorder import recorder
+from .repositories.subscription_index import get_subscription_settings
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerSettings(BaseSettings):
+    worker_concurrency: int = 2
+    worker_lease_seconds: float = 60.0
+    worker_poll_seconds: float = 2.0
+    worker_max_attempts: int = 3
+
+    class Config:
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+
+
+@lru_cache()
+def get_worker_settings() -> WorkerSettings:
+    return WorkerSettings()
+
+
+class Worker:
+    def __init__(self, session_factory: sessionmaker, settings: Optional[WorkerSettings] = None,
+                 worker_id: Optional[str] = None):
+        self.session_factory = session_factory
+        self.settings = settings or get_worker_settings()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def claim(self) -> Optional[CrawlJob]:
+        with self.session_factory() as db:
+            job = JobRepository(db).claim(
+                self.worker_id, self.settings.worker_lease_seconds, self.settings.worker_max_attempts)
+            if job is not None:
+                db.expunge(job)
+            return job
+
+    async def run(self) -> None:
+        """持续认领任务直到 stop()；退出前等待正在执行的任务结束"""
+        logger.info("worker %s 启动，并发 %s", self.worker_id, self.settings.worker_concurrency)
+        while not self._stopping.is_set():
+            job = None
+            if len(self._tasks) < self.settings.worker_concurrency:
+                job = self.claim()
+            if job is not None:
+                self._tasks[job.id] = asyncio.create_task(self._run_job(job))
+                continue
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.settings.worker_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def run_once(self) -> int:
+        """认领并执行当前能认领的任务，全部结束后返回执行数（用于脚本和压测）"""
+        count = 0
+        while True:
+            while len(self._tasks) < self.settings.worker_concurrency:
+                job = self.claim()
+                if job is None:
+                    break
+                self._tasks[job.id] = asyncio.create_task(self._run_job(job))
+                count += 1
+            if not self._tasks:
+                return count
+            await asyncio.wait(list(self._tasks.values()), return_when=asyncio.FIRST_COMPLETED)
+
+    async def _run_job(self, job: CrawlJob) -> None:
+        logger.info("开始任务 %s（%s %s，第 %s 次）", job.id, job.kind, job.dialog_id, job.attempts)
+        work = asyncio.create_task(self._execute(job))
+        heartbeat = asyncio.create_task(self._heartbeat(job, work))
+        status, error = JobStatusEnum.done, None
+        try:
+            await work
+        except asyncio.CancelledError:
+            # 租约已丢失时任务归新的持有者处理；进程退出时等租约过期后由其他 worker 接手
+            if self._lease_lost(heartbeat):
+                logger.warning("任务 %s 租约丢失，已放弃", job.id)
+                return
+            raise
+        except Exception as e:
+            logger.exception("任务 %s 执行失败", job.id)
+            retry = job.attempts < self.settings.worker_max_attempts
+            status, error = (JobStatusEnum.pending if retry else JobStatusEnum.failed), f"{type(e).__name__}: {e}"
+        finally:
+            heartbeat.cancel()
+            self._tasks.pop(job.id, None)
+        with self.session_factory() as db:
+            JobRepository(db).finish(job.id, job.dialog_id, self.worker_id, status, error)
+        logger.info("任务 %s 结束：%s", job.id, status.value)
+
+    async def _execute(self, job: CrawlJob) -> None:
+        with self.session_factory() as db:
+            await JobService(db).execute(job)
+
+    async def _heartbeat(self, job: CrawlJob, work: asyncio.Task) -> bool:
+        """每三分之一租期续租一次；续租失败时取消任务并返回 True"""
+        interval = self.settings.worker_lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                with self.session_factory() as db:
+                    renewed = JobRepository(db).heartbeat(
+                        job.id, job.dialog_id, self.worker_id, self.settings.worker_lease_seconds)
+            except Exception as e:
+                # 数据库暂时不可用时继续执行，下个周期再续租
+                logger.warning("任务 %s 心跳失败: %s", job.id, e)
+                continue
+            if not renewed:
+                work.cancel()
+                return True
+
+    async def catch_up_forever(self) -> None:
+        """启动时先补齐断线期间的更新，之后定期补齐并保存状态；Telegram 断线重连后立即补齐一次"""
+        interval = get_catch_up_settings().catchup_interval_seconds
+        reconnected = asyncio.Event()
+        manager = TelegramClientManager()
+        manager.add_reconnect_listener(reconnected.set)
+        try:
+            while not self._stopping.is_set():
+                # 补齐过程中又重连的，结束后再补一次
+                reconnected.clear()
+                try:
+                    with self.session_factory() as db:
+                        report = await CatchUpService(db).catch_up()
+                    logger.info("补齐完成: %s", report)
+                except Exception:
+                    logger.exception("补齐失败")
+                waiters = [asyncio.ensure_future(self._stopping.wait()), asyncio.ensure_future(reconnected.wait())]
+                try:
+                    await asyncio.wait(waiters, timeout=interval, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    for waiter in waiters:
+                        waiter.cancel()
+                if reconnected.is_set() and not self._stopping.is_set():
+                    logger.info("Telegram 已重连，开始补齐")
+        finally:
+            manager.remove_reconnect_listener(reconnected.set)
+
+    async def refresh_views_forever(self) -> None:
+        """定期刷新所有频道最近消息的浏览数"""
+        interval = get_view_refresh_settings().views_interval_seconds
+        while not self._stopping.is_set():
+            try:
+                with self.session_factory() as db:
+                    reports = await ViewRefreshService(db).refresh_all()
+                updated = sum(r["updated"] for r in reports)
+                seconds = sum(r["seconds"] for r in reports)
+                logger.info("浏览数刷新完成: %s 个频道 %s 条，%.1f 条/秒",
+                            len(reports), updated, updated / seconds if seconds else 0.0)
+            except Exception:
+                logger.exception("浏览数刷新失败")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def subscriptions_forever(self) -> None:
+        """定期扫描订阅的来源频道，并把转发队列发完"""
+        interval = get_subscription_settings().subscription_forward_interval_seconds
+        while not self._stopping.is_set():
+            try:
+                with self.session_factory() as db:
+                    service = SubscriptionService(db)
+                    reports = await service.crawl_all()
+                    report = await service.dispatch()
+                if report["batches"]:
+                    logger.info("订阅扫描 %s 个频道，转发 %s", len(reports), report)
+            except Exception:
+                logger.exception("订阅转发失败")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    def _lease_lost(heartbeat: asyncio.Task) -> bool:
+        return heartbeat.done() and not heartbeat.cancelled() and heartbeat.result() is True
+
+
+async def _main(args) -> None:
+    settings = get_worker_settings()
+    if args.concurrency:
+        settings.worker_concurrency = args.concurrency
+    # worker 进程自己持有 Telegram 连接，任务里的 service 通过单例拿到同一个客户端
+    await TelegramClientManager().connect()
+
+    worker = Worker(SessionLocal, settings, args.worker_id)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except NotImplementedError:
+            # Windows 不支持，Ctrl+C 时直接中断
+            pass
+    if args.once:
+        await worker.run_once()
+    else:
+        loops = []
+        if args.catch_up:
+            loops.append(asyncio.create_task(worker.catch_up_forever()))
+        if args.refresh_views:
+            loops.append(asyncio.create_task(worker.refresh_views_forever()))
+        if args.subscriptions:
+            loops.append(asyncio.create_task(worker.subscriptions_forever()))
+        await worker.run()
+        if loops:
+            await asyncio.gather(*loops)
+    # 录制缓冲里不满一块的记录
+    recorder.flush()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="TGCrawler 抓取 worker")
+    parser.add_argument("--concurrency", type=int, help="同时执行的任务数，默认 WORKER_CONCURRENCY")
+    parser.add_argument("--worker-id", help="worker 标识，默认 主机名:进程号")
+    parser.add_argument("--once", action="store_true", help="执行完当前可认领的任务后退出")
+    parser.add_argument("--catch-up", action="store_true",
+                        help="启动时用保存的更新状态补齐错过的消息，并定期保存状态（同一账号只需一个 worker 开启）")
+    parser.add_argument("--refresh-views", action="store_true",
+                        help="定期刷新所有频道最近消息的浏览数，间隔 VIEWS_INTERVAL_SECONDS")
+    parser.add_argument("--subscriptions", action="store_true",
+                        help="定期扫描订阅的来源频道并转发命中的消息，间隔 SUBSCRIPTION_FORWARD_INTERVAL_SECONDS"
+                             "（同一账号只需一个 worker 开启）")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_converter.py
+"""
+消息转换器的微基准。
+
+用一组合成消息（含各类媒体、频道署名、匿名、转发、回复）分别计时
+``convert_message`` 与 MessageService 中原有的逐项判断函数每条消息的耗时。
+两条路径逐字段一致由 tests/test_message_converter.py 校验。
+
+用法::
+
+    python -m benchmarks.bench_converter --messages 20000
+"""
+import argparse
+import json
+import sys
+import timeit
+
+from . import bench_ingest  # 先导入，设置好 Telegram 配置的环境变量
+
+from app.services import MessageService
+from app.services.message_converter import convert_message
+from .fake_client import FakeTelegramClient, SyntheticChannel
+
+ALL_MEDIA = {"photo": 0.15, "video": 0.1, "document": 0.1, "audio": 0.05, "voice": 0.05,
+             "sticker": 0.05, "gif": 0.05, "webpage": 0.1}
+
+
+def legacy_convert(service: MessageService, message):
+    """原有逐项判断函数拼出来的结果"""
+    message_row = {
+        "message_id": message.id,
+        "dialog_id": message.chat.id,
+        "sender_id": service._get_sender_id(message),
+        "sender_type": service._determine_sender_type(message),
+        "date": message.date,
+        "message": message.text,
+        "views": getattr(message, "views", None),
+        "media_type": service._determine_media_type(message),
+        "media_size": service._get_media_size(message),
+        "reply_to_msg_id": getattr(message.reply_to, "reply_to_msg_id", None),
+        "forward_from_id": service._get_forward_from_id(message),
+        "forward_from_msg_id": service._get_forward_from_msg_id(message),
+    }
+    media = None
+    if message.media and message_row["media_type"] is not None:
+        media = service._create_media_from_message(message, message.id, message.chat.id)
+    return message_row, media
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Message converter micro-benchmark")
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    channel = SyntheticChannel(channel_id=1_000_001, title="bench", message_count=args.messages,
+                               hit_rate=0, media_mix=ALL_MEDIA, reply_rate=0.2, forward_rate=0.2)
+    client = FakeTelegramClient([channel])
+    messages = [client._build_message(channel, i) for i in range(1, args.messages + 1)]
+    service = MessageService(db=None)
+
+    def run_legacy():
+        for message in messages:
+            legacy_convert(service, message)
+
+    def run_new():
+        for message in messages:
+            convert_message(message)
+
+    legacy = min(timeit.repeat(run_legacy, number=1, repeat=3))
+    new = min(timeit.repeat(run_new, number=1, repeat=3))
+    print(json.dumps({
+        "messages": len(messages),
+        "legacy_us_per_msg": round(legacy / len(messages) * 1e6, 3),
+        "converter_us_per_msg": round(new / len(messages) * 1e6, 3),
+        "speedup": round(legacy / new, 2),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+# benchmarks/bench_formats.py
+"""
+响应格式压测：同一批消息分别以 JSON（response_model 逐行校验）、MessagePack、
+Arrow IPC stream 从列表接口分页拉取、从导出接口流式拉取，
+按每 10 万行折算传输字节数和进程 CPU 时间。
+
+CPU 用 ``time.process_time`` 统计，TestClient 与应用在同一进程；列表接口翻页
+需要解出响应，解码耗时单独计时后从中扣除（server_cpu），收包开销仍包含在内。
+db_only 一行是只从数据库读出同样的行、不编码的开销，作为下限参考。
+
+用法::
+
+    python -m benchmarks.bench_formats --messages 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from . import bench_ingest  # 先导入，设置好 Telegram 配置的环境变量
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import get_db, get_read_db
+from app.main import app
+from app.models import Base
+from app.services import DialogService, MessageService
+from app.services.message_service import INGEST_BATCH_SIZE
+from .fake_client import FakeTelegramClient, SyntheticChannel
+
+CHANNEL_ID = 1_000_001
+
+FORMATS = {
+    "json": "application/json",
+    "msgpack": "application/x-msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "msgpack": "application/x-msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+async def _prepare(session_factory, args) -> None:
+    channel = SyntheticChannel(channel_id=CHANNEL_ID, title="bench-source", message_count=args.messages,
+                               keyword="needle", hit_rate=0.1, media_mix={"photo": 0.2, "video": 0.1})
+    client = FakeTelegramClient([channel], seed=args.seed)
+    with session_factory() as db:
+        service = DialogService(db)
+        service.client = client
+        await service.get_all_dialogs()
+        pages = await client.get_messages(CHANNEL_ID)
+        service = MessageService(db)
+        for offset in range(0, len(pages), INGEST_BATCH_SIZE):
+            service.ingest_messages(pages[offset:offset + INGEST_BATCH_SIZE])
+
+
+def _measure(func) -> dict:
+    cpu, wall = time.process_time(), time.perf_counter()
+    rows, size, client_cpu = func()
+    return {"rows": rows, "bytes": size, "cpu": time.process_time() - cpu - client_cpu,
+            "wall": time.perf_counter() - wall}
+
+
+def _list_pages(client: TestClient, accept: str, page: int):
+    def run():
+        rows = size = 0
+        after_id = 0
+        client_cpu = 0.0
+        while True:
+            r = client.get(f"/messages/dialog/{CHANNEL_ID}", params={"after_id": after_id, "limit": page},
+                           headers={"Accept": accept})
+            r.raise_for_status()
+            size += len(r.content)
+            start = time.process_time()
+            count, last = _count(accept, r.content)
+            client_cpu += time.process_time() - start
+            if not count:
+                return rows, size, client_cpu
+            rows += count
+            after_id = last
+    return run
+
+
+def _count(accept: str, content: bytes):
+    """解出行数与最后一条的 message_id，用于翻页"""
+    if accept == "application/json":
+        data = json.loads(content)
+        return len(data), data[-1]["message_id"] if data else None
+    if accept == "application/x-msgpack":
+        import msgpack
+        data = msgpack.unpackb(content)
+        return len(data), data[-1]["message_id"] if data else None
+    import pyarrow as pa
+    table = pa.ipc.open_stream(content).read_all()
+    return table.num_rows, table.column("message_id")[-1].as_py() if table.num_rows else None
+
+
+def _export(client: TestClient, accept: str):
+    def run():
+        size = 0
+        with client.stream("GET", f"/messages/dialog/{CHANNEL_ID}/export", headers={"Accept": accept}) as r:
+            r.raise_for_status()
+            for chunk in r.iter_bytes():
+                size += len(chunk)
+        return None, size, 0.0
+    return run
+
+
+def _db_only(session_factory):
+    def run():
+        with session_factory() as db:
+            rows = sum(1 for _ in MessageService(db).export_messages(CHANNEL_ID))
+        return rows, 0, 0.0
+    return run
+
+
+def _per_100k(result: dict, rows: int) -> dict:
+    scale = 100_000 / rows
+    return {
+        "mb_per_100k": round(result["bytes"] * scale / 1e6, 2),
+        "server_cpu_s_per_100k": round(result["cpu"] * scale, 3),
+        "wall_s_per_100k": round(result["wall"] * scale, 3),
+    }
+
+
+def run(args) -> dict:
+    db_url = args.db_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="tgcrawler-bench-"), "bench.db")
+    engine = create_engine(db_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    asyncio.run(_prepare(session_factory, args))
+
+    def override():
+        with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override
+    app.dependency_overrides[get_read_db] = override
+    # 导出接口在流式生成时自己开 Session
+    sys.modules["app.routers.message_router"].read_session = lambda max_lag=None: session_factory()
+    client = TestClient(app)
+
+    results = {"messages": args.messages, "db_only": _per_100k(_measure(_db_only(session_factory)), args.messages)}
+    for name, accept in FORMATS.items():
+        measured = _measure(_list_pages(client, accept, args.page))
+        assert measured["rows"] == args.messages, (name, measured["rows"])
+        results[f"list_{name}"] = _per_100k(measured, args.messages)
+    for name, accept in EXPORT_FORMATS.items():
+        results[f"export_{name}"] = _per_100k(_measure(_export(client, accept)), args.messages)
+    app.dependency_overrides.clear()
+    engine.dispose()
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="TGCrawler response format benchmark")
+    parser.add_argument("--db-url", help="数据库 URL，默认使用临时 SQLite 文件")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--page", type=int, default=1000, help="列表接口每页行数")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    print(json.dumps(run(args), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/bench_replay.py
+"""
+录制与回放压测：用 FakeTelegramClient 各抓取一遍（不录制 / 录制），
+比较录制带来的额外耗时和每条消息占用的磁盘；然后清空数据库，从录制
+回放同样的关键词，统计回放吞吐，并校验回放写出的 messages / medias
+行与在线抓取的完全一致，再用新关键词从录制重新筛选一遍。
+不一致时以非零状态码退出。
+
+用法::
+
+    python -m benchmarks.bench_replay --messages 20000
+    python -m benchmarks.bench_replay --page-latency 0.05   # 模拟网络，对比回放只受磁盘限制
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from . import bench_ingest  # 先导入，设置好 Telegram 配置的环境变量
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, Message, Media
+from app.repositories import RecordingStore
+from app.repositories.recording_store import RecordingSettings
+from app.services import DialogService, MessageService, ReplayService
+from app.services.recorder import recorder
+from .fake_client import FakeTelegramClient, SyntheticChannel
+
+CHANNEL_ID = 1_000_001
+_SKIP = {"id", "created_at", "updated_at"}
+
+
+def _snapshot(session_factory) -> tuple:
+    with session_factory() as db:
+        result = []
+        for model in (Message, Media):
+            columns = [c.name for c in model.__table__.columns if c.name not in _SKIP]
+            result.append([tuple(getattr(obj, name) for name in columns)
+                           for obj in db.query(model).order_by(model.message_id)])
+        return tuple(result)
+
+
+def _clear(session_factory) -> None:
+    with session_factory() as db:
+        for model in (Message, Media):
+            db.execute(model.__table__.delete())
+        db.commit()
+
+
+async def run(args) -> dict:
+    db_url = args.db_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="tgcrawler-bench-"), "bench.db")
+    engine = create_engine(db_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    channel = SyntheticChannel(channel_id=CHANNEL_ID, title="bench-source", message_count=args.messages,
+                               keyword=args.keyword, hit_rate=args.hit_rate,
+                               media_mix={"photo": 0.2, "video": 0.1, "document": 0.05})
+    client = FakeTelegramClient([channel], page_latency=args.page_latency, seed=args.seed)
+    with session_factory() as db:
+        service = DialogService(db)
+        service.client = client
+        await service.get_all_dialogs()
+
+    store = RecordingStore(RecordingSettings(recording_enabled=False,
+                                             recording_dir=tempfile.mkdtemp(prefix="tgcrawler-rec-")))
+    previous, recorder.store = recorder.store, store
+    result = {"messages": args.messages}
+    try:
+        for name, enabled in (("crawl_seconds", False), ("crawl_recording_seconds", True)):
+            _clear(session_factory)
+            store.settings.recording_enabled = enabled
+            with session_factory() as db:
+                service = MessageService(db)
+                service.client = client
+                start = time.perf_counter()
+                await service.fetch_messages_by_keywords(CHANNEL_ID, args.keyword)
+                result[name] = round(time.perf_counter() - start, 3)
+        store.settings.recording_enabled = False
+        live = _snapshot(session_factory)
+        stats = store.stats(CHANNEL_ID)
+        result["segments"] = stats["segments"]
+        result["bytes_per_message"] = round(stats["bytes"] / args.messages, 1)
+
+        _clear(session_factory)
+        with session_factory() as db:
+            report = ReplayService(db, store).replay(CHANNEL_ID, args.keyword)
+        result["replay_seconds"] = report["seconds"]
+        result["replay_messages_per_second"] = round(args.messages / report["seconds"]) if report["seconds"] else None
+        result["identical"] = _snapshot(session_factory) == live
+        result["rows"] = len(live[0])
+
+        # 换关键词重新筛选：不需要重新抓取
+        with session_factory() as db:
+            report = ReplayService(db, store).replay(CHANNEL_ID, args.rekey)
+        result["rekey_matched"] = report["matched"]
+        result["rekey_seconds"] = report["seconds"]
+    finally:
+        recorder.store = previous
+        engine.dispose()
+    return result
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="TGCrawler record/replay benchmark")
+    parser.add_argument("--db-url", help="数据库 URL，默认使用临时 SQLite 文件")
+    parser.add_argument("--messages", type=int, default=10000, help="源频道消息数")
+    parser.add_argument("--keyword", default="needle")
+    parser.add_argument("--rekey", default="python,archive", help="回放时换用的关键词")
+    parser.add_argument("--hit-rate", type=float, default=0.1)
+    parser.add_argument("--page-latency", type=float, default=0.0, help="每页模拟延迟（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if not result["identical"]:
+        print("回放写出的行与在线抓取不一致", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
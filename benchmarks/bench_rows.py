@@ -0,0 +1,105 @@
+# benchmarks/bench_rows.py
+"""
+写入路径行表示的对比：Pydantic 模型 + ORM 对象 vs ``__slots__`` 行记录。
+
+- 每条缓冲消息占用的内存（tracemalloc，含媒体行）；
+- 每行从转换结果到 INSERT 参数的 CPU 耗时。
+
+用法::
+
+    python -m benchmarks.bench_rows --messages 20000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from . import bench_ingest  # 先导入，设置好 Telegram 配置的环境变量
+from app.models import Message, Media
+from app.repositories import MessageRow, MediaRow
+from app.schemas import MessageCreate, MediaCreate
+from app.services.message_converter import convert_message
+from .bench_converter import ALL_MEDIA
+from .fake_client import FakeTelegramClient, SyntheticChannel
+
+
+def _pydantic_orm(converted):
+    """原写入路径：MessageCreate/MediaCreate -> .dict() -> ORM 对象"""
+    out = []
+    for row, media in converted:
+        message = Message(**MessageCreate(**row.as_dict()).dict())
+        out.append(message)
+        if media is not None:
+            out.append(Media(**MediaCreate(**media.as_dict()).dict()))
+    return out
+
+
+def _pydantic_only(converted):
+    out = []
+    for row, media in converted:
+        out.append(MessageCreate(**row.as_dict()))
+        if media is not None:
+            out.append(MediaCreate(**media.as_dict()))
+    return out
+
+
+def _rows(converted):
+    """新写入路径：行记录直接转成 Core 参数字典"""
+    out = []
+    for row, media in converted:
+        out.append({name: getattr(row, name) for name in MessageRow.__slots__})
+        if media is not None:
+            out.append({name: getattr(media, name) for name in MediaRow.__slots__})
+    return out
+
+
+def _buffer_memory(factory, count: int) -> float:
+    """缓冲 count 条消息时，每条平均占用的字节数"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    buffered = factory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del buffered
+    return round(size / count, 1)
+
+
+def _cpu_per_row(func, converted) -> float:
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        func(converted)
+        best = min(best, time.perf_counter() - start)
+    return round(best / len(converted) * 1e6, 3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest row representation benchmark")
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    channel = SyntheticChannel(channel_id=1_000_001, title="bench", message_count=args.messages,
+                               hit_rate=0, media_mix=ALL_MEDIA)
+    client = FakeTelegramClient([channel])
+    messages = [client._build_message(channel, i) for i in range(1, args.messages + 1)]
+    converted = [convert_message(m) for m in messages]
+
+    results = {
+        "messages": args.messages,
+        "bytes_per_buffered_msg": {
+            "pydantic_models": _buffer_memory(lambda: _pydantic_only(converted), args.messages),
+            "slots_rows": _buffer_memory(lambda: [convert_message(m) for m in messages], args.messages),
+        },
+        "us_per_row_to_insert_params": {
+            "pydantic_orm": _cpu_per_row(_pydantic_orm, converted),
+            "slots_rows": _cpu_per_row(_rows, converted),
+        },
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# benchmarks/bench_sharding.py
+"""
+分片压测：同样的频道分别抓进单库和“主库 + N 个分片”（都是临时 SQLite 文件），
+逐个频道比较 messages / medias / 汇总表读出的结果必须一致，统计每个分片分到
+的频道数、按 (主键, dialog_id) 查找与跨分片存储统计的耗时；然后把一个频道迁到另一
+个分片，校验迁移后读出的结果不变、源分片不再有该频道的行，重抓不会重复写入。
+结果不一致时以非零状态码退出。
+
+用法::
+
+    python -m benchmarks.bench_sharding
+    python -m benchmarks.bench_sharding --shards 4 --channels 12 --messages 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from . import bench_ingest  # 先导入，设置好 Telegram 配置的环境变量
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.orm import sessionmaker
+
+from app.database import AppSession
+from app.models import Base, Message
+from app.repositories import (MessageRepository, MediaRepository, RollupRepository, CompressionRepository,
+                              shards)
+from app.repositories.shard_repository import SHARDED_MODELS, shard_tables
+from app.repositories.shard_router import ShardSettings
+from app.services import DialogService, MessageService, ShardService
+from .fake_client import FakeTelegramClient, SyntheticChannel
+
+FIRST_CHANNEL_ID = 1_000_001
+_SKIP = {"id", "created_at", "updated_at"}
+
+
+def _snapshot(db, dialog_id: int) -> tuple:
+    messages = [tuple(v for k, v in row.items() if k not in _SKIP)
+                for row in MessageRepository(db).iter_by_dialog(dialog_id)]
+    medias = [tuple(v for k, v in row.items() if k not in _SKIP)
+              for row in MediaRepository(db).iter_by_dialog(dialog_id)]
+    rollups = RollupRepository(db)
+    summary = (
+        [(r.bucket, r.messages, r.media_messages) for r in rollups.get_activity(dialog_id, "day")],
+        [(r.media_type, r.messages, r.total_bytes) for r in rollups.get_media(dialog_id)],
+        sorted((r.sender_id, r.messages) for r in rollups.get_top_senders(dialog_id, 1000)),
+        [(r.day, r.keyword, r.hits) for r in rollups.get_keyword_hits(dialog_id)],
+    )
+    return messages, medias, summary
+
+
+async def _crawl(session_factory, client, channels, keyword) -> float:
+    with session_factory() as db:
+        service = DialogService(db)
+        service.client = client
+        await service.get_all_dialogs()
+    start = time.perf_counter()
+    for channel in channels:
+        with session_factory() as db:
+            service = MessageService(db)
+            service.client = client
+            await service.fetch_messages_by_keywords(channel.channel_id, keyword)
+    return round(time.perf_counter() - start, 3)
+
+
+def _lookup_keys(session_factory, limit: int) -> list:
+    """(主键, dialog_id)：分片时主键只在分片内唯一，按主键查找要带上 dialog_id"""
+    with session_factory() as db:
+        pages = shards.fan_out(db, lambda data: data.execute(
+            select(Message.id, Message.dialog_id).order_by(Message.id).limit(limit)).all())
+    return [tuple(row) for page in pages for row in page][:limit]
+
+
+def _lookup_seconds(session_factory, keys) -> float:
+    with session_factory() as db:
+        repo = MessageRepository(db)
+        start = time.perf_counter()
+        for id, dialog_id in keys:
+            assert repo.get_by_id(id, include_archived=False, dialog_id=dialog_id) is not None
+        return round(time.perf_counter() - start, 3)
+
+
+def _stats_seconds(session_factory, repeat: int = 20) -> tuple:
+    with session_factory() as db:
+        repo = CompressionRepository(db)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            stats = repo.storage_stats()
+        return round((time.perf_counter() - start) / repeat * 1000, 2), stats
+
+
+async def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="tgcrawler-bench-")
+    channels = [SyntheticChannel(channel_id=FIRST_CHANNEL_ID + i, title=f"bench-{i}", message_count=args.messages,
+                                 keyword=args.keyword, hit_rate=args.hit_rate,
+                                 media_mix={"photo": 0.2, "video": 0.1, "document": 0.05})
+                for i in range(args.channels)]
+    dialog_ids = [channel.channel_id for channel in channels]
+    result = {"shards": args.shards, "channels": args.channels, "messages_per_channel": args.messages}
+
+    # 单库基线
+    engine = create_engine("sqlite:///" + os.path.join(workdir, "single.db"))
+    Base.metadata.create_all(engine)
+    single = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AppSession)
+    result["single_crawl_seconds"] = await _crawl(single, FakeTelegramClient(channels, seed=args.seed), channels,
+                                                  args.keyword)
+    with single() as db:
+        expected = {dialog_id: _snapshot(db, dialog_id) for dialog_id in dialog_ids}
+    result["single_lookup_seconds"] = _lookup_seconds(single, _lookup_keys(single, args.lookups))
+    result["single_stats_ms"], single_stats = _stats_seconds(single)
+    engine.dispose()
+
+    # 主库 + 分片
+    sharded_tables = [model.__table__ for model in SHARDED_MODELS]
+    engine = create_engine("sqlite:///" + os.path.join(workdir, "main.db"))
+    Base.metadata.create_all(engine, tables=[t for t in Base.metadata.sorted_tables if t not in sharded_tables])
+    main = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AppSession)
+    urls = ["sqlite:///" + os.path.join(workdir, f"shard{i}.db") for i in range(args.shards)]
+    previous = shards._settings
+    shards._settings = ShardSettings(shard_urls=",".join(urls))
+    shards.invalidate()
+    try:
+        tables = shard_tables()
+        for index in shards.indexes():
+            for table in tables:
+                table.create(shards.engine(index))
+        client = FakeTelegramClient(channels, seed=args.seed)
+        result["sharded_crawl_seconds"] = await _crawl(main, client, channels, args.keyword)
+        with main() as db:
+            result["identical"] = all(_snapshot(db, d) == expected[d] for d in dialog_ids)
+            result["dialogs_per_shard"] = [item["dialogs"] for item in ShardService(db).stats()]
+        result["sharded_lookup_seconds"] = _lookup_seconds(main, _lookup_keys(main, args.lookups))
+        result["sharded_stats_ms"], sharded_stats = _stats_seconds(main)
+        result["stats_identical"] = sharded_stats == single_stats
+
+        # 迁移一个频道
+        moved = dialog_ids[0]
+        with main() as db:
+            source = shards.index_of(db, moved)
+            report = ShardService(db).rebalance(moved, (source + 1) % shards.count, args.batch_size)
+        result["rebalance"] = report
+        with main() as db:
+            result["identical_after_rebalance"] = _snapshot(db, moved) == expected[moved]
+            result["source_rows_left"] = sum(
+                shards.shard_session(db, source).execute(
+                    select(func.count()).select_from(model).where(model.dialog_id == moved)).scalar()
+                for model in SHARDED_MODELS)
+            service = MessageService(db)
+            service.client = client
+            again = await service.fetch_messages_by_keywords(moved, args.keyword)
+        with main() as db:
+            result["identical_after_recrawl"] = _snapshot(db, moved) == expected[moved]
+        result["recrawl"] = again
+    finally:
+        shards.dispose()
+        shards._settings = previous
+        shards.invalidate()
+        engine.dispose()
+    return result
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="TGCrawler sharding benchmark")
+    parser.add_argument("--shards", type=int, default=3, help="分片数")
+    parser.add_argument("--channels", type=int, default=6, help="频道数")
+    parser.add_argument("--messages", type=int, default=2000, help="每个频道的消息数")
+    parser.add_argument("--keyword", default="needle")
+    parser.add_argument("--hit-rate", type=float, default=0.3)
+    parser.add_argument("--lookups", type=int, default=200, help="按主键查找的次数")
+    parser.add_argument("--batch-size", type=int, default=500, help="迁移时每批的行数")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2, ensure_ascii=False, default=str))
+    checks = ("identical", "stats_identical", "identical_after_rebalance", "identical_after_recrawl")
+    if not all(result[name] for name in checks) or result["source_rows_left"]:
+        print("分片读出的结果与单库不一致", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+# benchmarks/bench_subscriptions.py
+"""
+订阅规则压测：规则数逐级增加（默认 1 / 10 / 100 / 500），比较编译后的
+索引与逐条规则各跑一遍正则的单条消息匹配耗时；两者的命中结果必须一致。
+之后把最多的一级规则写进库里，对每个来源频道各扫描一次并转发，统计
+请求数与扫描条数（每个频道只扫一遍），从头重扫不应再入队。
+结果不一致时以非零状态码退出。
+
+用法::
+
+    python -m benchmarks.bench_subscriptions
+    python -m benchmarks.bench_subscriptions --rules 1,10,100,500,2000 --messages 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+from . import bench_ingest  # 先导入，设置好 Telegram 配置的环境变量
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, SubscriptionRule
+from app.repositories import RuleIndex, subscriptions
+from app.repositories.subscription_index import split_ids, split_keywords
+from app.services import DialogService, SubscriptionService
+from app.services.message_converter import convert_message
+from .fake_client import FakeTelegramClient, SyntheticChannel
+
+CHANNEL_IDS = (1_000_001, 1_000_002, 1_000_003)
+MEDIA_TYPES = ("video", "photo", "document")
+
+
+def _make_rules(count: int, keyword: str, rng: random.Random) -> list:
+    """随机规则：多数限定来源，部分带媒体条件，少数不限来源；不限关键词的规则都带媒体条件"""
+    rules = []
+    for i in range(count):
+        sources = ",".join(map(str, rng.sample(CHANNEL_IDS, rng.randint(1, 2)))) if rng.random() < 0.9 else None
+        words = [f"kw{rng.randrange(count * 4)}" for _ in range(3)]
+        if rng.random() < 0.3:
+            words.append(keyword)
+        media = rng.choice(MEDIA_TYPES) if rng.random() < 0.3 else None
+        rules.append(SubscriptionRule(
+            id=i + 1, name=f"rule-{i}", source_dialog_ids=sources,
+            keywords=",".join(words) if media is None or rng.random() < 0.7 else None, media_types=media,
+            min_duration=rng.choice((None, 60, 600)) if media == "video" else None,
+            to_chat_id=rng.randrange(1, 20), enabled=True,
+        ))
+    return rules
+
+
+class _NaiveRule:
+    """逐条规则匹配的对照实现：每条规则一个正则"""
+
+    def __init__(self, obj: SubscriptionRule):
+        self.obj = obj
+        self.sources = set(split_ids(obj.source_dialog_ids))
+        words = split_keywords(obj.keywords)
+        self.pattern = re.compile("|".join(map(re.escape, words)), re.IGNORECASE) if words else None
+
+    def match(self, row, media) -> bool:
+        obj = self.obj
+        if self.sources and row.dialog_id not in self.sources:
+            return False
+        if self.pattern is not None and not (row.message and self.pattern.search(row.message)):
+            return False
+        if obj.media_types and (row.media_type is None or row.media_type.value != obj.media_types):
+            return False
+        if obj.min_duration is not None and (media is None or media.duration is None
+                                             or media.duration < obj.min_duration):
+            return False
+        return True
+
+
+def _per_message_us(func_, rows, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for row, media in rows:
+            func_(row, media)
+        best = min(best, time.perf_counter() - start)
+    return round(best / len(rows) * 1e6, 2)
+
+
+async def _match_steps(rows, args) -> list:
+    results = []
+    for count in map(int, args.rules.split(",")):
+        rules = _make_rules(count, args.keyword, random.Random(args.seed + count))
+        start = time.perf_counter()
+        index = RuleIndex(rules)
+        build_ms = (time.perf_counter() - start) * 1000
+        naive = [_NaiveRule(obj) for obj in rules]
+
+        def indexed(row, media):
+            return index.match(row.dialog_id, row.message, row.media_type,
+                               media.duration if media is not None else None)
+
+        def one_by_one(row, media):
+            return [rule for rule in naive if rule.match(row, media)]
+
+        consistent = all(
+            sorted(rule.id for rule in indexed(row, media)) == sorted(rule.obj.id for rule in one_by_one(row, media))
+            for row, media in rows
+        )
+        results.append({
+            "rules": count,
+            "build_ms": round(build_ms, 2),
+            "index_us_per_msg": _per_message_us(indexed, rows, args.repeat),
+            "per_rule_us_per_msg": _per_message_us(one_by_one, rows, args.repeat),
+            "consistent": consistent,
+        })
+    return results
+
+
+async def _crawl_step(channels, args) -> dict:
+    db_url = args.db_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="tgcrawler-bench-"), "bench.db")
+    engine = create_engine(db_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    client = FakeTelegramClient(channels, seed=args.seed)
+    count = max(map(int, args.rules.split(",")))
+    with session_factory() as db:
+        service = DialogService(db)
+        service.client = client
+        await service.get_all_dialogs()
+        db.add_all(_make_rules(count, args.keyword, random.Random(args.seed + count)))
+        db.commit()
+
+    subscriptions.invalidate()
+    result = {"rules": count, "channels": len(channels)}
+    with session_factory() as db:
+        service = SubscriptionService(db)
+        service.client = client
+        client.rpc_calls = 0
+        start = time.perf_counter()
+        # 规则直接写库，来源频道还没有扫描进度：显式从头扫描（否则首次扫描只设置进度）
+        reports = [await service.crawl(dialog_id, min_id=0) for dialog_id in subscriptions.get(db).sources()]
+        result["crawl_seconds"] = round(time.perf_counter() - start, 3)
+        result["rpc_calls"] = client.rpc_calls
+        result["scanned"] = sum(r["scanned"] for r in reports)
+        result["matched"] = sum(r["matched"] for r in reports)
+        result["queued"] = sum(r["queued"] for r in reports)
+        result["scanned_once"] = sorted(r["scanned"] for r in reports) == sorted(c.message_count for c in channels)
+
+        start = time.perf_counter()
+        dispatch = await service.dispatch()
+        result["dispatch_seconds"] = round(time.perf_counter() - start, 3)
+        result["forward_calls"] = dispatch["batches"]
+        result["forwarded"] = client.forwarded
+
+        # 从头重扫：消息都已在库里，不会再入队
+        again = [await service.crawl(channel.channel_id, min_id=0) for channel in channels]
+        result["rescan_queued"] = sum(r["queued"] for r in again)
+    engine.dispose()
+    subscriptions.invalidate()
+    return result
+
+
+async def run(args) -> dict:
+    channels = [SyntheticChannel(channel_id=channel_id, title=f"bench-{channel_id}", message_count=args.messages,
+                                 keyword=args.keyword, hit_rate=args.hit_rate,
+                                 media_mix={"photo": 0.2, "video": 0.1, "document": 0.05})
+                for channel_id in CHANNEL_IDS]
+    client = FakeTelegramClient(channels, seed=args.seed)
+    rows = []
+    for channel in channels:
+        async for message in client.iter_messages(channel.channel_id, limit=args.sample):
+            rows.append(convert_message(message))
+    return {"match": await _match_steps(rows, args), "crawl": await _crawl_step(channels, args)}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="TGCrawler subscription benchmark")
+    parser.add_argument("--db-url", help="数据库 URL，默认使用临时 SQLite 文件")
+    parser.add_argument("--rules", default="1,10,100,500", help="逗号分隔的规则数")
+    parser.add_argument("--messages", type=int, default=3000, help="每个来源频道的消息数")
+    parser.add_argument("--sample", type=int, default=1000, help="每个频道取多少条消息测匹配耗时")
+    parser.add_argument("--keyword", default="needle")
+    parser.add_argument("--hit-rate", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=3, help="匹配耗时取最好的一次")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    crawl = results["crawl"]
+    if not all(r["consistent"] for r in results["match"]):
+        print("索引与逐条规则的匹配结果不一致", file=sys.stderr)
+        return 1
+    if not crawl["scanned_once"] or crawl["rescan_queued"] or crawl["forwarded"] != crawl["queued"]:
+        print("扫描或转发结果不符合预期", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
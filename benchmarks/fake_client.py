@@ -0,0 +1,396 @@
+# benchmarks/fake_client.py
+"""
+本地伪造的 TelegramClient，用于在没有真实账号的情况下压测抓取链路。
+
+生成的消息是真正的 Telethon ``Message`` 对象（经过 ``_finish_init``），
+因此 ``message.text`` / ``message.chat`` / ``message.sender`` / ``message.video``
+等属性与线上完全一致，业务代码无需任何改动即可被驱动。
+"""
+import asyncio
+import math
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from telethon import utils
+from telethon._updates import EntityCache
+from telethon.tl import types
+
+# 每页消息数，与 Telethon iter_messages 的单次请求上限保持一致
+PAGE_SIZE = 100
+
+DEFAULT_MEDIA_MIX = {
+    "photo": 0.15,
+    "video": 0.10,
+    "document": 0.05,
+    "audio": 0.03,
+    "voice": 0.03,
+    "sticker": 0.02,
+    "gif": 0.02,
+}
+
+
+def parse_media_mix(value: Optional[str]) -> Dict[str, float]:
+    """解析形如 ``photo=0.2,video=0.1`` 的媒体占比配置"""
+    if not value:
+        return dict(DEFAULT_MEDIA_MIX)
+    mix = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        kind, _, ratio = part.partition("=")
+        kind = kind.strip()
+        if kind not in _MEDIA_BUILDERS:
+            raise ValueError(f"不支持的媒体类型: {kind}")
+        mix[kind] = float(ratio)
+    if sum(mix.values()) > 1:
+        raise ValueError("媒体占比之和不能超过 1")
+    return mix
+
+
+@dataclass
+class SyntheticChannel:
+    """一个合成频道的配置"""
+    channel_id: int
+    title: str
+    message_count: int
+    top_message_id: Optional[int] = None
+    keyword: str = "needle"
+    hit_rate: float = 0.1
+    media_mix: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_MEDIA_MIX))
+    text_length: int = 200
+    reply_rate: float = 0.05
+    forward_rate: float = 0.05
+    unread_count: int = 0
+    # 最新一条消息距离“现在”的分钟数，用于构造活跃度不同的对话列表
+    idle_minutes: int = 0
+
+    def __post_init__(self):
+        if self.top_message_id is None:
+            self.top_message_id = self.message_count
+
+
+def _photo(rng: random.Random, now: datetime):
+    w, h = rng.choice([(1280, 720), (800, 600), (1080, 1080)])
+    return types.MessageMediaPhoto(photo=types.Photo(
+        id=rng.getrandbits(62), access_hash=rng.getrandbits(62), file_reference=b"\x01" * 16,
+        date=now, dc_id=2,
+        sizes=[
+            types.PhotoStrippedSize(type="i", bytes=b"\x00" * 32),
+            types.PhotoSize(type="m", w=w // 4, h=h // 4, size=rng.randint(5_000, 20_000)),
+            types.PhotoSize(type="y", w=w, h=h, size=rng.randint(50_000, 500_000)),
+        ],
+    ))
+
+
+def _document(rng: random.Random, now: datetime, mime_type: str, attributes: list):
+    return types.MessageMediaDocument(document=types.Document(
+        id=rng.getrandbits(62), access_hash=rng.getrandbits(62), file_reference=b"\x02" * 16,
+        date=now, mime_type=mime_type, size=rng.randint(10_000, 200_000_000), dc_id=2,
+        attributes=attributes,
+    ))
+
+
+def _video(rng, now):
+    return _document(rng, now, "video/mp4", [
+        types.DocumentAttributeVideo(duration=rng.uniform(1, 3600), w=1280, h=720, supports_streaming=True),
+        types.DocumentAttributeFilename(file_name="video.mp4"),
+    ])
+
+
+def _file(rng, now):
+    return _document(rng, now, "application/pdf", [
+        types.DocumentAttributeFilename(file_name=f"file_{rng.randint(1, 9999)}.pdf"),
+    ])
+
+
+def _audio(rng, now):
+    return _document(rng, now, "audio/mpeg", [
+        types.DocumentAttributeAudio(duration=rng.randint(60, 600), title="track", performer="artist"),
+        types.DocumentAttributeFilename(file_name="track.mp3"),
+    ])
+
+
+def _voice(rng, now):
+    return _document(rng, now, "audio/ogg", [
+        types.DocumentAttributeAudio(duration=rng.randint(1, 120), voice=True),
+    ])
+
+
+def _sticker(rng, now):
+    return _document(rng, now, "image/webp", [
+        types.DocumentAttributeImageSize(w=512, h=512),
+        types.DocumentAttributeSticker(alt="🙂", stickerset=types.InputStickerSetEmpty()),
+    ])
+
+
+def _gif(rng, now):
+    return _document(rng, now, "video/mp4", [
+        types.DocumentAttributeAnimated(),
+        types.DocumentAttributeVideo(duration=rng.uniform(1, 10), w=320, h=240),
+    ])
+
+
+def _webpage(rng, now):
+    return types.MessageMediaWebPage(webpage=types.WebPage(
+        id=rng.getrandbits(62), url="https://example.com/a", display_url="example.com/a", hash=0,
+        title="example",
+    ))
+
+
+_MEDIA_BUILDERS = {
+    "photo": _photo,
+    "video": _video,
+    "document": _file,
+    "audio": _audio,
+    "voice": _voice,
+    "sticker": _sticker,
+    "gif": _gif,
+    "webpage": _webpage,
+}
+
+_WORDS = (
+    "telegram channel crawler python mysql archive update release video photo "
+    "daily news market report weekly digest link share topic chat group"
+).split()
+
+
+class FakeTelegramClient:
+    """
+    只实现业务代码用到的那部分 TelegramClient 接口：
+    ``is_connected`` / ``connect`` / ``get_dialogs`` / ``iter_dialogs`` / ``iter_messages`` /
+    ``get_messages`` / ``forward_messages``，以及 ``client(request)`` 形式的 updates 请求、
+    messages.getMessagesViews 和 users.getUsers / channels.getChannels。
+    每页返回前会 ``sleep(page_latency)`` 以模拟网络往返。
+    """
+
+    def __init__(self, channels: List[SyntheticChannel], page_latency: float = 0.0,
+                 user_pool: int = 500, seed: int = 42):
+        self.channels = {c.channel_id: c for c in channels}
+        self.page_latency = page_latency
+        self.seed = seed
+        self.parse_mode = None
+        self._self_id = 1
+        self._mb_entity_cache = EntityCache()
+        self.rpc_calls = 0
+        self.forwarded = 0
+
+        self._now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self._channel_entities = {
+            c.channel_id: types.Channel(
+                id=c.channel_id, title=c.title, photo=types.ChatPhotoEmpty(),
+                date=self._now, broadcast=True, access_hash=c.channel_id * 7,
+                participants_count=1000, username=f"chan{c.channel_id}",
+            )
+            for c in channels
+        }
+        self._users = [
+            # bot 与 bot_info_version 同样要么都给要么都不给
+            types.User(id=100_000 + i, access_hash=i * 13, first_name=f"user{i}",
+                       bot=True if i % 50 == 0 else None, bot_info_version=1 if i % 50 == 0 else None)
+            for i in range(user_pool)
+        ]
+        self._entities = {utils.get_peer_id(u): u for u in self._users}
+        for entity in self._channel_entities.values():
+            self._entities[utils.get_peer_id(entity)] = entity
+
+    # region 连接相关
+    def is_connected(self) -> bool:
+        return True
+
+    async def connect(self):
+        return None
+
+    async def _rpc(self):
+        self.rpc_calls += 1
+        if self.page_latency:
+            await asyncio.sleep(self.page_latency)
+    # endregion
+
+    def _channel(self, entity) -> SyntheticChannel:
+        channel_id = getattr(entity, "id", entity)
+        if isinstance(channel_id, int) and channel_id < 0:
+            channel_id = utils.resolve_id(channel_id)[0]
+        try:
+            return self.channels[channel_id]
+        except KeyError:
+            raise ValueError(f"Cannot find any entity corresponding to \"{entity}\"")
+
+    def _build_message(self, channel: SyntheticChannel, msg_id: int) -> types.Message:
+        # 每条消息用 (seed, channel, id) 派生随机数，保证多次运行结果一致
+        rng = random.Random(hash((self.seed, channel.channel_id, msg_id)))
+        date = self._top_date(channel) - timedelta(seconds=(channel.top_message_id - msg_id) * 60)
+
+        words = []
+        length = 0
+        while length < channel.text_length:
+            word = rng.choice(_WORDS)
+            words.append(word)
+            length += len(word) + 1
+        if rng.random() < channel.hit_rate:
+            words.insert(rng.randrange(len(words) + 1), channel.keyword)
+        text = " ".join(words)
+
+        media = None
+        roll = rng.random()
+        for kind, ratio in channel.media_mix.items():
+            if roll < ratio:
+                media = _MEDIA_BUILDERS[kind](rng, date)
+                break
+            roll -= ratio
+
+        sender = rng.choice(self._users)
+        reply_to = None
+        if msg_id > 1 and rng.random() < channel.reply_rate:
+            reply_to = types.MessageReplyHeader(reply_to_msg_id=rng.randint(max(1, msg_id - 500), msg_id - 1))
+        fwd_from = None
+        if rng.random() < channel.forward_rate:
+            if rng.random() < 0.5:
+                fwd_from = types.MessageFwdHeader(date=date, from_id=types.PeerUser(rng.choice(self._users).id))
+            else:
+                # 转发自频道带原帖ID
+                fwd_from = types.MessageFwdHeader(date=date, from_id=types.PeerChannel(rng.randint(1, 50)),
+                                                  channel_post=rng.randint(1, 10_000))
+
+        views = rng.randint(0, 100_000)
+        message = types.Message(
+            id=msg_id,
+            peer_id=types.PeerChannel(channel.channel_id),
+            date=date,
+            message=text,
+            from_id=types.PeerUser(sender.id),
+            fwd_from=fwd_from,
+            reply_to=reply_to,
+            media=media,
+            # views 与 forwards 在 TL 里是同一组可选字段，必须同时给出才能序列化
+            views=views,
+            forwards=views // 100,
+        )
+        message._finish_init(self, self._entities, None)
+        return message
+
+    def _top_date(self, channel: SyntheticChannel) -> datetime:
+        return self._now - timedelta(minutes=channel.idle_minutes)
+
+    def _dialog(self, channel: SyntheticChannel) -> "FakeDialog":
+        top = self._build_message(channel, channel.top_message_id) if channel.top_message_id else None
+        return FakeDialog(
+            entity=self._channel_entities[channel.channel_id],
+            message=top,
+            unread_count=channel.unread_count,
+            date=top.date if top else None,
+            dialog=FakeRawDialog(pts=channel.top_message_id),
+        )
+
+    async def get_dialogs(self, limit=None, **kwargs):
+        await self._rpc()
+        dialogs = [self._dialog(channel) for channel in self.channels.values()]
+        return dialogs[:limit] if limit else dialogs
+
+    async def iter_dialogs(self, limit=None, **kwargs):
+        """按最新消息时间从新到旧逐页产出对话，调用方中途退出就不再发请求"""
+        ordered = sorted(self.channels.values(), key=self._top_date, reverse=True)
+        if limit is not None:
+            ordered = ordered[:limit]
+        for start in range(0, len(ordered), PAGE_SIZE):
+            await self._rpc()
+            for channel in ordered[start:start + PAGE_SIZE]:
+                yield self._dialog(channel)
+
+    async def iter_messages(self, entity, limit=None, *, offset_date=None, offset_id=0,
+                            max_id=0, min_id=0, add_offset=0, reverse=False, wait_time=None, **kwargs):
+        """按 Telethon 的语义逐页（从新到旧）产出消息，reverse=True 时从旧到新"""
+        channel = self._channel(entity)
+        upper = channel.top_message_id
+        if offset_id:
+            upper = min(upper, offset_id - 1)
+        if max_id:
+            upper = min(upper, max_id - 1)
+        lower = max(min_id + 1, channel.top_message_id - channel.message_count + 1, 1)
+        if offset_date is not None:
+            # 合成消息每分钟一条，可以直接换算出 offset_date 对应的 ID；只返回严格早于它的消息
+            minutes = (self._top_date(channel) - offset_date).total_seconds() / 60
+            upper = min(upper, channel.top_message_id - math.floor(minutes) - 1)
+
+        ids = range(lower, upper + 1) if reverse else range(upper, lower - 1, -1)
+        produced = 0
+        for start in range(0, len(ids), PAGE_SIZE):
+            await self._rpc()
+            for msg_id in ids[start:start + PAGE_SIZE]:
+                if limit is not None and produced >= limit:
+                    return
+                produced += 1
+                yield self._build_message(channel, msg_id)
+
+    async def get_messages(self, entity, limit=None, **kwargs):
+        return [m async for m in self.iter_messages(entity, limit=limit, **kwargs)]
+
+    async def forward_messages(self, entity, messages, from_peer=None, **kwargs):
+        await self._rpc()
+        count = len(messages) if isinstance(messages, (list, tuple)) else 1
+        self.forwarded += count
+        return [None] * count
+
+    async def __call__(self, request, ordered=False, flood_sleep_threshold=None):
+        """直接发送的 TL 请求：只支持补齐用到的 updates.* 三个方法、浏览数查询和发送者补查"""
+        await self._rpc()
+        name = type(request).__name__
+        if name == "GetStateRequest":
+            return types.updates.State(pts=1, qts=0, date=self._now, seq=0, unread_count=0)
+        if name == "GetDifferenceRequest":
+            # 合成频道的消息只通过频道差异下发
+            return types.updates.DifferenceEmpty(date=self._now, seq=0)
+        if name == "GetChannelDifferenceRequest":
+            # 频道 pts 与消息 ID 一一对应
+            channel = self._channel(request.channel.channel_id)
+            top = channel.top_message_id
+            if request.pts >= top:
+                return types.updates.ChannelDifferenceEmpty(pts=top, final=True)
+            upper = min(top, request.pts + request.limit)
+            return types.updates.ChannelDifference(
+                pts=upper,
+                new_messages=[self._build_message(channel, i) for i in range(request.pts + 1, upper + 1)],
+                other_updates=[],
+                chats=[self._channel_entities[channel.channel_id]],
+                users=[],
+                final=upper >= top,
+            )
+        if name == "GetMessagesViewsRequest":
+            # 浏览数在抓取时的基础上增长一次；不存在的消息返回空
+            channel = self._channel(request.peer.channel_id)
+            lower = channel.top_message_id - channel.message_count
+            return types.messages.MessageViews(
+                views=[
+                    types.MessageViews(views=hash((self.seed, msg_id)) % 100_000 + 1
+                                       if lower < msg_id <= channel.top_message_id else None)
+                    for msg_id in request.id
+                ],
+                chats=[],
+                users=[],
+            )
+        if name == "GetUsersRequest":
+            # 与真实接口一样按请求顺序返回，查不到的给 UserEmpty
+            users = {u.id: u for u in self._users}
+            return [users.get(item.user_id) or types.UserEmpty(id=item.user_id) for item in request.id]
+        if name == "GetChannelsRequest":
+            return types.messages.Chats(chats=[self._channel_entities[item.channel_id] for item in request.id
+                                               if item.channel_id in self._channel_entities])
+        raise NotImplementedError(name)
+
+
+@dataclass
+class FakeDialog:
+    """对应 ``telethon.tl.custom.Dialog`` 中被业务代码使用的字段"""
+    entity: object
+    message: Optional[types.Message]
+    unread_count: int = 0
+    date: Optional[datetime] = None
+    pinned: bool = False
+    dialog: Optional["FakeRawDialog"] = None
+
+
+@dataclass
+class FakeRawDialog:
+    """``types.Dialog`` 中被业务代码使用的字段"""
+    pts: Optional[int] = None
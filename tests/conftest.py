@@ -0,0 +1,76 @@
+# tests/conftest.py
+"""
+测试用的数据库：主库和每个分片都是临时目录里的 SQLite 文件，
+数据由 benchmarks/fake_client.py 的合成频道抓取写入。
+"""
+import asyncio
+import os
+
+os.environ.setdefault("TELEGRAM_TELEGRAM_API_ID", "0")
+os.environ.setdefault("TELEGRAM_TELEGRAM_API_HASH", "test")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import AppSession
+from app.models import Base
+from app.repositories import shards
+from app.repositories.shard_repository import SHARDED_MODELS, shard_tables
+from app.repositories.shard_router import ShardSettings
+from app.services import DialogService, MessageService
+from benchmarks.fake_client import FakeTelegramClient
+
+SHARD_COUNT = 3
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    """主库 + SHARD_COUNT 个分片，返回主库的 Session 工厂"""
+    sharded_tables = {model.__table__ for model in SHARDED_MODELS}
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    Base.metadata.create_all(engine, tables=[t for t in Base.metadata.sorted_tables if t not in sharded_tables])
+    previous = shards._settings
+    shards._settings = ShardSettings(shard_urls=",".join(
+        f"sqlite:///{tmp_path / f'shard{index}.db'}" for index in range(SHARD_COUNT)))
+    shards.invalidate()
+    tables = shard_tables()
+    for index in shards.indexes():
+        for table in tables:
+            table.create(shards.engine(index))
+    try:
+        yield sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AppSession)
+    finally:
+        shards.dispose()
+        shards._settings = previous
+        shards.invalidate()
+        engine.dispose()
+
+
+def crawl(session_factory, channels, keyword: str = "needle") -> FakeTelegramClient:
+    """抓取对话列表和每个频道里命中关键词的消息"""
+    client = FakeTelegramClient(channels)
+
+    async def run():
+        with session_factory() as db:
+            service = DialogService(db)
+            service.client = client
+            await service.get_all_dialogs()
+        for channel in channels:
+            with session_factory() as db:
+                service = MessageService(db)
+                service.client = client
+                await service.fetch_messages_by_keywords(channel.channel_id, keyword)
+
+    asyncio.run(run())
+    return client
+
+
+def dialogs_on_distinct_shards(count: int, start: int = 1_000_001) -> list:
+    """按哈希默认分片各不相同的 count 个频道ID"""
+    found = {}
+    dialog_id = start
+    while len(found) < count:
+        found.setdefault(shards.home(dialog_id), dialog_id)
+        dialog_id += 1
+    return sorted(found.values())
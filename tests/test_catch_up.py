@@ -0,0 +1,53 @@
+# tests/test_catch_up.py
+import asyncio
+
+from app.services import CatchUpService, DialogService
+from benchmarks.fake_client import FakeTelegramClient, SyntheticChannel
+
+
+def _run(session_factory, client, method: str):
+    async def run():
+        with session_factory() as db:
+            service = (DialogService if method == "get_all_dialogs" else CatchUpService)(db)
+            service.client = client
+            return await getattr(service, method)()
+
+    return asyncio.run(run())
+
+
+def test_unseedable_channels_do_not_relist_dialogs(sharded):
+    kept, left, joined = (SyntheticChannel(channel_id=channel_id, title=str(channel_id), message_count=20)
+                          for channel_id in (101, 202, 303))
+    client = FakeTelegramClient([kept, left, joined])
+    client.channels.pop(joined.channel_id)
+    _run(sharded, client, "get_all_dialogs")
+    # 退出的频道还在 dialogs 表里，对话列表里已经没有
+    client.channels.pop(left.channel_id)
+    _run(sharded, client, "snapshot")
+
+    listings = []
+    iter_dialogs = client.iter_dialogs
+
+    def counting(*args, **kwargs):
+        listings.append(1)
+        return iter_dialogs(*args, **kwargs)
+
+    client.iter_dialogs = counting
+    assert _run(sharded, client, "catch_up")["seeded"] == 0
+    assert len(listings) == 1
+    for _ in range(2):
+        assert "seeded" not in _run(sharded, client, "catch_up")
+    assert len(listings) == 1
+    with sharded() as db:
+        assert CatchUpService(db).get_state()["channels"][left.channel_id] is None
+
+    # 重新加入后，随新频道翻对话列表时一并取到 pts
+    client.channels[left.channel_id] = left
+    client.channels[joined.channel_id] = joined
+    _run(sharded, client, "get_all_dialogs")
+    listings.clear()
+    assert _run(sharded, client, "catch_up")["seeded"] == 2
+    assert len(listings) == 1
+    with sharded() as db:
+        channels = CatchUpService(db).get_state()["channels"]
+    assert channels[left.channel_id] is not None and channels[joined.channel_id] is not None
@@ -0,0 +1,67 @@
+# tests/test_ingest.py
+import asyncio
+
+from sqlalchemy import select
+
+from app.models import Message
+from app.repositories import shards
+from app.services import MessageService, ViewRefreshService
+from app.services.view_refresh_service import ViewRefreshSettings
+from benchmarks.fake_client import SyntheticChannel
+
+from .conftest import crawl, dialogs_on_distinct_shards
+
+
+def _rows(dialog_id: int) -> dict:
+    with shards.engine(shards.home(dialog_id)).connect() as conn:
+        return {row.message_id: row for row in conn.execute(
+            select(Message.message_id, Message.views, Message.content_hash).where(Message.dialog_id == dialog_id))}
+
+
+def test_view_changes_do_not_rewrite_rows(sharded):
+    dialog_id, = dialogs_on_distinct_shards(1)
+    client = crawl(sharded, [SyntheticChannel(channel_id=dialog_id, title="c", message_count=200, hit_rate=1.0)])
+    before = _rows(dialog_id)
+
+    # 两次抓取之间只有浏览数变了
+    build = client._build_message
+
+    def with_more_views(channel, msg_id):
+        message = build(channel, msg_id)
+        message.views += 1
+        return message
+
+    client._build_message = with_more_views
+    with sharded() as db:
+        service = MessageService(db)
+        service.client = client
+        report = asyncio.run(service.fetch_messages_by_keywords(dialog_id, "needle"))
+
+    assert report["inserted"] == 0
+    assert report["updated"] == 0
+    assert report["unchanged"] == 200
+    after = _rows(dialog_id)
+    assert {m: row.views for m, row in after.items()} == {m: row.views + 1 for m, row in before.items()}
+    assert {m: row.content_hash for m, row in after.items()} == {m: row.content_hash for m, row in before.items()}
+
+
+def test_view_refresh_keeps_fingerprints(sharded):
+    dialog_id, = dialogs_on_distinct_shards(1)
+    client = crawl(sharded, [SyntheticChannel(channel_id=dialog_id, title="c", message_count=200, hit_rate=1.0)])
+    before = _rows(dialog_id)
+
+    with sharded() as db:
+        service = ViewRefreshService(db, ViewRefreshSettings())
+        service.client = client
+        assert asyncio.run(service.refresh(dialog_id, days=0))["updated"] == 200
+    refreshed = _rows(dialog_id)
+    assert any(refreshed[m].views != row.views for m, row in before.items())
+    assert all(refreshed[m].content_hash == row.content_hash for m, row in before.items())
+
+    # 刷新过浏览数的行重抓时内容不变，只写回抓到的浏览数
+    with sharded() as db:
+        service = MessageService(db)
+        service.client = client
+        report = asyncio.run(service.fetch_messages_by_keywords(dialog_id, "needle"))
+    assert report["updated"] == 0
+    assert _rows(dialog_id) == before
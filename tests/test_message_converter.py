@@ -0,0 +1,135 @@
+# tests/test_message_converter.py
+"""convert_message 与 MessageService 原有逐项判断函数逐字段一致"""
+import random
+from datetime import datetime, timezone
+
+import pytest
+from telethon import utils
+from telethon.tl import types
+
+from app.schemas import MediaCreate, MessageCreate
+from app.schemas.message_schema import MediaTypeEnum, SenderTypeEnum
+from app.services import MessageService
+from app.services.message_converter import convert_message
+from benchmarks.bench_converter import ALL_MEDIA, legacy_convert
+from benchmarks.fake_client import _MEDIA_BUILDERS, FakeTelegramClient, SyntheticChannel
+
+CHANNEL_ID = 1_000_001
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+USER_ID = 100_001
+BOT_ID = 100_000
+
+_channel = SyntheticChannel(channel_id=CHANNEL_ID, title="c", message_count=2000, hit_rate=0,
+                            media_mix=ALL_MEDIA, reply_rate=0.2, forward_rate=0.2)
+_client = FakeTelegramClient([_channel])
+_service = MessageService(db=None)
+_chat = types.Chat(id=43, title="g", photo=types.ChatPhotoEmpty(), participants_count=2, date=NOW, version=1)
+_entities = {**_client._entities, utils.get_peer_id(_chat): _chat}
+
+
+def _message(message_id=1, peer=None, **kwargs):
+    message = types.Message(id=message_id, peer_id=peer or types.PeerChannel(CHANNEL_ID), date=NOW,
+                            message="text", **kwargs)
+    message._finish_init(_client, _entities, None)
+    return message
+
+
+def _convert(message):
+    """两条路径都转换一遍，逐字段比对后返回新转换器的结果"""
+    legacy_row, legacy_media = legacy_convert(_service, message)
+    row, media_row = convert_message(message)
+    assert MessageCreate(**row.as_dict()).model_dump() == MessageCreate(**legacy_row).model_dump()
+    assert (MediaCreate(**media_row.as_dict()).model_dump() if media_row else None) == \
+           (legacy_media.model_dump() if legacy_media else None)
+    return row, media_row
+
+
+def _web_document(mime_type="video/mp4", size=123):
+    return types.Document(id=1, access_hash=1, file_reference=b"", date=NOW, mime_type=mime_type, size=size,
+                          dc_id=1, attributes=[types.DocumentAttributeVideo(duration=1.5, w=1, h=1)])
+
+
+@pytest.mark.parametrize("name", sorted(_MEDIA_BUILDERS))
+def test_media_classes(name):
+    row, media_row = _convert(_message(media=_MEDIA_BUILDERS[name](random.Random(0), NOW)))
+    assert row.media_type == media_row.media_type == MediaTypeEnum(name)
+
+
+@pytest.mark.parametrize("media, media_type, media_size", [
+    # 过期照片 / 空文档
+    (types.MessageMediaPhoto(photo=types.PhotoEmpty(id=1)), MediaTypeEnum.photo, None),
+    (types.MessageMediaDocument(document=types.DocumentEmpty(id=1)), MediaTypeEnum.document, None),
+    (types.MessageMediaPoll(poll=types.Poll(id=1, question=types.TextWithEntities(text="q", entities=[]),
+                                            answers=[]), results=types.PollResults()), MediaTypeEnum.poll, None),
+    # 账单的 photo 是 WebDocument，没有 sizes
+    (types.MessageMediaInvoice(title="t", description="d", currency="USD", total_amount=1, start_param="",
+                               photo=types.WebDocumentNoProxy(url="u", size=1, mime_type="image/jpeg",
+                                                              attributes=[])), MediaTypeEnum.photo, None),
+    # 网页预览：空预览、无附件、带文档、同时带照片和文档
+    (types.MessageMediaWebPage(webpage=types.WebPageEmpty(id=1)), MediaTypeEnum.webpage, None),
+    (types.MessageMediaWebPage(webpage=types.WebPage(id=2, url="u", display_url="u", hash=0)),
+     MediaTypeEnum.webpage, None),
+    (types.MessageMediaWebPage(webpage=types.WebPage(id=2, url="u", display_url="u", hash=0,
+                                                     document=_web_document())), MediaTypeEnum.webpage, 123),
+    (types.MessageMediaWebPage(webpage=types.WebPage(
+        id=2, url="u", display_url="u", hash=0, document=_web_document(),
+        photo=types.Photo(id=1, access_hash=1, file_reference=b"", date=NOW, sizes=[], dc_id=1))),
+     MediaTypeEnum.webpage, None),
+    # 不支持的媒体：不生成 medias 行
+    (types.MessageMediaGeo(geo=types.GeoPointEmpty()), None, None),
+    (types.MessageMediaDice(value=3, emoticon="🎲"), None, None),
+])
+def test_media_edge_cases(media, media_type, media_size):
+    row, media_row = _convert(_message(media=media))
+    assert row.media_type == media_type
+    assert row.media_size == media_size
+    assert (media_row is None) == (media_type is None)
+
+
+@pytest.mark.parametrize("peer, dialog_id", [
+    (types.PeerChannel(CHANNEL_ID), CHANNEL_ID),
+    (types.PeerUser(USER_ID), USER_ID),
+    (types.PeerChat(43), 43),
+])
+def test_peer_classes(peer, dialog_id):
+    row, _ = _convert(_message(peer=peer, from_id=types.PeerUser(USER_ID)))
+    assert row.dialog_id == dialog_id
+
+
+@pytest.mark.parametrize("kwargs, sender_id, sender_type", [
+    ({"from_id": types.PeerUser(USER_ID)}, USER_ID, SenderTypeEnum.user),
+    ({"from_id": types.PeerUser(BOT_ID)}, BOT_ID, SenderTypeEnum.bot),
+    # 以频道身份发言 / 频道署名消息（无 from_id，sender 为频道本身）
+    ({"from_id": types.PeerChannel(CHANNEL_ID)}, CHANNEL_ID, SenderTypeEnum.channel),
+    ({"post": True}, CHANNEL_ID, SenderTypeEnum.channel),
+    # 群组里的匿名管理员：没有 from_id，也没有 sender 实体
+    ({"peer": types.PeerChat(43)}, None, SenderTypeEnum.anonymous),
+])
+def test_sender_types(kwargs, sender_id, sender_type):
+    row, _ = _convert(_message(**kwargs))
+    assert (row.sender_id, row.sender_type) == (sender_id, sender_type)
+
+
+@pytest.mark.parametrize("fwd_from, forward_from_id, forward_from_msg_id", [
+    (types.MessageFwdHeader(date=NOW, from_id=types.PeerUser(USER_ID)), USER_ID, None),
+    (types.MessageFwdHeader(date=NOW, from_id=types.PeerChannel(42), channel_post=7), 42, 7),
+    (types.MessageFwdHeader(date=NOW, from_id=types.PeerChat(43)), 43, None),
+    # 隐藏来源的转发只有 from_name
+    (types.MessageFwdHeader(date=NOW, from_name="someone"), None, None),
+])
+def test_forwards(fwd_from, forward_from_id, forward_from_msg_id):
+    row, _ = _convert(_message(fwd_from=fwd_from))
+    assert (row.forward_from_id, row.forward_from_msg_id) == (forward_from_id, forward_from_msg_id)
+
+
+def test_replies():
+    row, _ = _convert(_message(reply_to=types.MessageReplyHeader(reply_to_msg_id=5)))
+    assert row.reply_to_msg_id == 5
+    # 回复的是故事
+    row, _ = _convert(_message(reply_to=types.MessageReplyStoryHeader(peer=types.PeerUser(1), story_id=1)))
+    assert row.reply_to_msg_id is None
+
+
+def test_synthetic_messages():
+    for message_id in range(1, _channel.message_count + 1):
+        _convert(_client._build_message(_channel, message_id))
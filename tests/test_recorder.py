@@ -0,0 +1,36 @@
+# tests/test_recorder.py
+from app.repositories import RecordingStore
+from app.repositories.recording_store import KIND_ENTITY, RecordingSettings
+from app.services.recorder import Recorder
+from benchmarks.fake_client import FakeTelegramClient, SyntheticChannel
+
+
+class _FailingStore(RecordingStore):
+    """第一块写入失败，之后的块只记下来"""
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.blocks = []
+
+    def append(self, dialog_id, records):
+        self.blocks.append(list(records))
+        if len(self.blocks) == 1:
+            raise OSError("disk full")
+        return False
+
+
+def test_entities_are_rewritten_after_a_dropped_block(tmp_path):
+    channel = SyntheticChannel(channel_id=77, title="a", message_count=10)
+    client = FakeTelegramClient([channel])
+    store = _FailingStore(RecordingSettings(recording_dir=str(tmp_path), recording_block_records=4))
+    recorder = Recorder(store)
+
+    for message_id in range(1, 5):
+        recorder.record(client._build_message(channel, message_id))
+    recorder.flush()
+
+    dropped, written = store.blocks
+    channel_entity = bytes(client._channel_entities[channel.channel_id])
+    assert (KIND_ENTITY, channel_entity) in dropped
+    # 频道实体随丢弃的块一起丢了，下一块重新写
+    assert (KIND_ENTITY, channel_entity) in written
@@ -0,0 +1,190 @@
+# tests/test_sharding.py
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app.database import get_db, get_read_db
+from app.main import app
+from app.models import Media, Message
+from app.repositories import (AmbiguousIdError, MediaRepository, MessageRepository, ShardRepository,
+                              ThreadRepository, shards)
+from app.repositories import archive_store
+from app.repositories.shard_repository import SHARDED_MODELS
+from app.services import ArchiveService, MessageService, ShardService
+from benchmarks.fake_client import SyntheticChannel
+
+from .conftest import SHARD_COUNT, crawl, dialogs_on_distinct_shards
+
+_SKIP = {"id", "created_at", "updated_at"}
+
+
+def _channels(dialog_ids, **kwargs):
+    options = {"message_count": 300, "hit_rate": 1.0, "forward_rate": 0.3,
+               "media_mix": {"photo": 0.3, "video": 0.1}}
+    options.update(kwargs)
+    return [SyntheticChannel(channel_id=dialog_id, title=f"c{dialog_id}", **options) for dialog_id in dialog_ids]
+
+
+def _count(index: int, model, dialog_id: int) -> int:
+    with shards.engine(index).connect() as conn:
+        return conn.execute(select(func.count()).select_from(model).where(model.dialog_id == dialog_id)).scalar()
+
+
+def _snapshot(db, dialog_id: int) -> tuple:
+    messages = [tuple(v for k, v in row.items() if k not in _SKIP)
+                for row in MessageRepository(db).iter_by_dialog(dialog_id)]
+    medias = [tuple(v for k, v in row.items() if k not in _SKIP)
+              for row in MediaRepository(db).iter_by_dialog(dialog_id)]
+    return messages, medias
+
+
+@pytest.fixture
+def client(sharded):
+    def session():
+        with sharded() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = session
+    app.dependency_overrides[get_read_db] = session
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_rows_land_on_the_dialog_shard(sharded):
+    dialog_ids = dialogs_on_distinct_shards(SHARD_COUNT)
+    crawl(sharded, _channels(dialog_ids))
+
+    for dialog_id in dialog_ids:
+        home = shards.home(dialog_id)
+        for index in shards.indexes():
+            expected = 300 if index == home else 0
+            assert _count(index, Message, dialog_id) == expected
+    with sharded() as db:
+        assert ShardRepository(db).get_dialog_ids() == [[d] for d in sorted(dialog_ids, key=shards.home)]
+        # dialog_shards 里的记录优先于哈希
+        ShardRepository(db).set_placement(dialog_ids[0], (shards.home(dialog_ids[0]) + 1) % SHARD_COUNT)
+        shards.invalidate()
+        assert shards.index_of(db, dialog_ids[0]) == (shards.home(dialog_ids[0]) + 1) % SHARD_COUNT
+
+
+def test_fan_out_merges_pages_across_shards(sharded):
+    dialog_ids = dialogs_on_distinct_shards(SHARD_COUNT)
+    crawl(sharded, _channels(dialog_ids))
+
+    # 各分片直接查出的全部转发，按 (dialog_id, message_id) 排序作为期望结果
+    by_source = {}
+    for index in shards.indexes():
+        with shards.engine(index).connect() as conn:
+            for source, dialog_id, message_id in conn.execute(
+                    select(Message.forward_from_id, Message.dialog_id, Message.message_id)
+                    .where(Message.forward_from_id.is_not(None))):
+                by_source.setdefault(source, []).append((dialog_id, message_id))
+    source, expected = max(by_source.items(), key=lambda item: len({d for d, _ in item[1]}))
+    assert len({d for d, _ in expected}) > 1
+    expected.sort()
+
+    with sharded() as db:
+        repo = ThreadRepository(db)
+        got, after = [], None
+        while True:
+            page = repo.get_forwarded(source, after, limit=3)
+            got.extend((row["dialog_id"], row["message_id"]) for row in page)
+            if len(page) < 3:
+                break
+            after = got[-1]
+    assert got == expected
+
+
+def test_rebalance_moves_every_row(sharded):
+    dialog_ids = dialogs_on_distinct_shards(2)
+    channels = _channels(dialog_ids)
+    client = crawl(sharded, channels)
+    moved, other = dialog_ids
+    source = shards.home(moved)
+    target = (source + 1) % SHARD_COUNT
+
+    with sharded() as db:
+        before = _snapshot(db, moved)
+        untouched = _snapshot(db, other)
+        report = ShardService(db).rebalance(moved, target, batch_size=64)
+    assert report["rows"]["messages"] == 300
+
+    with sharded() as db:
+        assert shards.index_of(db, moved) == target
+        assert _snapshot(db, moved) == before
+        assert _snapshot(db, other) == untouched
+    assert all(_count(source, model, moved) == 0 for model in SHARDED_MODELS)
+    assert _count(target, Message, moved) == 300
+
+    # 迁移后重抓写到新分片，不产生重复行
+    with sharded() as db:
+        service = MessageService(db)
+        service.client = client
+        import asyncio
+        again = asyncio.run(service.fetch_messages_by_keywords(moved, "needle"))
+    assert again["inserted"] == 0
+    assert _count(target, Message, moved) == 300
+    assert _count(source, Message, moved) == 0
+
+
+def test_by_id_never_returns_another_dialogs_row(sharded, client):
+    first, second = dialogs_on_distinct_shards(2)
+    crawl(sharded, _channels([first, second]))
+
+    # 两个分片的自增主键都从 1 开始
+    with sharded() as db:
+        repo = MessageRepository(db)
+        with pytest.raises(AmbiguousIdError):
+            repo.get_by_id(1)
+        assert repo.get_by_id(1, dialog_id=first).dialog_id == first
+        assert repo.get_by_id(1, dialog_id=second).dialog_id == second
+        message_id = repo.get_by_id(1, dialog_id=first).message_id
+
+    assert client.get("/messages/1").status_code == 409
+    assert client.put("/messages/1", json={"message_id": 1, "dialog_id": first,
+                                           "date": "2025-01-01T00:00:00"}).status_code == 409
+    assert client.delete("/messages/1").status_code == 409
+    assert client.get("/messages/1", params={"dialog_id": second}).json()["dialog_id"] == second
+
+    # 按 (dialog_id, message_id) 修改与删除只影响该频道
+    row = client.get(f"/messages/dialog/{first}/message/{message_id}").json()
+    response = client.put(f"/messages/dialog/{first}/message/{message_id}", json={**row, "views": 123456})
+    assert response.status_code == 200 and response.json()["views"] == 123456
+    assert client.delete("/messages/1", params={"dialog_id": first}).status_code == 204
+    assert _count(shards.home(first), Message, first) == 299
+    assert _count(shards.home(second), Message, second) == 300
+    # 只剩一个分片有这个主键时不带 dialog_id 也能读
+    assert client.get("/messages/1").json()["dialog_id"] == second
+
+    # 媒体同理
+    with sharded() as db:
+        media_ids = [{row[0] for row in shards.shard_session(db, shards.home(d)).execute(select(Media.id))}
+                     for d in (first, second)]
+    shared = min(media_ids[0] & media_ids[1])
+    assert client.get(f"/medias/{shared}").status_code == 409
+    media = client.get(f"/medias/{shared}", params={"dialog_id": first}).json()
+    assert media["dialog_id"] == first
+    assert client.get(f"/medias/dialog/{first}/message/{media['message_id']}").json()["id"] == shared
+    assert client.delete(f"/medias/dialog/{first}/message/{media['message_id']}").status_code == 204
+    assert client.get(f"/medias/{shared}").json()["dialog_id"] == second
+
+
+def test_by_id_sees_archived_rows_from_other_shards(sharded, client, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    settings = archive_store.ArchiveSettings(archive_dir=str(tmp_path / "archive"))
+    monkeypatch.setattr(archive_store, "get_archive_settings", lambda: settings)
+    first, second = dialogs_on_distinct_shards(2)
+    crawl(sharded, _channels([first, second]))
+
+    with sharded() as db:
+        ArchiveService(db, settings).archive(first, before=datetime(2100, 1, 1))
+    assert _count(shards.home(first), Message, first) == 0
+
+    # 热表只有第二个频道有主键 1，归档里还有第一个频道的
+    assert client.get("/messages/1").status_code == 409
+    assert client.get("/messages/1", params={"dialog_id": first}).json()["dialog_id"] == first
+    assert client.get("/messages/1", params={"dialog_id": second}).json()["dialog_id"] == second
@@ -0,0 +1,46 @@
+# tests/test_subscriptions.py
+import asyncio
+
+from sqlalchemy import select
+from telethon import errors
+
+from app.models import ForwardQueueItem
+from app.services import SubscriptionService
+from benchmarks.fake_client import FakeTelegramClient, SyntheticChannel
+
+DIALOG_ID = 77
+
+
+class _Client(FakeTelegramClient):
+    """含 invalid 里消息的一组转发失败，从 flood 里的消息开始的一组触发限流"""
+    invalid = set()
+    flood = set()
+
+    async def forward_messages(self, entity, messages, from_peer=None, **kwargs):
+        if messages[0] in self.flood:
+            raise errors.FloodWaitError(request=None, capture=30)
+        if self.invalid & set(messages):
+            raise ValueError("MESSAGE_ID_INVALID")
+        return await super().forward_messages(entity, messages, from_peer, **kwargs)
+
+
+def test_flood_wait_after_split_only_fails_unsent(sharded):
+    with sharded() as db:
+        db.add_all(ForwardQueueItem(rule_id=1, dialog_id=DIALOG_ID, message_id=message_id, to_chat_id=1)
+                   for message_id in range(1, 9))
+        db.commit()
+
+    client = _Client([SyntheticChannel(channel_id=DIALOG_ID, title="a", message_count=10)])
+    # 整组失败后拆成 1-4 与 5-8：前半里 2 无法转发，1、3、4 转发成功，后半被限流
+    client.invalid, client.flood = {2}, {5}
+    with sharded() as db:
+        service = SubscriptionService(db)
+        service.client = client
+        report = asyncio.run(service.dispatch())
+        assert report == {"batches": 1, "sent": 3, "failed": 5}
+        rows = {row.message_id: row for row in db.execute(select(ForwardQueueItem)).scalars()}
+
+    assert [m for m, row in rows.items() if row.sent_at is not None] == [1, 3, 4]
+    assert {m: row.attempts for m, row in rows.items()} == {1: 1, 2: 1, 3: 1, 4: 1, 5: 1, 6: 1, 7: 1, 8: 1}
+    assert rows[2].error.startswith("ValueError")
+    assert all(rows[m].error.startswith("FloodWaitError") for m in range(5, 9))